@@ -1,10 +1,16 @@
 # app.py
 import subprocess
 import os
+import sys
 from flask import Flask, render_template, Response, stream_with_context
 
 app = Flask(__name__)
 
+# Shared runtime (metrics, debug endpoints) lives at the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import runtime
+runtime.init_app(app)
+
 # Ensure the docker-compose.yml file is in the same directory as app.py,
 # or specify the full path to it here.
 DOCKER_COMPOSE_FILE = 'docker-compose.yml'
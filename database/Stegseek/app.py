@@ -7,40 +7,28 @@ import threading
 import queue
 import time
 import uuid # For unique filenames
-import shutil # Added for shutil.which
 import sys # To detect OS and get command-line arguments
 
 app = Flask(__name__)
 
+# Shared runtime (metrics, debug endpoints) lives at the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import runtime
+
 # Directory to store temporary files (e.g., uploaded images, wordlists, scan outputs)
 UPLOAD_FOLDER = 'uploads'
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
 # In-memory storage for tool outputs and processes
-tool_outputs = {}
+tool_outputs = runtime.JobOutputs()
 tool_processes = {} # To keep track of running Stegseek processes
 tool_queues = {} # To store queues for real-time output
 
-# Load examples from stegseek_examples.txt
-def load_examples(filename="stegseek_examples.txt"):
-    """Loads examples from a JSON file."""
-    try:
-        # Assuming stegseek_examples.txt is in the same directory as app.py
-        filepath = os.path.join(os.path.dirname(__file__), filename)
-        with open(filepath, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"Error: Examples file '{filename}' not found. Please ensure it's in the same directory as app.py.")
-        return []
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from '{filename}': {e}")
-        return []
-    except Exception as e:
-        print(f"An unexpected error occurred while loading examples: {e}")
-        return []
+runtime.init_app(app, upload_folder=UPLOAD_FOLDER, outputs=tool_outputs, processes=tool_processes, queues=tool_queues, tools=['stegseek'])
 
-ALL_EXAMPLES = load_examples()
+# Examples from stegseek_examples.txt, parsed once and again only when the file changes
+EXAMPLES = runtime.ExamplesIndex(app, "stegseek_examples.txt")
 
 @app.route('/')
 def index():
@@ -51,7 +39,7 @@ def index():
 @app.route('/get_examples', methods=['GET'])
 def get_examples():
     """Returns the Stegseek examples as JSON."""
-    return jsonify(ALL_EXAMPLES)
+    return EXAMPLES.serve()
 
 @app.route('/upload_file', methods=['POST'])
 def upload_file():
@@ -171,17 +159,16 @@ def run_stegseek():
     if command[0] != 'stegseek':
         return jsonify({'status': 'error', 'message': 'Only Stegseek commands are allowed.'}), 403
 
-    # Check if stegseek executable exists using shutil.which
-    if shutil.which(command[0]) is None:
+    # Check if stegseek executable exists using runtime.which
+    if runtime.which(command[0]) is None:
         return jsonify({'status': 'error', 'message': f"Stegseek executable '{command[0]}' not found on the server. Please ensure Stegseek is installed and accessible in the system's PATH."}), 500
 
     # Create a new queue for this operation's real-time output
-    output_queue = queue.Queue()
+    output_queue = runtime.OutputLog()
     tool_queues[scan_id] = output_queue
-    tool_outputs[scan_id] = "" # Initialize full output storage
+    tool_outputs[scan_id] = output_queue # The log is the stored output (see runtime.JobOutputs)
 
     def _run_stegseek_thread(cmd, q, scan_id_val):
-        full_output_buffer = []
         try:
             process = subprocess.Popen(
                 cmd,
@@ -195,7 +182,6 @@ def run_stegseek():
 
             for line in iter(process.stdout.readline, ''):
                 q.put(line) # Put each line into the queue
-                full_output_buffer.append(line) # Also append to buffer for final output
 
             process.wait()
             return_code = process.returncode
@@ -204,17 +190,12 @@ def run_stegseek():
             final_status_line += f"STATUS: {'Completed' if return_code == 0 else 'Failed'}\n"
             q.put(final_status_line) # Add final status to queue
 
-            full_output_buffer.append(final_status_line)
-            tool_outputs[scan_id_val] = "".join(full_output_buffer) # Store complete output
-
         except FileNotFoundError:
             error_msg = f"Error: '{cmd[0]}' command not found. Make sure Stegseek is installed and in your system's PATH.\nSTATUS: Error\n"
             q.put(error_msg)
-            tool_outputs[scan_id_val] = error_msg
         except Exception as e:
             error_msg = f"An unexpected error occurred: {e}\nSTATUS: Error\n"
             q.put(error_msg)
-            tool_outputs[scan_id_val] = error_msg
         finally:
             if scan_id_val in tool_processes:
                 del tool_processes[scan_id_val]
@@ -330,7 +311,7 @@ def install_stegseek():
     if sys.platform.startswith('linux'):
         scan_id = str(uuid.uuid4()) # Unique ID for this installation process
         full_output = []
-        output_queue = queue.Queue()
+        output_queue = runtime.OutputLog()
         tool_queues[scan_id] = output_queue
         tool_outputs[scan_id] = "" # Initialize full output storage for this ID
 
@@ -58,6 +58,11 @@ class TwinHexDecoder:
 
 app = Flask(__name__)
 
+# Shared runtime (metrics, debug endpoints) lives at the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import runtime
+runtime.init_app(app)
+
 # Initialize encoder and decoder instances
 encoder = TwinHexEncoder()
 decoder = TwinHexDecoder()
@@ -1,3 +1,4 @@
+import os
 import http.client
 import socket
 import sys
@@ -8,6 +9,11 @@ from flask import Flask, request, jsonify, render_template
 # Initialize Flask app
 app = Flask(__name__)
 
+# Shared runtime (metrics, debug endpoints) lives at the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import runtime
+runtime.init_app(app)
+
 # Define the lists of common admin paths for different technologies
 # These lists are combined from both original Python scripts.
 PHP_PATHS = [
@@ -325,15 +331,27 @@ def scan_admin_pages(site, admin_paths):
     Scans the given website for admin pages using the provided list of paths.
     Returns a list of scan results.
     """
+    # Remove http:// or https:// from the site string for httplib
+    site_clean = site.replace("http://", "").replace("https://", "")
+
+    # Share of the host's request budget with the other tools (runtime/ratelimit.py)
+    lease = runtime.ratelimit.open_lease(runtime.ratelimit.host_of(site_clean), 'adm_pagefinder')
+    try:
+        return _scan_admin_pages(site, site_clean, admin_paths, lease)
+    finally:
+        lease.release()
+
+def _scan_admin_pages(site, site_clean, admin_paths, lease):
     results = []
     var1 = 0  # Counter for admin pages found
     var2 = 0  # Counter for total pages scanned
 
-    # Remove http:// or https:// from the site string for httplib
-    site_clean = site.replace("http://", "").replace("https://", "")
+    if lease.id is not None:
+        results.append({"type": "info", "message": f"[$] Rate limit: {lease.rate:g} requests per second against {lease.host}"})
 
     try:
         # Check if the server is online
+        lease.acquire()
         conn = http.client.HTTPConnection(site_clean, timeout=5)
         conn.request("HEAD", "/")
         response = conn.getresponse()
@@ -354,6 +372,7 @@ def scan_admin_pages(site, admin_paths):
         results.append({"type": "checking", "message": f"[#] Checking {host_url}..."})
 
         try:
+            lease.acquire()
             connection = http.client.HTTPConnection(site_clean, timeout=10)
             connection.request("GET", admin_path_clean)
             response = connection.getresponse()
@@ -9,6 +9,11 @@ from queue import Queue
 # Initialize Flask app
 app = Flask(__name__)
 
+# Shared runtime (metrics, debug endpoints) lives at the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import runtime
+runtime.init_app(app)
+
 # List of admin pages to check (combined from both original scripts)
 # This list can be loaded from a file or database if it becomes very large
 ADMPAGE_LIST = [
@@ -118,9 +123,15 @@ def perform_scan(site):
     if not site.startswith(('http://', 'https://')):
         site = 'http://' + site # Default to http if no scheme provided
 
+    # Share of the host's request budget with the other tools (runtime/ratelimit.py); the loop
+    # below asks for at most 20 requests per second
+    lease = runtime.ratelimit.open_lease(runtime.ratelimit.host_of(site), 'admin finder', wanted=20)
+    if lease.id is not None:
+        log_message(f"Rate limit: {lease.rate:g} requests per second against {lease.host}.")
     try:
         log_message(f"Attempting initial connection to {site}...")
         # Use a HEAD request for faster initial connection check
+        lease.acquire()
         requests.head(site, timeout=5)
         log_message("Initial connection successful.")
         log_message(f"Loaded {len(ADMPAGE_LIST)} admin-pages.")
@@ -140,6 +151,7 @@ def perform_scan(site):
             log_message(f"Checking --- {full_url}")
 
             try:
+                lease.acquire()
                 response = requests.get(full_url, timeout=5)
                 if response.status_code == 200:
                     log_message(f"Page found --- {full_url}", message_type='found')
@@ -171,6 +183,7 @@ def perform_scan(site):
     except Exception as e:
         log_message(f"An unexpected error occurred during scan setup: {e}", message_type='error')
     finally:
+        lease.release()
         scan_in_progress = False
         log_message("SCAN_FINISHED") # Signal frontend that scan has truly finished
 
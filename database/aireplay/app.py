@@ -10,6 +10,11 @@ from flask import Flask, request, jsonify, render_template, Response
 
 # Initialize Flask app
 app = Flask(__name__)
+
+# Shared runtime (metrics, debug endpoints) lives at the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import runtime
+runtime.init_app(app)
 app.config['SECRET_KEY'] = os.urandom(24) # Generate a random secret key for session management
 
 # Global variables for managing the aireplay-ng process and its output
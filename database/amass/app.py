@@ -2,16 +2,21 @@ import os
 import subprocess
 import shlex
 import json
-from flask import Flask, render_template, request, jsonify, send_file
+import sqlite3
+from flask import Flask, Response, render_template, request, jsonify, send_file
 import threading
 import queue
 import time
 import uuid # For unique filenames
-import shutil # Added for shutil.which
 import sys # To detect OS and get command-line arguments
 
 app = Flask(__name__)
 
+# Shared runtime (metrics, debug endpoints) lives at the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import runtime
+import subdomain_store
+
 # Directory to store temporary files (e.g., uploaded wordlists, scan outputs)
 UPLOAD_FOLDER = 'uploads'
 if not os.path.exists(UPLOAD_FOLDER):
@@ -19,29 +24,17 @@ if not os.path.exists(UPLOAD_FOLDER):
 
 # In-memory storage for scan outputs (for demonstration).
 # In a real-world app, consider a more persistent and scalable solution (e.g., database, cloud storage).
-scan_outputs = {}
+scan_outputs = runtime.JobOutputs()
 scan_processes = {} # To keep track of running Amass processes
 scan_queues = {} # To store queues for real-time output
 
-# Load examples from amass_examples.txt
-def load_examples(filename="amass_examples.txt"):
-    """Loads examples from a JSON file."""
-    try:
-        # Assuming amass_examples.txt is in the same directory as app.py
-        filepath = os.path.join(os.path.dirname(__file__), filename)
-        with open(filepath, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"Error: Examples file '{filename}' not found. Please ensure it's in the same directory as app.py.")
-        return []
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from '{filename}': {e}")
-        return []
-    except Exception as e:
-        print(f"An unexpected error occurred while loading examples: {e}")
-        return []
+runtime.init_app(app, upload_folder=UPLOAD_FOLDER, outputs=scan_outputs, processes=scan_processes, queues=scan_queues, tools=['amass'])
 
-ALL_EXAMPLES = load_examples()
+# Every name a run finds goes to the subdomain store (see subdomain_store.py)
+SUBDOMAINS = subdomain_store.SubdomainStore()
+
+# Examples from amass_examples.txt, parsed once and again only when the file changes
+EXAMPLES = runtime.ExamplesIndex(app, "amass_examples.txt")
 
 @app.route('/')
 def index():
@@ -52,122 +45,65 @@ def index():
 @app.route('/get_examples', methods=['GET'])
 def get_examples():
     """Returns the Amass examples as JSON."""
-    return jsonify(ALL_EXAMPLES)
+    return EXAMPLES.serve()
+
+# amass's options by UI tab; /generate_command builds commands from this spec and /command_spec serves it to the UI
+AMASS_COMMAND = runtime.CommandSpec(app, 'amass', {
+    'Main Domain': [
+        runtime.Value('-d', 'domain_entry', prefix=['enum']), # Amass enum is the primary subcommand
+    ],
+    'Scan Types': [
+        runtime.Switch('-passive', 'passive_scan_var', conflicts='enumeration mode'),
+        runtime.Switch('-active', 'active_scan_var', conflicts='enumeration mode'),
+        runtime.Switch('-brute', 'brute_force_var'),
+        runtime.Value('-w', 'wordlist_entry'),
+        runtime.Switch('-r', 'recursive_brute_var'), # Amass uses -r for recursive brute-forcing
+    ],
+    'Sources': [
+        runtime.Value('-src', 'include_sources_entry'),
+        runtime.Value('-exclude', 'exclude_sources_entry'),
+        runtime.Switch('-show', 'list_sources_var'), # Amass uses -show to list data sources
+    ],
+    'Resolvers': [
+        runtime.Value('-r', 'resolvers_entry'), # Amass uses -r for resolvers
+        runtime.Value('-rf', 'resolver_file_entry'),
+    ],
+    'Output': [
+        runtime.Value('-o', 'output_file_entry'),
+        runtime.Value('-json', 'json_output_file_entry'),
+        runtime.Switch('-v', 'verbose_var'),
+        runtime.Switch('-silent', 'silent_var'),
+        runtime.Value('-dir', 'dir_output_entry'),
+    ],
+    'Exclusions/Inclusions': [
+        runtime.Value('-bl', 'blacklist_domains_entry'),
+        runtime.Value('-wl', 'whitelist_domains_entry'),
+        runtime.Value('-blacklist', 'blacklist_subdomains_entry'), # Amass uses -blacklist for subdomains
+        runtime.Value('-whitelist', 'whitelist_subdomains_entry'), # Amass uses -whitelist for subdomains
+    ],
+    'Timing/Performance': [
+        runtime.Value('-max-dns-queries', 'max_dns_queries_entry', type='int'),
+        runtime.Value('-max-retries', 'max_retries_entry', type='int'),
+        runtime.Value('-timeout', 'timeout_entry'),
+        runtime.Value('-rate-limit', 'rate_limit_entry', type='int'),
+    ],
+    'Advanced': [
+        runtime.Value('-config', 'config_file_entry'),
+        runtime.Value('-proxy', 'proxy_entry'),
+        runtime.Lines('-headers', 'http_headers_entry'),
+        runtime.Value('-user-agent', 'user_agent_entry'),
+        runtime.Value('-dir', 'data_path_entry'), # Amass uses -dir for data path
+        runtime.Switch('-version', 'show_version_var'),
+        runtime.Switch('-h', 'show_help_var'),
+        runtime.Extra('additional_args_entry'),
+    ],
+})
 
 @app.route('/generate_command', methods=['POST'])
 def generate_command():
     """Generates the Amass command based on form data."""
-    data = request.json
-    command_parts = ["amass"]
-
-    def add_arg(arg_name, value):
-        if value:
-            command_parts.append(arg_name)
-            command_parts.append(shlex.quote(str(value)))
-
-    def add_checkbox_arg(arg_name, value):
-        if value:
-            command_parts.append(arg_name)
-
-    # Main Domain
-    if data.get('domain_entry'):
-        command_parts.append("enum") # Amass enum is the primary subcommand
-        command_parts.append("-d")
-        command_parts.append(shlex.quote(data['domain_entry']))
-
-    # Scan Types Tab
-    if data.get('passive_scan_var'):
-        add_checkbox_arg("-passive", True)
-    if data.get('active_scan_var'):
-        add_checkbox_arg("-active", True)
-    if data.get('brute_force_var'):
-        add_checkbox_arg("-brute", True)
-    if data.get('wordlist_entry'):
-        add_arg("-w", data.get('wordlist_entry'))
-    if data.get('recursive_brute_var'):
-        add_checkbox_arg("-r", True) # Amass uses -r for recursive brute-forcing
-    if data.get('reverse_dns_var'):
-        add_checkbox_arg("-noreverse", False) # -noreverse means NO reverse DNS, so if checked, don't add it.
-
-    # Sources Tab
-    if data.get('include_sources_entry'):
-        add_arg("-src", data.get('include_sources_entry'))
-    if data.get('exclude_sources_entry'):
-        add_arg("-exclude", data.get('exclude_sources_entry'))
-    if data.get('list_sources_var'):
-        add_checkbox_arg("-show", True) # Amass uses -show to list data sources
-
-    # Resolvers Tab
-    if data.get('resolvers_entry'):
-        add_arg("-r", data.get('resolvers_entry')) # Amass uses -r for resolvers
-    if data.get('resolver_file_entry'):
-        add_arg("-rf", data.get('resolver_file_entry'))
-
-    # Output Tab
-    if data.get('output_file_entry'):
-        add_arg("-o", data.get('output_file_entry'))
-    if data.get('json_output_file_entry'):
-        add_arg("-json", data.get('json_output_file_entry'))
-    if data.get('verbose_var'):
-        add_checkbox_arg("-v", True)
-    if data.get('silent_var'):
-        add_checkbox_arg("-silent", True)
-    if data.get('dir_output_entry'):
-        add_arg("-dir", data.get('dir_output_entry'))
-
-    # Exclusions/Inclusions Tab
-    if data.get('blacklist_domains_entry'):
-        add_arg("-bl", data.get('blacklist_domains_entry'))
-    if data.get('whitelist_domains_entry'):
-        add_arg("-wl", data.get('whitelist_domains_entry'))
-    if data.get('blacklist_subdomains_entry'):
-        add_arg("-blacklist", data.get('blacklist_subdomains_entry')) # Amass uses -blacklist for subdomains
-    if data.get('whitelist_subdomains_entry'):
-        add_arg("-whitelist", data.get('whitelist_subdomains_entry')) # Amass uses -whitelist for subdomains
-
-    # Timing/Performance Tab
-    if data.get('max_dns_queries_entry'):
-        add_arg("-max-dns-queries", data.get('max_dns_queries_entry'))
-    if data.get('max_retries_entry'):
-        add_arg("-max-retries", data.get('max_retries_entry'))
-    if data.get('timeout_entry'):
-        add_arg("-timeout", data.get('timeout_entry'))
-    if data.get('rate_limit_entry'):
-        add_arg("-rate-limit", data.get('rate_limit_entry'))
-
-    # Advanced Tab
-    if data.get('config_file_entry'):
-        add_arg("-config", data.get('config_file_entry'))
-    if data.get('proxy_entry'):
-        add_arg("-proxy", data.get('proxy_entry'))
-    if data.get('http_headers_entry'):
-        headers = data.get('http_headers_entry').strip()
-        if headers:
-            for header_line in headers.split('\n'):
-                header_line = header_line.strip()
-                if header_line:
-                    command_parts.append("-headers")
-                    command_parts.append(shlex.quote(header_line))
-    if data.get('user_agent_entry'):
-        add_arg("-user-agent", data.get('user_agent_entry'))
-    if data.get('data_path_entry'):
-        add_arg("-dir", data.get('data_path_entry')) # Amass uses -dir for data path
-    if data.get('show_version_var'):
-        add_checkbox_arg("-version", True)
-    if data.get('show_help_var'):
-        add_checkbox_arg("-h", True)
-
-    additional_args = data.get('additional_args_entry', '').strip()
-    if additional_args:
-        try:
-            split_args = shlex.split(additional_args)
-            command_parts.extend(split_args)
-        except ValueError:
-            # Fallback if shlex can't parse, just add as a single string (less safe)
-            command_parts.append(shlex.quote(additional_args))
-
-    generated_cmd = " ".join(command_parts)
-    return jsonify({'command': generated_cmd})
+    command, warnings = AMASS_COMMAND.build(request.json)
+    return jsonify({'command': command, 'warnings': warnings})
 
 @app.route('/run_amass', methods=['POST'])
 def run_amass():
@@ -198,17 +134,22 @@ def run_amass():
     if command[0] != 'amass':
         return jsonify({'status': 'error', 'message': 'Only Amass commands are allowed.'}), 403
 
-    # Check if amass executable exists using shutil.which
-    if shutil.which(command[0]) is None:
+    # Check if amass executable exists using runtime.which
+    if runtime.which(command[0]) is None:
         return jsonify({'status': 'error', 'message': f"Amass executable '{command[0]}' not found on the server. Please ensure Amass is installed and accessible in the system's PATH."}), 500
 
     # Create a new queue for this scan's real-time output
-    output_queue = queue.Queue()
+    output_queue = runtime.OutputLog()
     scan_queues[scan_id] = output_queue
-    scan_outputs[scan_id] = "" # Initialize full output storage
+    scan_outputs[scan_id] = output_queue # The log is the stored output (see runtime.JobOutputs)
 
     def _run_amass_thread(cmd, q, scan_id_val):
-        full_output_buffer = []
+        recorder = None
+        return_code = None
+        try:
+            recorder = subdomain_store.RunRecorder(SUBDOMAINS, scan_id_val, cmd)
+        except sqlite3.Error as e:
+            q.put(f"Could not open the subdomain store, names will not be recorded: {e}\n")
         try:
             process = subprocess.Popen(
                 cmd,
@@ -222,27 +163,29 @@ def run_amass():
 
             for line in iter(process.stdout.readline, ''):
                 q.put(line) # Put each line into the queue
-                full_output_buffer.append(line) # Also append to buffer for final output
+                if recorder is not None:
+                    recorder.feed(line)
+                    if recorder.error is not None: # Keep draining amass, just stop recording
+                        q.put(f"Could not record the subdomains, names are no longer recorded: {recorder.error}\n")
+                        recorder = None
 
             process.wait()
             return_code = process.returncode
 
             final_status_line = f"\nAmass finished with exit code: {return_code}\n"
+            final_status_line += _finish_recording(recorder, return_code == 0)
             final_status_line += f"STATUS: {'Completed' if return_code == 0 else 'Failed'}\n"
             q.put(final_status_line) # Add final status to queue
 
-            full_output_buffer.append(final_status_line)
-            scan_outputs[scan_id_val] = "".join(full_output_buffer) # Store complete output
-
         except FileNotFoundError:
             error_msg = f"Error: '{cmd[0]}' command not found. Make sure Amass is installed and in your system's PATH.\nSTATUS: Error\n"
             q.put(error_msg)
-            scan_outputs[scan_id_val] = error_msg
         except Exception as e:
             error_msg = f"An unexpected error occurred: {e}\nSTATUS: Error\n"
             q.put(error_msg)
-            scan_outputs[scan_id_val] = error_msg
         finally:
+            if return_code is None: # Failed before the end: keep what was found, without a delta
+                _finish_recording(recorder, False)
             if scan_id_val in scan_processes:
                 del scan_processes[scan_id_val]
             # Signal end of output by putting a special marker
@@ -256,6 +199,117 @@ def run_amass():
 
     return jsonify({'status': 'running', 'scan_id': scan_id, 'message': 'Amass scan started.'})
 
+def _finish_recording(recorder, completed):
+    """Closes a run in the subdomain store. Returns the 'new / gone since the last run' lines."""
+    if recorder is None:
+        return ""
+    try:
+        deltas = recorder.finish(completed)
+    except sqlite3.Error as e:
+        return f"Could not record the subdomains: {e}\n"
+    lines = ""
+    for delta in deltas:
+        if delta is None:
+            continue
+        if delta['previous_run'] is None:
+            lines += f"Subdomains of {delta['domain']}: {delta['names']} name(s), the first completed run.\n"
+        else:
+            lines += (f"Subdomains of {delta['domain']}: {delta['names']} name(s), {delta['new']} new and "
+                      f"{delta['gone']} gone since the last run (GET /amass/{delta['domain']}/delta).\n")
+    return lines
+
+def _page_args():
+    """offset and limit query arguments; raises ValueError."""
+    offset = max(int(request.args.get('offset', 0)), 0)
+    limit = min(max(int(request.args.get('limit', 100)), 1), subdomain_store.MAX_LIMIT)
+    return offset, limit
+
+def _since_arg(name):
+    value = request.args.get(name)
+    return float(value) if value not in (None, '') else None
+
+@app.route('/amass/domains', methods=['GET'])
+def amass_domains():
+    """The domains in the subdomain store, with their name counts."""
+    try:
+        return jsonify({'status': 'success', 'domains': SUBDOMAINS.domains()})
+    except sqlite3.Error as e:
+        return jsonify({'status': 'error', 'message': f'Could not read the subdomain store: {e}'}), 500
+
+@app.route('/amass/<domain>/names', methods=['GET'])
+def amass_names(domain):
+    """
+    Names found for a domain, in tree order. ?suffix=dev.example.com keeps a subtree; seen_since and
+    new_since (epoch seconds) keep names last or first seen after a time; offset and limit page them.
+    format=txt downloads the matching names, one per line.
+    """
+    domain = domain.lower().strip('.')
+    try:
+        seen_since, new_since = _since_arg('seen_since'), _since_arg('new_since')
+        offset, limit = _page_args()
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'offset, limit, seen_since and new_since must be numbers.'}), 400
+    suffix = request.args.get('suffix') or None
+    try:
+        if request.args.get('format') == 'txt':
+            names = SUBDOMAINS.names(domain, suffix, seen_since, new_since)
+            return Response(''.join(name['name'] + '\n' for name in names), mimetype='text/plain',
+                            headers={'Content-Disposition': f'attachment; filename=amass_{domain}_names.txt'})
+        names = SUBDOMAINS.names(domain, suffix, seen_since, new_since, offset, limit + 1)
+    except sqlite3.Error as e:
+        return jsonify({'status': 'error', 'message': f'Could not read the subdomain store: {e}'}), 500
+    return jsonify({'domain': domain, 'suffix': suffix, 'offset': offset, 'limit': limit,
+                    'more': len(names) > limit, 'names': names[:limit]})
+
+@app.route('/amass/<domain>/delta', methods=['GET'])
+def amass_delta(domain):
+    """The names new and gone in a completed run (?run=<id>, default: the latest) against the one before it."""
+    domain = domain.lower().strip('.')
+    try:
+        run_id = int(request.args['run']) if request.args.get('run') else None
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'run must be a run id.'}), 400
+    try:
+        delta = SUBDOMAINS.delta(domain, run_id)
+        if delta is None:
+            return jsonify({'status': 'not_found', 'message': f'No completed run of {domain} found.'}), 404
+        delta['runs'] = SUBDOMAINS.runs(domain)
+    except sqlite3.Error as e:
+        return jsonify({'status': 'error', 'message': f'Could not read the subdomain store: {e}'}), 500
+    return jsonify(delta)
+
+@app.route('/amass/<domain>/export', methods=['POST'])
+def amass_export(domain):
+    """
+    Saves names of a domain as a shared target list that other apps run batches against
+    ({"targets_list": <list>} in /run_batch). Body: suffix, and only = all (default) or new
+    (the names new in the latest completed run).
+    """
+    domain = domain.lower().strip('.')
+    data = request.json or {}
+    only = data.get('only') or 'all'
+    if only not in ('all', 'new'):
+        return jsonify({'status': 'error', 'message': "only must be 'all' or 'new'."}), 400
+    suffix = (data.get('suffix') or '').lower().strip('.') or None
+    try:
+        if only == 'new':
+            delta = SUBDOMAINS.delta(domain)
+            if delta is None:
+                return jsonify({'status': 'not_found', 'message': f'No completed run of {domain} found.'}), 404
+            names = [name for name in delta['new'] if not suffix or name == suffix or name.endswith('.' + suffix)]
+        else:
+            names = [name['name'] for name in SUBDOMAINS.names(domain, suffix)]
+    except sqlite3.Error as e:
+        return jsonify({'status': 'error', 'message': f'Could not read the subdomain store: {e}'}), 500
+    if not names:
+        return jsonify({'status': 'error', 'message': 'No names to export.'}), 400
+    try:
+        list_name = runtime.batch.save_target_list(f"amass_{suffix or domain}{'_new' if only == 'new' else ''}", names)
+    except (OSError, ValueError) as e:
+        return jsonify({'status': 'error', 'message': f'Could not save the target list: {e}'}), 500
+    return jsonify({'status': 'success', 'targets_list': list_name, 'names': len(names),
+                    'message': f'{len(names)} name(s) saved as target list {list_name}.'})
+
 # Modified get_scan_output to handle 'amass_install' ID
 @app.route('/get_scan_output/<scan_id>', methods=['GET'])
 def get_scan_output(scan_id):
@@ -360,7 +414,7 @@ def install_amass():
     # Check if running on Linux or Termux (sys.platform for Termux is 'linux')
     if sys.platform.startswith('linux'):
         scan_id = str(uuid.uuid4()) # Unique ID for this installation process
-        output_queue = queue.Queue()
+        output_queue = runtime.OutputLog()
         scan_queues[scan_id] = output_queue
         scan_outputs[scan_id] = "" # Initialize full output storage for this ID
 
@@ -0,0 +1,275 @@
+"""
+Subdomain store: the names amass found for each domain, across runs.
+
+The runner picks names out of amass's output as it arrives (plain `name`
+lines of amass 3, or `name (FQDN) --> ...` lines of amass 4) and keeps the
+ones under a domain given with -d. They are stored in a local SQLite
+database, keyed by (domain, reversed name): `api.dev.example.com` is kept
+as `com.example.dev.api`. The table is a sorted set in which every subtree
+is one contiguous range, so "everything under dev.example.com" is a range
+scan. Each name has first-seen and last-seen times and the runs it was seen
+in.
+
+When a run completes, its delta against the previous completed run of the
+domain is computed once and stored:
+
+* new: seen in this run, not in the previous one;
+* gone: seen in the previous run, not in this one.
+
+A run that failed or was stopped records its names but gets no delta, and
+it does not count as the previous run of the next one.
+
+The database is CYBERWEB_AMASS_DB (default: subdomains.db in the app folder).
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+
+DB_PATH = os.environ.get('CYBERWEB_AMASS_DB', 'subdomains.db')
+FLUSH_NAMES = 500
+FLUSH_SECONDS = 2.0
+MAX_LIMIT = 5000
+_NAME = re.compile(r'(?<![\w.-])(?:[a-z0-9_](?:[a-z0-9_-]{0,61}[a-z0-9_])?\.)+[a-z][a-z0-9-]{0,61}[a-z0-9](?![\w-])')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    scan_id TEXT,
+    domain TEXT NOT NULL,
+    args TEXT,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    status TEXT NOT NULL,          -- running, completed or failed
+    names INTEGER,
+    new INTEGER,
+    gone INTEGER,
+    previous_run INTEGER           -- the completed run the delta is against
+);
+CREATE INDEX IF NOT EXISTS runs_domain ON runs (domain, status, id);
+CREATE TABLE IF NOT EXISTS names (
+    domain TEXT NOT NULL,
+    rname TEXT NOT NULL,           -- labels in reverse order: com.example.dev.api
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    first_run INTEGER,
+    last_run INTEGER,
+    last_completed_run INTEGER,
+    PRIMARY KEY (domain, rname)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS names_last_run ON names (domain, last_run);
+CREATE INDEX IF NOT EXISTS names_last_completed_run ON names (domain, last_completed_run);
+CREATE TABLE IF NOT EXISTS changes (
+    run_id INTEGER NOT NULL,
+    change TEXT NOT NULL,          -- new or gone
+    rname TEXT NOT NULL,
+    PRIMARY KEY (run_id, change, rname)
+) WITHOUT ROWID;
+"""
+_UPSERT = """
+INSERT INTO names (domain, rname, first_seen, last_seen, first_run, last_run) VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT (domain, rname) DO UPDATE SET last_seen = excluded.last_seen, last_run = excluded.last_run
+"""
+
+
+def reverse_name(name):
+    return '.'.join(reversed(name.split('.')))
+
+
+def domains_of(argv):
+    """The domains an amass argv enumerates: every -d value (comma separated) and the lines of -df files."""
+    domains = []
+    for index, token in enumerate(argv[:-1]):
+        if token == '-d':
+            domains.extend(argv[index + 1].split(','))
+        elif token == '-df':
+            try:
+                with open(argv[index + 1]) as f:
+                    domains.extend(f.read().split())
+            except OSError:
+                pass
+    return list(dict.fromkeys(domain.strip().strip('.').lower() for domain in domains if domain.strip().strip('.')))
+
+
+class NameParser:
+    """Picks the names under a set of domains out of amass output lines."""
+
+    def __init__(self, domains):
+        # Longest domain first, so a name goes to the most specific domain given
+        self.domains = sorted(domains, key=len, reverse=True)
+
+    def names(self, line):
+        """(domain, name) pairs in one output line."""
+        found = []
+        for name in _NAME.findall(line.lower()):
+            for domain in self.domains:
+                if name == domain or name.endswith('.' + domain):
+                    found.append((domain, name))
+                    break
+        return found
+
+
+class SubdomainStore:
+    """The SQLite subdomain store of the amass app."""
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self.local = threading.local() # One connection per thread
+        self.connection().executescript(SCHEMA)
+
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self.local.connection = connection
+        return connection
+
+    def start_run(self, scan_id, domain, args):
+        with self.connection() as connection:
+            return connection.execute(
+                "INSERT INTO runs (scan_id, domain, args, started_at, status) VALUES (?, ?, ?, ?, 'running')",
+                (scan_id, domain, args, time.time())).lastrowid
+
+    def add(self, run_id, domain, names):
+        now = time.time()
+        with self.connection() as connection:
+            connection.executemany(_UPSERT, [(domain, reverse_name(name), now, now, run_id, run_id) for name in names])
+
+    def finish_run(self, run_id, domain, completed):
+        """Closes a run; a completed run gets its delta against the previous completed run."""
+        connection = self.connection()
+        with connection:
+            names = connection.execute('SELECT COUNT(*) FROM names WHERE domain = ? AND last_run = ?',
+                                       (domain, run_id)).fetchone()[0]
+            if not completed:
+                connection.execute("UPDATE runs SET status = 'failed', finished_at = ?, names = ? WHERE id = ?",
+                                   (time.time(), names, run_id))
+                return None
+            row = connection.execute(
+                "SELECT MAX(id) FROM runs WHERE domain = ? AND status = 'completed' AND id < ?",
+                (domain, run_id)).fetchone()
+            previous = row[0]
+            new = connection.execute(
+                "INSERT INTO changes (run_id, change, rname) SELECT ?, 'new', rname FROM names "
+                "WHERE domain = ? AND last_run = ? AND last_completed_run IS NOT ?",
+                (run_id, domain, run_id, previous)).rowcount
+            gone = 0
+            if previous is not None:
+                gone = connection.execute(
+                    "INSERT INTO changes (run_id, change, rname) SELECT ?, 'gone', rname FROM names "
+                    "WHERE domain = ? AND last_completed_run = ? AND last_run != ?",
+                    (run_id, domain, previous, run_id)).rowcount
+            connection.execute('UPDATE names SET last_completed_run = ? WHERE domain = ? AND last_run = ?',
+                               (run_id, domain, run_id))
+            connection.execute(
+                "UPDATE runs SET status = 'completed', finished_at = ?, names = ?, new = ?, gone = ?, previous_run = ? "
+                "WHERE id = ?", (time.time(), names, new, gone, previous, run_id))
+        return {'run_id': run_id, 'domain': domain, 'names': names, 'new': new, 'gone': gone, 'previous_run': previous}
+
+    def delta(self, domain, run_id=None):
+        """The new and gone names of a completed run (default: the latest one) of a domain, or None."""
+        connection = self.connection()
+        if run_id is None:
+            row = connection.execute("SELECT MAX(id) FROM runs WHERE domain = ? AND status = 'completed'",
+                                     (domain,)).fetchone()
+            run_id = row[0]
+        run = self._run(run_id)
+        if run is None or run['domain'] != domain or run['status'] != 'completed':
+            return None
+        changes = {'new': [], 'gone': []}
+        for change, rname in connection.execute('SELECT change, rname FROM changes WHERE run_id = ? ORDER BY rname',
+                                                (run_id,)):
+            changes[change].append(reverse_name(rname))
+        run.update(changes)
+        return run
+
+    def _run(self, run_id):
+        cursor = self.connection().execute('SELECT * FROM runs WHERE id = ?', (run_id,))
+        row = cursor.fetchone()
+        return dict(zip([column[0] for column in cursor.description], row)) if row is not None else None
+
+    def runs(self, domain, limit=50):
+        cursor = self.connection().execute('SELECT * FROM runs WHERE domain = ? ORDER BY id DESC LIMIT ?',
+                                           (domain, limit))
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+    def domains(self):
+        rows = self.connection().execute(
+            "SELECT domain, COUNT(*), MAX(last_seen) FROM names GROUP BY domain ORDER BY domain").fetchall()
+        return [{'domain': domain, 'names': count, 'last_seen': last_seen} for domain, count, last_seen in rows]
+
+    def names(self, domain, suffix=None, seen_since=None, new_since=None, offset=0, limit=None):
+        """
+        Names of a domain in tree order (api.dev.example.com right after dev.example.com), with their
+        times. `suffix` keeps a subtree (dev.example.com and the names under it); `seen_since` and
+        `new_since` (epoch seconds) keep names last or first seen after a time.
+        """
+        where, params = ['domain = ?'], [domain]
+        if suffix:
+            prefix = reverse_name(suffix.strip('.').lower())
+            where.append('(rname = ? OR (rname > ? AND rname < ?))') # '/' sorts right after '.'
+            params += [prefix, prefix + '.', prefix + '/']
+        if seen_since is not None:
+            where.append('last_seen >= ?')
+            params.append(seen_since)
+        if new_since is not None:
+            where.append('first_seen >= ?')
+            params.append(new_since)
+        query = f"SELECT rname, first_seen, last_seen, first_run, last_run FROM names WHERE {' AND '.join(where)} ORDER BY rname"
+        if limit is not None:
+            query += ' LIMIT ? OFFSET ?'
+            params += [limit, offset]
+        return [{'name': reverse_name(rname), 'first_seen': first_seen, 'last_seen': last_seen,
+                 'first_run': first_run, 'last_run': last_run}
+                for rname, first_seen, last_seen, first_run, last_run in self.connection().execute(query, params)]
+
+
+class RunRecorder:
+    """
+    Parses one running amass job's output into the store, in batches. When a write fails, `error` is set
+    and the recorder ignores further output, so the caller can drop it and keep reading amass.
+    """
+
+    def __init__(self, store, scan_id, argv):
+        self.store = store
+        self.parser = NameParser(domains_of(argv))
+        self.runs = {domain: store.start_run(scan_id, domain, ' '.join(argv)) for domain in self.parser.domains}
+        self.seen = set() # (domain, name) of this run
+        self.pending = []
+        self.flushed_at = time.monotonic()
+        self.error = None # The sqlite3.Error that stopped the recording
+
+    def feed(self, line):
+        if self.error is not None:
+            return
+        for pair in self.parser.names(line):
+            if pair not in self.seen:
+                self.seen.add(pair)
+                self.pending.append(pair)
+        if len(self.pending) >= FLUSH_NAMES or (self.pending and time.monotonic() - self.flushed_at >= FLUSH_SECONDS):
+            self.flush()
+
+    def flush(self):
+        by_domain = {}
+        for domain, name in self.pending:
+            by_domain.setdefault(domain, []).append(name)
+        self.pending = []
+        self.flushed_at = time.monotonic()
+        try:
+            for domain, names in by_domain.items():
+                self.store.add(self.runs[domain], domain, names)
+        except sqlite3.Error as e:
+            if self.error is None:
+                print(f"Could not record amass names in the subdomain store: {e}")
+            self.error = e
+
+    def finish(self, completed):
+        """Writes what is left and closes the runs. Returns the delta of each domain (if completed)."""
+        self.flush()
+        if self.error is not None:
+            raise self.error
+        return [self.store.finish_run(run_id, domain, completed) for domain, run_id in self.runs.items()]
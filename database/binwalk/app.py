@@ -7,11 +7,14 @@ import threading
 import queue
 import time
 import uuid # For unique filenames
-import shutil # Added for shutil.which
 import sys # To detect OS and get command-line arguments
 
 app = Flask(__name__)
 
+# Shared runtime (metrics, debug endpoints) lives at the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import runtime
+
 # Directory to store temporary files (e.g., uploaded target files, scan outputs)
 UPLOAD_FOLDER = 'uploads'
 if not os.path.exists(UPLOAD_FOLDER):
@@ -23,20 +26,10 @@ binwalk_outputs = {}
 binwalk_processes = {} # To keep track of running binwalk processes
 binwalk_queues = {} # To store queues for real-time output
 
-# Load examples from binwalk_examples.txt
-def load_examples(filename="binwalk_examples.txt"):
-    """Loads examples from a JSON file."""
-    try:
-        # Assuming binwalk_examples.txt is in the same directory as app.py
-        filepath = os.path.join(os.path.dirname(__file__), filename)
-        with open(filepath, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"Error: Examples file '{filename}' not found. Please ensure it's in the same directory as app.py.")
-        return []
-    except json.JSONDecodeError:
-        print(f"Error: Could not decode JSON from '{filename}'. Please check its format.")
-        return []
+runtime.init_app(app, upload_folder=UPLOAD_FOLDER, outputs=binwalk_outputs, processes=binwalk_processes, queues=binwalk_queues, tools=['binwalk'])
+
+# Examples from binwalk_examples.txt, parsed once and again only when the file changes
+EXAMPLES = runtime.ExamplesIndex(app, "binwalk_examples.txt")
 
 # Function to run a command and stream its output to a queue
 def run_command_stream_output(command, scan_id, output_queue):
@@ -104,7 +97,7 @@ def run_binwalk():
     print(f"Executing command: {full_command}")
 
     scan_id = str(uuid.uuid4())
-    output_queue = queue.Queue()
+    output_queue = runtime.OutputLog()
     binwalk_queues[scan_id] = output_queue
 
     # Start binwalk in a new thread to avoid blocking the Flask app
@@ -144,13 +137,12 @@ def stream_output(scan_id):
 @app.route('/get_examples')
 def get_examples():
     """Returns the binwalk examples."""
-    examples = load_examples()
-    return jsonify(examples)
+    return EXAMPLES.serve()
 
 @app.route('/check_binwalk_installed')
 def check_binwalk_installed():
     """Checks if binwalk is installed on the system."""
-    binwalk_path = shutil.which("binwalk")
+    binwalk_path = runtime.which("binwalk")
     if binwalk_path:
         return jsonify({'installed': True, 'path': binwalk_path}), 200
     else:
@@ -15,6 +15,11 @@ from werkzeug.serving import make_server
 # --- Flask Application Setup ---
 app = Flask(__name__)
 
+# Shared runtime (metrics, debug endpoints) lives at the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import runtime
+runtime.init_app(app)
+
 # --- Logging Setup ---
 # Create a thread-safe queue for logs
 log_queue = queue.Queue()
@@ -7,40 +7,29 @@ import threading
 import queue
 import time
 import uuid # For unique filenames
-import shutil # Added for shutil.which
 import sys # To detect OS and get command-line arguments
 import urllib.parse # For URL encoding
 
 app = Flask(__name__)
 
+# Shared runtime (metrics, debug endpoints) lives at the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import runtime
+
 # Directory to store temporary files (e.g., scan outputs)
 UPLOAD_FOLDER = 'uploads'
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
 # In-memory storage for command outputs.
-lfi_outputs = {}
+lfi_outputs = runtime.JobOutputs()
 lfi_processes = {} # To keep track of running curl processes
 lfi_queues = {} # To store queues for real-time output
 
-# Load examples from lfi_examples.txt
-def load_examples(filename="lfi_examples.txt"):
-    """Loads examples from a JSON file."""
-    try:
-        filepath = os.path.join(os.path.dirname(__file__), filename)
-        with open(filepath, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"Error: Examples file '{filename}' not found. Please ensure it's in the same directory as app.py.")
-        return []
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from '{filename}': {e}")
-        return []
-    except Exception as e:
-        print(f"An unexpected error occurred while loading examples: {e}")
-        return []
+runtime.init_app(app, upload_folder=UPLOAD_FOLDER, outputs=lfi_outputs, processes=lfi_processes, queues=lfi_queues, tools=['curl'])
 
-ALL_LFI_EXAMPLES = load_examples()
+# Examples from lfi_examples.txt, parsed once and again only when the file changes
+EXAMPLES = runtime.ExamplesIndex(app, "lfi_examples.txt")
 
 @app.route('/')
 def index():
@@ -50,7 +39,7 @@ def index():
 @app.route('/get_examples', methods=['GET'])
 def get_examples():
     """Returns the LFI examples as JSON."""
-    return jsonify(ALL_LFI_EXAMPLES)
+    return EXAMPLES.serve()
 
 @app.route('/generate_curl_command', methods=['POST'])
 def generate_curl_command():
@@ -210,17 +199,16 @@ def run_curl():
     if command[0] != 'curl':
         return jsonify({'status': 'error', 'message': 'Only curl commands are allowed.'}), 403
 
-    # Check if curl executable exists using shutil.which
-    if shutil.which(command[0]) is None:
+    # Check if curl executable exists using runtime.which
+    if runtime.which(command[0]) is None:
         return jsonify({'status': 'error', 'message': f"curl executable '{command[0]}' not found on the server. Please ensure curl is installed and accessible in the system's PATH."}), 500
 
     # Create a new queue for this scan's real-time output
-    output_queue = queue.Queue()
+    output_queue = runtime.OutputLog()
     lfi_queues[scan_id] = output_queue
-    lfi_outputs[scan_id] = "" # Initialize full output storage
+    lfi_outputs[scan_id] = output_queue # The log is the stored output (see runtime.JobOutputs)
 
     def _run_curl_thread(cmd, q, scan_id_val):
-        full_output_buffer = []
         try:
             process = subprocess.Popen(
                 cmd,
@@ -234,7 +222,6 @@ def run_curl():
 
             for line in iter(process.stdout.readline, ''):
                 q.put(line) # Put each line into the queue
-                full_output_buffer.append(line) # Also append to buffer for final output
 
             process.wait()
             return_code = process.returncode
@@ -243,17 +230,12 @@ def run_curl():
             final_status_line += f"STATUS: {'Completed' if return_code == 0 else 'Failed'}\n"
             q.put(final_status_line) # Add final status to queue
 
-            full_output_buffer.append(final_status_line)
-            lfi_outputs[scan_id_val] = "".join(full_output_buffer) # Store complete output
-
         except FileNotFoundError:
             error_msg = f"Error: '{cmd[0]}' command not found. Make sure curl is installed and in your system's PATH.\nSTATUS: Error\n"
             q.put(error_msg)
-            lfi_outputs[scan_id_val] = error_msg
         except Exception as e:
             error_msg = f"An unexpected error occurred: {e}\nSTATUS: Error\n"
             q.put(error_msg)
-            lfi_outputs[scan_id_val] = error_msg
         finally:
             if scan_id_val in lfi_processes:
                 del lfi_processes[scan_id_val]
@@ -373,7 +355,7 @@ def install_curl():
     if sys.platform.startswith('linux'):
         scan_id = str(uuid.uuid4()) # Unique ID for this installation process
         full_output = []
-        output_queue = queue.Queue()
+        output_queue = runtime.OutputLog()
         lfi_queues[scan_id] = output_queue
         lfi_outputs[scan_id] = "" # Initialize full output storage for this ID
 
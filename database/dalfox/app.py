@@ -7,11 +7,14 @@ import threading
 import queue
 import time
 import uuid # For unique filenames
-import shutil # Added for shutil.which
 import sys # To detect OS and get command-line arguments
 
 app = Flask(__name__)
 
+# Shared runtime (metrics, debug endpoints) lives at the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import runtime
+
 # Directory to store temporary files (e.g., uploaded target lists, scan outputs)
 UPLOAD_FOLDER = 'uploads'
 if not os.path.exists(UPLOAD_FOLDER):
@@ -19,29 +22,14 @@ if not os.path.exists(UPLOAD_FOLDER):
 
 # In-memory storage for scan outputs (for demonstration).
 # In a real-world app, consider a more persistent and scalable solution (e.g., database, cloud storage).
-scan_outputs = {}
+scan_outputs = runtime.JobOutputs()
 scan_processes = {} # To keep track of running Dalfox processes
 scan_queues = {} # To store queues for real-time output
 
-# Load examples from dalfox_examples.txt
-def load_examples(filename="dalfox_examples.txt"):
-    """Loads examples from a JSON file."""
-    try:
-        # Assuming dalfox_examples.txt is in the same directory as dalfox_app.py
-        filepath = os.path.join(os.path.dirname(__file__), filename)
-        with open(filepath, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"Error: Examples file '{filename}' not found. Please ensure it's in the same directory as dalfox_app.py.")
-        return []
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from '{filename}': {e}")
-        return []
-    except Exception as e:
-        print(f"An unexpected error occurred while loading examples: {e}")
-        return []
+runtime.init_app(app, upload_folder=UPLOAD_FOLDER, outputs=scan_outputs, processes=scan_processes, queues=scan_queues, tools=['dalfox'])
 
-ALL_EXAMPLES = load_examples()
+# Examples from dalfox_examples.txt, parsed once and again only when the file changes
+EXAMPLES = runtime.ExamplesIndex(app, "dalfox_examples.txt")
 
 @app.route('/')
 def index():
@@ -54,7 +42,7 @@ def index():
 @app.route('/get_examples', methods=['GET'])
 def get_examples():
     """Returns the Dalfox examples as JSON."""
-    return jsonify(ALL_EXAMPLES)
+    return EXAMPLES.serve()
 
 @app.route('/generate_command', methods=['POST'])
 def generate_command():
@@ -160,18 +148,22 @@ def run_dalfox():
     if command[0] != 'dalfox':
         return jsonify({'status': 'error', 'message': 'Only Dalfox commands are allowed.'}), 403
 
-    # Check if dalfox executable exists using shutil.which
-    if shutil.which(command[0]) is None:
+    # Check if dalfox executable exists using runtime.which
+    if runtime.which(command[0]) is None:
         return jsonify({'status': 'error', 'message': f"Dalfox executable '{command[0]}' not found on the server. Please ensure Dalfox is installed and accessible in the system's PATH."}), 500
 
     # Create a new queue for this scan's real-time output
-    output_queue = queue.Queue()
+    output_queue = runtime.OutputLog()
     scan_queues[scan_id] = output_queue
-    scan_outputs[scan_id] = "" # Initialize full output storage
+    scan_outputs[scan_id] = output_queue # The log is the stored output (see runtime.JobOutputs)
 
     def _run_dalfox_thread(cmd, q, scan_id_val):
-        full_output_buffer = []
+        # Pace the tool to its share of the target host's request budget (runtime/ratelimit.py)
+        cmd, lease = runtime.ratelimit.throttle_command(cmd, q, cancelled=q.cancelled)
         try:
+            if q.cancelled.is_set(): # Stopped through /jobs/<id>/cancel while waiting for budget
+                q.put("Cancelled before the scan started.\nSTATUS: Cancelled\n")
+                return
             process = subprocess.Popen(
                 cmd,
                 stdout=subprocess.PIPE,
@@ -184,7 +176,6 @@ def run_dalfox():
 
             for line in iter(process.stdout.readline, ''):
                 q.put(line) # Put each line into the queue
-                full_output_buffer.append(line) # Also append to buffer for final output
 
             process.wait()
             return_code = process.returncode
@@ -193,20 +184,16 @@ def run_dalfox():
             final_status_line += f"STATUS: {'Completed' if return_code == 0 else 'Failed'}\n"
             q.put(final_status_line) # Add final status to queue
 
-            full_output_buffer.append(final_status_line)
-            scan_outputs[scan_id_val] = "".join(full_output_buffer) # Store complete output
-
         except FileNotFoundError:
             error_msg = f"Error: '{cmd[0]}' command not found. Make sure Dalfox is installed and in your system's PATH.\nSTATUS: Error\n"
             q.put(error_msg)
-            scan_outputs[scan_id_val] = error_msg
         except Exception as e:
             error_msg = f"An unexpected error occurred: {e}\nSTATUS: Error\n"
             q.put(error_msg)
-            scan_outputs[scan_id_val] = error_msg
         finally:
             if scan_id_val in scan_processes:
                 del scan_processes[scan_id_val]
+            lease.release()
             # Signal end of output by putting a special marker
             q.put("---SCAN_COMPLETE---")
 
@@ -323,7 +310,7 @@ def install_dalfox():
     if sys.platform.startswith('linux'):
         scan_id = str(uuid.uuid4()) # Unique ID for this installation process
         full_output = []
-        output_queue = queue.Queue()
+        output_queue = runtime.OutputLog()
         scan_queues[scan_id] = output_queue
         scan_outputs[scan_id] = "" # Initialize full output storage for this ID
 
@@ -331,7 +318,7 @@ def install_dalfox():
             temp_buffer_thread = [] # Local buffer for the thread
             try:
                 # Check for Go installation first
-                if shutil.which("go") is None:
+                if runtime.which("go") is None:
                     q.put("Go programming language is not found. Dalfox requires Go to be installed.\n")
                     q.put("Please install Go first. For Linux/Termux, you can use:\n")
                     if p_type == 'termux':
@@ -364,7 +351,7 @@ def install_dalfox():
                     raise subprocess.CalledProcessError(install_process.returncode, dalfox_install_command, "".join(temp_buffer_thread), "")
                 
                 # Verify Dalfox installation
-                if shutil.which("dalfox") is None:
+                if runtime.which("dalfox") is None:
                     q.put("Dalfox command not found in PATH after installation. You may need to add Go's bin directory to your PATH.\n")
                     q.put("Typically, add 'export PATH=$PATH:~/go/bin' to your .bashrc or .zshrc and restart your shell.\n")
                     q.put("---INSTALL_COMPLETE_FAILURE---")
@@ -11,6 +11,11 @@ import sys # Import sys for platform check
 
 app = Flask(__name__)
 
+# Shared runtime (metrics, debug endpoints) lives at the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import runtime
+runtime.init_app(app)
+
 # Global variable to store installation status and output
 installation_status = "idle"
 installation_output = []
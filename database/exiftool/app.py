@@ -7,11 +7,14 @@ import threading
 import queue
 import time
 import uuid # For unique filenames
-import shutil # Added for shutil.which
 import sys # To detect OS and get command-line arguments
 
 app = Flask(__name__)
 
+# Shared runtime (metrics, debug endpoints) lives at the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import runtime
+
 # Directory to store temporary files (e.g., uploaded target files, scan outputs)
 UPLOAD_FOLDER = 'uploads'
 if not os.path.exists(UPLOAD_FOLDER):
@@ -23,20 +26,10 @@ exiftool_outputs = {}
 exiftool_processes = {} # To keep track of running exiftool processes
 exiftool_queues = {} # To store queues for real-time output
 
-# Load examples from exiftool_examples.txt
-def load_examples(filename="exiftool_examples.txt"):
-    """Loads examples from a JSON file."""
-    try:
-        # Assuming exiftool_examples.txt is in the same directory as app.py
-        filepath = os.path.join(os.path.dirname(__file__), filename)
-        with open(filepath, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"Error: Examples file '{filename}' not found. Please ensure it's in the same directory as app.py.")
-        return []
-    except json.JSONDecodeError:
-        print(f"Error: Could not decode JSON from '{filename}'. Please check file format.")
-        return []
+runtime.init_app(app, upload_folder=UPLOAD_FOLDER, outputs=exiftool_outputs, processes=exiftool_processes, queues=exiftool_queues, tools=['exiftool'])
+
+# Examples from exiftool_examples.txt, parsed once and again only when the file changes
+EXAMPLES = runtime.ExamplesIndex(app, "exiftool_examples.txt")
 
 @app.route('/')
 def index():
@@ -92,13 +85,13 @@ def run_exiftool():
 
 
     process_id = str(uuid.uuid4())
-    output_queue = queue.Queue()
+    output_queue = runtime.OutputLog()
     exiftool_queues[process_id] = output_queue
 
     def run_exiftool_process(command, pid, output_q, output_file):
         try:
             # Check if exiftool is installed
-            if shutil.which("exiftool") is None:
+            if runtime.which("exiftool") is None:
                 output_q.put("ERROR: exiftool is not installed or not in PATH. Please install it first.\n")
                 output_q.put("---PROCESS_COMPLETE---")
                 return
@@ -207,8 +200,7 @@ def upload_file():
 @app.route('/get_examples', methods=['GET'])
 def get_examples():
     """Endpoint to retrieve exiftool examples."""
-    examples = load_examples()
-    return jsonify(examples)
+    return EXAMPLES.serve()
 
 @app.route('/install_exiftool', methods=['POST'])
 def install_exiftool():
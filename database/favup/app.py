@@ -7,40 +7,28 @@ import threading
 import queue
 import time
 import uuid # For unique filenames
-import shutil # Added for shutil.which
 import sys # To detect OS and get command-line arguments
 
 app = Flask(__name__)
 
+# Shared runtime (metrics, debug endpoints) lives at the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import runtime
+
 # Directory to store temporary files (e.g., uploaded target lists, scan outputs)
 UPLOAD_FOLDER = 'uploads'
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
 # In-memory storage for scan outputs.
-scan_outputs = {}
+scan_outputs = runtime.JobOutputs()
 scan_processes = {} # To keep track of running fav-up processes
 scan_queues = {} # To store queues for real-time output
 
-# Load examples from favup_examples.txt
-def load_examples(filename="favup_examples.txt"):
-    """Loads examples from a JSON file."""
-    try:
-        # Assuming favup_examples.txt is in the same directory as favup_app.py
-        filepath = os.path.join(os.path.dirname(__file__), filename)
-        with open(filepath, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"Error: Examples file '{filename}' not found. Please ensure it's in the same directory as favup_app.py.")
-        return []
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from '{filename}': {e}")
-        return []
-    except Exception as e:
-        print(f"An unexpected error occurred while loading examples: {e}")
-        return []
+runtime.init_app(app, upload_folder=UPLOAD_FOLDER, outputs=scan_outputs, processes=scan_processes, queues=scan_queues)
 
-ALL_EXAMPLES = load_examples()
+# Examples from favup_examples.txt, parsed once and again only when the file changes
+EXAMPLES = runtime.ExamplesIndex(app, "favup_examples.txt")
 
 @app.route('/')
 def index():
@@ -51,7 +39,7 @@ def index():
 @app.route('/get_examples', methods=['GET'])
 def get_examples():
     """Returns the Fav-Up examples as JSON."""
-    return jsonify(ALL_EXAMPLES)
+    return EXAMPLES.serve()
 
 @app.route('/generate_command', methods=['POST'])
 def generate_command():
@@ -126,8 +114,8 @@ def run_favup():
     if len(command) < 2 or command[0] != 'python3' or not command[1].endswith('favUp.py'):
         return jsonify({'status': 'error', 'message': 'Only favUp.py commands are allowed.'}), 403
 
-    # Check if python3 executable exists using shutil.which
-    if shutil.which(command[0]) is None:
+    # Check if python3 executable exists using runtime.which
+    if runtime.which(command[0]) is None:
         return jsonify({'status': 'error', 'message': f"Python3 executable '{command[0]}' not found on the server. Please ensure Python3 is installed and accessible in the system's PATH."}), 500
     
     # Check if favUp.py script exists
@@ -137,12 +125,11 @@ def run_favup():
 
 
     # Create a new queue for this scan's real-time output
-    output_queue = queue.Queue()
+    output_queue = runtime.OutputLog()
     scan_queues[scan_id] = output_queue
-    scan_outputs[scan_id] = "" # Initialize full output storage
+    scan_outputs[scan_id] = output_queue # The log is the stored output (see runtime.JobOutputs)
 
     def _run_favup_thread(cmd, q, scan_id_val):
-        full_output_buffer = []
         try:
             process = subprocess.Popen(
                 cmd,
@@ -156,7 +143,6 @@ def run_favup():
 
             for line in iter(process.stdout.readline, ''):
                 q.put(line) # Put each line into the queue
-                full_output_buffer.append(line) # Also append to buffer for final output
 
             process.wait()
             return_code = process.returncode
@@ -165,17 +151,12 @@ def run_favup():
             final_status_line += f"STATUS: {'Completed' if return_code == 0 else 'Failed'}\n"
             q.put(final_status_line) # Add final status to queue
 
-            full_output_buffer.append(final_status_line)
-            scan_outputs[scan_id_val] = "".join(full_output_buffer) # Store complete output
-
         except FileNotFoundError:
             error_msg = f"Error: '{cmd[0]}' command not found. Make sure Python3 is installed and in your system's PATH.\nSTATUS: Error\n"
             q.put(error_msg)
-            scan_outputs[scan_id_val] = error_msg
         except Exception as e:
             error_msg = f"An unexpected error occurred: {e}\nSTATUS: Error\n"
             q.put(error_msg)
-            scan_outputs[scan_id_val] = error_msg
         finally:
             if scan_id_val in scan_processes:
                 del scan_processes[scan_id_val]
@@ -2,16 +2,22 @@ import os
 import subprocess
 import shlex
 import json
+from collections import OrderedDict
 from flask import Flask, render_template, request, jsonify, send_file
 import threading
 import queue
 import time
 import uuid # For unique filenames
-import shutil # Added for shutil.which
 import sys # To detect OS and get command-line arguments
 
 app = Flask(__name__)
 
+# Shared runtime (metrics, debug endpoints) lives at the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import runtime
+import recursion
+import result_store
+
 # Directory to store temporary files (e.g., uploaded target lists, scan outputs)
 UPLOAD_FOLDER = 'uploads'
 if not os.path.exists(UPLOAD_FOLDER):
@@ -19,29 +25,18 @@ if not os.path.exists(UPLOAD_FOLDER):
 
 # In-memory storage for scan outputs (for demonstration).
 # In a real-world app, consider a more persistent and scalable solution (e.g., database, cloud storage).
-scan_outputs = {}
+scan_outputs = runtime.JobOutputs()
 scan_processes = {} # To keep track of running ffuf processes
 scan_queues = {} # To store queues for real-time output
+result_tables = OrderedDict() # scan_id -> result_store.ResultTable, for /ffuf/<id>/results
+MAX_KEPT_TABLES = 10 # Result tables of finished jobs kept; older ones are forgotten
+recursive_scans = {} # scan_id -> recursion.RecursiveScan, for /ffuf/<id>/tree
+MAX_RECURSION_DEPTH = 10
 
-# Load examples from ffuf_examples.txt
-def load_examples(filename="ffuf_examples.txt"):
-    """Loads examples from a JSON file."""
-    try:
-        # Assuming ffuf_examples.txt is in the same directory as app.py
-        filepath = os.path.join(os.path.dirname(__file__), filename)
-        with open(filepath, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"Error: Examples file '{filename}' not found. Please ensure it's in the same directory as app.py.")
-        return []
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from '{filename}': {e}")
-        return []
-    except Exception as e:
-        print(f"An unexpected error occurred while loading examples: {e}")
-        return []
+runtime.init_app(app, upload_folder=UPLOAD_FOLDER, outputs=scan_outputs, processes=scan_processes, queues=scan_queues, tools=['ffuf'])
 
-ALL_EXAMPLES = load_examples()
+# Examples from ffuf_examples.txt, parsed once and again only when the file changes
+EXAMPLES = runtime.ExamplesIndex(app, "ffuf_examples.txt")
 
 @app.route('/')
 def index():
@@ -52,193 +47,177 @@ def index():
 @app.route('/get_examples', methods=['GET'])
 def get_examples():
     """Returns the ffuf examples as JSON."""
-    return jsonify(ALL_EXAMPLES)
+    return EXAMPLES.serve()
+
+# ffuf's options by UI tab; /generate_command builds commands from this spec and /command_spec serves it to the UI
+FFUF_COMMAND = runtime.CommandSpec(app, 'ffuf', {
+    'Target': [
+        runtime.Value('-u', 'url_entry'),
+        runtime.Value('-request', 'request_file_entry'),
+        runtime.Value('-recursion-depth', 'recursion_depth_entry', type='int'),
+        runtime.Switch('-recursion', 'recursion_var'),
+        runtime.Switch('-r', 'follow_redirects_var'),
+        runtime.Value('-x', 'proxy_entry'),
+        runtime.Value('-timeout', 'timeout_entry', type='int'),
+        runtime.Value('-rate', 'rate_limit_entry', type='int'),
+        runtime.Value('-replay-proxy', 'replay_proxy_entry'),
+        runtime.Value('-replay-auth', 'replay_auth_entry'),
+    ],
+    'Input': [
+        runtime.Value('-w', 'wordlist_entry', repeat=True),
+        runtime.Value('-w', 'wordlist_2_entry', repeat=True), # For multiple wordlists
+        runtime.Value('-request-proto', 'request_proto_entry'),
+        runtime.Value('-input-file', 'input_file_entry'),
+        runtime.Value('-input-mode', 'input_mode_select'),
+        runtime.Value('-D', 'data_entry'),
+        runtime.Value('-X', 'request_method_select'),
+        runtime.Value('-H', 'headers_entry', repeat=True),
+        runtime.Value('-b', 'cookie_entry', repeat=True),
+        runtime.Value('-u', 'url_fuzz_entry'), # For URL fuzzing
+        runtime.Value('-d', 'data_fuzz_entry'), # For data fuzzing
+        runtime.Value('-config', 'config_file_entry'),
+        runtime.Switch('-s', 'stop_on_all_var'),
+        runtime.Switch('-sa', 'stop_on_all_codes_var'),
+        runtime.Switch('-se', 'stop_on_error_var'),
+        runtime.Switch('-sf', 'stop_on_filter_var'),
+        runtime.Switch('-sfreq', 'stop_on_freq_var'),
+        runtime.Value('-p', 'delay_entry'),
+        runtime.Value('-t', 'threads_entry', type='int'),
+        runtime.Value('-maxtime', 'max_time_entry', type='int'),
+        runtime.Value('-maxtime-job', 'max_time_job_entry', type='int'),
+        runtime.Value('-max-size', 'max_size_entry'),
+        runtime.Value('-max-error', 'max_error_entry'),
+    ],
+    'Filtering/Matching': [
+        runtime.Value('-fc', 'filter_status_entry'),
+        runtime.Value('-fs', 'filter_size_entry'),
+        runtime.Value('-fw', 'filter_words_entry'),
+        runtime.Value('-fl', 'filter_lines_entry'),
+        runtime.Value('-fd', 'filter_duration_entry'),
+        runtime.Value('-mc', 'match_status_entry'),
+        runtime.Value('-ms', 'match_size_entry'),
+        runtime.Value('-mw', 'match_words_entry'),
+        runtime.Value('-ml', 'match_lines_entry'),
+        runtime.Value('-md', 'match_duration_entry'),
+        runtime.Switch('-acc', 'auto_calibrate_var'),
+        runtime.Switch('-ac', 'auto_calibrate_codes_var'),
+        runtime.Switch('-acs', 'auto_calibrate_size_var', since='2.0.0'),
+    ],
+    'Output': [
+        runtime.Value('-o', 'output_file_entry'),
+        runtime.Value('-of', 'output_format_select'),
+        runtime.Switch('-v', 'verbose_var'),
+        runtime.Switch('-sa', 'show_all_var'),
+        runtime.Switch('-q', 'quiet_var'),
+        runtime.Switch('-c', 'colors_var'),
+        runtime.Switch('-s', 'silent_var'),
+        runtime.Switch('-k', 'insecure_var'),
+        runtime.Switch('-r', 'follow_redirects_output_var'),
+        runtime.Switch('-v', 'verbose_output_var'),
+        runtime.Switch('-s', 'show_request_var'),
+        runtime.Switch('-sf', 'show_response_var'),
+        runtime.Switch('-hh', 'hide_headers_var'),
+        runtime.Switch('-hc', 'hide_color_var'),
+        runtime.Switch('-H', 'show_headers_var'),
+        runtime.Switch('-i', 'show_input_var'),
+        runtime.Switch('-e', 'show_errors_var'),
+        runtime.Switch('-j', 'json_output_var'),
+        runtime.Switch('-html', 'html_output_var'),
+        runtime.Switch('-csv', 'csv_output_var'),
+        runtime.Switch('-e', 'export_errors_var'),
+    ],
+    'Advanced': [
+        runtime.Value('-H', 'custom_headers_adv_entry', repeat=True), # For multiple custom headers
+        runtime.Value('-b', 'custom_cookies_adv_entry', repeat=True), # For multiple custom cookies
+        runtime.Value('-d', 'custom_data_adv_entry'),
+        runtime.Value('-X', 'custom_method_adv_entry'),
+        runtime.Value('-timeout', 'timeout_adv_entry', type='int'),
+        runtime.Value('-rate', 'rate_limit_adv_entry', type='int'),
+        runtime.Value('-t', 'threads_adv_entry', type='int'),
+        runtime.Switch('-r', 'follow_redirects_adv_var'),
+        runtime.Switch('-k', 'insecure_adv_var'),
+        runtime.Switch('-s', 'silent_adv_var'),
+        runtime.Switch('-c', 'colors_adv_var'),
+        runtime.Switch('-v', 'verbose_adv_var'),
+        runtime.Value('-maxtime', 'max_time_adv_entry', type='int'),
+        runtime.Value('-maxtime-job', 'max_time_job_adv_entry', type='int'),
+        runtime.Value('-max-size', 'max_size_adv_entry'),
+        runtime.Value('-max-error', 'max_error_adv_entry'),
+        runtime.Value('-delay', 'delay_adv_entry'),
+        runtime.Value('-input-cmd', 'input_cmd_entry'),
+        runtime.Value('-input-num', 'input_num_entry'),
+        runtime.Value('-input-num-min', 'input_num_min_entry'),
+        runtime.Value('-input-num-max', 'input_num_max_entry'),
+        runtime.Value('-input-num-step', 'input_num_step_entry'),
+        runtime.Switch('-se', 'stop_on_error_adv_var'),
+        runtime.Switch('-sf', 'stop_on_filter_adv_var'),
+        runtime.Switch('-sfreq', 'stop_on_freq_adv_var'),
+        runtime.Switch('-acc', 'auto_calibrate_adv_var'),
+        runtime.Switch('-ac', 'auto_calibrate_codes_adv_var'),
+        runtime.Switch('-acs', 'auto_calibrate_size_adv_var', since='2.0.0'),
+        runtime.Value('-e', 'data_encoding_select'), # Data encoding
+        runtime.Switch('-sa', 'show_all_adv_var'),
+        runtime.Switch('-q', 'quiet_adv_var'),
+        runtime.Switch('-ignore-body', 'ignore_body_var'),
+        runtime.Switch('-ignore-content-length', 'ignore_content_length_var'),
+        runtime.Value('-recursion-depth', 'recursion_depth_adv_entry', type='int'),
+        runtime.Value('-recursion-strategy', 'recursion_strategy_select'),
+        runtime.Value('-request-proto', 'request_proto_adv_entry'),
+        runtime.Value('-request-base', 'request_base_entry'),
+        runtime.Value('-request-body', 'request_body_entry'),
+        runtime.Value('-request-header', 'request_header_entry'),
+        runtime.Value('-request-url', 'request_url_entry'),
+        runtime.Value('-request-method', 'request_method_adv_entry'),
+        runtime.Value('-request-data', 'request_data_entry'),
+        runtime.Value('-request-cookie', 'request_cookie_entry'),
+        runtime.Value('-request-proxy', 'request_proxy_entry'),
+        runtime.Value('-request-timeout', 'request_timeout_entry'),
+        runtime.Value('-request-delay', 'request_delay_entry'),
+        runtime.Value('-request-rate', 'request_rate_entry'),
+        runtime.Value('-request-threads', 'request_threads_entry'),
+        runtime.Value('-request-maxtime', 'request_maxtime_entry'),
+        runtime.Value('-request-maxtime-job', 'request_maxtime_job_entry'),
+        runtime.Value('-request-max-size', 'request_max_size_entry'),
+        runtime.Value('-request-max-error', 'request_max_error_entry'),
+        runtime.Switch('-request-stop-on-all', 'request_stop_on_all_var'),
+        runtime.Switch('-request-stop-on-all-codes', 'request_stop_on_all_codes_var'),
+        runtime.Switch('-request-stop-on-error', 'request_stop_on_error_var'),
+        runtime.Switch('-request-stop-on-filter', 'request_stop_on_filter_var'),
+        runtime.Switch('-request-stop-on-freq', 'request_stop_on_freq_var'),
+        runtime.Switch('-request-auto-calibrate', 'request_auto_calibrate_var'),
+        runtime.Switch('-request-auto-calibrate-codes', 'request_auto_calibrate_codes_var'),
+        runtime.Switch('-request-auto-calibrate-size', 'request_auto_calibrate_size_var'),
+        runtime.Switch('-request-show-all', 'request_show_all_var'),
+        runtime.Switch('-request-quiet', 'request_quiet_var'),
+        runtime.Switch('-request-colors', 'request_colors_var'),
+        runtime.Switch('-request-silent', 'request_silent_var'),
+        runtime.Switch('-request-insecure', 'request_insecure_var'),
+        runtime.Switch('-request-follow-redirects', 'request_follow_redirects_var'),
+        runtime.Switch('-request-verbose', 'request_verbose_var'),
+        runtime.Switch('-request-show-request', 'request_show_request_var'),
+        runtime.Switch('-request-show-response', 'request_show_response_var'),
+        runtime.Switch('-request-hide-headers', 'request_hide_headers_var'),
+        runtime.Switch('-request-hide-color', 'request_hide_color_var'),
+        runtime.Switch('-request-show-headers', 'request_show_headers_var'),
+        runtime.Switch('-request-show-input', 'request_show_input_var'),
+        runtime.Switch('-request-show-errors', 'request_show_errors_var'),
+        runtime.Switch('-request-json-output', 'request_json_output_var'),
+        runtime.Switch('-request-html-output', 'request_html_output_var'),
+        runtime.Switch('-request-csv-output', 'request_csv_output_var'),
+        runtime.Switch('-request-export-errors', 'request_export_errors_var'),
+        runtime.Switch('-request-ignore-body', 'request_ignore_body_var'),
+        runtime.Switch('-request-ignore-content-length', 'request_ignore_content_length_var'),
+        runtime.Switch('-request-recursion-depth', 'request_recursion_depth_var'),
+        runtime.Switch('-request-recursion-strategy', 'request_recursion_strategy_var'),
+        runtime.Extra('additional_args_entry'),
+    ],
+})
 
 @app.route('/generate_command', methods=['POST'])
 def generate_command():
     """Generates the ffuf command based on form data."""
-    data = request.json
-    command_parts = ["ffuf"]
-
-    def add_arg(arg_name, value):
-        if value:
-            command_parts.append(arg_name)
-            command_parts.append(shlex.quote(str(value)))
-
-    def add_checkbox_arg(arg_name, value):
-        if value:
-            command_parts.append(arg_name)
-
-    # Target Tab
-    add_arg("-u", data.get('url_entry'))
-    add_arg("-request", data.get('request_file_entry'))
-    add_arg("-recursion", data.get('recursion_depth_entry'))
-    add_checkbox_arg("-recursion", data.get('recursion_var'))
-    add_checkbox_arg("-r", data.get('follow_redirects_var'))
-    add_arg("-x", data.get('proxy_entry'))
-    add_arg("-timeout", data.get('timeout_entry'))
-    add_arg("-rate", data.get('rate_limit_entry'))
-    add_arg("-replay-proxy", data.get('replay_proxy_entry'))
-    add_arg("-replay-auth", data.get('replay_auth_entry'))
-
-    # Input Tab
-    add_arg("-w", data.get('wordlist_entry'))
-    add_arg("-w", data.get('wordlist_2_entry')) # For multiple wordlists
-    add_arg("-request-proto", data.get('request_proto_entry'))
-    add_arg("-input-file", data.get('input_file_entry'))
-    add_arg("-input-mode", data.get('input_mode_select'))
-    add_arg("-D", data.get('data_entry'))
-    add_arg("-X", data.get('request_method_select'))
-    add_arg("-H", data.get('headers_entry'))
-    add_arg("-b", data.get('cookie_entry'))
-    add_arg("-u", data.get('url_fuzz_entry')) # For URL fuzzing
-    add_arg("-d", data.get('data_fuzz_entry')) # For data fuzzing
-    add_arg("-c", data.get('config_file_entry'))
-    add_checkbox_arg("-s", data.get('stop_on_all_var'))
-    add_checkbox_arg("-sa", data.get('stop_on_all_codes_var'))
-    add_checkbox_arg("-se", data.get('stop_on_error_var'))
-    add_checkbox_arg("-sf", data.get('stop_on_filter_var'))
-    add_checkbox_arg("-sfreq", data.get('stop_on_freq_var'))
-    add_arg("-p", data.get('delay_entry'))
-    add_arg("-t", data.get('threads_entry'))
-    add_arg("-maxtime", data.get('max_time_entry'))
-    add_arg("-maxtime-job", data.get('max_time_job_entry'))
-    add_arg("-max-size", data.get('max_size_entry'))
-    add_arg("-max-error", data.get('max_error_entry'))
-
-    # Filtering/Matching Tab
-    add_arg("-fc", data.get('filter_status_entry'))
-    add_arg("-fs", data.get('filter_size_entry'))
-    add_arg("-fw", data.get('filter_words_entry'))
-    add_arg("-fl", data.get('filter_lines_entry'))
-    add_arg("-fd", data.get('filter_duration_entry'))
-    add_arg("-mc", data.get('match_status_entry'))
-    add_arg("-ms", data.get('match_size_entry'))
-    add_arg("-mw", data.get('match_words_entry'))
-    add_arg("-ml", data.get('match_lines_entry'))
-    add_arg("-md", data.get('match_duration_entry'))
-    add_checkbox_arg("-acc", data.get('auto_calibrate_var'))
-    add_checkbox_arg("-ac", data.get('auto_calibrate_codes_var'))
-    add_checkbox_arg("-acs", data.get('auto_calibrate_size_var'))
-
-    # Output Tab
-    add_arg("-o", data.get('output_file_entry'))
-    add_arg("-of", data.get('output_format_select'))
-    add_checkbox_arg("-v", data.get('verbose_var'))
-    add_checkbox_arg("-sa", data.get('show_all_var'))
-    add_checkbox_arg("-q", data.get('quiet_var'))
-    add_checkbox_arg("-c", data.get('colors_var'))
-    add_checkbox_arg("-s", data.get('silent_var'))
-    add_checkbox_arg("-k", data.get('insecure_var'))
-    add_checkbox_arg("-r", data.get('follow_redirects_output_var')) # Redundant but kept for clarity
-    add_checkbox_arg("-v", data.get('verbose_output_var')) # Redundant but kept for clarity
-    add_checkbox_arg("-s", data.get('show_request_var'))
-    add_checkbox_arg("-sf", data.get('show_response_var'))
-    add_checkbox_arg("-hh", data.get('hide_headers_var'))
-    add_checkbox_arg("-hc", data.get('hide_color_var'))
-    add_checkbox_arg("-H", data.get('show_headers_var'))
-    add_checkbox_arg("-i", data.get('show_input_var'))
-    add_checkbox_arg("-e", data.get('show_errors_var'))
-    add_checkbox_arg("-j", data.get('json_output_var'))
-    add_checkbox_arg("-html", data.get('html_output_var'))
-    add_checkbox_arg("-csv", data.get('csv_output_var'))
-    add_checkbox_arg("-e", data.get('export_errors_var'))
-
-    # Advanced Tab
-    add_arg("-H", data.get('custom_headers_adv_entry')) # For multiple custom headers
-    add_arg("-b", data.get('custom_cookies_adv_entry')) # For multiple custom cookies
-    add_arg("-d", data.get('custom_data_adv_entry'))
-    add_arg("-X", data.get('custom_method_adv_entry'))
-    add_arg("-timeout", data.get('timeout_adv_entry'))
-    add_arg("-rate", data.get('rate_limit_adv_entry'))
-    add_arg("-t", data.get('threads_adv_entry'))
-    add_checkbox_arg("-r", data.get('follow_redirects_adv_var'))
-    add_checkbox_arg("-k", data.get('insecure_adv_var'))
-    add_checkbox_arg("-s", data.get('silent_adv_var'))
-    add_checkbox_arg("-c", data.get('colors_adv_var'))
-    add_checkbox_arg("-v", data.get('verbose_adv_var'))
-    add_arg("-maxtime", data.get('max_time_adv_entry'))
-    add_arg("-maxtime-job", data.get('max_time_job_adv_entry'))
-    add_arg("-max-size", data.get('max_size_adv_entry'))
-    add_arg("-max-error", data.get('max_error_adv_entry'))
-    add_arg("-delay", data.get('delay_adv_entry'))
-    add_arg("-input-cmd", data.get('input_cmd_entry'))
-    add_arg("-input-num", data.get('input_num_entry'))
-    add_arg("-input-num-min", data.get('input_num_min_entry'))
-    add_arg("-input-num-max", data.get('input_num_max_entry'))
-    add_arg("-input-num-step", data.get('input_num_step_entry'))
-    add_arg("-se", data.get('stop_on_error_adv_var'))
-    add_arg("-sf", data.get('stop_on_filter_adv_var'))
-    add_arg("-sfreq", data.get('stop_on_freq_adv_var'))
-    add_arg("-acc", data.get('auto_calibrate_adv_var'))
-    add_arg("-ac", data.get('auto_calibrate_codes_adv_var'))
-    add_arg("-acs", data.get('auto_calibrate_size_adv_var'))
-    add_arg("-e", data.get('data_encoding_select')) # Data encoding
-    add_arg("-sa", data.get('show_all_adv_var'))
-    add_arg("-q", data.get('quiet_adv_var'))
-    add_arg("-ignore-body", data.get('ignore_body_var'))
-    add_arg("-ignore-content-length", data.get('ignore_content_length_var'))
-    add_arg("-recursion-depth", data.get('recursion_depth_adv_entry'))
-    add_arg("-recursion-strategy", data.get('recursion_strategy_select'))
-    add_arg("-request-proto", data.get('request_proto_adv_entry'))
-    add_arg("-request-base", data.get('request_base_entry'))
-    add_arg("-request-body", data.get('request_body_entry'))
-    add_arg("-request-header", data.get('request_header_entry'))
-    add_arg("-request-url", data.get('request_url_entry'))
-    add_arg("-request-method", data.get('request_method_adv_entry'))
-    add_arg("-request-data", data.get('request_data_entry'))
-    add_arg("-request-cookie", data.get('request_cookie_entry'))
-    add_arg("-request-proxy", data.get('request_proxy_entry'))
-    add_arg("-request-timeout", data.get('request_timeout_entry'))
-    add_arg("-request-delay", data.get('request_delay_entry'))
-    add_arg("-request-rate", data.get('request_rate_entry'))
-    add_arg("-request-threads", data.get('request_threads_entry'))
-    add_arg("-request-maxtime", data.get('request_maxtime_entry'))
-    add_arg("-request-maxtime-job", data.get('request_maxtime_job_entry'))
-    add_arg("-request-max-size", data.get('request_max_size_entry'))
-    add_arg("-request-max-error", data.get('request_max_error_entry'))
-    add_arg("-request-stop-on-all", data.get('request_stop_on_all_var'))
-    add_arg("-request-stop-on-all-codes", data.get('request_stop_on_all_codes_var'))
-    add_arg("-request-stop-on-error", data.get('request_stop_on_error_var'))
-    add_arg("-request-stop-on-filter", data.get('request_stop_on_filter_var'))
-    add_arg("-request-stop-on-freq", data.get('request_stop_on_freq_var'))
-    add_arg("-request-auto-calibrate", data.get('request_auto_calibrate_var'))
-    add_arg("-request-auto-calibrate-codes", data.get('request_auto_calibrate_codes_var'))
-    add_arg("-request-auto-calibrate-size", data.get('request_auto_calibrate_size_var'))
-    add_arg("-request-show-all", data.get('request_show_all_var'))
-    add_arg("-request-quiet", data.get('request_quiet_var'))
-    add_arg("-request-colors", data.get('request_colors_var'))
-    add_arg("-request-silent", data.get('request_silent_var'))
-    add_arg("-request-insecure", data.get('request_insecure_var'))
-    add_arg("-request-follow-redirects", data.get('request_follow_redirects_var'))
-    add_arg("-request-verbose", data.get('request_verbose_var'))
-    add_arg("-request-show-request", data.get('request_show_request_var'))
-    add_arg("-request-show-response", data.get('request_show_response_var'))
-    add_arg("-request-hide-headers", data.get('request_hide_headers_var'))
-    add_arg("-request-hide-color", data.get('request_hide_color_var'))
-    add_arg("-request-show-headers", data.get('request_show_headers_var'))
-    add_arg("-request-show-input", data.get('request_show_input_var'))
-    add_arg("-request-show-errors", data.get('request_show_errors_var'))
-    add_arg("-request-json-output", data.get('request_json_output_var'))
-    add_arg("-request-html-output", data.get('request_html_output_var'))
-    add_arg("-request-csv-output", data.get('request_csv_output_var'))
-    add_arg("-request-export-errors", data.get('request_export_errors_var'))
-    add_arg("-request-ignore-body", data.get('request_ignore_body_var'))
-    add_arg("-request-ignore-content-length", data.get('request_ignore_content_length_var'))
-    add_arg("-request-recursion-depth", data.get('request_recursion_depth_var'))
-    add_arg("-request-recursion-strategy", data.get('request_recursion_strategy_var'))
-
-    additional_args = data.get('additional_args_entry', '').strip()
-    if additional_args:
-        try:
-            split_args = shlex.split(additional_args)
-            command_parts.extend(split_args)
-        except ValueError:
-            # Fallback if shlex can't parse, just add as a single string (less safe)
-            command_parts.append(shlex.quote(additional_args))
-
-    generated_cmd = " ".join(command_parts)
-    return jsonify({'command': generated_cmd})
+    command, warnings = FFUF_COMMAND.build(request.json)
+    return jsonify({'command': command, 'warnings': warnings})
 
 @app.route('/run_ffuf', methods=['POST'])
 def run_ffuf():
@@ -269,18 +248,64 @@ def run_ffuf():
     if command[0] != 'ffuf':
         return jsonify({'status': 'error', 'message': 'Only ffuf commands are allowed.'}), 403
 
-    # Check if ffuf executable exists using shutil.which
-    if shutil.which(command[0]) is None:
+    # Check if ffuf executable exists using runtime.which
+    if runtime.which(command[0]) is None:
         return jsonify({'status': 'error', 'message': f"ffuf executable '{command[0]}' not found on the server. Please ensure ffuf is installed and accessible in the system's PATH."}), 500
 
+    # App-level recursion: one ffuf job per directory through the shared scheduler
+    if data.get('recursive'):
+        try:
+            max_depth = int(data['max_depth']) if data.get('max_depth') not in (None, '') else None
+            max_breadth = int(data.get('max_breadth') or 20)
+            per_host = int(data.get('per_host') or 2)
+        except (TypeError, ValueError):
+            return jsonify({'status': 'error', 'message': 'max_depth, max_breadth and per_host must be whole numbers.'}), 400
+        try:
+            scan = recursion.RecursiveScan(
+                scan_id, command, None if max_depth is None else min(max(max_depth, 0), MAX_RECURSION_DEPTH),
+                max(max_breadth, 1), max(per_host, 1), data.get('strategy') or 'default', json_lines_supported(),
+                UPLOAD_FOLDER)
+        except recursion.RecursionError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        forget_old_tables()
+        result_tables[scan_id] = scan.table
+        recursive_scans[scan_id] = scan
+        scan_queues[scan_id] = scan.log
+        scan_outputs[scan_id] = scan.log
+        thread = threading.Thread(target=scan.run, args=(scan_processes, scan_outputs), daemon=True)
+        thread.start()
+        return jsonify({'status': 'running', 'scan_id': scan_id, 'recursive': True, 'max_depth': scan.max_depth,
+                        'message': 'Recursive ffuf scan started.'})
+
+    # Every result also goes to a columnar table: from -json lines on stdout (ffuf 2.0+),
+    # else from the -of json file ffuf writes when it finishes
+    user_json = '-json' in command
+    json_lines = user_json or json_lines_supported()
+    json_file = None
+    if json_lines and not user_json:
+        command.append('-json')
+    elif not json_lines:
+        json_file = _option_value(command, '-o')
+        if json_file is None:
+            json_file = os.path.join(UPLOAD_FOLDER, f'ffuf_{scan_id}.json')
+            command += ['-o', json_file, '-of', 'json']
+        elif _option_value(command, '-of') not in (None, 'json'):
+            json_file = None # Another output format; nothing to load
+    forget_old_tables()
+    table = result_tables[scan_id] = result_store.ResultTable()
+
     # Create a new queue for this scan's real-time output
-    output_queue = queue.Queue()
+    output_queue = runtime.OutputLog()
     scan_queues[scan_id] = output_queue
-    scan_outputs[scan_id] = "" # Initialize full output storage
+    scan_outputs[scan_id] = output_queue # The log is the stored output (see runtime.JobOutputs)
 
     def _run_ffuf_thread(cmd, q, scan_id_val):
-        full_output_buffer = []
+        # Pace the tool to its share of the target host's request budget (runtime/ratelimit.py)
+        cmd, lease = runtime.ratelimit.throttle_command(cmd, q, cancelled=q.cancelled)
         try:
+            if q.cancelled.is_set(): # Stopped through /jobs/<id>/cancel while waiting for budget
+                q.put("Cancelled before the scan started.\nSTATUS: Cancelled\n")
+                return
             process = subprocess.Popen(
                 cmd,
                 stdout=subprocess.PIPE,
@@ -292,30 +317,35 @@ def run_ffuf():
             scan_processes[scan_id_val] = process
 
             for line in iter(process.stdout.readline, ''):
+                record = result_store.parse_result_line(line) if json_lines else None
+                if record is not None:
+                    table.append(record)
+                    if not user_json:
+                        line = result_store.format_result(record) # The text line ffuf would print
                 q.put(line) # Put each line into the queue
-                full_output_buffer.append(line) # Also append to buffer for final output
 
             process.wait()
             return_code = process.returncode
+            if json_file is not None:
+                loaded = result_store.load_json_file(table, json_file)
+                if loaded is not None:
+                    q.put(f"\n{len(loaded)} result(s) loaded for filtering.\n")
 
             final_status_line = f"\nffuf finished with exit code: {return_code}\n"
             final_status_line += f"STATUS: {'Completed' if return_code == 0 else 'Failed'}\n"
             q.put(final_status_line) # Add final status to queue
 
-            full_output_buffer.append(final_status_line)
-            scan_outputs[scan_id_val] = "".join(full_output_buffer) # Store complete output
-
         except FileNotFoundError:
             error_msg = f"Error: '{cmd[0]}' command not found. Make sure ffuf is installed and in your system's PATH.\nSTATUS: Error\n"
             q.put(error_msg)
-            scan_outputs[scan_id_val] = error_msg
         except Exception as e:
             error_msg = f"An unexpected error occurred: {e}\nSTATUS: Error\n"
             q.put(error_msg)
-            scan_outputs[scan_id_val] = error_msg
         finally:
             if scan_id_val in scan_processes:
                 del scan_processes[scan_id_val]
+            lease.release()
+            table.finished = True
             # Signal end of output by putting a special marker
             q.put("---SCAN_COMPLETE---")
 
@@ -327,6 +357,75 @@ def run_ffuf():
 
     return jsonify({'status': 'running', 'scan_id': scan_id, 'message': 'ffuf scan started.'})
 
+def _option_value(command, flag):
+    """The value after the last occurrence of `flag` in an argv, or None."""
+    value = None
+    for index, token in enumerate(command[:-1]):
+        if token == flag:
+            value = command[index + 1]
+    return value
+
+def json_lines_supported():
+    """
+    Whether the installed ffuf prints JSON lines with -json (2.0 and later), from the background
+    probe; None while it is unknown, and scans then use the -of json file, which every version writes.
+    """
+    tool = runtime.tool_registry.REGISTRY.cached('ffuf') # Never spawns ffuf in the request
+    if not tool or not tool.get('found'):
+        return None
+    if '-json' in tool.get('flags', ()):
+        return True
+    version = tool.get('version')
+    return bool(version) and runtime.tool_registry.version_tuple(version) >= (2, 0)
+
+def forget_old_tables():
+    finished = [scan_id for scan_id, table in result_tables.items() if table.finished]
+    for scan_id in finished[:max(len(finished) - MAX_KEPT_TABLES + 1, 0)]:
+        del result_tables[scan_id]
+        recursive_scans.pop(scan_id, None)
+
+@app.route('/ffuf/<scan_id>/results', methods=['GET'])
+def get_ffuf_results(scan_id):
+    """
+    Results of a job, filtered and sorted server side, e.g. ?status=200&size_not=1234&sort=length.
+    Filters (ffuf value syntax, e.g. 200,301-302): status, size, words, lines, duration (ms), each also
+    as <name>_not; q (URL or input substring). sort: position, status, length, words, lines, duration,
+    url; order=desc; offset, limit (up to 5000); facets=1 adds status/size counts.
+    """
+    table = result_tables.get(scan_id)
+    if table is None:
+        return jsonify({'status': 'not_found', 'message': 'Scan ID not found or expired.'}), 404
+    started = time.perf_counter()
+    try:
+        ids = result_store.query_from_args(table, request.args)
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = min(max(int(request.args.get('limit', 100)), 1), result_store.MAX_LIMIT)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': f'Invalid filter: {e}'}), 400
+    body = {'status': 'completed' if table.finished else 'running', 'total': len(ids), 'rows': len(table),
+            'offset': offset, 'limit': limit, 'results': [table.row(i) for i in ids[offset:offset + limit]]}
+    if request.args.get('facets') == '1':
+        body['facets'] = table.facets(ids)
+    body['milliseconds'] = round((time.perf_counter() - started) * 1000, 2)
+    return jsonify(body)
+
+@app.route('/ffuf/<scan_id>/tree', methods=['GET'])
+def get_ffuf_tree(scan_id):
+    """The jobs of a recursive scan as a tree, with their state and hit counts."""
+    scan = recursive_scans.get(scan_id)
+    if scan is None:
+        return jsonify({'status': 'not_found', 'message': 'No recursive scan with this ID.'}), 404
+    return jsonify(scan.describe())
+
+@app.route('/ffuf/<scan_id>/cancel', methods=['POST'])
+def cancel_ffuf_tree(scan_id):
+    """Drops the queued jobs of a recursive scan and stops the running ones."""
+    scan = recursive_scans.get(scan_id)
+    if scan is None:
+        return jsonify({'status': 'not_found', 'message': 'No recursive scan with this ID.'}), 404
+    scan.cancel(scan_processes)
+    return jsonify({'status': 'success', 'message': 'Recursive scan cancelled.', 'counts': scan.counts()})
+
 @app.route('/get_scan_output/<scan_id>', methods=['GET'])
 def get_scan_output(scan_id):
     """
@@ -408,9 +507,9 @@ def install_ffuf():
         try:
             # Determine package manager
             package_manager = None
-            if shutil.which("apt"):
+            if runtime.which("apt"):
                 package_manager = "apt"
-            elif shutil.which("pkg"): # For Termux
+            elif runtime.which("pkg"): # For Termux
                 package_manager = "pkg"
             
             if not package_manager:
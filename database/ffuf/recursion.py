@@ -0,0 +1,303 @@
+"""
+App-level ffuf recursion: one ffuf job per directory instead of one serial process.
+
+ffuf's own `-recursion` walks every directory it finds inside one process,
+one directory after another. In recursive mode the app runs the command as
+the root job instead, and every directory hit spawns a child job with the
+same wordlist, matchers and filters and `<directory>/FUZZ` as the URL. The
+children go through the shared runner limiter (see runtime/runner.py), so a
+wide site uses all allowed concurrency. The scheduler enforces:
+
+* a depth limit (the root is depth 0) and a breadth limit (child
+  directories per job), plus MAX_TREE_JOBS for the whole tree;
+* a per-host cap on jobs running at once;
+* dedupe: a directory already queued or scanned is not queued again.
+
+A hit is a directory, like ffuf's default strategy, when it redirects to
+the same URL with a trailing slash; the greedy strategy recurses into every
+hit. All results go into one ResultTable (/ffuf/<id>/results) and
+`/ffuf/<id>/tree` shows the jobs as a tree with their hits.
+"""
+import os
+import shlex
+import threading
+import time
+from collections import deque
+from urllib.parse import urljoin, urlsplit
+
+import result_store
+import runtime
+from runtime.runner import LIMITER, run_process
+
+MAX_TREE_JOBS = 200
+STRATEGIES = ('default', 'greedy')
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+# Options dropped from the command (-> whether they take a value): ffuf's own recursion is
+# replaced by the scheduler, and each job gets its own result output
+STRIPPED_FLAGS = {'-recursion': False, '-recursion-depth': True, '-recursion-strategy': True,
+                  '-json': False, '-o': True, '-of': True}
+END_MARKER = '---SCAN_COMPLETE---'
+
+
+class RecursionError(ValueError):
+    """The command cannot be run in recursive mode."""
+
+
+def prepare_command(argv):
+    """
+    Splits an ffuf argv for recursive mode. Returns (argv without -u and STRIPPED_FLAGS,
+    base URL ending in FUZZ, the -recursion-depth value or None).
+    """
+    rest, url, depth = [], None, None
+    index = 1
+    while index < len(argv):
+        token = argv[index]
+        if token == '-u' and index + 1 < len(argv):
+            url = argv[index + 1]
+            index += 2
+            continue
+        if token in STRIPPED_FLAGS:
+            if STRIPPED_FLAGS[token] and index + 1 < len(argv):
+                if token == '-recursion-depth':
+                    depth = argv[index + 1]
+                index += 2
+            else:
+                index += 1
+            continue
+        rest.append(token)
+        index += 1
+    if url is None:
+        raise RecursionError('Recursive mode needs the target URL in -u.')
+    if not url.endswith('/FUZZ'):
+        raise RecursionError('Recursive mode needs a URL ending in /FUZZ, e.g. https://example.com/FUZZ.')
+    try:
+        depth = int(depth) if depth is not None else None
+    except ValueError:
+        raise RecursionError('-recursion-depth must be a whole number.')
+    return [argv[0]] + rest, url, depth
+
+
+def is_directory(record, strategy):
+    """Whether a hit is a directory to recurse into."""
+    if strategy == 'greedy':
+        return True
+    if int(record.get('status') or 0) not in REDIRECT_STATUSES or not record.get('redirectlocation'):
+        return False
+    url = record.get('url') or ''
+    target = urlsplit(urljoin(url, record['redirectlocation']))
+    source = urlsplit(url)
+    return target.netloc in ('', source.netloc) and target.path == source.path + '/'
+
+
+class Node:
+    """One ffuf job of the tree."""
+
+    def __init__(self, index, url, depth, parent=None):
+        self.index = index
+        self.url = url # ends in FUZZ
+        self.depth = depth
+        self.parent = parent
+        self.host = urlsplit(url).netloc
+        self.children = []
+        self.state = 'queued'
+        self.exit_code = None
+        self.hits = 0
+        self.directories = 0
+        self.skipped = 0 # directories over the breadth or job limit
+
+    def describe(self):
+        return {
+            'index': self.index,
+            'url': self.url,
+            'depth': self.depth,
+            'state': self.state,
+            'exit_code': self.exit_code,
+            'hits': self.hits,
+            'directories': self.directories,
+            'skipped': self.skipped,
+            'children': [child.describe() for child in self.children],
+        }
+
+
+class _NodeOutput:
+    """Receives a job's output lines: results go to the table, text goes to the shared log."""
+
+    def __init__(self, scan, node):
+        self.scan = scan
+        self.node = node
+        self.prefix = f"[{urlsplit(node.url).path[:-len('FUZZ')] or '/'}] "
+
+    def put(self, line):
+        record = result_store.parse_result_line(line) if self.scan.json_lines else None
+        if record is None:
+            self.scan.log.put(self.prefix + line)
+            return
+        self.scan.table.append(record)
+        self.scan.add_result(self.node, record)
+        self.scan.log.put(self.prefix + result_store.format_result(record))
+
+
+class RecursiveScan:
+    """A tree of ffuf jobs started from one command."""
+
+    def __init__(self, scan_id, argv, max_depth, max_breadth, per_host, strategy, json_lines, work_folder):
+        self.id = scan_id
+        self.argv, base_url, ffuf_depth = prepare_command(argv)
+        self.max_depth = max_depth if max_depth is not None else (ffuf_depth or 2)
+        self.max_breadth = max_breadth
+        self.per_host = per_host
+        if strategy not in STRATEGIES:
+            raise RecursionError(f"strategy must be one of {', '.join(STRATEGIES)}.")
+        self.strategy = strategy
+        self.json_lines = json_lines
+        self.work_folder = work_folder
+        self.log = runtime.OutputLog()
+        self.table = result_store.ResultTable()
+        self.cancelled = threading.Event()
+        self.cond = threading.Condition()
+        self.nodes = []
+        self.queue = deque()
+        self.seen = set() # directory URLs already queued or scanned
+        self.host_running = {}
+        self.running = 0
+        self.started_at = time.time()
+        self.finished_at = None
+        self.root = self._queue(base_url, 0, None)
+
+    def _queue(self, url, depth, parent):
+        """Adds a job to the tree and the queue (call with self.cond held, or before start)."""
+        node = Node(len(self.nodes), url, depth, parent)
+        self.nodes.append(node)
+        self.seen.add(url)
+        if parent is not None:
+            parent.children.append(node)
+        self.queue.append(node)
+        return node
+
+    def command(self, node):
+        argv = self.argv + ['-u', node.url]
+        if self.json_lines:
+            argv.append('-json')
+        else:
+            argv += ['-o', self._result_file(node), '-of', 'json']
+        return argv
+
+    def _result_file(self, node):
+        return os.path.join(self.work_folder, f'ffuf_{self.id}_{node.index}.json')
+
+    def add_result(self, node, record):
+        """Counts a hit of a job and queues a child job if it is a directory."""
+        node.hits += 1
+        if node.depth >= self.max_depth or not is_directory(record, self.strategy):
+            return
+        child_url = record['url'].rstrip('/') + '/FUZZ'
+        with self.cond:
+            if child_url in self.seen:
+                return
+            node.directories += 1
+            if node.directories > self.max_breadth or len(self.nodes) >= MAX_TREE_JOBS:
+                node.skipped += 1
+                return
+            self._queue(child_url, node.depth + 1, node)
+            self.cond.notify_all()
+
+    def _next_node(self):
+        """The first queued job whose host has a free slot (call with self.cond held)."""
+        for node in self.queue:
+            if self.host_running.get(node.host, 0) < self.per_host:
+                self.queue.remove(node)
+                return node
+        return None
+
+    def run(self, processes, outputs):
+        """Schedules the tree until no job is queued or running. Meant for a background thread."""
+        self.log.put(f"Recursive ffuf: depth {self.max_depth}, breadth {self.max_breadth}, "
+                     f"{self.per_host} job(s) per host, {self.strategy} strategy\n")
+        while True:
+            with self.cond:
+                node = None
+                while node is None:
+                    if self.cancelled.is_set():
+                        for queued in self.queue:
+                            queued.state = 'cancelled'
+                        self.queue.clear()
+                    node = self._next_node()
+                    if node is None:
+                        if not self.queue and self.running == 0:
+                            break
+                        self.cond.wait(0.5)
+                if node is None:
+                    break
+                node.state = 'waiting'
+            if not LIMITER.acquire(self.cancelled):
+                node.state = 'cancelled'
+                continue
+            with self.cond:
+                node.state = 'running'
+                self.running += 1
+                self.host_running[node.host] = self.host_running.get(node.host, 0) + 1
+            threading.Thread(target=self._run_node, args=(node, processes), daemon=True).start()
+
+        self.table.finished = True
+        self.finished_at = time.time()
+        counts = self.counts()
+        summary = (f"\nRecursive ffuf finished: {len(self.nodes)} job(s), {len(self.table)} result(s); "
+                   f"{counts.get('completed', 0)} completed, {counts.get('failed', 0)} failed, "
+                   f"{counts.get('cancelled', 0)} cancelled.\n"
+                   f"STATUS: {'Cancelled' if self.cancelled.is_set() else 'Completed'}\n")
+        self.log.put(summary)
+        outputs[self.id] = self.log
+        self.log.put(END_MARKER)
+
+    def _run_node(self, node, processes):
+        try:
+            output = _NodeOutput(self, node)
+            command = self.command(node)
+            self.log.put(f"{output.prefix}$ {shlex.join(command)}\n")
+            code = run_process(command, output, processes=processes, job_id=f'{self.id}-{node.index}',
+                               cancelled=self.cancelled)
+            if not self.json_lines:
+                for record in result_store.load_json_file(self.table, self._result_file(node)) or []:
+                    self.add_result(node, record)
+            node.exit_code = code
+            if self.cancelled.is_set():
+                node.state = 'cancelled'
+            else:
+                node.state = 'completed' if code == 0 else 'failed'
+        finally:
+            LIMITER.release()
+            with self.cond:
+                self.running -= 1
+                self.host_running[node.host] -= 1
+                self.cond.notify_all()
+
+    def counts(self):
+        counts = {}
+        for node in self.nodes:
+            counts[node.state] = counts.get(node.state, 0) + 1
+        return counts
+
+    def cancel(self, processes):
+        self.cancelled.set()
+        for node in self.nodes:
+            process = processes.get(f'{self.id}-{node.index}')
+            if process is not None and process.poll() is None:
+                process.terminate()
+        with self.cond:
+            self.cond.notify_all()
+
+    def describe(self):
+        return {
+            'scan_id': self.id,
+            'status': 'running' if self.finished_at is None else ('cancelled' if self.cancelled.is_set() else 'completed'),
+            'max_depth': self.max_depth,
+            'max_breadth': self.max_breadth,
+            'per_host': self.per_host,
+            'strategy': self.strategy,
+            'jobs': len(self.nodes),
+            'counts': self.counts(),
+            'results': len(self.table),
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'tree': self.root.describe(),
+        }
@@ -0,0 +1,262 @@
+"""
+Columnar store of ffuf results, for filtering a finished (or running) job
+again without sending a single request to the target.
+
+The runner reads ffuf's JSON-lines output (`-json`, ffuf 2.0+) or, on older
+ffuf, the `-of json` file it writes at the end, and appends every result to
+a ResultTable. Numbers live in typed arrays (status, length, words, lines,
+duration in ms) and strings (URLs, inputs, redirect locations, content
+types) are interned, so a 500k-result run takes a few tens of MB.
+
+`ResultTable.query()` filters with ffuf's own value syntax ("200,301-302")
+and sorts. Rows are also indexed by status code, the usual first filter;
+the other filters run as C-level map/compress passes over the candidate
+rows. The matching row ids are cached per (filters, sort, row count), so
+paging through a result set does not filter again.
+
+Note that ffuf only reports the responses its matchers and filters let
+through. Run with `-mc all` (and without -fs/-fw/...) to keep every response
+in the table and do the filtering here instead.
+"""
+import base64
+import binascii
+import json
+import operator
+import threading
+from array import array
+from collections import Counter, OrderedDict
+from itertools import chain, compress
+
+NUMERIC_COLUMNS = ('status', 'length', 'words', 'lines', 'duration')
+SORT_KEYS = ('position',) + NUMERIC_COLUMNS + ('url',)
+FILTERS = {'status': 'status', 'size': 'length', 'words': 'words', 'lines': 'lines', 'duration': 'duration'}
+MAX_LIMIT = 5000
+CACHED_QUERIES = 8
+UINT32_MAX = 2 ** 32 - 1
+
+
+def parse_ranges(text):
+    """Parses ffuf's value syntax ('200,301-302' or 'all') into a list of (low, high) ranges."""
+    text = str(text).strip()
+    if text == 'all':
+        return [(0, UINT32_MAX)]
+    ranges = []
+    for part in text.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        low, _sep, high = part.partition('-')
+        low, high = int(low), int(high or low)
+        if low > high:
+            raise ValueError(f"bad range '{part}'")
+        ranges.append((low, high))
+    if not ranges:
+        raise ValueError('empty value list')
+    return ranges
+
+
+def _matcher(ranges):
+    """A set's membership test when the ranges are small, else a range-checking function."""
+    if sum(high - low + 1 for low, high in ranges) <= 4096:
+        values = set()
+        for low, high in ranges:
+            values.update(range(low, high + 1))
+        return frozenset(values).__contains__
+    return lambda value: any(low <= value <= high for low, high in ranges)
+
+
+def _select(ids, values, ranges, negate):
+    """The ids (None: all rows of `values`) whose value is in the ranges, or not in them."""
+    matches = map(_matcher(ranges), values if ids is None else map(values.__getitem__, ids))
+    if negate:
+        matches = map(operator.not_, matches)
+    return array('I', compress(range(len(values)) if ids is None else ids, matches))
+
+
+def _input_text(inputs, encoded):
+    """Turns ffuf's input map into 'admin' (one keyword) or 'W1=a W2=b'."""
+    values = []
+    for keyword, value in (inputs or {}).items():
+        if keyword == 'FFUFHASH':
+            continue
+        if encoded: # -json prints []byte values, which Go encodes as base64
+            try:
+                value = base64.b64decode(value, validate=True).decode('utf-8', errors='replace')
+            except (binascii.Error, ValueError):
+                pass
+        values.append((keyword, value))
+    if len(values) == 1:
+        return values[0][1]
+    return ' '.join(f'{keyword}={value}' for keyword, value in values)
+
+
+def parse_result_line(line):
+    """The result in one line of ffuf's -json output, or None for any other line."""
+    if not line.startswith('{'):
+        return None
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    return record if isinstance(record, dict) and 'status' in record else None
+
+
+def load_json_file(table, path):
+    """Appends the results of an ffuf -of json file to a table. Returns the records, or None."""
+    try:
+        with open(path) as f:
+            results = json.load(f).get('results') or []
+    except (OSError, ValueError, AttributeError) as e:
+        print(f"Could not load ffuf results from '{path}': {e}")
+        return None
+    for record in results:
+        table.append(record, encoded=False) # The file writes inputs as plain strings
+    return results
+
+
+def format_result(record, encoded=True):
+    """ffuf's own text line for a JSON result, for the live output view."""
+    return (f"{_input_text(record.get('input'), encoded):<25} [Status: {record.get('status')}, "
+            f"Size: {record.get('length')}, Words: {record.get('words')}, Lines: {record.get('lines')}, "
+            f"Duration: {int(record.get('duration') or 0) // 1000000}ms]\n")
+
+
+class ResultTable:
+    """The results of one ffuf job, column by column."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.position = array('I')
+        self.status = array('H')
+        self.length = array('I')
+        self.words = array('I')
+        self.lines = array('I')
+        self.duration = array('I') # milliseconds
+        self.url = array('I') # indexes into self.strings
+        self.input = array('I')
+        self.redirect = array('I')
+        self.content_type = array('I')
+        self.strings = [''] # interned strings; 0 is ''
+        self._string_ids = {'': 0}
+        self._by_status = {} # status -> row ids
+        self._queries = OrderedDict() # query key -> matching row ids
+        self.finished = False
+
+    def __len__(self):
+        return len(self.status)
+
+    def _intern(self, text):
+        text = text or ''
+        index = self._string_ids.get(text)
+        if index is None:
+            index = self._string_ids[text] = len(self.strings)
+            self.strings.append(text)
+        return index
+
+    def append(self, record, encoded=True):
+        """Adds one ffuf result (a decoded JSON object); `encoded` if its inputs are base64."""
+        def number(key):
+            return min(max(int(record.get(key) or 0), 0), UINT32_MAX)
+        with self.lock:
+            status = min(number('status'), 65535)
+            rows = self._by_status.get(status)
+            if rows is None:
+                rows = self._by_status[status] = array('I')
+            rows.append(len(self.status))
+            self.position.append(number('position'))
+            self.status.append(status)
+            self.length.append(number('length'))
+            self.words.append(number('words'))
+            self.lines.append(number('lines'))
+            self.duration.append(min(number('duration') // 1000000, UINT32_MAX)) # Go durations are ns
+            self.url.append(self._intern(record.get('url')))
+            self.input.append(self._intern(_input_text(record.get('input'), encoded)))
+            self.redirect.append(self._intern(record.get('redirectlocation')))
+            self.content_type.append(self._intern(record.get('content-type')))
+
+    def row(self, index):
+        strings = self.strings
+        return {
+            'position': self.position[index],
+            'input': strings[self.input[index]],
+            'url': strings[self.url[index]],
+            'status': self.status[index],
+            'length': self.length[index],
+            'words': self.words[index],
+            'lines': self.lines[index],
+            'duration': self.duration[index],
+            'redirect': strings[self.redirect[index]],
+            'content_type': strings[self.content_type[index]],
+        }
+
+    def query(self, filters=None, search=None, sort='position', descending=False):
+        """
+        Returns the ids of the matching rows, sorted.
+
+        Args:
+            filters (dict): column -> (ranges, negate), e.g. {'length': ([(1234, 1234)], True)}.
+            search (str): Substring the URL or input must contain.
+            sort (str): One of SORT_KEYS.
+            descending (bool): Sort order.
+        """
+        filters = filters or {}
+        count = len(self)
+        key = (count, tuple(sorted((column, tuple(ranges), negate) for column, (ranges, negate) in filters.items())),
+               search, sort, descending)
+        with self.lock:
+            cached = self._queries.get(key)
+            if cached is not None:
+                self._queries.move_to_end(key)
+                return cached
+
+        ids = None # all rows up to `count`; rows appended meanwhile are not part of this answer
+        filters = dict(filters)
+        status_filter = filters.get('status')
+        if status_filter is not None and not status_filter[1]:
+            # Straight from the status index
+            del filters['status']
+            matches = _matcher(status_filter[0])
+            with self.lock:
+                picked = [rows[:] for status, rows in self._by_status.items() if matches(status)]
+            ids = array('I', sorted(i for i in chain.from_iterable(picked) if i < count))
+        for column, (ranges, negate) in filters.items():
+            values = getattr(self, column)
+            ids = _select(ids, values[:count] if ids is None else values, ranges, negate)
+        if ids is None:
+            ids = array('I', range(count))
+        if search:
+            strings, urls, inputs = self.strings, self.url, self.input
+            ids = array('I', [i for i in ids if search in strings[urls[i]] or search in strings[inputs[i]]])
+        if sort == 'url':
+            strings, urls = self.strings, self.url
+            ids = array('I', sorted(ids, key=lambda i: strings[urls[i]], reverse=descending))
+        elif sort != 'position' or descending:
+            ids = array('I', sorted(ids, key=getattr(self, sort).__getitem__, reverse=descending))
+
+        with self.lock:
+            self._queries[key] = ids
+            while len(self._queries) > CACHED_QUERIES:
+                self._queries.popitem(last=False)
+        return ids
+
+    def facets(self, ids, top=10):
+        """Status counts and the most common sizes among the given rows (what to filter out next)."""
+        statuses = Counter(self.status[i] for i in ids)
+        lengths = Counter(self.length[i] for i in ids)
+        return {'status': dict(sorted(statuses.items())), 'length': lengths.most_common(top)}
+
+
+def query_from_args(table, args):
+    """Runs ResultTable.query() for /ffuf/<job>/results arguments. Raises ValueError."""
+    filters = {}
+    for name, column in FILTERS.items():
+        if args.get(name):
+            filters[column] = (parse_ranges(args[name]), False)
+        if args.get(f'{name}_not'):
+            if column in filters:
+                raise ValueError(f"use either {name} or {name}_not")
+            filters[column] = (parse_ranges(args[f'{name}_not']), True)
+    sort = args.get('sort') or 'position'
+    if sort not in SORT_KEYS:
+        raise ValueError(f"sort must be one of {', '.join(SORT_KEYS)}")
+    return table.query(filters, args.get('q') or None, sort, args.get('order') == 'desc')
@@ -7,11 +7,14 @@ import threading
 import queue
 import time
 import uuid # For unique filenames
-import shutil # Added for shutil.which
 import sys # To detect OS and get command-line arguments
 
 app = Flask(__name__)
 
+# Shared runtime (metrics, debug endpoints) lives at the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import runtime
+
 # Directory to store temporary files (e.g., uploaded target lists, scan outputs)
 UPLOAD_FOLDER = 'uploads'
 if not os.path.exists(UPLOAD_FOLDER):
@@ -19,29 +22,14 @@ if not os.path.exists(UPLOAD_FOLDER):
 
 # In-memory storage for scan outputs (for demonstration).
 # In a real-world app, consider a more persistent and scalable solution (e.g., database, cloud storage).
-file_outputs = {}
+file_outputs = runtime.JobOutputs()
 file_processes = {} # To keep track of running file processes
 file_queues = {} # To store queues for real-time output
 
-# Load examples from file_examples.txt
-def load_examples(filename="file_examples.txt"):
-    """Loads examples from a JSON file."""
-    try:
-        # Assuming file_examples.txt is in the same directory as app.py
-        filepath = os.path.join(os.path.dirname(__file__), filename)
-        with open(filepath, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"Error: Examples file '{filename}' not found. Please ensure it's in the same directory as app.py.")
-        return []
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from '{filename}': {e}")
-        return []
-    except Exception as e:
-        print(f"An unexpected error occurred while loading examples: {e}")
-        return []
+runtime.init_app(app, upload_folder=UPLOAD_FOLDER, outputs=file_outputs, processes=file_processes, queues=file_queues, tools=['file'])
 
-ALL_EXAMPLES = load_examples()
+# Examples from file_examples.txt, parsed once and again only when the file changes
+EXAMPLES = runtime.ExamplesIndex(app, "file_examples.txt")
 
 @app.route('/')
 def index():
@@ -52,7 +40,7 @@ def index():
 @app.route('/get_examples', methods=['GET'])
 def get_examples():
     """Returns the File examples as JSON."""
-    return jsonify(ALL_EXAMPLES)
+    return EXAMPLES.serve()
 
 @app.route('/generate_command', methods=['POST'])
 def generate_command():
@@ -149,17 +137,16 @@ def run_file():
     if command[0] != 'file':
         return jsonify({'status': 'error', 'message': 'Only "file" commands are allowed.'}), 403
 
-    # Check if 'file' executable exists using shutil.which
-    if shutil.which(command[0]) is None:
+    # Check if 'file' executable exists using runtime.which
+    if runtime.which(command[0]) is None:
         return jsonify({'status': 'error', 'message': f"'{command[0]}' executable not found on the server. Please ensure 'file' is installed and accessible in the system's PATH."}), 500
 
     # Create a new queue for this execution's real-time output
-    output_queue = queue.Queue()
+    output_queue = runtime.OutputLog()
     file_queues[scan_id] = output_queue
-    file_outputs[scan_id] = "" # Initialize full output storage
+    file_outputs[scan_id] = output_queue # The log is the stored output (see runtime.JobOutputs)
 
     def _run_file_thread(cmd, q, scan_id_val):
-        full_output_buffer = []
         try:
             process = subprocess.Popen(
                 cmd,
@@ -173,7 +160,6 @@ def run_file():
 
             for line in iter(process.stdout.readline, ''):
                 q.put(line) # Put each line into the queue
-                full_output_buffer.append(line) # Also append to buffer for final output
 
             process.wait()
             return_code = process.returncode
@@ -182,17 +168,12 @@ def run_file():
             final_status_line += f"STATUS: {'Completed' if return_code == 0 else 'Failed'}\n"
             q.put(final_status_line) # Add final status to queue
 
-            full_output_buffer.append(final_status_line)
-            file_outputs[scan_id_val] = "".join(full_output_buffer) # Store complete output
-
         except FileNotFoundError:
             error_msg = f"Error: '{cmd[0]}' command not found. Make sure 'file' is installed and in your system's PATH.\nSTATUS: Error\n"
             q.put(error_msg)
-            file_outputs[scan_id_val] = error_msg
         except Exception as e:
             error_msg = f"An unexpected error occurred: {e}\nSTATUS: Error\n"
             q.put(error_msg)
-            file_outputs[scan_id_val] = error_msg
         finally:
             if scan_id_val in file_processes:
                 del file_processes[scan_id_val]
@@ -308,7 +289,7 @@ def install_file():
     if sys.platform.startswith('linux'):
         scan_id = str(uuid.uuid4()) # Unique ID for this installation process
         full_output = []
-        output_queue = queue.Queue()
+        output_queue = runtime.OutputLog()
         file_queues[scan_id] = output_queue
         file_outputs[scan_id] = "" # Initialize full output storage for this ID
 
@@ -2,44 +2,42 @@ import os
 import subprocess
 import shlex
 import json
-from flask import Flask, render_template, request, jsonify, send_file
+import sqlite3
+from flask import Flask, Response, render_template, request, jsonify, send_file
 import threading
 import queue
 import time
 import uuid # For unique filenames
-import shutil # Added for shutil.which
 import sys # To detect OS and get command-line arguments
+from collections import OrderedDict
 
 app = Flask(__name__)
 
+# Shared runtime (metrics, debug endpoints) lives at the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import frontier
+import runtime
+import url_dedupe
+
 # Directory to store temporary files (e.g., uploaded target lists, scan outputs)
 UPLOAD_FOLDER = 'uploads'
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
 # In-memory storage for scan outputs (for demonstration).
-scan_outputs = {}
+scan_outputs = runtime.JobOutputs()
 scan_processes = {} # To keep track of running Gospider processes
 scan_queues = {} # To store queues for real-time output
+crawl_urls = OrderedDict() # scan_id -> url_dedupe.CrawlUrls, for /gospider/<id>/urls
+MAX_KEPT_URL_LISTS = 10 # URL lists of finished crawls kept; older ones are forgotten (their files stay)
 
-# Load examples from gospider_examples.txt
-def load_examples(filename="gospider_examples.txt"):
-    """Loads examples from a JSON file."""
-    try:
-        filepath = os.path.join(os.path.dirname(__file__), filename)
-        with open(filepath, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"Error: Examples file '{filename}' not found. Please ensure it's in the same directory as app.py.")
-        return []
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from '{filename}': {e}")
-        return []
-    except Exception as e:
-        print(f"An unexpected error occurred while loading examples: {e}")
-        return []
+# Discovered and visited URLs of every crawl, kept across runs for resume/incremental crawls
+FRONTIER = frontier.Frontier()
 
-ALL_EXAMPLES = load_examples()
+runtime.init_app(app, upload_folder=UPLOAD_FOLDER, outputs=scan_outputs, processes=scan_processes, queues=scan_queues, tools=['gospider'])
+
+# Examples from gospider_examples.txt, parsed once and again only when the file changes
+EXAMPLES = runtime.ExamplesIndex(app, "gospider_examples.txt")
 
 @app.route('/')
 def index():
@@ -50,7 +48,7 @@ def index():
 @app.route('/get_examples', methods=['GET'])
 def get_examples():
     """Returns the Gospider examples as JSON."""
-    return jsonify(ALL_EXAMPLES)
+    return EXAMPLES.serve()
 
 @app.route('/generate_command', methods=['POST'])
 def generate_command():
@@ -183,18 +181,41 @@ def run_gospider():
     if command[0] != 'gospider':
         return jsonify({'status': 'error', 'message': 'Only Gospider commands are allowed.'}), 403
 
-    # Check if gospider executable exists using shutil.which
-    if shutil.which(command[0]) is None:
+    # Check if gospider executable exists using runtime.which
+    if runtime.which(command[0]) is None:
         return jsonify({'status': 'error', 'message': f"Gospider executable '{command[0]}' not found on the server. Please ensure Gospider is installed and accessible in the system's PATH."}), 500
 
+    # Resume/incremental: crawl from the URLs earlier runs discovered but did not visit
+    mode = data.get('mode') or 'full'
+    seeding = None
+    if mode != 'full':
+        try:
+            command, seeding = FRONTIER.seed_command(command, mode, os.path.join(UPLOAD_FOLDER, f'gospider_{scan_id}_seeds.txt'))
+        except frontier.EmptyFrontier as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 409
+        except frontier.FrontierError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        except (OSError, sqlite3.Error) as e:
+            return jsonify({'status': 'error', 'message': f'Could not read the crawl frontier: {e}'}), 500
+
+    # Every URL line goes through a dedupe filter; only the first sighting of a URL is shown and recorded.
+    # All of them also go to the frontier
+    forget_old_url_lists()
+    recorder = frontier.CrawlRecorder(FRONTIER)
+    urls = crawl_urls[scan_id] = url_dedupe.CrawlUrls(os.path.join(UPLOAD_FOLDER, f'gospider_{scan_id}_urls.jsonl'), recorder)
+
     # Create a new queue for this scan's real-time output
-    output_queue = queue.Queue()
+    output_queue = runtime.OutputLog()
     scan_queues[scan_id] = output_queue
-    scan_outputs[scan_id] = "" # Initialize full output storage
+    scan_outputs[scan_id] = output_queue # The log is the stored output (see runtime.JobOutputs)
 
     def _run_gospider_thread(cmd, q, scan_id_val):
-        full_output_buffer = []
+        # Pace the tool to its share of the target host's request budget (runtime/ratelimit.py)
+        cmd, lease = runtime.ratelimit.throttle_command(cmd, q, cancelled=q.cancelled)
         try:
+            if q.cancelled.is_set(): # Stopped through /jobs/<id>/cancel while waiting for budget
+                q.put("Cancelled before the scan started.\nSTATUS: Cancelled\n")
+                return
             process = subprocess.Popen(
                 cmd,
                 stdout=subprocess.PIPE,
@@ -205,31 +226,39 @@ def run_gospider():
             )
             scan_processes[scan_id_val] = process
 
+            if seeding is not None:
+                seeded_line = (f"{seeding['mode'].capitalize()} crawl of {seeding['origin']}: {seeding['seeds']} seed URL(s) "
+                               f"({seeding['visited']} of {seeding['discovered']} known URL(s) visited, "
+                               f"{seeding['frontier_left']} left for a later run)\n")
+                q.put(seeded_line)
+
             for line in iter(process.stdout.readline, ''):
+                if not urls.add_line(line):
+                    continue # A URL already reported
                 q.put(line) # Put each line into the queue
-                full_output_buffer.append(line) # Also append to buffer for final output
 
             process.wait()
             return_code = process.returncode
 
-            final_status_line = f"\nGospider finished with exit code: {return_code}\n"
+            recorder.close()
+            final_status_line = (f"\n{urls.count} unique URL(s) in {urls.lines} output line(s); "
+                                 f"{urls.duplicates} repeated URL(s) not shown; {recorder.new} new to the frontier.\n")
+            final_status_line += f"Gospider finished with exit code: {return_code}\n"
             final_status_line += f"STATUS: {'Completed' if return_code == 0 else 'Failed'}\n"
             q.put(final_status_line) # Add final status to queue
 
-            full_output_buffer.append(final_status_line)
-            scan_outputs[scan_id_val] = "".join(full_output_buffer) # Store complete output
-
         except FileNotFoundError:
             error_msg = f"Error: '{cmd[0]}' command not found. Make sure Gospider is installed and in your system's PATH.\nSTATUS: Error\n"
             q.put(error_msg)
-            scan_outputs[scan_id_val] = error_msg
         except Exception as e:
             error_msg = f"An unexpected error occurred: {e}\nSTATUS: Error\n"
             q.put(error_msg)
-            scan_outputs[scan_id_val] = error_msg
         finally:
             if scan_id_val in scan_processes:
                 del scan_processes[scan_id_val]
+            lease.release()
+            urls.close()
+            recorder.close()
             # Signal end of output by putting a special marker
             q.put("---SCAN_COMPLETE---")
 
@@ -239,7 +268,81 @@ def run_gospider():
     thread.daemon = True
     thread.start()
 
-    return jsonify({'status': 'running', 'scan_id': scan_id, 'message': 'Gospider scan started.'})
+    return jsonify({'status': 'running', 'scan_id': scan_id, 'message': 'Gospider scan started.', 'seeding': seeding})
+
+def forget_old_url_lists():
+    finished = [scan_id for scan_id, urls in crawl_urls.items() if urls.finished]
+    for scan_id in finished[:max(len(finished) - MAX_KEPT_URL_LISTS + 1, 0)]:
+        del crawl_urls[scan_id]
+
+@app.route('/gospider/<scan_id>/urls', methods=['GET'])
+def get_crawl_urls(scan_id):
+    """
+    The unique URLs of a crawl in the order they were found, with their source type (href, javascript,
+    sitemap, ...) and status. ?type= keeps one source type; offset, limit (up to 5000);
+    format=txt downloads the whole list, one URL per line.
+    """
+    urls = crawl_urls.get(scan_id)
+    if urls is None:
+        return jsonify({'status': 'not_found', 'message': 'Scan ID not found or expired.'}), 404
+    source = request.args.get('type') or None
+    if request.args.get('format') == 'txt':
+        def generate():
+            offset = 0
+            while True:
+                records = urls.page(offset, url_dedupe.MAX_LIMIT, source)
+                if not records:
+                    return
+                yield ''.join(record['url'] + '\n' for record in records)
+                offset += len(records)
+        return Response(generate(), mimetype='text/plain',
+                        headers={'Content-Disposition': f'attachment; filename=gospider_{scan_id}_urls.txt'})
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = min(max(int(request.args.get('limit', 100)), 1), url_dedupe.MAX_LIMIT)
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'offset and limit must be whole numbers.'}), 400
+    body = urls.describe()
+    body.update({'total': urls.types.get(source, 0) if source else urls.count, 'offset': offset, 'limit': limit,
+                 'urls': urls.page(offset, limit, source)})
+    return jsonify(body)
+
+@app.route('/gospider/frontier', methods=['GET'])
+def get_frontier():
+    """
+    Crawl frontier of a site: ?site=https://example.com gives its discovered, visited and unvisited
+    URL counts (list=1 adds a page of the unvisited URLs: offset, limit); without site, the known origins.
+    """
+    site = request.args.get('site')
+    try:
+        if not site:
+            return jsonify({'origins': FRONTIER.origins()})
+        key = url_dedupe.normalize_url(site)
+        if key is None:
+            return jsonify({'status': 'error', 'message': 'site must be an http(s) URL.'}), 400
+        body = FRONTIER.summary(frontier.origin_of(key))
+        if request.args.get('list') == '1':
+            try:
+                offset = max(int(request.args.get('offset', 0)), 0)
+                limit = min(max(int(request.args.get('limit', 100)), 1), url_dedupe.MAX_LIMIT)
+            except ValueError:
+                return jsonify({'status': 'error', 'message': 'offset and limit must be whole numbers.'}), 400
+            body['unvisited'] = FRONTIER.unvisited(body['origin'], limit, offset)
+        return jsonify(body)
+    except sqlite3.Error as e:
+        return jsonify({'status': 'error', 'message': f'Could not read the crawl frontier: {e}'}), 500
+
+@app.route('/gospider/frontier/forget', methods=['POST'])
+def forget_frontier():
+    """Drops everything the frontier knows about a site, so the next crawl starts from scratch."""
+    key = url_dedupe.normalize_url((request.json or {}).get('site') or '')
+    if key is None:
+        return jsonify({'status': 'error', 'message': 'site must be an http(s) URL.'}), 400
+    try:
+        removed = FRONTIER.forget(frontier.origin_of(key))
+    except sqlite3.Error as e:
+        return jsonify({'status': 'error', 'message': f'Could not update the crawl frontier: {e}'}), 500
+    return jsonify({'status': 'success', 'message': f'{removed} URL(s) forgotten.', 'removed': removed})
 
 # Modified get_scan_output to handle 'gospider_install' ID
 @app.route('/get_scan_output/<scan_id>', methods=['GET'])
@@ -347,7 +450,7 @@ def install_gospider():
     if sys.platform.startswith('linux'):
         scan_id = str(uuid.uuid4()) # Unique ID for this installation process
         full_output = []
-        output_queue = queue.Queue()
+        output_queue = runtime.OutputLog()
         scan_queues[scan_id] = output_queue
         scan_outputs[scan_id] = "" # Initialize full output storage for this ID
 
@@ -355,7 +458,7 @@ def install_gospider():
             temp_buffer_thread = [] # Local buffer for the thread
             try:
                 # Check for Go installation first
-                if shutil.which("go") is None:
+                if runtime.which("go") is None:
                     q.put("Go programming language not found. Gospider requires Go to be installed.\n")
                     q.put("Please install Go first (e.g., 'sudo apt install golang' on Debian/Ubuntu, or 'pkg install golang' on Termux).\n")
                     q.put("---INSTALL_COMPLETE_FAILURE---")
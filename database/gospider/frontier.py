@@ -0,0 +1,219 @@
+"""
+Crawl frontier: the URLs gospider discovered and visited, kept across runs.
+
+Every crawl records its URLs in a local SQLite database, keyed by origin
+(scheme://host[:port]) and a 16-byte fingerprint of the normalized URL (see
+url_dedupe.py), so a URL is stored once however often it is found. A URL is
+visited once gospider fetched it (a `[url] - [code-NNN] - ...` line, or a
+--json line of type url with a status). Rows are written in small batches
+while the crawl runs, so a crawl that is killed keeps what it found.
+
+A later run against the same site can then start from the frontier instead
+of from scratch (`seed_command()`):
+
+* resume: crawl only the URLs discovered but not visited yet;
+* incremental: crawl the site again, plus the unvisited URLs.
+
+Static assets (images, fonts, styles, media, documents, archives) are
+recorded but never seeded again; gospider's default blacklist already skips
+them within a crawl. Seeds go to gospider in a sites file (`-S`) that
+replaces the `-s` site.
+
+The database is CYBERWEB_GOSPIDER_FRONTIER_DB (default: frontier.db in the
+app folder).
+"""
+import os
+import posixpath
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit
+
+import url_dedupe
+
+DB_PATH = os.environ.get('CYBERWEB_GOSPIDER_FRONTIER_DB', 'frontier.db')
+MODES = ('full', 'resume', 'incremental')
+MAX_SEEDS = 5000
+FLUSH_ROWS = 500
+FLUSH_SECONDS = 1.0
+STATIC_EXTENSIONS = frozenset((
+    '.css', '.png', '.jpg', '.jpeg', '.gif', '.bmp', '.ico', '.svg', '.webp', '.tif', '.tiff',
+    '.woff', '.woff2', '.ttf', '.otf', '.eot', '.mp3', '.mp4', '.webm', '.ogg', '.wav', '.avi', '.mov',
+    '.pdf', '.doc', '.docx', '.xls', '.xlsx', '.ppt', '.pptx', '.zip', '.gz', '.tgz', '.rar', '.7z',
+))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    origin TEXT NOT NULL,          -- scheme://host[:port]
+    key BLOB NOT NULL,             -- url_dedupe.fingerprint() of the normalized URL
+    url TEXT NOT NULL,             -- as gospider first reported it
+    type TEXT,                     -- where it was first found: href, javascript, sitemap, ...
+    status INTEGER,
+    static INTEGER NOT NULL,
+    first_seen REAL NOT NULL,
+    visited_at REAL,
+    PRIMARY KEY (origin, key)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS urls_frontier ON urls (origin, visited_at, static);
+"""
+_DISCOVERED = """
+INSERT INTO urls (origin, key, url, type, status, static, first_seen, visited_at) VALUES (?, ?, ?, ?, ?, ?, ?, NULL)
+ON CONFLICT (origin, key) DO NOTHING
+"""
+_VISITED = """
+INSERT INTO urls (origin, key, url, type, status, static, first_seen, visited_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (origin, key) DO UPDATE SET visited_at = excluded.visited_at, status = excluded.status
+"""
+
+
+class FrontierError(ValueError):
+    """A crawl cannot be seeded from the frontier."""
+
+
+class EmptyFrontier(FrontierError):
+    """Every URL known for the site was visited already."""
+
+
+def origin_of(key):
+    """scheme://host[:port] of a normalized URL."""
+    parts = urlsplit(key)
+    return f'{parts.scheme}://{parts.netloc}'
+
+
+def is_static(key):
+    return posixpath.splitext(urlsplit(key).path)[1].lower() in STATIC_EXTENSIONS
+
+
+def _site_index(argv):
+    """Index of the site in a gospider argv: the -s/--site value, else the first http(s) URL argument."""
+    site = None
+    for index, token in enumerate(argv[:-1]):
+        if token in ('-s', '--site'):
+            site = index + 1
+    if site is None:
+        site = next((index for index, token in enumerate(argv) if index and token.startswith(('http://', 'https://'))), None)
+    return site
+
+
+class Frontier:
+    """The SQLite URL store of the gospider app."""
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self.local = threading.local() # One connection per thread
+        self.connection().executescript(SCHEMA)
+
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self.local.connection = connection
+        return connection
+
+    def write(self, discovered, visited):
+        """Stores batches of rows. Returns how many URLs were new to the store."""
+        connection = self.connection()
+        with connection:
+            before = connection.total_changes
+            connection.executemany(_DISCOVERED, discovered)
+            new = connection.total_changes - before
+            connection.executemany(_VISITED, visited)
+        return new
+
+    def summary(self, origin):
+        row = self.connection().execute(
+            'SELECT COUNT(*), COUNT(visited_at), SUM(visited_at IS NULL AND static = 0), SUM(static), '
+            'MAX(first_seen), MAX(visited_at) FROM urls WHERE origin = ?', (origin,)).fetchone()
+        return {'origin': origin, 'discovered': row[0], 'visited': row[1], 'frontier': row[2] or 0,
+                'static': row[3] or 0, 'last_discovered_at': row[4], 'last_visited_at': row[5]}
+
+    def origins(self, limit=100):
+        rows = self.connection().execute(
+            'SELECT origin, COUNT(*), COUNT(visited_at), MAX(first_seen) FROM urls GROUP BY origin '
+            'ORDER BY MAX(first_seen) DESC LIMIT ?', (limit,)).fetchall()
+        return [{'origin': origin, 'discovered': discovered, 'visited': visited, 'last_discovered_at': last}
+                for origin, discovered, visited, last in rows]
+
+    def unvisited(self, origin, limit=MAX_SEEDS, offset=0):
+        """URLs discovered but not visited yet (static assets left out), oldest first."""
+        return [url for (url,) in self.connection().execute(
+            'SELECT url FROM urls WHERE origin = ? AND visited_at IS NULL AND static = 0 '
+            'ORDER BY first_seen LIMIT ? OFFSET ?', (origin, limit, offset))]
+
+    def forget(self, origin):
+        with self.connection() as connection:
+            return connection.execute('DELETE FROM urls WHERE origin = ?', (origin,)).rowcount
+
+    def seed_command(self, argv, mode, seed_file, max_seeds=MAX_SEEDS):
+        """
+        Rewrites a gospider argv to crawl from the frontier of its -s site.
+
+        Returns:
+            (list, dict): The new argv (-s replaced by `-S seed_file`) and the seeding summary.
+        Raises:
+            FrontierError: No -s site or an unknown mode; EmptyFrontier: nothing left to resume.
+        """
+        if mode not in MODES[1:]:
+            raise FrontierError(f"mode must be one of {', '.join(MODES)}.")
+        site_index = _site_index(argv)
+        site = argv[site_index] if site_index is not None else None
+        key = url_dedupe.normalize_url(site or '')
+        if key is None:
+            raise FrontierError('Resume and incremental crawls need the target as an http(s) URL in -s.')
+        origin = origin_of(key)
+        summary = self.summary(origin)
+        seeds = self.unvisited(origin, max_seeds)
+        if mode == 'incremental':
+            seeds = [site] + [url for url in seeds if url_dedupe.normalize_url(url) != key]
+        elif not seeds:
+            raise EmptyFrontier(f"Nothing left to resume for {origin}: all {summary['discovered']} "
+                                f"discovered URL(s) were visited or are static assets.")
+        with open(seed_file, 'w') as f:
+            f.write(''.join(url + '\n' for url in seeds))
+        rest = [token for index, token in enumerate(argv)
+                if index != site_index and not (index == site_index - 1 and token in ('-s', '--site'))]
+        summary.update({'mode': mode, 'seeds': len(seeds), 'seed_file': seed_file,
+                        'frontier_left': max(summary['frontier'] - max_seeds, 0)})
+        return rest + ['-S', seed_file], summary
+
+
+class CrawlRecorder:
+    """Writes the URLs of one running crawl to the frontier in batches (a CrawlUrls listener)."""
+
+    def __init__(self, frontier):
+        self.frontier = frontier
+        self.lock = threading.Lock()
+        self.discovered = []
+        self.visited = []
+        self.flushed_at = time.monotonic()
+        self.new = 0 # URLs no earlier crawl had found
+
+    def __call__(self, key, url, source, status, new):
+        now = time.time()
+        with self.lock:
+            if new:
+                self.discovered.append((origin_of(key), url_dedupe.fingerprint(key), url, source, status,
+                                        is_static(key), now))
+            if source == 'url' and status is not None:
+                self.visited.append((origin_of(key), url_dedupe.fingerprint(key), url, source, status,
+                                     is_static(key), now, now))
+            if len(self.discovered) + len(self.visited) >= FLUSH_ROWS or \
+                    time.monotonic() - self.flushed_at >= FLUSH_SECONDS:
+                self._flush()
+
+    def _flush(self):
+        discovered, visited = self.discovered, self.visited
+        self.discovered, self.visited = [], []
+        self.flushed_at = time.monotonic()
+        if not discovered and not visited:
+            return
+        try:
+            self.new += self.frontier.write(discovered, visited)
+        except sqlite3.Error as e:
+            print(f"Could not record crawl URLs in the frontier: {e}")
+
+    def close(self):
+        with self.lock:
+            self._flush()
@@ -0,0 +1,232 @@
+"""
+Deduplication of the URLs a gospider crawl reports.
+
+gospider prints a URL every time it finds it: in the sitemap, in robots.txt,
+in every page that links to it, in JavaScript, on subdomains... On a large
+site most output lines are repeats. The runner passes every output line
+through a CrawlUrls, which parses it (text output `[type] - ... - <url>`, or
+`--json` lines), normalizes the URL and shows and records the line only the
+first time the URL comes up.
+
+Memory stays bounded: seen URLs are kept as 128-bit fingerprints in an exact
+set up to EXACT_LIMIT of them, then moved into a Bloom filter sized for
+BLOOM_CAPACITY URLs at ERROR_RATE false positives (a false positive drops a
+new URL as a repeat). The new URLs themselves go to a JSON-lines file in
+uploads/ with their source type and status, indexed every INDEX_STEP records
+for paging; `/gospider/<id>/urls` serves them.
+"""
+import hashlib
+import json
+import math
+import threading
+from array import array
+from collections import Counter
+from urllib.parse import urlsplit
+
+EXACT_LIMIT = 200000
+BLOOM_CAPACITY = 5000000
+ERROR_RATE = 0.001
+INDEX_STEP = 1000
+MAX_LIMIT = 5000
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url):
+    """
+    The dedupe key of a URL: lowercase scheme and host, no default port, user
+    info or fragment, '/' for an empty path, query parameters sorted. None if
+    it is not an http(s) URL.
+    """
+    try:
+        parts = urlsplit(url.strip())
+        port = parts.port
+    except ValueError:
+        return None
+    scheme = parts.scheme.lower()
+    host = parts.hostname
+    if scheme not in DEFAULT_PORTS or not host:
+        return None
+    if ':' in host:
+        host = f'[{host}]'
+    netloc = host if port in (None, DEFAULT_PORTS[scheme]) else f'{host}:{port}'
+    query = '&'.join(sorted(parts.query.split('&'))) if parts.query else ''
+    return f"{scheme}://{netloc}{parts.path or '/'}{'?' + query if query else ''}"
+
+
+def parse_line(line):
+    """
+    The (source type, URL, status) a gospider output line reports, or None.
+    Text lines look like `[href] - https://...` or `[url] - [code-200] - https://...`;
+    with --json every line is an object with type, output and status.
+    """
+    line = line.strip()
+    if line.startswith('{'):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return None
+        if not isinstance(record, dict) or not isinstance(record.get('output'), str):
+            return None
+        return record.get('type') or 'url', record['output'], record.get('status') or None
+    if line.startswith('['):
+        parts = line.split(' - ')
+        if len(parts) < 2 or not parts[0].endswith(']'):
+            return None
+        status = None
+        for part in parts[1:-1]:
+            if part.startswith('[code-') and part.endswith(']'):
+                try:
+                    status = int(part[len('[code-'):-1])
+                except ValueError:
+                    pass
+        return parts[0][1:-1], parts[-1], status
+    if line.startswith(('http://', 'https://')) and ' ' not in line: # -q prints bare URLs
+        return 'url', line, None
+    return None
+
+
+def fingerprint(key):
+    """16-byte digest of a normalized URL."""
+    return hashlib.blake2b(key.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+
+class BloomFilter:
+    """A Bloom filter over 128-bit fingerprints (double hashing on their two halves)."""
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 64)
+        self.hashes = max(round(self.size / capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def add(self, fingerprint):
+        """Adds a fingerprint. Returns True if it was (probably) there already."""
+        first, step = fingerprint >> 64, (fingerprint & 0xFFFFFFFFFFFFFFFF) | 1
+        bits, size = self.bits, self.size
+        present = True
+        for i in range(self.hashes):
+            bit = (first + i * step) % size
+            mask = 1 << (bit & 7)
+            if not bits[bit >> 3] & mask:
+                bits[bit >> 3] |= mask
+                present = False
+        return present
+
+
+class SeenUrls:
+    """Set of URL keys: exact up to `exact_limit` keys, a Bloom filter after that."""
+
+    def __init__(self, exact_limit=EXACT_LIMIT, capacity=BLOOM_CAPACITY, error_rate=ERROR_RATE):
+        self.exact_limit = exact_limit
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.exact = set()
+        self.bloom = None
+        self.count = 0
+
+    def add(self, key):
+        """Adds a key. Returns True if it is new."""
+        value = int.from_bytes(fingerprint(key), 'big')
+        if self.bloom is None:
+            if value in self.exact:
+                return False
+            self.exact.add(value)
+            if len(self.exact) > self.exact_limit:
+                self.bloom = BloomFilter(self.capacity, self.error_rate)
+                for seen in self.exact:
+                    self.bloom.add(seen)
+                self.exact = None
+        elif self.bloom.add(value):
+            return False
+        self.count += 1
+        return True
+
+    def describe(self):
+        if self.bloom is None:
+            return {'mode': 'exact', 'keys': self.count, 'switch_at': self.exact_limit}
+        return {'mode': 'bloom', 'keys': self.count, 'bytes': len(self.bloom.bits), 'hashes': self.bloom.hashes,
+                'capacity': self.capacity, 'error_rate': self.error_rate}
+
+
+class CrawlUrls:
+    """
+    The unique URLs of one crawl, recorded to a JSON-lines file as they are found.
+    `listener(key, url, source, status, new)` is called for every URL line, repeats included.
+    """
+
+    def __init__(self, path, listener=None):
+        self.path = path
+        self.listener = listener
+        self.seen = SeenUrls()
+        self.lock = threading.Lock()
+        self.file = open(path, 'wb')
+        self.index = array('Q', [0]) # file offset of every INDEX_STEP-th record
+        self.offset = 0
+        self.count = 0
+        self.lines = 0
+        self.duplicates = 0
+        self.types = Counter()
+        self.finished = False
+
+    def add_line(self, line):
+        """Takes one output line. Returns False if it only repeats a URL already reported."""
+        parsed = parse_line(line)
+        with self.lock:
+            self.lines += 1
+            if parsed is None:
+                return True
+            source, url, status = parsed
+            key = normalize_url(url)
+            if key is None: # e.g. an S3 bucket name; not a URL to dedupe
+                return True
+            new = self.seen.add(key)
+            if self.listener is not None:
+                self.listener(key, url, source, status, new)
+            if not new:
+                self.duplicates += 1
+                return False
+            data = (json.dumps({'url': url, 'type': source, 'status': status}, ensure_ascii=False) + '\n').encode('utf-8')
+            self.file.write(data)
+            self.offset += len(data)
+            self.count += 1
+            self.types[source] += 1
+            if self.count % INDEX_STEP == 0:
+                self.index.append(self.offset)
+            return True
+
+    def close(self):
+        with self.lock:
+            if not self.file.closed:
+                self.file.close()
+            self.finished = True
+
+    def page(self, offset, limit, source=None):
+        """Records from `offset` on (of the ones of type `source`, if given)."""
+        with self.lock:
+            if not self.file.closed:
+                self.file.flush()
+            index, end = self.index[:], self.offset # Records added after this are not part of the page
+        if source is None and offset // INDEX_STEP >= len(index):
+            return []
+        records = []
+        with open(self.path, 'rb') as f:
+            if source is None:
+                position = index[offset // INDEX_STEP]
+                skip = offset % INDEX_STEP
+            else:
+                position, skip = 0, offset
+            f.seek(position)
+            while position < end and len(records) < limit:
+                line = f.readline()
+                position += len(line)
+                record = json.loads(line)
+                if source is not None and record['type'] != source:
+                    continue
+                if skip:
+                    skip -= 1
+                    continue
+                records.append(record)
+        return records
+
+    def describe(self):
+        return {'status': 'completed' if self.finished else 'running', 'unique': self.count, 'lines': self.lines,
+                'duplicates': self.duplicates, 'types': dict(self.types), 'dedupe': self.seen.describe()}
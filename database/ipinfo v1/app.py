@@ -7,11 +7,14 @@ import threading
 import queue
 import time
 import uuid # For unique filenames
-import shutil # Added for shutil.which
 import sys # To detect OS and get command-line arguments
 
 app = Flask(__name__)
 
+# Shared runtime (metrics, debug endpoints) lives at the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import runtime
+
 # Directory to store temporary files (e.g., uploaded target lists, scan outputs)
 UPLOAD_FOLDER = 'uploads'
 if not os.path.exists(UPLOAD_FOLDER):
@@ -19,29 +22,14 @@ if not os.path.exists(UPLOAD_FOLDER):
 
 # In-memory storage for scan outputs (for demonstration).
 # In a real-world app, consider a more persistent and scalable solution (e.g., database, cloud storage).
-tool_outputs = {}
+tool_outputs = runtime.JobOutputs()
 tool_processes = {} # To keep track of running processes
 tool_queues = {} # To store queues for real-time output
 
-# Load examples from ip_info_examples.txt
-def load_examples(filename="ip_info_examples.txt"):
-    """Loads examples from a JSON file."""
-    try:
-        # Assuming ip_info_examples.txt is in the same directory as app.py
-        filepath = os.path.join(os.path.dirname(__file__), filename)
-        with open(filepath, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"Error: Examples file '{filename}' not found. Please ensure it's in the same directory as app.py.")
-        return []
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from '{filename}': {e}")
-        return []
-    except Exception as e:
-        print(f"An unexpected error occurred while loading examples: {e}")
-        return []
+runtime.init_app(app, upload_folder=UPLOAD_FOLDER, outputs=tool_outputs, processes=tool_processes, queues=tool_queues)
 
-ALL_EXAMPLES = load_examples()
+# Examples from ip_info_examples.txt, parsed once and again only when the file changes
+EXAMPLES = runtime.ExamplesIndex(app, "ip_info_examples.txt")
 
 @app.route('/')
 def index():
@@ -52,7 +40,7 @@ def index():
 @app.route('/get_examples', methods=['GET'])
 def get_examples():
     """Returns the examples as JSON."""
-    return jsonify(ALL_EXAMPLES)
+    return EXAMPLES.serve()
 
 @app.route('/generate_command', methods=['POST'])
 def generate_command():
@@ -135,7 +123,7 @@ def generate_command():
                 command_parts.append("-type=" + data['nslookup_type_select'])
             command_parts.append(target)
         # Fallback for Windows if dig/nslookup not found, use system nslookup
-        if sys.platform == 'win32' and not shutil.which(command_parts[0]):
+        if sys.platform == 'win32' and not runtime.which(command_parts[0]):
             command_parts = ["nslookup"]
             if data.get('nslookup_server_entry'):
                 command_parts.append(shlex.quote(data['nslookup_server_entry']))
@@ -173,17 +161,16 @@ def run_tool():
     except ValueError as e:
         return jsonify({'status': 'error', 'message': f'Error parsing command: {e}'}), 400
 
-    # Check if executable exists using shutil.which
-    if shutil.which(command[0]) is None:
+    # Check if executable exists using runtime.which
+    if runtime.which(command[0]) is None:
         return jsonify({'status': 'error', 'message': f"Executable '{command[0]}' not found on the server. Please ensure the tool is installed and accessible in the system's PATH."}), 500
 
     # Create a new queue for this tool's real-time output
-    output_queue = queue.Queue()
+    output_queue = runtime.OutputLog()
     tool_queues[tool_id] = output_queue
-    tool_outputs[tool_id] = "" # Initialize full output storage
+    tool_outputs[tool_id] = output_queue # The log is the stored output (see runtime.JobOutputs)
 
     def _run_tool_thread(cmd, q, tool_id_val):
-        full_output_buffer = []
         try:
             process = subprocess.Popen(
                 cmd,
@@ -197,7 +184,6 @@ def run_tool():
 
             for line in iter(process.stdout.readline, ''):
                 q.put(line) # Put each line into the queue
-                full_output_buffer.append(line) # Also append to buffer for final output
 
             process.wait()
             return_code = process.returncode
@@ -206,17 +192,12 @@ def run_tool():
             final_status_line += f"STATUS: {'Completed' if return_code == 0 else 'Failed'}\n"
             q.put(final_status_line) # Add final status to queue
 
-            full_output_buffer.append(final_status_line)
-            tool_outputs[tool_id_val] = "".join(full_output_buffer) # Store complete output
-
         except FileNotFoundError:
             error_msg = f"Error: '{cmd[0]}' command not found. Make sure the tool is installed and in your system's PATH.\nSTATUS: Error\n"
             q.put(error_msg)
-            tool_outputs[tool_id_val] = error_msg
         except Exception as e:
             error_msg = f"An unexpected error occurred: {e}\nSTATUS: Error\n"
             q.put(error_msg)
-            tool_outputs[tool_id_val] = error_msg
         finally:
             if tool_id_val in tool_processes:
                 del tool_processes[tool_id_val]
@@ -318,7 +299,7 @@ def install_tool():
     if sys.platform.startswith('linux'):
         install_id = str(uuid.uuid4()) # Unique ID for this installation process
         full_output = []
-        output_queue = queue.Queue()
+        output_queue = runtime.OutputLog()
         tool_queues[install_id] = output_queue
         tool_outputs[install_id] = "" # Initialize full output storage for this ID
 
@@ -7,11 +7,14 @@ import threading
 import queue
 import time
 import uuid # For unique filenames
-import shutil # Added for shutil.which
 import sys # To detect OS and get command-line arguments
 
 app = Flask(__name__)
 
+# Shared runtime (metrics, debug endpoints) lives at the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import runtime
+
 # Directory to store temporary files (e.g., generated payloads)
 UPLOAD_FOLDER = 'payloads'
 if not os.path.exists(UPLOAD_FOLDER):
@@ -22,24 +25,10 @@ if not os.path.exists(UPLOAD_FOLDER):
 process_outputs = {}
 process_queues = {} # To store queues for real-time output
 
-# Load examples from msfvenom_examples.txt
-def load_examples(filename="msfvenom_examples.txt"):
-    """Loads examples from a JSON file."""
-    try:
-        filepath = os.path.join(os.path.dirname(__file__), filename)
-        with open(filepath, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"Error: Examples file '{filename}' not found. Please ensure it's in the same directory as app.py.")
-        return []
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from '{filename}': {e}")
-        return []
-    except Exception as e:
-        print(f"An unexpected error occurred while loading examples: {e}")
-        return []
-
-ALL_EXAMPLES = load_examples()
+runtime.init_app(app, upload_folder=UPLOAD_FOLDER, outputs=process_outputs, queues=process_queues, tools=['msfvenom'])
+
+# Examples from msfvenom_examples.txt, parsed once and again only when the file changes
+EXAMPLES = runtime.ExamplesIndex(app, "msfvenom_examples.txt")
 
 @app.route('/')
 def index():
@@ -50,7 +39,7 @@ def index():
 @app.route('/get_examples', methods=['GET'])
 def get_examples():
     """Returns the msfvenom examples as JSON."""
-    return jsonify(ALL_EXAMPLES)
+    return EXAMPLES.serve()
 
 @app.route('/generate_command', methods=['POST'])
 def generate_command():
@@ -164,8 +153,8 @@ def run_msfvenom():
     if command[0] != 'msfvenom':
         return jsonify({'status': 'error', 'message': 'Only msfvenom commands are allowed.'}), 403
 
-    # Check if msfvenom executable exists using shutil.which
-    if shutil.which(command[0]) is None:
+    # Check if msfvenom executable exists using runtime.which
+    if runtime.which(command[0]) is None:
         return jsonify({'status': 'error', 'message': f"msfvenom executable '{command[0]}' not found on the server. Please ensure msfvenom is installed and accessible in the system's PATH."}), 500
 
     # Determine the actual output path for the payload
@@ -184,7 +173,7 @@ def run_msfvenom():
         command.extend(["-o", final_output_path]) # Add -o to the command
 
     # Create a new queue for this process's real-time output
-    output_queue = queue.Queue()
+    output_queue = runtime.OutputLog()
     process_queues[scan_id] = output_queue
     process_outputs[scan_id] = {"output": "", "file_path": final_output_path} # Initialize full output storage
 
@@ -302,7 +291,7 @@ def install_msfvenom():
     if sys.platform.startswith('linux'):
         scan_id = str(uuid.uuid4()) # Unique ID for this installation process
         full_output = []
-        output_queue = queue.Queue()
+        output_queue = runtime.OutputLog()
         process_queues[scan_id] = output_queue
         process_outputs[scan_id] = {"output": "", "status": "running"} # Initialize full output storage for this ID
 
@@ -7,11 +7,14 @@ import threading
 import queue
 import time
 import uuid # For unique filenames
-import shutil # Added for shutil.which
 import sys # To detect OS and get command-line arguments
 
 app = Flask(__name__)
 
+# Shared runtime (metrics, debug endpoints) lives at the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import runtime
+
 # Directory to store temporary files (e.g., uploaded target lists, scan outputs)
 UPLOAD_FOLDER = 'uploads'
 if not os.path.exists(UPLOAD_FOLDER):
@@ -19,29 +22,14 @@ if not os.path.exists(UPLOAD_FOLDER):
 
 # In-memory storage for scan outputs (for demonstration).
 # In a real-world app, consider a more persistent and scalable solution (e.g., database, cloud storage).
-scan_outputs = {}
+scan_outputs = runtime.JobOutputs()
 scan_processes = {} # To keep track of running Netdiscover processes
 scan_queues = {} # To store queues for real-time output
 
-# Load examples from netdiscover_examples.txt
-def load_examples(filename="netdiscover_examples.txt"):
-    """Loads examples from a JSON file."""
-    try:
-        # Assuming netdiscover_examples.txt is in the same directory as app.py
-        filepath = os.path.join(os.path.dirname(__file__), filename)
-        with open(filepath, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"Error: Examples file '{filename}' not found. Please ensure it's in the same directory as app.py.")
-        return []
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from '{filename}': {e}")
-        return []
-    except Exception as e:
-        print(f"An unexpected error occurred while loading examples: {e}")
-        return []
+runtime.init_app(app, upload_folder=UPLOAD_FOLDER, outputs=scan_outputs, processes=scan_processes, queues=scan_queues, tools=['netdiscover'])
 
-ALL_EXAMPLES = load_examples()
+# Examples from netdiscover_examples.txt, parsed once and again only when the file changes
+EXAMPLES = runtime.ExamplesIndex(app, "netdiscover_examples.txt")
 
 @app.route('/')
 def index():
@@ -52,7 +40,7 @@ def index():
 @app.route('/get_examples', methods=['GET'])
 def get_examples():
     """Returns the Netdiscover examples as JSON."""
-    return jsonify(ALL_EXAMPLES)
+    return EXAMPLES.serve()
 
 @app.route('/generate_command', methods=['POST'])
 def generate_command():
@@ -131,18 +119,17 @@ def run_netdiscover():
     if len(command) <= actual_command_index or command[actual_command_index] != 'netdiscover':
         return jsonify({'status': 'error', 'message': 'Only Netdiscover commands are allowed.'}), 403
 
-    # Check if netdiscover executable exists using shutil.which
+    # Check if netdiscover executable exists using runtime.which
     # This checks for 'netdiscover' directly, not 'sudo'
-    if shutil.which('netdiscover') is None:
+    if runtime.which('netdiscover') is None:
         return jsonify({'status': 'error', 'message': "Netdiscover executable not found on the server. Please ensure Netdiscover is installed and accessible in the system's PATH."}), 500
 
     # Create a new queue for this scan's real-time output
-    output_queue = queue.Queue()
+    output_queue = runtime.OutputLog()
     scan_queues[scan_id] = output_queue
-    scan_outputs[scan_id] = "" # Initialize full output storage
+    scan_outputs[scan_id] = output_queue # The log is the stored output (see runtime.JobOutputs)
 
     def _run_netdiscover_thread(cmd, q, scan_id_val):
-        full_output_buffer = []
         try:
             process = subprocess.Popen(
                 cmd,
@@ -156,7 +143,6 @@ def run_netdiscover():
 
             for line in iter(process.stdout.readline, ''):
                 q.put(line) # Put each line into the queue
-                full_output_buffer.append(line) # Also append to buffer for final output
 
             process.wait()
             return_code = process.returncode
@@ -165,17 +151,12 @@ def run_netdiscover():
             final_status_line += f"STATUS: {'Completed' if return_code == 0 else 'Failed'}\n"
             q.put(final_status_line) # Add final status to queue
 
-            full_output_buffer.append(final_status_line)
-            scan_outputs[scan_id_val] = "".join(full_output_buffer) # Store complete output
-
         except FileNotFoundError:
             error_msg = f"Error: '{cmd[actual_command_index]}' command not found. Make sure Netdiscover is installed and in your system's PATH.\nSTATUS: Error\n"
             q.put(error_msg)
-            scan_outputs[scan_id_val] = error_msg
         except Exception as e:
             error_msg = f"An unexpected error occurred: {e}\nSTATUS: Error\n"
             q.put(error_msg)
-            scan_outputs[scan_id_val] = error_msg
         finally:
             if scan_id_val in scan_processes:
                 del scan_processes[scan_id_val]
@@ -293,7 +274,7 @@ def install_netdiscover():
     # Check if running on Linux or Termux (sys.platform for Termux is 'linux')
     if sys.platform.startswith('linux'):
         scan_id = str(uuid.uuid4()) # Unique ID for this installation process
-        output_queue = queue.Queue()
+        output_queue = runtime.OutputLog()
         scan_queues[scan_id] = output_queue
         scan_outputs[scan_id] = "" # Initialize full output storage for this ID
 
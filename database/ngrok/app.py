@@ -7,43 +7,32 @@ import threading
 import queue
 import time
 import uuid # For unique filenames
-import shutil # Added for shutil.which
 import sys # To detect OS and get command-line arguments
 import re # For parsing Ngrok output
 
 app = Flask(__name__)
 
+# Shared runtime (metrics, debug endpoints) lives at the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import runtime
+
 # Directory to store temporary files (e.g., uploaded target lists, scan outputs)
 UPLOAD_FOLDER = 'uploads'
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 
 # In-memory storage for tunnel outputs and processes
-tunnel_outputs = {}
+tunnel_outputs = runtime.JobOutputs()
 tunnel_processes = {} # To keep track of running Ngrok processes
 tunnel_queues = {} # To store queues for real-time output
 
-# Path to Ngrok executable (will be determined at runtime or assume in PATH)
-NGROK_EXECUTABLE = shutil.which("ngrok")
+runtime.init_app(app, upload_folder=UPLOAD_FOLDER, outputs=tunnel_outputs, processes=tunnel_processes, queues=tunnel_queues, tools=['ngrok'])
 
-# Load examples from ngrok_examples.txt
-def load_examples(filename="ngrok_examples.txt"):
-    """Loads examples from a JSON file."""
-    try:
-        filepath = os.path.join(os.path.dirname(__file__), filename)
-        with open(filepath, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"Error: Examples file '{filename}' not found. Please ensure it's in the same directory as app.py.")
-        return []
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from '{filename}': {e}")
-        return []
-    except Exception as e:
-        print(f"An unexpected error occurred while loading examples: {e}")
-        return []
+# Path to Ngrok executable (will be determined at runtime or assume in PATH)
+NGROK_EXECUTABLE = runtime.which("ngrok")
 
-ALL_EXAMPLES = load_examples()
+# Examples from ngrok_examples.txt, parsed once and again only when the file changes
+EXAMPLES = runtime.ExamplesIndex(app, "ngrok_examples.txt")
 
 @app.route('/')
 def index():
@@ -54,7 +43,7 @@ def index():
 @app.route('/get_examples', methods=['GET'])
 def get_examples():
     """Returns the Ngrok examples as JSON."""
-    return jsonify(ALL_EXAMPLES)
+    return EXAMPLES.serve()
 
 @app.route('/generate_command', methods=['POST'])
 def generate_command():
@@ -210,7 +199,7 @@ def run_ngrok():
     # Check if ngrok executable exists
     global NGROK_EXECUTABLE
     if NGROK_EXECUTABLE is None:
-        NGROK_EXECUTABLE = shutil.which("ngrok")
+        NGROK_EXECUTABLE = runtime.which("ngrok")
     
     if NGROK_EXECUTABLE is None:
         return jsonify({'status': 'error', 'message': "Ngrok executable 'ngrok' not found on the server. Please ensure Ngrok is installed and accessible in the system's PATH."}), 500
@@ -219,12 +208,11 @@ def run_ngrok():
     command[0] = NGROK_EXECUTABLE
 
     # Create a new queue for this tunnel's real-time output
-    output_queue = queue.Queue()
+    output_queue = runtime.OutputLog()
     tunnel_queues[tunnel_id] = output_queue
-    tunnel_outputs[tunnel_id] = "" # Initialize full output storage
+    tunnel_outputs[tunnel_id] = output_queue # The log is the stored output (see runtime.JobOutputs)
 
     def _run_ngrok_thread(cmd, q, tunnel_id_val):
-        full_output_buffer = []
         try:
             process = subprocess.Popen(
                 cmd,
@@ -238,7 +226,6 @@ def run_ngrok():
 
             for line in iter(process.stdout.readline, ''):
                 q.put(line) # Put each line into the queue
-                full_output_buffer.append(line) # Also append to buffer for final output
 
             process.wait()
             return_code = process.returncode
@@ -247,17 +234,12 @@ def run_ngrok():
             final_status_line += f"STATUS: {'Completed' if return_code == 0 else 'Failed'}\n"
             q.put(final_status_line) # Add final status to queue
 
-            full_output_buffer.append(final_status_line)
-            tunnel_outputs[tunnel_id_val] = "".join(full_output_buffer) # Store complete output
-
         except FileNotFoundError:
             error_msg = f"Error: '{cmd[0]}' command not found. Make sure Ngrok is installed and in your system's PATH.\nSTATUS: Error\n"
             q.put(error_msg)
-            tunnel_outputs[tunnel_id_val] = error_msg
         except Exception as e:
             error_msg = f"An unexpected error occurred: {e}\nSTATUS: Error\n"
             q.put(error_msg)
-            tunnel_outputs[tunnel_id_val] = error_msg
         finally:
             if tunnel_id_val in tunnel_processes:
                 del tunnel_processes[tunnel_id_val]
@@ -394,7 +376,7 @@ def install_ngrok():
     # Check if running on Linux or Termux (sys.platform for Termux is 'linux')
     if sys.platform.startswith('linux'):
         install_id = str(uuid.uuid4()) # Unique ID for this installation process
-        output_queue = queue.Queue()
+        output_queue = runtime.OutputLog()
         tunnel_queues[install_id] = output_queue
         tunnel_outputs[install_id] = "" # Initialize full output storage for this ID
 
@@ -410,7 +392,7 @@ def install_ngrok():
                     # This is a simplified example. A real installer might fetch from ngrok.com
                     # and place it in /usr/local/bin or similar.
                     # For now, we'll just check if it's already in PATH or provide instructions.
-                    if shutil.which("ngrok"):
+                    if runtime.which("ngrok"):
                         q.put("Ngrok already found in system PATH. No installation needed.\n")
                         q.put("---INSTALL_COMPLETE_SUCCESS---")
                         tunnel_outputs[current_install_id] = "".join(temp_buffer_thread) + "Ngrok already found in system PATH. No installation needed."
@@ -7,11 +7,15 @@ import threading
 import queue
 import time
 import uuid # For unique filenames
-import shutil # Added for shutil.which
 import sys # To detect OS and get command-line arguments
 
 app = Flask(__name__)
 
+# Shared runtime (metrics, debug endpoints) lives at the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import multihost
+import runtime
+
 # Directory to store temporary files (e.g., uploaded target lists, scan outputs)
 UPLOAD_FOLDER = 'uploads'
 if not os.path.exists(UPLOAD_FOLDER):
@@ -19,29 +23,18 @@ if not os.path.exists(UPLOAD_FOLDER):
 
 # In-memory storage for scan outputs (for demonstration).
 # In a real-world app, consider a more persistent and scalable solution (e.g., database, cloud storage).
-scan_outputs = {}
+scan_outputs = runtime.JobOutputs()
 scan_processes = {} # To keep track of running Nikto processes
 scan_queues = {} # To store queues for real-time output
 
-# Load examples from nikto_examples.txt
-def load_examples(filename="nikto_examples.txt"):
-    """Loads examples from a JSON file."""
-    try:
-        # Assuming nikto_examples.txt is in the same directory as app.py
-        filepath = os.path.join(os.path.dirname(__file__), filename)
-        with open(filepath, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"Error: Examples file '{filename}' not found. Please ensure it's in the same directory as app.py.")
-        return []
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from '{filename}': {e}")
-        return []
-    except Exception as e:
-        print(f"An unexpected error occurred while loading examples: {e}")
-        return []
+runtime.init_app(app, upload_folder=UPLOAD_FOLDER, outputs=scan_outputs, processes=scan_processes, queues=scan_queues, tools=['nikto.pl'])
+
+MAX_KEPT_MULTIHOST_SCANS = 10
+# scan_id -> multihost.MultiHostScan, for /nikto/<id>/hosts and /nikto/<id>/findings
+multihost_scans = runtime.batch.RunTable(MAX_KEPT_MULTIHOST_SCANS, scan_processes, scan_queues, scan_outputs)
 
-ALL_EXAMPLES = load_examples()
+# Examples from nikto_examples.txt, parsed once and again only when the file changes
+EXAMPLES = runtime.ExamplesIndex(app, "nikto_examples.txt")
 
 @app.route('/')
 def index():
@@ -52,7 +45,7 @@ def index():
 @app.route('/get_examples', methods=['GET'])
 def get_examples():
     """Returns the Nikto examples as JSON."""
-    return jsonify(ALL_EXAMPLES)
+    return EXAMPLES.serve()
 
 @app.route('/generate_command', methods=['POST'])
 def generate_command():
@@ -159,18 +152,42 @@ def run_nikto():
     if command[0] != 'nikto.pl':
         return jsonify({'status': 'error', 'message': 'Only Nikto commands are allowed (nikto.pl).'}), 403
 
-    # Check if nikto.pl executable exists using shutil.which
-    if shutil.which(command[0]) is None:
+    # Check if nikto.pl executable exists using runtime.which
+    if runtime.which(command[0]) is None:
         return jsonify({'status': 'error', 'message': f"Nikto executable '{command[0]}' not found on the server. Please ensure Nikto is installed and accessible in the system's PATH."}), 500
 
+    # Multi-host mode: one nikto job per host through the shared limiter, findings in one index
+    if data.get('hosts') or data.get('targets_list'):
+        try:
+            hosts = multihost.parse_hosts(runtime.batch.request_target_text(data, 'hosts'))
+        except FileNotFoundError:
+            return jsonify({'status': 'not_found', 'message': f"No target list named '{data['targets_list']}'."}), 404
+        except (OSError, ValueError) as e:
+            return jsonify({'status': 'error', 'message': f'Could not read the host list: {e}'}), 400
+        if not hosts:
+            return jsonify({'status': 'error', 'message': 'No hosts to scan in the list (nmap output needs open HTTP ports).'}), 400
+        if len(hosts) > multihost.MAX_HOSTS:
+            return jsonify({'status': 'error', 'message': f'At most {multihost.MAX_HOSTS} hosts per run.'}), 400
+        try:
+            concurrency = runtime.batch.request_concurrency(data, len(hosts))
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        multihost_scans.start(multihost.MultiHostScan(scan_id, command, hosts, concurrency, UPLOAD_FOLDER))
+        return jsonify({'status': 'running', 'scan_id': scan_id, 'multihost': True, 'total': len(hosts),
+                        'concurrency': concurrency, 'message': f'Nikto scan of {len(hosts)} host(s) started.'})
+
     # Create a new queue for this scan's real-time output
-    output_queue = queue.Queue()
+    output_queue = runtime.OutputLog()
     scan_queues[scan_id] = output_queue
-    scan_outputs[scan_id] = "" # Initialize full output storage
+    scan_outputs[scan_id] = output_queue # The log is the stored output (see runtime.JobOutputs)
 
     def _run_nikto_thread(cmd, q, scan_id_val):
-        full_output_buffer = []
+        # Pace the tool to its share of the target host's request budget (runtime/ratelimit.py)
+        cmd, lease = runtime.ratelimit.throttle_command(cmd, q, cancelled=q.cancelled)
         try:
+            if q.cancelled.is_set(): # Stopped through /jobs/<id>/cancel while waiting for budget
+                q.put("Cancelled before the scan started.\nSTATUS: Cancelled\n")
+                return
             process = subprocess.Popen(
                 cmd,
                 stdout=subprocess.PIPE,
@@ -183,7 +200,6 @@ def run_nikto():
 
             for line in iter(process.stdout.readline, ''):
                 q.put(line) # Put each line into the queue
-                full_output_buffer.append(line) # Also append to buffer for final output
 
             process.wait()
             return_code = process.returncode
@@ -192,20 +208,16 @@ def run_nikto():
             final_status_line += f"STATUS: {'Completed' if return_code == 0 else 'Failed'}\n"
             q.put(final_status_line) # Add final status to queue
 
-            full_output_buffer.append(final_status_line)
-            scan_outputs[scan_id_val] = "".join(full_output_buffer) # Store complete output
-
         except FileNotFoundError:
             error_msg = f"Error: '{cmd[0]}' command not found. Make sure Nikto is installed and in your system's PATH.\nSTATUS: Error\n"
             q.put(error_msg)
-            scan_outputs[scan_id_val] = error_msg
         except Exception as e:
             error_msg = f"An unexpected error occurred: {e}\nSTATUS: Error\n"
             q.put(error_msg)
-            scan_outputs[scan_id_val] = error_msg
         finally:
             if scan_id_val in scan_processes:
                 del scan_processes[scan_id_val]
+            lease.release()
             # Signal end of output by putting a special marker
             q.put("---SCAN_COMPLETE---")
 
@@ -217,6 +229,43 @@ def run_nikto():
 
     return jsonify({'status': 'running', 'scan_id': scan_id, 'message': 'Nikto scan started.'})
 
+@app.route('/nikto/<scan_id>/hosts', methods=['GET'])
+def get_nikto_hosts(scan_id):
+    """The hosts of a multi-host run with their state, exit code and finding count."""
+    scan = multihost_scans.get(scan_id)
+    if scan is None:
+        return jsonify({'status': 'not_found', 'message': 'No multi-host scan with this ID.'}), 404
+    return jsonify(scan.describe())
+
+@app.route('/nikto/<scan_id>/findings', methods=['GET'])
+def get_nikto_findings(scan_id):
+    """
+    The findings of a multi-host run across all hosts. Without arguments: every finding ID with its
+    host count, the most widespread first (q=<text> matches descriptions). ?finding=<id> gives the
+    hosts that reported a finding, ?host=<host> the findings of one host.
+    """
+    scan = multihost_scans.get(scan_id)
+    if scan is None:
+        return jsonify({'status': 'not_found', 'message': 'No multi-host scan with this ID.'}), 404
+    body = {'status': 'running' if scan.finished_at is None else 'completed', 'hosts_done': sum(
+        1 for entry in scan.hosts if entry['finished_at'] is not None), 'total': len(scan.hosts)}
+    if request.args.get('finding'):
+        body.update({'finding': request.args['finding'], 'hosts': scan.index.hosts(request.args['finding'])})
+    elif request.args.get('host'):
+        body.update({'host': request.args['host'], 'findings': scan.index.findings(request.args['host'])})
+    else:
+        body['findings'] = scan.index.summary(request.args.get('q'))
+    return jsonify(body)
+
+@app.route('/nikto/<scan_id>/cancel', methods=['POST'])
+def cancel_nikto_hosts(scan_id):
+    """Drops the queued hosts of a multi-host run and stops the running ones."""
+    scan = multihost_scans.get(scan_id)
+    if scan is None:
+        return jsonify({'status': 'not_found', 'message': 'No multi-host scan with this ID.'}), 404
+    scan.cancel(scan_processes)
+    return jsonify({'status': 'success', 'message': 'Multi-host scan cancelled.', 'counts': scan.counts()})
+
 # Modified get_scan_output to handle 'nikto_install' ID
 @app.route('/get_scan_output/<scan_id>', methods=['GET'])
 def get_scan_output(scan_id):
@@ -322,7 +371,7 @@ def install_nikto():
     if sys.platform.startswith('linux'):
         scan_id = str(uuid.uuid4()) # Unique ID for this installation process
         full_output = []
-        output_queue = queue.Queue()
+        output_queue = runtime.OutputLog()
         scan_queues[scan_id] = output_queue
         scan_outputs[scan_id] = "" # Initialize full output storage for this ID
 
@@ -0,0 +1,97 @@
+"""
+Nikto findings: parsing of nikto's XML reports and an index across hosts.
+
+Every host of a multi-host run writes `-Format xml` to its own file. When
+the host finishes, the file is parsed into findings: nikto's test ID, the
+method, the URI, the description and the references (the OSVDB ID on nikto
+2.1, `references` on 2.5). A FindingsIndex keyed by (finding ID, host)
+gathers the findings of every host of the run. "Which hosts expose
+finding X" is one lookup in the index, not one log read per host.
+"""
+import threading
+import xml.etree.ElementTree as ET
+
+
+def _text(element, tag):
+    child = element.find(tag)
+    return (child.text or '').strip() if child is not None else ''
+
+
+def parse_report(path):
+    """
+    The scanned sites and findings of a nikto XML report.
+
+    Returns:
+        (list, list): Site dicts (ip, hostname, port, banner, site) and finding dicts
+        (id, method, uri, description, references, link).
+    Raises:
+        OSError, ET.ParseError: The report is missing or not (complete) XML.
+    """
+    root = ET.parse(path).getroot()
+    sites, items = [], []
+    for details in root.iter('scandetails'):
+        sites.append({'ip': details.get('targetip'), 'hostname': details.get('targethostname'),
+                      'port': details.get('targetport'), 'banner': details.get('targetbanner'),
+                      'site': details.get('sitename')})
+        for item in details.iter('item'):
+            osvdb = item.get('osvdbid')
+            items.append({
+                'id': item.get('id') or '',
+                'method': item.get('method'),
+                'uri': _text(item, 'uri'),
+                'description': _text(item, 'description'),
+                'references': item.get('references') or (f'OSVDB-{osvdb}' if osvdb and osvdb != '0' else ''),
+                'link': _text(item, 'namelink'),
+            })
+    return sites, items
+
+
+class FindingsIndex:
+    """The findings of a multi-host run, by finding ID and by host."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.items = {} # (finding ID, host) -> [finding dicts]
+        self.hosts_by_finding = {} # finding ID -> [hosts], in the order they reported it
+        self.findings_by_host = {} # host -> [finding IDs]
+        self.descriptions = {} # finding ID -> first description seen
+
+    def add(self, host, items):
+        with self.lock:
+            for item in items:
+                key = (item['id'], host)
+                if key not in self.items:
+                    self.items[key] = []
+                    self.hosts_by_finding.setdefault(item['id'], []).append(host)
+                    self.findings_by_host.setdefault(host, []).append(item['id'])
+                    self.descriptions.setdefault(item['id'], item['description'])
+                self.items[key].append(item)
+
+    def __len__(self):
+        return sum(len(items) for items in self.items.values())
+
+    def summary(self, query=None):
+        """Finding IDs with their host and item counts, the most widespread first; `query` matches descriptions."""
+        query = query.lower() if query else None
+        with self.lock:
+            rows = []
+            for finding_id, hosts in self.hosts_by_finding.items():
+                if query and not any(query in item['description'].lower()
+                                     for host in hosts for item in self.items[(finding_id, host)]):
+                    continue
+                rows.append({'id': finding_id, 'description': self.descriptions[finding_id], 'hosts': len(hosts),
+                             'items': sum(len(self.items[(finding_id, host)]) for host in hosts)})
+        rows.sort(key=lambda row: (-row['hosts'], row['id']))
+        return rows
+
+    def hosts(self, finding_id):
+        """The hosts that reported a finding, with their items."""
+        with self.lock:
+            return [{'host': host, 'items': list(self.items[(finding_id, host)])}
+                    for host in self.hosts_by_finding.get(finding_id, ())]
+
+    def findings(self, host):
+        """The findings of one host, with their items."""
+        with self.lock:
+            return [{'id': finding_id, 'items': list(self.items[(finding_id, host)])}
+                    for finding_id in self.findings_by_host.get(host, ())]
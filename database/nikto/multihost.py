@@ -0,0 +1,156 @@
+"""
+Multi-host nikto runs: one nikto job per host, findings in one index.
+
+Given a host list, the app runs the command once per host through the
+shared runner limiter (see runtime/runner.py), so hosts are scanned in
+parallel. Each job writes `-Format xml` to its own file in uploads/. The
+file is parsed into the run's FindingsIndex (see findings.py) as soon as the
+job ends, while the other hosts keep running.
+
+The host list can be plain (one host or URL per line), a shared target list
+such as an amass export, or nmap output. From nmap XML (-oX) or greppable
+(-oG) output, every open port with an HTTP service becomes a URL target.
+"""
+import os
+import re
+import shlex
+import xml.etree.ElementTree as ET
+
+import findings
+import runtime
+from runtime.runner import run_process
+
+MAX_HOSTS = 1000
+# Options dropped from the command (-> whether they take a value): every host gets its own
+# -h and XML report
+STRIPPED_FLAGS = {'-h': True, '-host': True, '-url': True, '-o': True, '-output': True, '-Format': True, '-F': True}
+_GREPPABLE_PORT = re.compile(r'(\d+)/open/tcp//([^/]*)/')
+
+
+class HostListError(ValueError):
+    """The host list cannot be used."""
+
+
+def _http_url(host, port, service, tunnel):
+    secure = tunnel == 'ssl' or service.startswith(('https', 'ssl/')) or port in ('443', '8443')
+    return f"{'https' if secure else 'http'}://{host}:{port}/"
+
+
+def _nmap_xml_hosts(text):
+    try:
+        root = ET.fromstring(text)
+    except ET.ParseError as e:
+        raise HostListError(f'Could not parse the nmap XML: {e}') from None
+    targets = []
+    for host in root.iter('host'):
+        names = [hostname.get('name') for hostname in host.iter('hostname') if hostname.get('name')]
+        addresses = [address.get('addr') for address in host.iter('address') if address.get('addrtype') in ('ipv4', 'ipv6')]
+        name = (names or addresses or [None])[0]
+        if name is None:
+            continue
+        if ':' in name:
+            name = f'[{name}]'
+        for port in host.iter('port'):
+            state, service = port.find('state'), port.find('service')
+            if state is None or state.get('state') != 'open' or service is None or 'http' not in (service.get('name') or ''):
+                continue
+            targets.append(_http_url(name, port.get('portid'), service.get('name'), service.get('tunnel')))
+    return targets
+
+
+def _greppable_hosts(text):
+    targets = []
+    for line in text.splitlines():
+        if not line.startswith('Host:') or 'Ports:' not in line:
+            continue
+        address = line.split()[1]
+        for port, service in _GREPPABLE_PORT.findall(line.split('Ports:', 1)[1]):
+            if 'http' in service:
+                targets.append(_http_url(address, port, service, None))
+    return targets
+
+
+def parse_hosts(text):
+    """The targets in a host list: plain lines, nmap XML or nmap greppable output."""
+    if '<nmaprun' in text:
+        targets = _nmap_xml_hosts(text)
+    elif re.search(r'^Host: .*Ports: ', text, re.MULTILINE):
+        targets = _greppable_hosts(text)
+    else:
+        targets = runtime.batch.parse_targets(text)
+    return [target for target in dict.fromkeys(targets) if not target.startswith('-')]
+
+
+def prepare_command(argv):
+    """A nikto argv without STRIPPED_FLAGS."""
+    rest = [argv[0]]
+    index = 1
+    while index < len(argv):
+        if argv[index] in STRIPPED_FLAGS:
+            index += 2 if STRIPPED_FLAGS[argv[index]] else 1
+            continue
+        rest.append(argv[index])
+        index += 1
+    return rest
+
+
+class MultiHostScan(runtime.batch.FanOutRun):
+    """One nikto command run against a list of hosts."""
+    kind = 'Multi-host Nikto'
+    end_marker = '---SCAN_COMPLETE---'
+
+    def __init__(self, scan_id, argv, hosts, concurrency, work_folder):
+        super().__init__(scan_id, concurrency)
+        self.argv = prepare_command(argv)
+        self.work_folder = work_folder
+        self.index = findings.FindingsIndex()
+        for host in hosts:
+            self.add_entry(host=host, findings=0, sites=[])
+
+    @property
+    def hosts(self):
+        return self.entries
+
+    def _report_file(self, entry):
+        return os.path.join(self.work_folder, f"nikto_{self.id}_{entry['index']}.xml")
+
+    def command(self, entry):
+        return self.argv + ['-h', entry['host'], '-Format', 'xml', '-o', self._report_file(entry)]
+
+    def prefix(self, entry):
+        return f"[{entry['host']}] "
+
+    def before_run(self, processes):
+        self.log.put(f"Multi-host Nikto: {len(self.hosts)} host(s), {self.concurrency} at a time\n")
+
+    def run_entry(self, entry, processes, prefix):
+        command = self.command(entry)
+        self.log.put(f"{prefix}$ {shlex.join(command)}\n")
+        return run_process(command, self.log, prefix=prefix, processes=processes, job_id=entry['job_id'],
+                           cancelled=self.cancelled)
+
+    def finish_entry(self, entry, prefix):
+        try:
+            entry['sites'], items = findings.parse_report(self._report_file(entry))
+            self.index.add(entry['host'], items)
+            entry['findings'] = len(items)
+        except FileNotFoundError:
+            entry['error'] = 'nikto wrote no report'
+        except (OSError, ET.ParseError) as e:
+            entry['error'] = f'could not read the report: {e}'
+
+    def entry_ok(self, entry):
+        # nikto's exit status differs between versions; a readable report means the scan ran
+        return True
+
+    def entry_summary(self, entry):
+        return f": {entry['findings']} finding(s){', ' + entry['error'] if entry['error'] else ''}"
+
+    def summary(self):
+        counts = self.counts()
+        return (f"Multi-host Nikto finished: {counts['completed']} completed, {counts['failed']} failed, "
+                f"{counts['cancelled']} cancelled; {len(self.index)} finding(s), {len(self.index.hosts_by_finding)} distinct.")
+
+    def describe(self):
+        return dict(self.describe_run(), scan_id=self.id, findings=len(self.index),
+                    distinct_findings=len(self.index.hosts_by_finding), hosts=self.hosts)
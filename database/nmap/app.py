@@ -1,17 +1,25 @@
 import os
 import subprocess
 import shlex
+import sqlite3
 import json
 from flask import Flask, render_template, request, jsonify, send_file
 import threading
 import queue
 import time
 import uuid # For unique filenames
-import shutil # Added for shutil.which
 import sys # To detect OS and get command-line arguments
 
 app = Flask(__name__)
 
+# Shared runtime (metrics, debug endpoints) lives at the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import runtime
+import checkpoints
+import nmap_xml
+import scan_history
+import sharding
+
 # Directory to store temporary files (e.g., uploaded target lists, scan outputs)
 UPLOAD_FOLDER = 'uploads'
 if not os.path.exists(UPLOAD_FOLDER):
@@ -19,29 +27,32 @@ if not os.path.exists(UPLOAD_FOLDER):
 
 # In-memory storage for scan outputs (for demonstration).
 # In a real-world app, consider a more persistent and scalable solution (e.g., database, cloud storage).
-scan_outputs = {}
+scan_outputs = runtime.JobOutputs()
 scan_processes = {} # To keep track of running Nmap processes
 scan_queues = {} # To store queues for real-time output
-
-# Load examples from nmap_examples.txt
-def load_examples(filename="nmap_examples.txt"):
-    """Loads examples from a JSON file."""
+sharded_scans = {} # scan_id -> sharding.ShardedScan, for the per-shard progress view
+scan_hosts = {} # scan_id -> nmap_xml.HostStore of the hosts/ports found so far
+resuming_scans = set() # scan IDs whose resume request has not saved the job as running yet
+resume_lock = threading.Lock()
+# Finished scans and imported -oX files, for /scan_diff
+SCAN_HISTORY = scan_history.ScanHistory()
+# Job metadata of every scan, so scans interrupted by a restart can be resumed
+JOURNAL = checkpoints.JobJournal(os.path.join(UPLOAD_FOLDER, 'jobs'))
+for _job in JOURNAL.recover():
+    print(f"Interrupted nmap scan {_job['scan_id']} can be resumed: {shlex.join(_job['command'])}")
+
+
+def record_scan_history(scan_id, args, store, started_at, xml_file=None):
+    """Stores a finished scan's hosts and ports in the scan history."""
     try:
-        # Assuming nmap_examples.txt is in the same directory as app.py
-        filepath = os.path.join(os.path.dirname(__file__), filename)
-        with open(filepath, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"Error: Examples file '{filename}' not found. Please ensure it's in the same directory as app.py.")
-        return []
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from '{filename}': {e}")
-        return []
-    except Exception as e:
-        print(f"An unexpected error occurred while loading examples: {e}")
-        return []
+        SCAN_HISTORY.record_store(scan_id, args, store, started_at, time.time(), xml_file)
+    except sqlite3.Error as e:
+        print(f"Could not record scan {scan_id} in the scan history: {e}")
+
+runtime.init_app(app, upload_folder=UPLOAD_FOLDER, outputs=scan_outputs, processes=scan_processes, queues=scan_queues, tools=['nmap'])
 
-ALL_EXAMPLES = load_examples()
+# Examples from nmap_examples.txt, parsed once and again only when the file changes
+EXAMPLES = runtime.ExamplesIndex(app, "nmap_examples.txt")
 
 @app.route('/')
 def index():
@@ -54,180 +65,159 @@ def index():
 @app.route('/get_examples', methods=['GET'])
 def get_examples():
     """Returns the Nmap examples as JSON."""
-    return jsonify(ALL_EXAMPLES)
+    return EXAMPLES.serve()
+
+TIMING_TEMPLATES = ('0', '1', '2', '3', '4', '5', 'paranoid', 'sneaky', 'polite', 'normal', 'aggressive', 'insane')
+
+# nmap's options by UI tab; /generate_command builds commands from this spec and /command_spec serves it to the UI
+NMAP_COMMAND = runtime.CommandSpec(app, 'nmap', {
+    'Target': [
+        runtime.Positional('target_entry'),
+        runtime.Value('-iL', 'target_list_file_entry'),
+        runtime.Value('--exclude', 'exclude_hosts_entry'),
+        runtime.Value('--excludefile', 'exclude_file_entry'),
+        runtime.Value('-iR', 'random_hosts_entry', type='int'),
+        runtime.Switch('-iS', 'stdin_input_var'),
+        runtime.Switch('-Pn', 'no_ping_var'),
+        runtime.Switch('-sP', 'ping_scan_var'),
+        runtime.Switch('-sL', 'list_scan_var'),
+        runtime.Switch('-n', 'no_dns_resolution_var', conflicts='DNS resolution'),
+        runtime.Switch('-R', 'force_dns_resolution_var', conflicts='DNS resolution'),
+        runtime.Switch('--system-dns', 'system_dns_var'),
+        runtime.Value('--dns-servers', 'dns_servers_entry'),
+    ],
+    'Scan Types': [
+        runtime.Switch('-sS', 'syn_scan_var', conflicts='TCP scan type'),
+        runtime.Switch('-sT', 'connect_scan_var', conflicts='TCP scan type'),
+        runtime.Switch('-sU', 'udp_scan_var'),
+        runtime.Switch('-sA', 'ack_scan_var', conflicts='TCP scan type'),
+        runtime.Switch('-sW', 'window_scan_var', conflicts='TCP scan type'),
+        runtime.Switch('-sM', 'maimon_scan_var', conflicts='TCP scan type'),
+        runtime.Switch('-sF', 'fin_scan_var', conflicts='TCP scan type'),
+        runtime.Switch('-sX', 'xmas_scan_var', conflicts='TCP scan type'),
+        runtime.Switch('-sN', 'null_scan_var', conflicts='TCP scan type'),
+        runtime.Switch('-sO', 'ip_protocol_scan_var'),
+        runtime.Switch('-F', 'fast_scan_var', conflicts='port selection'),
+        runtime.Switch('-f', 'fragment_packets_var'),
+        runtime.Switch('--noreason', 'no_reason_var'),
+        runtime.Switch('-6', 'ipv6_scan_var'),
+        runtime.Switch('--append-output', 'append_output_var'),
+        runtime.Switch('-Pn', 'disable_host_discovery_var'),
+        runtime.Switch('-p', 'only_specified_ports_var', conflicts='port selection'),
+        runtime.Value('-PS', 'syn_ack_discovery_entry'),
+        runtime.Value('-PU', 'udp_discovery_entry'),
+        runtime.Switch('-sY', 'sctp_init_scan_var'),
+        runtime.Switch('-sZ', 'sctp_cookie_echo_scan_var'),
+        runtime.Value('-sI', 'idle_scan_entry'),
+        runtime.Switch('-sO', 'protocol_scan_var'),
+        runtime.Value('-D', 'decoy_scan_entry'),
+        runtime.Value('--spoof-mac', 'spoof_mac_entry'),
+        runtime.Value('--source-port', 'source_port_entry', type='int'),
+        runtime.Value('--data-length', 'data_length_entry', type='int'),
+        runtime.Switch('--badsum', 'bad_checksum_var'),
+    ],
+    'Port Specification': [
+        runtime.Value('-p', 'ports_entry', conflicts='port selection'),
+        runtime.Value('--exclude-ports', 'exclude_ports_entry'),
+        runtime.Switch('-F', 'fast_scan_ports_var', conflicts='port selection'),
+        runtime.Switch('-p-', 'all_ports_var', conflicts='port selection'),
+        runtime.Value('--top-ports', 'top_ports_entry', type='int', conflicts='port selection'),
+        runtime.Value('--port-ratio', 'port_ratio_entry', type='number'),
+        runtime.Switch('-sV', 'service_version_detection_var'),
+    ],
+    'Timing/Performance': [
+        runtime.Value('-T', 'timing_template_var', choices=TIMING_TEMPLATES),
+        runtime.Value('--min-hostgroup', 'min_hostgroup_entry', type='int'),
+        runtime.Value('--max-hostgroup', 'max_hostgroup_entry', type='int'),
+        runtime.Value('--min-parallelism', 'min_parallelism_entry', type='int'),
+        runtime.Value('--max-parallelism', 'max_parallelism_entry', type='int'),
+        runtime.Value('--min-rtt-timeout', 'min_rtt_timeout_entry'),
+        runtime.Value('--max-rtt-timeout', 'max_rtt_timeout_entry'),
+        runtime.Value('--initial-rtt-timeout', 'initial_rtt_timeout_entry'),
+        runtime.Value('--max-retries', 'max_retries_entry', type='int'),
+        runtime.Value('--host-timeout', 'host_timeout_entry'),
+        runtime.Value('--scan-delay', 'scan_delay_entry'),
+        runtime.Value('--min-rate', 'min_rate_entry', type='number'),
+        runtime.Value('--max-rate', 'max_rate_entry', type='number'),
+    ],
+    'Detection': [
+        runtime.Switch('-O', 'os_detection_var'),
+        runtime.Switch('-sV', 'service_version_detection_det_var'),
+        runtime.Switch('-A', 'aggressive_detection_var'),
+        runtime.Value('--version-intensity', 'version_intensity_entry', type='int', choices=range(10), conflicts='version intensity'),
+        runtime.Switch('--version-light', 'version_light_var', conflicts='version intensity'),
+        runtime.Switch('--version-all', 'version_all_var', conflicts='version intensity'),
+        runtime.Switch('--osscan-guess', 'osscan_guess_var'),
+        runtime.Switch('--osscan-limit', 'osscan_limit_var'),
+        runtime.Switch('--all-ports', 'all_ports_service_var'),
+    ],
+    'Evasion/Spoofing': [
+        runtime.Switch('-f', 'fragment_packets_evasion_var'),
+        runtime.Value('--mtu', 'mtu_entry', type='int'),
+        runtime.Value('-D', 'decoy_scan_evasion_entry'),
+        runtime.Value('-sI', 'idle_scan_evasion_entry'),
+        runtime.Value('--spoof-mac', 'spoof_mac_evasion_entry'),
+        runtime.Value('--source-port', 'source_port_evasion_entry', type='int'),
+        runtime.Value('--data-length', 'data_length_evasion_entry', type='int'),
+        runtime.Switch('--badsum', 'bad_checksum_evasion_var'),
+        runtime.Switch('--randomize-hosts', 'randomize_hosts_var'),
+        runtime.Switch('--randomize-ports', 'randomize_ports_var'),
+        runtime.Value('--ip-options', 'ip_options_entry'),
+        runtime.Value('--ttl', 'ttl_entry', type='int'),
+        runtime.Value('--data-string', 'data_string_entry'),
+        runtime.Value('--data-binary', 'data_binary_entry'),
+        runtime.Value('--scan-flags', 'scan_flags_entry'),
+    ],
+    'Output': [
+        runtime.Value('-oN', 'normal_output_file_entry'),
+        runtime.Value('-oX', 'xml_output_file_entry'),
+        runtime.Value('-oG', 'grepable_output_file_entry'),
+        runtime.Value('-oA', 'all_formats_output_file_entry'),
+        runtime.Switch('-v', 'verbose_var'),
+        runtime.Switch('-d', 'debug_var'),
+        runtime.Switch('--reason', 'reason_var'),
+        runtime.Switch('--open', 'open_ports_only_var'),
+        runtime.Switch('--packet-trace', 'packet_trace_var'),
+        runtime.Value('--resume', 'resume_file_entry'),
+        runtime.Switch('--append-output', 'append_output_output_var'),
+        runtime.Switch('--no-host-discovery', 'no_host_discovery_var'),
+        runtime.Switch('--version', 'show_version_var'),
+        runtime.Switch('-h', 'show_help_var'),
+    ],
+    'Scripting': [
+        runtime.Switch('-sC', 'script_scan_var'),
+        runtime.Value('--script', 'scripts_entry'),
+        runtime.Lines('--script-args', 'script_args_entry'),
+        runtime.Value('--script-timeout', 'script_timeout_entry'),
+        runtime.Switch('--script-trace', 'script_trace_var'),
+        runtime.Switch('--script-debug', 'script_debug_var'),
+        runtime.Value('--script-help', 'script_help_entry'),
+        runtime.Switch('--script-updatedb', 'script_update_db_var'),
+        runtime.Switch('--script-fags', 'script_fags_var'),
+    ],
+    'Advanced': [
+        runtime.Value('-e', 'interface_entry'),
+        runtime.Value('-S', 'source_address_entry'),
+        runtime.Value('--data-length', 'payload_length_entry', type='int'),
+        runtime.Value('--max-parallelism', 'max_parallelism_adv_entry', type='int'),
+        runtime.Value('--min-parallelism', 'min_parallelism_adv_entry', type='int'),
+        runtime.Switch('--packet-trace', 'packet_trace_adv_var'),
+        runtime.Switch('--badsum', 'badsum_adv_var'),
+        runtime.Switch('-f', 'fragment_packets_adv_var'),
+        runtime.Value('--ip-options', 'ip_options_adv_entry'),
+        runtime.Value('--ttl', 'ttl_adv_entry', type='int'),
+        runtime.Value('--max-retries', 'max_retries_adv_entry', type='int'),
+        runtime.Value('--host-timeout', 'host_timeout_adv_entry'),
+        runtime.Value('--scan-delay', 'scan_delay_adv_entry'),
+        runtime.Extra('additional_args_entry'),
+    ],
+})
 
 @app.route('/generate_command', methods=['POST'])
 def generate_command():
     """Generates the Nmap command based on form data."""
-    data = request.json
-    command_parts = ["nmap"]
-
-    def add_arg(arg_name, value):
-        if value:
-            command_parts.append(arg_name)
-            command_parts.append(shlex.quote(str(value)))
-
-    def add_checkbox_arg(arg_name, value):
-        if value:
-            command_parts.append(arg_name)
-
-    # Target Tab
-    if data.get('target_entry'):
-        command_parts.append(shlex.quote(data['target_entry']))
-    add_arg("-iL", data.get('target_list_file_entry'))
-    add_arg("--exclude", data.get('exclude_hosts_entry'))
-    add_arg("--excludefile", data.get('exclude_file_entry'))
-    add_arg("-iR", data.get('random_hosts_entry'))
-    add_checkbox_arg("-iS", data.get('stdin_input_var'))
-    add_checkbox_arg("-Pn", data.get('no_ping_var'))
-    add_checkbox_arg("-sP", data.get('ping_scan_var'))
-    add_checkbox_arg("-sL", data.get('list_scan_var'))
-    add_checkbox_arg("-n", data.get('no_dns_resolution_var'))
-    add_checkbox_arg("-R", data.get('force_dns_resolution_var'))
-    add_checkbox_arg("--system-dns", data.get('system_dns_var'))
-    add_arg("--dns-servers", data.get('dns_servers_entry'))
-
-    # Scan Types Tab
-    add_checkbox_arg("-sS", data.get('syn_scan_var'))
-    add_checkbox_arg("-sT", data.get('connect_scan_var'))
-    add_checkbox_arg("-sU", data.get('udp_scan_var'))
-    add_checkbox_arg("-sA", data.get('ack_scan_var'))
-    add_checkbox_arg("-sW", data.get('window_scan_var'))
-    add_checkbox_arg("-sM", data.get('maimon_scan_var'))
-    add_checkbox_arg("-sF", data.get('fin_scan_var'))
-    add_checkbox_arg("-sX", data.get('xmas_scan_var'))
-    add_checkbox_arg("-sN", data.get('null_scan_var'))
-    add_checkbox_arg("-sO", data.get('ip_protocol_scan_var'))
-    add_checkbox_arg("-F", data.get('fast_scan_var'))
-    add_checkbox_arg("-f", data.get('fragment_packets_var'))
-    add_checkbox_arg("--noreason", data.get('no_reason_var'))
-    add_checkbox_arg("-6", data.get('ipv6_scan_var'))
-    add_checkbox_arg("--append-output", data.get('append_output_var'))
-    add_checkbox_arg("-Pn", data.get('disable_host_discovery_var')) # This is redundant with target tab's -Pn, but kept for clarity
-    add_checkbox_arg("-p", data.get('only_specified_ports_var'))
-    add_arg("-PS", data.get('syn_ack_discovery_entry'))
-    add_arg("-PU", data.get('udp_discovery_entry'))
-    add_checkbox_arg("-sY", data.get('sctp_init_scan_var'))
-    add_checkbox_arg("-sZ", data.get('sctp_cookie_echo_scan_var'))
-    add_arg("-sI", data.get('idle_scan_entry'))
-    add_checkbox_arg("-sO", data.get('protocol_scan_var'))
-    add_arg("-D", data.get('decoy_scan_entry'))
-    add_arg("--spoof-mac", data.get('spoof_mac_entry'))
-    add_arg("--source-port", data.get('source_port_entry'))
-    add_arg("--data-length", data.get('data_length_entry'))
-    add_checkbox_arg("--badsum", data.get('bad_checksum_var'))
-
-    # Port Specification Tab
-    add_arg("-p", data.get('ports_entry'))
-    add_arg("--exclude-ports", data.get('exclude_ports_entry'))
-    add_checkbox_arg("-F", data.get('fast_scan_ports_var'))
-    add_checkbox_arg("-p-", data.get('all_ports_var'))
-    add_arg("--top-ports", data.get('top_ports_entry'))
-    add_arg("--port-ratio", data.get('port_ratio_entry'))
-    add_checkbox_arg("-sV", data.get('service_version_detection_var'))
-
-    # Timing/Performance Tab
-    add_arg("-T", data.get('timing_template_var'))
-    add_arg("--min-hostgroup", data.get('min_hostgroup_entry'))
-    add_arg("--max-hostgroup", data.get('max_hostgroup_entry'))
-    add_arg("--min-parallelism", data.get('min_parallelism_entry'))
-    add_arg("--max-parallelism", data.get('max_parallelism_entry'))
-    add_arg("--min-rtt-timeout", data.get('min_rtt_timeout_entry'))
-    add_arg("--max-rtt-timeout", data.get('max_rtt_timeout_entry'))
-    add_arg("--initial-rtt-timeout", data.get('initial_rtt_timeout_entry'))
-    add_arg("--max-retries", data.get('max_retries_entry'))
-    add_arg("--host-timeout", data.get('host_timeout_entry'))
-    add_arg("--scan-delay", data.get('scan_delay_entry'))
-    add_arg("--min-rate", data.get('min_rate_entry'))
-    add_arg("--max-rate", data.get('max_rate_entry'))
-
-    # Detection Tab
-    add_checkbox_arg("-O", data.get('os_detection_var'))
-    add_checkbox_arg("-sV", data.get('service_version_detection_det_var'))
-    add_checkbox_arg("-A", data.get('aggressive_detection_var'))
-    add_arg("--version-intensity", data.get('version_intensity_entry'))
-    add_checkbox_arg("--version-light", data.get('version_light_var'))
-    add_checkbox_arg("--version-all", data.get('version_all_var'))
-    add_checkbox_arg("--osscan-guess", data.get('osscan_guess_var'))
-    add_checkbox_arg("--osscan-limit", data.get('osscan_limit_var'))
-    add_checkbox_arg("--all-ports", data.get('all_ports_service_var'))
-
-    # Evasion/Spoofing Tab
-    add_checkbox_arg("-f", data.get('fragment_packets_evasion_var'))
-    add_arg("--mtu", data.get('mtu_entry'))
-    add_arg("-D", data.get('decoy_scan_evasion_entry'))
-    add_arg("-sI", data.get('idle_scan_evasion_entry'))
-    add_arg("--spoof-mac", data.get('spoof_mac_evasion_entry'))
-    add_arg("--source-port", data.get('source_port_evasion_entry'))
-    add_arg("--data-length", data.get('data_length_evasion_entry'))
-    add_checkbox_arg("--badsum", data.get('bad_checksum_evasion_var'))
-    add_checkbox_arg("--randomize-hosts", data.get('randomize_hosts_var'))
-    add_checkbox_arg("--randomize-ports", data.get('randomize_ports_var'))
-    add_arg("--ip-options", data.get('ip_options_entry'))
-    add_arg("--ttl", data.get('ttl_entry'))
-    add_arg("--data-string", data.get('data_string_entry'))
-    add_arg("--data-binary", data.get('data_binary_entry'))
-    add_arg("--scan-flags", data.get('scan_flags_entry'))
-
-    # Output Tab
-    add_arg("-oN", data.get('normal_output_file_entry'))
-    add_arg("-oX", data.get('xml_output_file_entry'))
-    add_arg("-oG", data.get('grepable_output_file_entry'))
-    add_arg("-oA", data.get('all_formats_output_file_entry'))
-    add_checkbox_arg("-v", data.get('verbose_var'))
-    add_checkbox_arg("-d", data.get('debug_var'))
-    add_checkbox_arg("--reason", data.get('reason_var'))
-    add_checkbox_arg("--open", data.get('open_ports_only_var'))
-    add_checkbox_arg("--packet-trace", data.get('packet_trace_var'))
-    add_arg("--resume", data.get('resume_file_entry'))
-    add_checkbox_arg("--append-output", data.get('append_output_output_var'))
-    add_checkbox_arg("--no-host-discovery", data.get('no_host_discovery_var'))
-    add_checkbox_arg("--version", data.get('show_version_var'))
-    add_checkbox_arg("-h", data.get('show_help_var'))
-
-    # Scripting Tab
-    add_checkbox_arg("-sC", data.get('script_scan_var'))
-    add_arg("--script", data.get('scripts_entry'))
-    script_args = data.get('script_args_entry', '').strip()
-    if script_args:
-        for arg_line in script_args.split('\n'):
-            arg_line = arg_line.strip()
-            if arg_line:
-                command_parts.append("--script-args")
-                command_parts.append(shlex.quote(arg_line))
-    add_arg("--script-timeout", data.get('script_timeout_entry'))
-    add_checkbox_arg("--script-trace", data.get('script_trace_var'))
-    add_checkbox_arg("--script-debug", data.get('script_debug_var'))
-    add_arg("--script-help", data.get('script_help_entry'))
-    add_checkbox_arg("--script-updatedb", data.get('script_update_db_var'))
-    add_checkbox_arg("--script-fags", data.get('script_fags_var'))
-
-    # Advanced Tab
-    add_arg("-e", data.get('interface_entry'))
-    add_arg("-S", data.get('source_address_entry'))
-    add_arg("--data-length", data.get('payload_length_entry'))
-    add_arg("--max-parallelism", data.get('max_parallelism_adv_entry'))
-    add_arg("--min-parallelism", data.get('min_parallelism_adv_entry'))
-    add_checkbox_arg("--packet-trace", data.get('packet_trace_adv_var'))
-    add_checkbox_arg("--badsum", data.get('badsum_adv_var'))
-    add_checkbox_arg("-f", data.get('fragment_packets_adv_var'))
-    add_arg("--ip-options", data.get('ip_options_adv_entry'))
-    add_arg("--ttl", data.get('ttl_adv_entry'))
-    add_arg("--max-retries", data.get('max_retries_adv_entry'))
-    add_arg("--host-timeout", data.get('host_timeout_adv_entry'))
-    add_arg("--scan-delay", data.get('scan_delay_adv_entry'))
-    
-    additional_args = data.get('additional_args_entry', '').strip()
-    if additional_args:
-        try:
-            split_args = shlex.split(additional_args)
-            command_parts.extend(split_args)
-        except ValueError:
-            # Fallback if shlex can't parse, just add as a single string (less safe)
-            command_parts.append(shlex.quote(additional_args))
-
-    generated_cmd = " ".join(command_parts)
-    return jsonify({'command': generated_cmd})
+    command, warnings = NMAP_COMMAND.build(request.json)
+    return jsonify({'command': command, 'warnings': warnings})
 
 @app.route('/run_nmap', methods=['POST'])
 def run_nmap():
@@ -258,63 +248,123 @@ def run_nmap():
     if command[0] != 'nmap':
         return jsonify({'status': 'error', 'message': 'Only Nmap commands are allowed.'}), 403
 
-    # Check if nmap executable exists using shutil.which
-    if shutil.which(command[0]) is None:
+    # Check if nmap executable exists using runtime.which
+    if runtime.which(command[0]) is None:
         return jsonify({'status': 'error', 'message': f"Nmap executable '{command[0]}' not found on the server. Please ensure Nmap is installed and accessible in the system's PATH."}), 500
 
-    # Create a new queue for this scan's real-time output
-    output_queue = queue.Queue()
-    scan_queues[scan_id] = output_queue
-    scan_outputs[scan_id] = "" # Initialize full output storage
-
-    def _run_nmap_thread(cmd, q, scan_id_val):
-        full_output_buffer = []
+    # Opt-in sharding: split the target list across several nmap processes
+    if data.get('shards'):
+        try:
+            scan = sharding.start(scan_id, command, int(data['shards']), data.get('shard_by', 'cidr'),
+                                  UPLOAD_FOLDER, scan_processes, scan_outputs, scan_queues,
+                                  on_complete=lambda scan: record_scan_history(
+                                      scan.id, scan.args, scan.store, scan.started_at, scan.merged_xml))
+        except (ValueError, sharding.ShardingError) as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        sharded_scans[scan_id] = scan
+        scan_hosts[scan_id] = scan.store
+        return jsonify({'status': 'running', 'scan_id': scan_id, 'shards': len(scan.shards),
+                        'message': f'Nmap scan started in {len(scan.shards)} shards.'})
+
+    # nmap takes no other options with --resume; it reuses the outputs of the resumed scan
+    resuming = '--resume' in command
+    # XML goes to a side file that is parsed live into hosts/ports for /scan/<id>/hosts
+    xml_path = nmap_xml.xml_output_path(command)
+    if xml_path is None and not resuming:
+        xml_path = os.path.join(UPLOAD_FOLDER, f'nmap_{scan_id}.xml')
+        command += ['-oX', xml_path]
+    elif xml_path not in (None, '-') and '--append-output' not in command and os.path.exists(xml_path):
+        os.remove(xml_path) # nmap overwrites it anyway; don't read the previous run's hosts
+    # A normal-format log lets the scan be resumed if the app stops under it
+    log_path = checkpoints.resume_log_path(command)
+    if log_path is None and not resuming and '-oN' not in command:
+        log_path = os.path.join(UPLOAD_FOLDER, f'nmap_{scan_id}.nmap')
+        command += ['-oN', log_path]
+    job = None
+    if log_path is not None and not resuming:
+        job = {'scan_id': scan_id, 'command': command, 'resume_log': log_path,
+               'xml_path': xml_path if xml_path != '-' else None, 'xml_segments': [0],
+               'status': 'running', 'started_at': time.time(), 'resumes': 0, 'exit_code': None}
         try:
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT, # Merge stderr into stdout for simpler real-time logging
-                text=True,
-                bufsize=1, # Line-buffered
-                universal_newlines=True
-            )
-            scan_processes[scan_id_val] = process
-
-            for line in iter(process.stdout.readline, ''):
-                q.put(line) # Put each line into the queue
-                full_output_buffer.append(line) # Also append to buffer for final output
-
-            process.wait()
-            return_code = process.returncode
-
-            final_status_line = f"\nNmap finished with exit code: {return_code}\n"
-            final_status_line += f"STATUS: {'Completed' if return_code == 0 else 'Failed'}\n"
-            q.put(final_status_line) # Add final status to queue
-
-            full_output_buffer.append(final_status_line)
-            scan_outputs[scan_id_val] = "".join(full_output_buffer) # Store complete output
-
-        except FileNotFoundError:
-            error_msg = f"Error: '{cmd[0]}' command not found. Make sure Nmap is installed and in your system's PATH.\nSTATUS: Error\n"
-            q.put(error_msg)
-            scan_outputs[scan_id_val] = error_msg
-        except Exception as e:
-            error_msg = f"An unexpected error occurred: {e}\nSTATUS: Error\n"
-            q.put(error_msg)
-            scan_outputs[scan_id_val] = error_msg
-        finally:
-            if scan_id_val in scan_processes:
-                del scan_processes[scan_id_val]
-            # Signal end of output by putting a special marker
-            q.put("---SCAN_COMPLETE---")
+            JOURNAL.save(job)
+        except OSError as e:
+            print(f"Could not save the checkpoint of scan {scan_id}: {e}")
+            job = None
 
+    start_scan(scan_id, command, xml_path if xml_path != '-' else None, nmap_xml.HostStore(), job)
+
+    return jsonify({'status': 'running', 'scan_id': scan_id, 'message': 'Nmap scan started.'})
+
+
+def start_scan(scan_id, command, xml_path, host_store, job=None, xml_start=0):
+    """Runs an nmap command in a background thread, streaming its output and following its XML."""
+    scan_hosts[scan_id] = host_store
+
+    # Create a new queue for this scan's real-time output
+    output_queue = runtime.OutputLog()
+    scan_queues[scan_id] = output_queue
+    scan_outputs[scan_id] = output_queue # The log is the stored output (see runtime.JobOutputs)
 
     # Start the Nmap process in a separate thread
-    thread = threading.Thread(target=_run_nmap_thread, args=(command, output_queue, scan_id))
+    thread = threading.Thread(target=_run_nmap_thread,
+                              args=(command, output_queue, scan_id, xml_path, host_store, job, xml_start))
     thread.daemon = True
     thread.start()
 
-    return jsonify({'status': 'running', 'scan_id': scan_id, 'message': 'Nmap scan started.'})
+
+def _run_nmap_thread(cmd, q, scan_id_val, xml_path, host_store, job, xml_start):
+    started_at = time.time()
+    return_code = None
+    nmap_done = threading.Event()
+    if xml_path is not None:
+        xml_follower = nmap_xml.XMLFollower(xml_path, host_store, nmap_done, start=xml_start)
+        xml_follower.start()
+    else:
+        xml_follower = None
+    try:
+        process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT, # Merge stderr into stdout for simpler real-time logging
+            text=True,
+            bufsize=1, # Line-buffered
+            universal_newlines=True
+        )
+        scan_processes[scan_id_val] = process
+
+        for line in iter(process.stdout.readline, ''):
+            q.put(line) # Put each line into the queue
+
+        process.wait()
+        return_code = process.returncode
+
+        final_status_line = f"\nNmap finished with exit code: {return_code}\n"
+        final_status_line += f"STATUS: {'Completed' if return_code == 0 else 'Failed'}\n"
+        q.put(final_status_line) # Add final status to queue
+
+    except FileNotFoundError:
+        error_msg = f"Error: '{cmd[0]}' command not found. Make sure Nmap is installed and in your system's PATH.\nSTATUS: Error\n"
+        q.put(error_msg)
+    except Exception as e:
+        error_msg = f"An unexpected error occurred: {e}\nSTATUS: Error\n"
+        q.put(error_msg)
+    finally:
+        if scan_id_val in scan_processes:
+            del scan_processes[scan_id_val]
+        nmap_done.set()
+        if xml_follower is not None:
+            xml_follower.join(timeout=10) # Let the last hosts land before reporting completion
+        host_store.finished = True
+        if job is not None:
+            # Killed by a signal (stopped, OOM, shutdown): resumable like an app restart
+            status = 'interrupted' if return_code is not None and return_code < 0 else \
+                'completed' if return_code == 0 else 'failed'
+            JOURNAL.update(scan_id_val, status=status, exit_code=return_code, finished_at=time.time())
+        if host_store.hosts:
+            record_scan_history(scan_id_val, shlex.join(job['command'] if job else cmd), host_store,
+                                job['started_at'] if job else started_at, xml_path)
+        # Signal end of output by putting a special marker
+        q.put("---SCAN_COMPLETE---")
 
 # Modified get_scan_output to handle 'nmap_install' ID
 @app.route('/get_scan_output/<scan_id>', methods=['GET'])
@@ -377,6 +427,145 @@ def get_scan_output(scan_id):
         return jsonify({'status': 'running', 'output': current_output_segment})
 
 
+@app.route('/scan/<scan_id>/shards', methods=['GET'])
+def get_scan_shards(scan_id):
+    """Per-shard state and progress of a sharded scan."""
+    scan = sharded_scans.get(scan_id)
+    if scan is None:
+        return jsonify({'status': 'not_found', 'message': 'No sharded scan with this ID.'}), 404
+    return jsonify(scan.describe())
+
+@app.route('/scan/<scan_id>/hosts', methods=['GET'])
+def get_scan_hosts(scan_id):
+    """
+    Hosts found so far, filtered by port criteria, e.g. ?state=open&port=443.
+    Filters: state, port (80,443,8000-8100), proto, service, script, ip (address or CIDR), host_state.
+    """
+    store = scan_hosts.get(scan_id)
+    if store is None:
+        return jsonify({'status': 'not_found', 'message': 'Scan ID not found or expired.'}), 404
+    try:
+        hosts = nmap_xml.query_from_args(store, request.args)
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = min(max(int(request.args.get('limit', 100)), 1), 5000)
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': f'Invalid filter: {e}'}), 400
+    return jsonify({'status': 'completed' if store.finished else 'running', 'total': len(hosts),
+                    'offset': offset, 'limit': limit, 'hosts': hosts[offset:offset + limit]})
+
+@app.route('/scan/<scan_id>/events', methods=['GET'])
+def get_scan_events(scan_id):
+    """Structured host/port/service/script events after sequence number `since`."""
+    store = scan_hosts.get(scan_id)
+    if store is None:
+        return jsonify({'status': 'not_found', 'message': 'Scan ID not found or expired.'}), 404
+    try:
+        since = max(int(request.args.get('since', 0)), 0)
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'since must be an integer.'}), 400
+    events, next_since = store.events_since(since)
+    return jsonify({'status': 'completed' if store.finished else 'running', 'events': events,
+                    'since': since + len(events), 'total': next_since})
+
+@app.route('/interrupted_scans', methods=['GET'])
+def interrupted_scans():
+    """Scans a restart (or a kill signal) interrupted, with the number of hosts their logs already hold."""
+    scans = [dict(job, hosts_done=checkpoints.hosts_done(job['resume_log']))
+             for job in JOURNAL.resumable() if job['scan_id'] not in scan_processes]
+    return jsonify({'status': 'success', 'scans': scans})
+
+@app.route('/scan/<scan_id>/resume', methods=['POST'])
+def resume_scan(scan_id):
+    """Continues an interrupted scan with `nmap --resume`, under the same scan ID."""
+    with resume_lock: # Read the job under the lock, so no request acts on a status another resume already changed
+        job = JOURNAL.get(scan_id)
+        if job is None:
+            return jsonify({'status': 'not_found', 'message': 'No checkpoint for this scan ID.'}), 404
+        if scan_id in resuming_scans:
+            return jsonify({'status': 'error', 'message': 'Scan is already being resumed.'}), 409
+        if job['status'] not in checkpoints.RESUMABLE or scan_id in scan_processes:
+            return jsonify({'status': 'error', 'message': f"Scan is {job['status']}, not interrupted."}), 409
+        resuming_scans.add(scan_id)
+    try:
+        return _resume(job)
+    finally:
+        # The job is saved as running (or was not resumed), so later requests get a 409 from its status
+        with resume_lock:
+            resuming_scans.discard(scan_id)
+
+def _resume(job):
+    scan_id = job['scan_id']
+    if not os.path.exists(job['resume_log']):
+        return jsonify({'status': 'error', 'message': f"The scan log '{job['resume_log']}' is gone; the scan cannot be resumed."}), 400
+    if runtime.which('nmap') is None:
+        return jsonify({'status': 'error', 'message': "Nmap executable 'nmap' not found on the server. Please ensure Nmap is installed and accessible in the system's PATH."}), 500
+
+    # The hosts found before the interruption, then the document nmap appends for the resumed run
+    host_store = nmap_xml.HostStore()
+    xml_start = 0
+    if job['xml_path'] and os.path.exists(job['xml_path']):
+        xml_start = os.path.getsize(job['xml_path'])
+        nmap_xml.load_segments(job['xml_path'], host_store, job['xml_segments'], xml_start)
+        job['xml_segments'].append(xml_start)
+    elif job['xml_path']:
+        job['xml_segments'] = [0]
+    job.update(status='running', resumes=job.get('resumes', 0) + 1, exit_code=None)
+    try:
+        JOURNAL.save(job)
+    except OSError as e:
+        print(f"Could not save the checkpoint of scan {scan_id}: {e}")
+        return jsonify({'status': 'error', 'message': f'Could not save the checkpoint, the scan was not resumed: {e}'}), 500
+
+    start_scan(scan_id, ['nmap', '--resume', job['resume_log']], job['xml_path'], host_store, job, xml_start)
+    return jsonify({'status': 'running', 'scan_id': scan_id, 'hosts_done': len(host_store.hosts),
+                    'message': f'Nmap scan resumed ({len(host_store.hosts)} host(s) already done).'})
+
+@app.route('/scan/<scan_id>/discard', methods=['POST'])
+def discard_scan(scan_id):
+    """Stops offering an interrupted scan for resume (its files stay in uploads/)."""
+    job = JOURNAL.get(scan_id)
+    if job is None:
+        return jsonify({'status': 'not_found', 'message': 'No checkpoint for this scan ID.'}), 404
+    if job['status'] not in checkpoints.RESUMABLE:
+        return jsonify({'status': 'error', 'message': f"Scan is {job['status']}, not interrupted."}), 409
+    JOURNAL.update(scan_id, status='discarded')
+    return jsonify({'status': 'success', 'message': 'Scan discarded.'})
+
+@app.route('/scan_history', methods=['GET'])
+def get_scan_history():
+    """Recorded scans, newest first; with ?ip= the ports of one host across all scans."""
+    ip = request.args.get('ip')
+    if ip:
+        return jsonify({'status': 'success', 'ip': ip, 'ports': SCAN_HISTORY.host_history(ip)})
+    return jsonify({'status': 'success', 'scans': SCAN_HISTORY.scans()})
+
+@app.route('/scan_history/import', methods=['POST'])
+def import_scan_history():
+    """Imports nmap -oX files from the upload folder (all *.xml, or {"files": [...]}); each file once."""
+    data = request.get_json(silent=True) or {}
+    names = data.get('files')
+    if names is not None and (not isinstance(names, list) or not all(isinstance(name, str) for name in names)):
+        return jsonify({'status': 'error', 'message': 'files must be a list of file names.'}), 400
+    started = time.perf_counter()
+    imported, skipped, errors = SCAN_HISTORY.import_folder(UPLOAD_FOLDER, names)
+    return jsonify({'status': 'success', 'imported': imported, 'skipped': skipped, 'errors': errors,
+                    'seconds': round(time.perf_counter() - started, 3)})
+
+@app.route('/scan_diff', methods=['GET'])
+def scan_diff():
+    """New, closed and changed open ports between two recorded scans (?a=<older id>&b=<newer id>)."""
+    a, b = request.args.get('a'), request.args.get('b')
+    if not a or not b:
+        return jsonify({'status': 'error', 'message': 'Both a and b scan IDs are required.'}), 400
+    for scan_id in (a, b):
+        if not SCAN_HISTORY.has_scan(scan_id):
+            return jsonify({'status': 'not_found', 'message': f"Scan '{scan_id}' is not in the scan history."}), 404
+    started = time.perf_counter()
+    diff = SCAN_HISTORY.diff(a, b)
+    return jsonify({'status': 'success', 'a': a, 'b': b, **diff,
+                    'counts': {key: len(rows) for key, rows in diff.items()},
+                    'milliseconds': round((time.perf_counter() - started) * 1000, 2)})
+
 @app.route('/save_output', methods=['POST'])
 def save_output():
     """Saves the provided content to a file on the server and allows download."""
@@ -421,7 +610,7 @@ def install_nmap():
     if sys.platform.startswith('linux'):
         scan_id = str(uuid.uuid4()) # Unique ID for this installation process
         full_output = []
-        output_queue = queue.Queue()
+        output_queue = runtime.OutputLog()
         scan_queues[scan_id] = output_queue
         scan_outputs[scan_id] = "" # Initialize full output storage for this ID
 
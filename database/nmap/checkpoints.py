@@ -0,0 +1,117 @@
+"""
+Checkpoints for long nmap scans, so that they survive an app or host restart.
+
+Every scan the app runs writes a normal-format log (`-oN`, unless the
+command already names a normal or grepable log) that `nmap --resume <log>`
+can continue from. Its job metadata (command, log, XML file, state) is kept
+in `<folder>/<scan_id>.json` and rewritten atomically on every state change.
+
+When the app starts, jobs still marked running were interrupted by the
+restart. They are listed by `/interrupted_scans`, and `POST /scan/<id>/resume`
+continues them from the last completed host group instead of from the start.
+nmap appends the resumed run to the original output files, so every resume
+starts a new XML document in the same file; `xml_segments` records where
+each one begins.
+"""
+import glob
+import json
+import os
+import threading
+import time
+
+# States a job can be resumed from: the app stopped under it, or nmap was killed by a signal
+RESUMABLE = ('interrupted',)
+# Finished job records kept; older ones are removed at startup (their logs stay in uploads/)
+MAX_KEPT_JOBS = 200
+
+
+def resume_log_path(argv):
+    """Returns the normal (-oN/-oA) or grepable (-oG) log an nmap argv writes, or None."""
+    for index, token in enumerate(argv[:-1]):
+        if token in ('-oN', '-oG'):
+            return argv[index + 1] if argv[index + 1] != '-' else None
+        if token == '-oA':
+            return argv[index + 1] + '.nmap'
+    return None
+
+
+def hosts_done(log_path):
+    """Counts the hosts a normal-format log already reports (what a resume will skip)."""
+    count = 0
+    try:
+        with open(log_path, 'r', errors='replace') as f:
+            for line in f:
+                if line.startswith('Nmap scan report for') or line.startswith('Host: '):
+                    count += 1
+    except OSError:
+        return None
+    return count
+
+
+class JobJournal:
+    """The persisted metadata of the scans the app ran, one JSON file per scan."""
+
+    def __init__(self, folder):
+        self.folder = folder
+        self.lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+
+    def _path(self, scan_id):
+        return os.path.join(self.folder, f'{scan_id}.json')
+
+    def save(self, job):
+        job['updated_at'] = time.time()
+        path = self._path(job['scan_id'])
+        with open(path + '.tmp', 'w') as f:
+            json.dump(job, f)
+        os.replace(path + '.tmp', path) # Never leave a half-written record behind
+
+    def get(self, scan_id):
+        try:
+            with open(self._path(scan_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def update(self, scan_id, **fields):
+        with self.lock:
+            job = self.get(scan_id)
+            if job is None:
+                return None
+            job.update(fields)
+            self.save(job)
+            return job
+
+    def jobs(self):
+        """All job records, newest first."""
+        jobs = []
+        for path in glob.glob(os.path.join(self.folder, '*.json')):
+            try:
+                with open(path) as f:
+                    jobs.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return sorted(jobs, key=lambda job: job.get('started_at') or 0, reverse=True)
+
+    def resumable(self):
+        return [job for job in self.jobs() if job.get('status') in RESUMABLE]
+
+    def recover(self):
+        """
+        Run once at startup: jobs still marked running were interrupted. Marks
+        them so, forgets the oldest finished records and returns the resumable jobs.
+        """
+        with self.lock:
+            jobs = self.jobs()
+            for job in jobs:
+                if job.get('status') == 'running':
+                    job['status'] = 'interrupted'
+                    job['interrupted_at'] = job.get('updated_at')
+                    self.save(job)
+            finished = [job for job in jobs if job.get('status') not in RESUMABLE]
+            for job in finished[MAX_KEPT_JOBS:]:
+                try:
+                    os.remove(self._path(job['scan_id']))
+                except OSError:
+                    pass
+        return [job for job in jobs if job.get('status') in RESUMABLE]
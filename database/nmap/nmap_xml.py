@@ -0,0 +1,293 @@
+"""
+Live structured results from nmap's XML output.
+
+Every scan writes XML next to its text output (`-oX uploads/nmap_<id>.xml`
+unless the command already names an XML file). `XMLFollower` tails that file
+while nmap runs and feeds it to an incremental parser. Each finished `<host>`
+is turned into events and then dropped from the parse tree, so memory stays
+flat however large the scan gets. The events are:
+
+    {"type": "host",    "ip": ..., "state": "up", "hostnames": [...]}
+    {"type": "port",    "ip": ..., "protocol": "tcp", "port": 443, "state": "open", "reason": ...}
+    {"type": "service", "ip": ..., "protocol": "tcp", "port": 443, "name": "https", "product": ..., ...}
+    {"type": "script",  "ip": ..., "protocol": "tcp", "port": 443, "id": "ssl-cert", "output": ...}
+      (host scripts have no protocol/port)
+
+`HostStore` keeps the events and a per-host index. It backs
+`/scan/<id>/hosts?state=open&port=443` and `/scan/<id>/events?since=<n>`,
+which work while the scan is still running.
+"""
+import ipaddress
+import os
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import OrderedDict
+
+READ_SIZE = 64 * 1024
+FOLLOW_INTERVAL = 0.25
+MAX_EVENTS_PER_CALL = 5000
+MAX_PORT = 65535
+SERVICE_FIELDS = ('name', 'product', 'version', 'extrainfo', 'ostype', 'tunnel', 'method', 'conf')
+
+
+def xml_output_path(argv):
+    """Returns the XML file an nmap argv already writes (-oX/-oA), '-' for stdout, or None."""
+    for index, token in enumerate(argv[:-1]):
+        if token == '-oX':
+            return argv[index + 1]
+        if token == '-oA':
+            return argv[index + 1] + '.xml'
+    return None
+
+
+def parse_ports(text):
+    """
+    Parses '80,443,8000-8100' into a set of port numbers.
+
+    Raises:
+        ValueError: A part is not a number or range of ports 0-65535, or a range ends before it starts.
+    """
+    ports = set()
+    for part in str(text).split(','):
+        part = part.strip()
+        if not part:
+            continue
+        start, _sep, end = part.partition('-')
+        start, end = int(start), int(end or start)
+        if not 0 <= start <= end <= MAX_PORT:
+            raise ValueError(f'bad port range {part!r}: ports are 0-{MAX_PORT}, with the lower one first')
+        ports.update(range(start, end + 1))
+    return ports
+
+
+def _host_record(element):
+    """Turns a finished <host> element into (host record, events)."""
+    addresses = {address.get('addrtype'): address.get('addr') for address in element.findall('address')}
+    ip = addresses.get('ipv4') or addresses.get('ipv6') or addresses.get('mac')
+    status = element.find('status')
+    record = {
+        'ip': ip,
+        'mac': addresses.get('mac'),
+        'state': status.get('state') if status is not None else None,
+        'hostnames': [hostname.get('name') for hostname in element.findall('hostnames/hostname')],
+        'ports': OrderedDict(), # (protocol, port) -> port record
+        'scripts': [],
+    }
+    os_match = element.find('os/osmatch')
+    if os_match is not None:
+        record['os'] = os_match.get('name')
+    events = [{'type': 'host', 'ip': ip, 'state': record['state'], 'hostnames': record['hostnames']}]
+
+    for port in element.findall('ports/port'):
+        protocol = port.get('protocol')
+        number = int(port.get('portid'))
+        port_state = port.find('state')
+        entry = {
+            'protocol': protocol,
+            'port': number,
+            'state': port_state.get('state') if port_state is not None else None,
+            'reason': port_state.get('reason') if port_state is not None else None,
+            'service': None,
+            'scripts': [],
+        }
+        events.append({'type': 'port', 'ip': ip, 'protocol': protocol, 'port': number,
+                       'state': entry['state'], 'reason': entry['reason']})
+        service = port.find('service')
+        if service is not None:
+            entry['service'] = {field: service.get(field) for field in SERVICE_FIELDS if service.get(field)}
+            events.append({'type': 'service', 'ip': ip, 'protocol': protocol, 'port': number, **entry['service']})
+        for script in port.findall('script'):
+            entry['scripts'].append({'id': script.get('id'), 'output': script.get('output')})
+            events.append({'type': 'script', 'ip': ip, 'protocol': protocol, 'port': number,
+                           'id': script.get('id'), 'output': script.get('output')})
+        record['ports'][(protocol, number)] = entry
+
+    for script in element.findall('hostscript/script'):
+        record['scripts'].append({'id': script.get('id'), 'output': script.get('output')})
+        events.append({'type': 'script', 'ip': ip, 'id': script.get('id'), 'output': script.get('output')})
+    return record, events
+
+
+class HostStore:
+    """Hosts, ports, services and scripts of one scan, as they are found."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.hosts = OrderedDict() # ip -> host record
+        self.events = []
+        self.finished = False # Set by the scan once nmap has exited and its XML is read
+        self.updated_at = time.time()
+
+    def add_host(self, element):
+        record, events = _host_record(element)
+        if record['ip'] is None:
+            return
+        with self.lock:
+            known = self.hosts.get(record['ip'])
+            if known is not None:
+                # The same host seen again (another shard, or a rescan): keep the union of its ports
+                known['ports'].update(record['ports'])
+                known['scripts'].extend(record['scripts'])
+                known['state'] = record['state'] if record['state'] == 'up' else known['state']
+            else:
+                self.hosts[record['ip']] = record
+            for event in events:
+                event['seq'] = len(self.events)
+                self.events.append(event)
+            self.updated_at = time.time()
+
+    def events_since(self, since, limit=MAX_EVENTS_PER_CALL):
+        with self.lock:
+            return self.events[since:since + limit], len(self.events)
+
+    def query(self, state=None, ports=None, protocol=None, service=None, script=None, network=None,
+              host_state=None):
+        """Returns the matching hosts; when a port criterion is given, only with their matching ports."""
+        port_filter = any(value is not None for value in (state, ports, protocol, service, script))
+        with self.lock:
+            hosts = list(self.hosts.values())
+        results = []
+        for host in hosts:
+            if host_state is not None and host['state'] != host_state:
+                continue
+            if network is not None:
+                try:
+                    if ipaddress.ip_address(host['ip']) not in network:
+                        continue
+                except ValueError:
+                    continue
+            matching = []
+            for entry in list(host['ports'].values()):
+                if state is not None and entry['state'] != state:
+                    continue
+                if ports is not None and entry['port'] not in ports:
+                    continue
+                if protocol is not None and entry['protocol'] != protocol:
+                    continue
+                if service is not None and (entry['service'] or {}).get('name') != service:
+                    continue
+                if script is not None and not any(s['id'] == script for s in entry['scripts']):
+                    continue
+                matching.append(entry)
+            if port_filter and not matching:
+                # A host script can match on its own when the script is the only criterion
+                only_script = script is not None and all(value is None for value in (state, ports, protocol, service))
+                if not (only_script and any(s['id'] == script for s in host['scripts'])):
+                    continue
+            results.append({
+                'ip': host['ip'],
+                'mac': host['mac'],
+                'state': host['state'],
+                'hostnames': host['hostnames'],
+                'os': host.get('os'),
+                'ports': matching if port_filter else list(host['ports'].values()),
+                'scripts': host['scripts'],
+            })
+        return results
+
+
+def iter_host_records(path, info=None):
+    """
+    Yields the host record of every <host> in a finished nmap XML file,
+    dropping each element once read. `info` (a dict), if given, receives the
+    <nmaprun> attributes and the finish time.
+    """
+    root = None
+    depth = 0
+    for event, element in ET.iterparse(path, events=('start', 'end')):
+        if event == 'start':
+            depth += 1
+            if root is None:
+                root = element
+                if info is not None:
+                    info.update(element.attrib)
+            continue
+        depth -= 1
+        if depth == 1:
+            if element.tag == 'host':
+                yield _host_record(element)[0]
+            elif element.tag == 'runstats' and info is not None:
+                finished = element.find('finished')
+                if finished is not None:
+                    info['finished'] = finished.get('time')
+            root.remove(element)
+
+
+class XMLFollower(threading.Thread):
+    """Tails an nmap XML file as it is written and feeds each finished host to a HostStore."""
+
+    def __init__(self, path, store, done, start=0, end=None):
+        super().__init__(name=f'nmap-xml-{os.path.basename(path)}', daemon=True)
+        self.path = path
+        self.store = store
+        self.done = done # Event set once nmap has exited
+        # Byte range of one XML document in the file (a resumed scan appends a new one)
+        self.start_offset = start
+        self.end_offset = end
+
+    def run(self):
+        parser = ET.XMLPullParser(events=('start', 'end'))
+        root = None
+        depth = 0
+        handle = None
+        try:
+            while True:
+                if handle is None:
+                    try:
+                        handle = open(self.path, 'rb')
+                    except OSError:
+                        if self.done.is_set():
+                            return
+                        time.sleep(FOLLOW_INTERVAL)
+                        continue
+                    handle.seek(self.start_offset)
+                finished = self.done.is_set() # Read once more after nmap exits, then stop
+                size = READ_SIZE if self.end_offset is None else min(READ_SIZE, self.end_offset - handle.tell())
+                chunk = handle.read(size) if size > 0 else b''
+                if not chunk:
+                    if finished:
+                        return
+                    time.sleep(FOLLOW_INTERVAL)
+                    continue
+                parser.feed(chunk)
+                for event, element in parser.read_events():
+                    if event == 'start':
+                        depth += 1
+                        if root is None:
+                            root = element
+                        continue
+                    depth -= 1
+                    if depth == 1:
+                        # A direct child of <nmaprun> is complete: use it, then drop it from the tree
+                        if element.tag == 'host':
+                            self.store.add_host(element)
+                        root.remove(element)
+        except ET.ParseError as e:
+            print(f"nmap XML: stopped reading '{self.path}': {e}")
+        finally:
+            if handle is not None:
+                handle.close()
+
+
+def load_segments(path, store, offsets, end=None):
+    """Reads the finished XML documents starting at `offsets` (up to `end`) into a HostStore."""
+    done = threading.Event()
+    done.set()
+    bounds = list(offsets) + [end]
+    for start, stop in zip(bounds, bounds[1:]):
+        XMLFollower(path, store, done, start, stop).run()
+
+
+def query_from_args(store, args):
+    """Runs HostStore.query() with the filters of a /scan/<id>/hosts request. Raises ValueError."""
+    network = args.get('ip')
+    return store.query(
+        state=args.get('state') or None,
+        ports=parse_ports(args['port']) if args.get('port') else None,
+        protocol=args.get('proto') or None,
+        service=args.get('service') or None,
+        script=args.get('script') or None,
+        network=ipaddress.ip_network(network, strict=False) if network else None,
+        host_state=args.get('host_state') or None,
+    )
@@ -0,0 +1,251 @@
+"""
+Scan history: nmap results in a local SQLite database, for diffs between runs.
+
+Finished scans are recorded from their HostStore (see nmap_xml.py). Existing
+`-oX` files can be bulk-imported; a file is recognised by its SHA-1 and only
+imported once. Ports are keyed by (scan_id, ip, proto, port), which is also
+the index the diff joins on, and indexed by (ip, port, proto) for the
+history of one host. Each host row also keeps a digest of its open ports and
+their services, so a diff only looks at the ports of hosts whose digest
+differs between the two scans; rescans where little changed take
+milliseconds even with 100k ports per scan.
+
+`diff(a, b)` compares the open ports of two scans with indexed anti-joins:
+
+* new: open in b, not open in a;
+* closed: open in a, not open in b (`b_state` says what b saw, null if the
+  host or port was not in b at all);
+* changed: open in both, with a different service name, product or version.
+
+The database is CYBERWEB_NMAP_HISTORY_DB (default: scan_history.db in the app
+folder).
+"""
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import nmap_xml
+
+DB_PATH = os.environ.get('CYBERWEB_NMAP_HISTORY_DB', 'scan_history.db')
+INSERT_BATCH = 5000
+MAX_DIFF_ROWS = 100000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scans (
+    id TEXT PRIMARY KEY,
+    source TEXT NOT NULL,          -- 'scan' (run from the app) or 'import'
+    args TEXT,
+    started_at REAL,
+    finished_at REAL,
+    file TEXT,
+    file_sha1 TEXT UNIQUE,
+    hosts_up INTEGER,
+    port_count INTEGER,
+    recorded_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS hosts (
+    scan_id TEXT NOT NULL,
+    ip TEXT NOT NULL,
+    state TEXT,
+    hostnames TEXT,
+    digest TEXT,                   -- of the open ports and their services
+    PRIMARY KEY (scan_id, ip)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS ports (
+    scan_id TEXT NOT NULL,
+    ip TEXT NOT NULL,
+    proto TEXT NOT NULL,
+    port INTEGER NOT NULL,
+    state TEXT,
+    service TEXT,
+    product TEXT,
+    version TEXT,
+    PRIMARY KEY (scan_id, ip, proto, port)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS ports_ip_port_proto ON ports (ip, port, proto);
+CREATE INDEX IF NOT EXISTS ports_scan_state ON ports (scan_id, state);
+"""
+
+# Hosts of scan ?1 whose open ports differ in scan ?2 (or that are not in ?2), and the hosts only in ?2
+_CANDIDATES = """
+INSERT OR IGNORE INTO temp.diff_candidates (ip)
+SELECT x.ip FROM hosts AS x LEFT JOIN hosts AS y ON y.scan_id = ?2 AND y.ip = x.ip
+WHERE x.scan_id = ?1 AND y.digest IS NOT x.digest
+UNION ALL
+SELECT y.ip FROM hosts AS y LEFT JOIN hosts AS x ON x.scan_id = ?1 AND x.ip = y.ip
+WHERE y.scan_id = ?2 AND x.ip IS NULL
+"""
+# Ports open in scan ?1 with no open counterpart in scan ?2, on the candidate hosts. CROSS JOIN keeps
+# SQLite from driving the join from `ports` (the temp table has no statistics)
+_MISSING_OPEN = """
+SELECT x.ip, x.proto, x.port, x.service, x.product, x.version, y.state
+FROM temp.diff_candidates AS candidates
+CROSS JOIN ports AS x ON x.scan_id = ?1 AND x.ip = candidates.ip
+LEFT JOIN ports AS y ON y.scan_id = ?2 AND y.ip = x.ip AND y.proto = x.proto AND y.port = x.port
+WHERE x.state = 'open' AND (y.state IS NULL OR y.state != 'open')
+ORDER BY x.ip, x.proto, x.port
+LIMIT ?3
+"""
+_CHANGED = """
+SELECT x.ip, x.proto, x.port, x.service, x.product, x.version, y.service, y.product, y.version
+FROM temp.diff_candidates AS candidates
+CROSS JOIN ports AS x ON x.scan_id = ?1 AND x.ip = candidates.ip
+CROSS JOIN ports AS y ON y.scan_id = ?2 AND y.ip = x.ip AND y.proto = x.proto AND y.port = x.port
+WHERE x.state = 'open' AND y.state = 'open'
+  AND (x.service IS NOT y.service OR x.product IS NOT y.product OR x.version IS NOT y.version)
+ORDER BY x.ip, x.proto, x.port
+LIMIT ?3
+"""
+
+
+class ScanHistory:
+    """The SQLite scan history of the nmap app."""
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self.local = threading.local() # One connection per thread
+        self.connection().executescript(SCHEMA)
+
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            connection.execute('CREATE TEMP TABLE IF NOT EXISTS diff_candidates (ip TEXT PRIMARY KEY) WITHOUT ROWID')
+            self.local.connection = connection
+        return connection
+
+    def _insert(self, scan, records):
+        """Stores a scan row and its hosts/ports from an iterable of host records."""
+        connection = self.connection()
+        hosts_up = port_count = 0
+        with connection:
+            connection.execute('DELETE FROM ports WHERE scan_id = ?', (scan['id'],))
+            connection.execute('DELETE FROM hosts WHERE scan_id = ?', (scan['id'],))
+            host_rows, port_rows = [], []
+            for record in records:
+                hosts_up += record['state'] == 'up'
+                digest = hashlib.blake2b(digest_size=8)
+                for entry in sorted(record['ports'].values(), key=lambda e: (e['protocol'], e['port'])):
+                    service = entry['service'] or {}
+                    row = (entry['protocol'], entry['port'], entry['state'],
+                           service.get('name'), service.get('product'), service.get('version'))
+                    port_rows.append((scan['id'], record['ip']) + row)
+                    if entry['state'] == 'open':
+                        digest.update(repr(row).encode())
+                host_rows.append((scan['id'], record['ip'], record['state'], json.dumps(record['hostnames']),
+                                  digest.hexdigest()))
+                if len(port_rows) >= INSERT_BATCH or len(host_rows) >= INSERT_BATCH:
+                    port_count += self._flush(connection, host_rows, port_rows)
+            port_count += self._flush(connection, host_rows, port_rows)
+            connection.execute(
+                'INSERT OR REPLACE INTO scans (id, source, args, started_at, finished_at, file, file_sha1, '
+                'hosts_up, port_count, recorded_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (scan['id'], scan['source'], scan.get('args'), scan.get('started_at'), scan.get('finished_at'),
+                 scan.get('file'), scan.get('file_sha1'), hosts_up, port_count, time.time()))
+        return hosts_up, port_count
+
+    @staticmethod
+    def _flush(connection, host_rows, port_rows):
+        connection.executemany('INSERT OR REPLACE INTO hosts VALUES (?, ?, ?, ?, ?)', host_rows)
+        connection.executemany('INSERT OR REPLACE INTO ports VALUES (?, ?, ?, ?, ?, ?, ?, ?)', port_rows)
+        count = len(port_rows)
+        host_rows.clear()
+        port_rows.clear()
+        return count
+
+    def record_store(self, scan_id, args, store, started_at, finished_at, file=None):
+        """Records a finished scan from its HostStore."""
+        with store.lock:
+            records = list(store.hosts.values())
+        return self._insert({'id': scan_id, 'source': 'scan', 'args': args, 'started_at': started_at,
+                             'finished_at': finished_at, 'file': os.path.basename(file) if file else None}, records)
+
+    def import_file(self, path):
+        """Imports one nmap XML file. Returns the scan row as a dict, or None if it was imported before."""
+        sha1 = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                sha1.update(block)
+        digest = sha1.hexdigest()
+        # Also skip the -oX files of scans this app ran and recorded itself
+        known = self.connection().execute(
+            "SELECT id FROM scans WHERE file_sha1 = ? OR (source = 'scan' AND file = ?)",
+            (digest, os.path.basename(path))).fetchone()
+        if known is not None:
+            return None
+        info = {}
+        scan = {'id': f'import-{uuid.uuid4().hex[:12]}', 'source': 'import', 'file': os.path.basename(path),
+                'file_sha1': digest}
+        hosts_up, port_count = self._insert(scan, nmap_xml.iter_host_records(path, info))
+        with self.connection() as connection:
+            connection.execute('UPDATE scans SET args = ?, started_at = ?, finished_at = ? WHERE id = ?',
+                               (info.get('args'), _number(info.get('start')), _number(info.get('finished')),
+                                scan['id']))
+        return {'id': scan['id'], 'file': scan['file'], 'hosts_up': hosts_up, 'port_count': port_count}
+
+    def import_folder(self, folder, names=None):
+        """Imports the given XML files (default: every *.xml) from a folder. Returns (imported, skipped, errors)."""
+        paths = [os.path.join(folder, os.path.basename(name)) for name in names] if names \
+            else sorted(glob.glob(os.path.join(folder, '*.xml')))
+        imported, skipped, errors = [], [], []
+        for path in paths:
+            try:
+                result = self.import_file(path)
+            except (OSError, nmap_xml.ET.ParseError) as e:
+                errors.append({'file': os.path.basename(path), 'error': str(e)})
+                continue
+            if result is None:
+                skipped.append(os.path.basename(path))
+            else:
+                imported.append(result)
+        return imported, skipped, errors
+
+    def scans(self, limit=200):
+        rows = self.connection().execute(
+            'SELECT id, source, args, started_at, finished_at, file, hosts_up, port_count, recorded_at '
+            'FROM scans ORDER BY COALESCE(started_at, recorded_at) DESC LIMIT ?', (limit,)).fetchall()
+        keys = ('id', 'source', 'args', 'started_at', 'finished_at', 'file', 'hosts_up', 'port_count', 'recorded_at')
+        return [dict(zip(keys, row)) for row in rows]
+
+    def has_scan(self, scan_id):
+        return self.connection().execute('SELECT 1 FROM scans WHERE id = ?', (scan_id,)).fetchone() is not None
+
+    def host_history(self, ip, limit=1000):
+        """Every recorded port of one host across scans (uses the (ip, port, proto) index)."""
+        rows = self.connection().execute(
+            'SELECT p.scan_id, s.started_at, p.proto, p.port, p.state, p.service, p.product, p.version '
+            'FROM ports AS p JOIN scans AS s ON s.id = p.scan_id WHERE p.ip = ? '
+            'ORDER BY p.port, p.proto, s.started_at LIMIT ?', (ip, limit)).fetchall()
+        keys = ('scan_id', 'started_at', 'proto', 'port', 'state', 'service', 'product', 'version')
+        return [dict(zip(keys, row)) for row in rows]
+
+    def diff(self, a, b, limit=MAX_DIFF_ROWS):
+        """New, closed and changed open ports from scan a to scan b."""
+        connection = self.connection()
+        service_keys = ('service', 'product', 'version')
+        with connection: # One read transaction; the temp table is private to this thread's connection
+            connection.execute('DELETE FROM temp.diff_candidates')
+            connection.execute(_CANDIDATES, (a, b))
+            new = [dict(zip(('ip', 'proto', 'port') + service_keys + ('a_state',), row))
+                   for row in connection.execute(_MISSING_OPEN, (b, a, limit))]
+            closed = [dict(zip(('ip', 'proto', 'port') + service_keys + ('b_state',), row))
+                      for row in connection.execute(_MISSING_OPEN, (a, b, limit))]
+            changed = [{'ip': row[0], 'proto': row[1], 'port': row[2],
+                        'a': dict(zip(service_keys, row[3:6])), 'b': dict(zip(service_keys, row[6:9]))}
+                       for row in connection.execute(_CHANGED, (a, b, limit))]
+            connection.execute('DELETE FROM temp.diff_candidates')
+        return {'new': new, 'closed': closed, 'changed': changed}
+
+
+def _number(value):
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
@@ -0,0 +1,432 @@
+"""
+Target sharding for large nmap scans.
+
+A scan over a big target list (`-iL scope.txt`, inline targets, or both) can
+be split into K shards that run as separate nmap processes:
+
+* the targets are split either by CIDR block (`cidr`: large networks are cut
+  into equal subnets, octet ranges such as 10.0.0-255.1-254 along their first
+  ranged octet, and the pieces are balanced across shards by address count,
+  without expanding them) or by host count (`hosts`: every address is
+  expanded and the list is cut into K equal runs);
+* each shard gets its own target file and `-oX` file and runs through the
+  shared runner, waiting for a slot in the process-wide limiter;
+* each shard's XML is followed live into one HostStore (see nmap_xml.py);
+* all shards write into one live output stream (lines prefixed with
+  `[shard i/K]`) and their XML is merged into a single nmaprun document
+  (also written to the user's own `-oX`/`-oA` path, and `-oN`/`-oG`/`-oS`
+  files are concatenated).
+
+`ShardedScan.describe()` backs the per-shard progress view.
+"""
+import heapq
+import ipaddress
+import itertools
+import math
+import os
+import re
+import shlex
+import shutil
+import threading
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+
+import nmap_xml
+import runtime
+from runtime.runner import LIMITER, run_process
+
+SHARD_MODES = ('cidr', 'hosts')
+MAX_SHARDS = 64
+# `hosts` mode expands every address; refuse scopes bigger than a /12
+MAX_EXPANDED_HOSTS = 1 << 20
+STATS_INTERVAL = '15s'
+
+# nmap options followed by a separate value (everything else is a flag, an
+# attached value such as -T4/-PS80 or --opt=value, or a target)
+VALUE_OPTIONS = {
+    '-iL', '-iR', '--exclude', '--excludefile', '--dns-servers', '-p', '--exclude-ports', '--top-ports',
+    '--port-ratio', '--version-intensity', '--script', '--script-args', '--script-args-file',
+    '--script-help', '--min-hostgroup', '--max-hostgroup', '--min-parallelism', '--max-parallelism',
+    '--min-rtt-timeout', '--max-rtt-timeout', '--initial-rtt-timeout', '--max-retries', '--host-timeout',
+    '--script-timeout', '--scan-delay', '--max-scan-delay', '--min-rate', '--max-rate', '--mtu', '-D', '-S',
+    '-e', '-g', '--source-port', '--proxies', '--data', '--data-string', '--data-length', '--ip-options',
+    '--ttl', '--spoof-mac', '-oN', '-oX', '-oS', '-oG', '-oA', '--stylesheet', '--datadir', '--servicedb',
+    '--versiondb', '--resume', '-sI', '-b', '--scanflags', '--stats-every', '--max-os-tries',
+    '--nsock-engine',
+}
+# Per-format output options and the extension their shard files get
+OUTPUT_OPTIONS = {'-oN': 'nmap', '-oG': 'gnmap', '-oS': 'skid', '-oX': 'xml'}
+UNSHARDABLE = {'-iR': 'random targets (-iR)', '--resume': '--resume'}
+
+PROGRESS_PATTERN = re.compile(r'About (\d+(?:\.\d+)?)% done')
+OCTET_RANGE = re.compile(r'^[\d*,\-]+(?:\.[\d*,\-]+){3}$')
+
+
+class ShardingError(ValueError):
+    """The command or target list cannot be sharded."""
+
+
+class Unit:
+    """A piece of the scope: a network, an octet range, or a hostname."""
+
+    def __init__(self, spec, size, network=None):
+        self.spec = spec
+        self.size = size
+        self.network = network
+
+
+def _octet_values(part):
+    values = []
+    for item in part.split(','):
+        if item == '*':
+            item = '0-255'
+        start, _sep, end = item.partition('-')
+        start = int(start) if start else 0
+        end = int(end) if end else (255 if _sep else start)
+        if not 0 <= start <= end <= 255:
+            raise ShardingError(f"Invalid octet range '{item}'.")
+        values.extend(range(start, end + 1))
+    return values
+
+
+def parse_target(spec):
+    """Turns one nmap target specification into a Unit."""
+    try:
+        network = ipaddress.ip_network(spec, strict=False)
+        return Unit(spec, network.num_addresses, network)
+    except ValueError:
+        pass
+    if OCTET_RANGE.match(spec):
+        return Unit(spec, math.prod(len(_octet_values(part)) for part in spec.split('.')))
+    host, _sep, mask = spec.partition('/')
+    if mask.isdigit() and int(mask) <= 32:
+        return Unit(spec, 1 << (32 - int(mask))) # nmap accepts hostname/24
+    return Unit(spec, 1)
+
+
+def read_targets(path):
+    """Reads an nmap target list (whitespace separated, '#' comments)."""
+    with open(path, encoding='utf-8', errors='replace') as f:
+        return [token for line in f for token in line.split('#', 1)[0].split()]
+
+
+def _expand(unit):
+    if unit.network is not None:
+        return (str(address) for address in unit.network)
+    if OCTET_RANGE.match(unit.spec):
+        parts = [_octet_values(part) for part in unit.spec.split('.')]
+        return ('.'.join(map(str, octets)) for octets in itertools.product(*parts))
+    return iter([unit.spec])
+
+
+def _octet_part(values):
+    """Writes octet values back in nmap's `a-b,c` form."""
+    runs = []
+    for _step, run in itertools.groupby(enumerate(values), key=lambda item: item[1] - item[0]):
+        run = [value for _index, value in run]
+        runs.append(str(run[0]) if len(run) == 1 else f'{run[0]}-{run[-1]}')
+    return ','.join(runs)
+
+
+def _split_octet_range(unit, piece):
+    """Cuts an octet-range unit along its first ranged octet into units of about `piece` addresses."""
+    parts = unit.spec.split('.')
+    octets = [_octet_values(part) for part in parts]
+    ranged = next(index for index, values in enumerate(octets) if len(values) > 1)
+    per_value = unit.size // len(octets[ranged])
+    step = max(piece // per_value, 1)
+    for start in range(0, len(octets[ranged]), step):
+        chunk = octets[ranged][start:start + step]
+        sub = Unit('.'.join(parts[:ranged] + [_octet_part(chunk)] + parts[ranged + 1:]), per_value * len(chunk))
+        if sub.size > piece:
+            yield from _split_octet_range(sub, piece) # One value of this octet is still too big: cut the next one
+        else:
+            yield sub
+
+
+def split_targets(specs, count, mode='cidr'):
+    """Splits target specs into at most `count` shards; returns a list of (target list, address count)."""
+    units = [parse_target(spec) for spec in specs]
+    total = sum(unit.size for unit in units)
+    if not units:
+        raise ShardingError('No targets to shard.')
+
+    if mode == 'hosts':
+        if total > MAX_EXPANDED_HOSTS:
+            raise ShardingError(f'{total} addresses is too many to split by host; use cidr mode.')
+        hosts = [host for unit in units for host in _expand(unit)]
+        size = math.ceil(len(hosts) / count)
+        return [(hosts[start:start + size], len(hosts[start:start + size])) for start in range(0, len(hosts), size)]
+
+    # cidr: cut networks and octet ranges bigger than a fair share into pieces of
+    # about a quarter of a share (so the shards come out even), then balance by size
+    share = max(math.ceil(total / count), 1)
+    piece = max(share // 4, 1)
+    pieces = []
+    for unit in units:
+        network = unit.network
+        if network is not None and unit.size > share and network.num_addresses > 1:
+            new_prefix = max(network.max_prefixlen - int(math.log2(piece)), network.prefixlen + 1)
+            pieces.extend(Unit(str(subnet), subnet.num_addresses, subnet)
+                          for subnet in network.subnets(new_prefix=new_prefix))
+        elif network is None and unit.size > share and OCTET_RANGE.match(unit.spec):
+            pieces.extend(_split_octet_range(unit, piece))
+        else:
+            pieces.append(unit)
+
+    heap = [(0, index, []) for index in range(min(count, len(pieces)))]
+    for order, piece in sorted(enumerate(pieces), key=lambda item: -item[1].size):
+        load, index, members = heapq.heappop(heap)
+        members.append((order, piece))
+        heapq.heappush(heap, (load + piece.size, index, members))
+    shards = []
+    for load, _index, members in sorted(heap, key=lambda item: item[1]):
+        if members:
+            shards.append(([piece.spec for _order, piece in sorted(members, key=lambda m: m[0])], load))
+    return shards
+
+
+def parse_command(argv):
+    """Splits an nmap argv into (options without targets/output, targets, target files, outputs)."""
+    options, targets, target_files, outputs = [], [], [], {}
+    tokens = iter(argv[1:])
+    for token in tokens:
+        if token in UNSHARDABLE:
+            raise ShardingError(f'Scans using {UNSHARDABLE[token]} cannot be sharded.')
+        if token in VALUE_OPTIONS:
+            value = next(tokens, None)
+            if value is None:
+                raise ShardingError(f'{token} needs a value.')
+            if token == '-iL':
+                if value == '-':
+                    raise ShardingError('Reading targets from stdin (-iL -) cannot be sharded.')
+                target_files.append(value)
+            elif token == '-oA':
+                outputs.update({'-oN': f'{value}.nmap', '-oG': f'{value}.gnmap', '-oX': f'{value}.xml'})
+            elif token in OUTPUT_OPTIONS:
+                outputs[token] = value
+            else:
+                options += [token, value]
+        elif token.startswith('-') and token != '-':
+            options.append(token)
+        else:
+            targets.append(token)
+    return options, targets, target_files, outputs
+
+
+def merge_xml(paths, out_path, args, started_at, finished_at):
+    """Merges the shards' nmaprun XML files into one document. Returns (hosts up, hosts down)."""
+    root = None
+    up = down = 0
+    for path in paths:
+        try:
+            shard_root = ET.parse(path).getroot()
+        except (OSError, ET.ParseError):
+            continue # The shard failed before writing (complete) XML
+        if root is None:
+            root = ET.Element('nmaprun', dict(shard_root.attrib))
+            for child in shard_root:
+                if child.tag in ('scaninfo', 'verbose', 'debugging'):
+                    root.append(child)
+        for host in shard_root.iter('host'):
+            root.append(host)
+        hosts = shard_root.find('runstats/hosts')
+        if hosts is not None:
+            up += int(hosts.get('up', 0))
+            down += int(hosts.get('down', 0))
+    if root is None:
+        return up, down
+    root.set('args', args)
+    root.set('start', str(int(started_at)))
+    runstats = ET.SubElement(root, 'runstats')
+    ET.SubElement(runstats, 'finished', {
+        'time': str(int(finished_at)),
+        'timestr': time.ctime(finished_at),
+        'elapsed': f'{finished_at - started_at:.2f}',
+        'summary': f'Nmap done; {up + down} IP addresses ({up} hosts up) scanned in {finished_at - started_at:.2f} seconds (sharded)',
+        'exit': 'success',
+    })
+    ET.SubElement(runstats, 'hosts', {'up': str(up), 'down': str(down), 'total': str(up + down)})
+    with open(out_path, 'wb') as f:
+        f.write(b'<?xml version="1.0" encoding="UTF-8"?>\n<!DOCTYPE nmaprun>\n')
+        ET.ElementTree(root).write(f, encoding='utf-8', xml_declaration=False)
+    return up, down
+
+
+class _ShardOutput:
+    """Forwards a shard's lines to the merged log, noting its progress on the way."""
+
+    def __init__(self, shard, log):
+        self.shard = shard
+        self.log = log
+
+    def put(self, line):
+        match = PROGRESS_PATTERN.search(line)
+        if match:
+            self.shard['progress'] = float(match.group(1))
+        self.log.put(line)
+
+
+class ShardedScan:
+    """One nmap scan split into shards that run in parallel."""
+
+    def __init__(self, scan_id, argv, count, mode, work_folder):
+        if mode not in SHARD_MODES:
+            raise ShardingError(f"shard_by must be one of {', '.join(SHARD_MODES)}.")
+        if not 2 <= count <= MAX_SHARDS:
+            raise ShardingError(f'shards must be between 2 and {MAX_SHARDS}.')
+        options, targets, target_files, outputs = parse_command(argv)
+        for path in target_files:
+            try:
+                targets.extend(read_targets(path))
+            except OSError as e:
+                raise ShardingError(f"Cannot read target list '{path}': {e}")
+        self.id = scan_id
+        self.args = shlex.join(argv)
+        self.mode = mode
+        self.outputs = outputs
+        self.folder = os.path.join(work_folder, f'shards_{scan_id}')
+        self.merged_xml = outputs.get('-oX') or os.path.join(work_folder, f'nmap_{scan_id}.xml')
+        if not any(option.startswith('--stats-every') for option in options):
+            options += ['--stats-every', STATS_INTERVAL] # Progress lines for the per-shard view
+        self.log = runtime.OutputLog(pending_limit=runtime.jobs.PENDING_LIMIT)
+        self.store = nmap_xml.HostStore()
+        self.started_at = time.time()
+        self.finished_at = None
+        self.hosts_up = self.hosts_down = None
+
+        split = split_targets(targets, count, mode)
+        os.makedirs(self.folder, exist_ok=True)
+        self.shards = []
+        for index, (shard_targets, addresses) in enumerate(split, 1):
+            base = os.path.join(self.folder, f'shard-{index}')
+            with open(f'{base}.txt', 'w', encoding='utf-8') as f:
+                f.write('\n'.join(shard_targets) + '\n')
+            command = [argv[0]] + options + ['-iL', f'{base}.txt', '-oX', f'{base}.xml']
+            for option, _path in outputs.items():
+                if option != '-oX':
+                    command += [option, f'{base}.{OUTPUT_OPTIONS[option]}']
+            self.shards.append({
+                'index': index,
+                'targets': len(shard_targets),
+                'addresses': addresses,
+                'command': shlex.join(command),
+                'argv': command,
+                'base': base,
+                'state': 'queued',
+                'progress': 0.0,
+                'exit_code': None,
+                'started_at': None,
+                'finished_at': None,
+            })
+
+    def describe(self):
+        return {
+            'scan_id': self.id,
+            'status': 'running' if self.finished_at is None else 'completed',
+            'shard_by': self.mode,
+            'merged_xml': os.path.basename(self.merged_xml) if self.finished_at else None,
+            'hosts_up': self.hosts_up,
+            'hosts_down': self.hosts_down,
+            'shards': [{key: value for key, value in shard.items() if key not in ('argv', 'base')}
+                       for shard in self.shards],
+        }
+
+    def _run_shard(self, shard, processes):
+        LIMITER.acquire()
+        try:
+            shard['state'] = 'running'
+            shard['started_at'] = time.time()
+            prefix = f"[shard {shard['index']}/{len(self.shards)}] "
+            self.log.put(f"{prefix}$ {shard['command']}\n")
+            done = threading.Event()
+            follower = nmap_xml.XMLFollower(f"{shard['base']}.xml", self.store, done)
+            follower.start()
+            try:
+                code = run_process(shard['argv'], _ShardOutput(shard, self.log), prefix=prefix,
+                                   processes=processes, job_id=f"{self.id}-shard-{shard['index']}")
+            finally:
+                done.set()
+                follower.join(timeout=10)
+            shard['exit_code'] = code
+            shard['finished_at'] = time.time()
+            shard['state'] = 'completed' if code == 0 else 'failed'
+            if code == 0:
+                shard['progress'] = 100.0
+            self.log.put(f"{prefix}Nmap finished with exit code: {code}\n")
+        finally:
+            LIMITER.release()
+
+    def _concatenate(self, option):
+        with open(self.outputs[option], 'wb') as out:
+            for shard in self.shards:
+                try:
+                    with open(f"{shard['base']}.{OUTPUT_OPTIONS[option]}", 'rb') as f:
+                        shutil.copyfileobj(f, out)
+                except OSError:
+                    pass
+
+    def run(self, processes, outputs, on_complete=None):
+        """
+        Runs every shard, then merges their results. Meant for a background thread. A shard that raises is
+        marked failed, and the log always ends with the STATUS line and the end marker.
+        """
+        failed = []
+        try:
+            self.log.put(f"Sharded scan: {len(self.shards)} shard(s) by {self.mode}, "
+                         f"{sum(shard['addresses'] for shard in self.shards)} address(es).\n")
+            with ThreadPoolExecutor(max_workers=len(self.shards), thread_name_prefix=f'nmap-shard-{self.id[:8]}') as pool:
+                futures = [(shard, pool.submit(self._run_shard, shard, processes)) for shard in self.shards]
+                for shard, future in futures:
+                    try:
+                        future.result()
+                    except Exception as e:
+                        shard['state'] = 'failed'
+                        shard['finished_at'] = time.time()
+                        self.log.put(f"[shard {shard['index']}/{len(self.shards)}] Error: {type(e).__name__}: {e}\n")
+            self.finished_at = time.time()
+            self.store.finished = True
+            failed = [shard['index'] for shard in self.shards if shard['state'] != 'completed']
+            try:
+                self.hosts_up, self.hosts_down = merge_xml([f"{shard['base']}.xml" for shard in self.shards],
+                                                           self.merged_xml, self.args, self.started_at, self.finished_at)
+                for option in self.outputs:
+                    if option != '-oX':
+                        self._concatenate(option)
+                self.log.put(f"\nMerged XML written to {self.merged_xml} ({self.hosts_up} host(s) up, "
+                             f"{self.hosts_down} down).\n")
+                if not failed:
+                    shutil.rmtree(self.folder, ignore_errors=True)
+            except OSError as e:
+                self.log.put(f"\nError merging shard results: {e}\n")
+                failed = failed or [0]
+        except Exception as e:
+            self.log.put(f"\nSharded scan failed: {type(e).__name__}: {e}\n")
+            failed = failed or [0]
+        finally:
+            if self.finished_at is None:
+                self.finished_at = time.time()
+            self.store.finished = True
+            final_status_line = f"STATUS: {'Failed' if failed else 'Completed'}\n"
+            if failed:
+                final_status_line = f"Shard(s) {', '.join(map(str, failed))} failed.\n" + final_status_line
+            try:
+                self.log.put(final_status_line)
+                if on_complete is not None:
+                    on_complete(self)
+            except Exception as e:
+                self.log.put(f"Error recording the scan: {type(e).__name__}: {e}\n")
+            finally:
+                outputs[self.id] = self.log
+                self.log.put("---SCAN_COMPLETE---")
+
+
+def start(scan_id, argv, count, mode, work_folder, processes, outputs, queues, on_complete=None):
+    """Builds a ShardedScan, registers its output stream and starts it. `on_complete(scan)` runs once merged."""
+    scan = ShardedScan(scan_id, argv, count, mode, work_folder)
+    queues[scan_id] = scan.log
+    outputs[scan_id] = scan.log
+    thread = threading.Thread(target=scan.run, args=(processes, outputs, on_complete), daemon=True)
+    thread.start()
+    return scan
@@ -5,6 +5,11 @@ import sys # For port argument
 
 app = Flask(__name__)
 
+# Shared runtime (metrics, debug endpoints) lives at the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import runtime
+runtime.init_app(app)
+
 # Define the root directory for the application
 # This assumes app.py is directly inside the image gallery app folder (e.g., scripts/image_gallery_app/)
 APP_ROOT = os.path.dirname(os.path.abspath(__file__))
@@ -0,0 +1,479 @@
+"""
+sqlmapapi backend: sqlmap runs as tasks of a local sqlmapapi server.
+
+The process backend starts a sqlmap process for every run. The API backend
+starts `sqlmapapi -s` on a free loopback port the first time it is needed,
+restarts it if it died, and stops it when the app exits. Each run becomes a
+task of that server:
+
+    GET /task/new -> POST /scan/<task>/start {options} -> poll /scan/<task>/status
+    and /scan/<task>/log/<start>/<end> -> GET /scan/<task>/data -> GET /task/<task>/delete
+
+The task log is streamed into the job's OutputLog while the task runs; each
+poll reads only the messages past a moving start (see ApiTask._read_log).
+The task's data (injection points, banner, dumped tables, ...) is kept with
+the job and served by `/sqlmap/<id>/data`. Tasks run under the shared
+runner limiter, one task per target at a time. A run waits for its target's
+session before it takes a limiter slot, so a queued re-run does not hold one.
+
+Every target gets a persistent output directory under SESSIONS_FOLDER
+(CYBERWEB_SQLMAP_SESSIONS, default: sessions/ in the app folder), keyed by
+host and port. sqlmap keeps its session file there, so a re-run of a target
+resumes the stored injection point instead of detecting it again.
+--flush-session still starts over.
+
+The API takes sqlmap's option names, not its flags. OPTIONS maps the
+supported flags; a command with any other flag, or an interactive one
+(--os-shell, --sql-shell, --wizard), is refused rather than run with the
+flag dropped.
+"""
+import atexit
+import contextlib
+import json
+import os
+import re
+import shutil
+import socket
+import subprocess
+import threading
+import time
+import urllib.request
+from urllib.parse import urlsplit
+
+import runtime
+from runtime.runner import LIMITER
+
+SESSIONS_FOLDER = os.environ.get('CYBERWEB_SQLMAP_SESSIONS', 'sessions')
+SERVER_COMMANDS = ('sqlmapapi', 'sqlmapapi.py')
+START_TIMEOUT = 30
+POLL_SECONDS = 1.0
+REQUEST_TIMEOUT = 30
+END_MARKER = '---SCAN_COMPLETE---'
+# End of /scan/<task>/log/<start>/<end> reads: above any message ID
+LOG_END = 10 ** 18 - 1
+# Messages a log read may return again before its start moves past them
+LOG_WINDOW = 500
+
+# sqlmap flag -> (API option name, value type: None for switches, else str, int or float)
+OPTIONS = {
+    '-u': ('url', str), '--url': ('url', str), '-r': ('requestFile', str), '-m': ('bulkFile', str),
+    '--data': ('data', str), '--method': ('method', str), '--cookie': ('cookie', str), '-H': ('header', str),
+    '--header': ('header', str), '--headers': ('headers', str), '-A': ('agent', str), '--user-agent': ('agent', str),
+    '--random-agent': ('randomAgent', None), '--referer': ('referer', str), '--host': ('host', str),
+    '--auth-type': ('authType', str), '--auth-cred': ('authCred', str), '--proxy': ('proxy', str),
+    '--proxy-cred': ('proxyCred', str), '--tor': ('tor', None), '--tor-type': ('torType', str),
+    '--tor-port': ('torPort', int), '--force-ssl': ('forceSSL', None), '--timeout': ('timeout', float),
+    '--delay': ('delay', float), '--retries': ('retries', int), '--threads': ('threads', int), '-o': ('optimize', None),
+    '--batch': ('batch', None), '-x': ('sitemapUrl', str), '-g': ('googleDork', str), '--forms': ('forms', None),
+    '--crawl': ('crawlDepth', int), '-p': ('testParameter', str), '--skip': ('skip', str),
+    '--technique': ('technique', str), '--techniques': ('technique', str), '--dbms': ('dbms', str),
+    '--os': ('os', str), '--prefix': ('prefix', str),
+    '--suffix': ('suffix', str), '--tamper': ('tamper', str), '--level': ('level', int), '--risk': ('risk', int),
+    '--string': ('string', str), '--not-string': ('notString', str), '--regexp': ('regexp', str),
+    '--code': ('code', int), '--text-only': ('textOnly', None), '--titles': ('titles', None),
+    '--time-sec': ('timeSec', int), '--smart': ('smart', None), '-f': ('extensiveFp', None),
+    '--fingerprint': ('extensiveFp', None), '-a': ('getAll', None), '--all': ('getAll', None),
+    '-b': ('getBanner', None), '--banner': ('getBanner', None), '--current-user': ('getCurrentUser', None),
+    '--current-db': ('getCurrentDb', None), '--hostname': ('getHostname', None), '--is-dba': ('isDba', None),
+    '--users': ('getUsers', None), '--passwords': ('getPasswordHashes', None), '--privileges': ('getPrivileges', None),
+    '--roles': ('getRoles', None), '--dbs': ('getDbs', None), '--tables': ('getTables', None),
+    '--columns': ('getColumns', None), '--schema': ('getSchema', None), '--count': ('getCount', None),
+    '--dump': ('dumpTable', None), '--dump-all': ('dumpAll', None), '-D': ('db', str), '-T': ('tbl', str),
+    '-C': ('col', str), '--exclude-sysdbs': ('excludeSysDbs', None), '--file-read': ('fileRead', str),
+    '--file-write': ('fileWrite', str), '--file-dest': ('fileDest', str), '-t': ('trafficFile', str),
+    '--skip-waf': ('skipWaf', None), '-v': ('verbose', int), '--flush-session': ('flushSession', None),
+    '--fresh-queries': ('freshQueries', None), '--dns-domain': ('dnsDomain', str),
+    '--disable-coloring': ('disableColoring', None),
+}
+INTERACTIVE_FLAGS = ('--os-shell', '--os-pwn', '--sql-shell', '--wizard', '--shell')
+# Console-only switches with nothing to do on the API (it prints no banner and cannot beep)
+IGNORED_FLAGS = ('--no-banner', '--beep')
+# sqlmap's CONTENT_TYPE values, as found in /scan/<task>/data
+CONTENT_TYPES = {
+    0: 'target', 1: 'techniques', 2: 'dbms_fingerprint', 3: 'banner', 4: 'current_user', 5: 'current_db',
+    6: 'hostname', 7: 'is_dba', 8: 'users', 9: 'passwords', 10: 'privileges', 11: 'roles', 12: 'dbs',
+    13: 'tables', 14: 'columns', 15: 'schema', 16: 'count', 17: 'dump_table', 18: 'search', 19: 'sql_query',
+    20: 'common_tables', 21: 'common_columns', 22: 'file_read', 23: 'file_write', 24: 'os_cmd', 25: 'reg_read',
+    26: 'statements',
+}
+
+
+class ApiError(Exception):
+    """The sqlmapapi server could not be started or did not answer as expected."""
+
+
+class UnsupportedOptions(ValueError):
+    """A command uses flags the API backend cannot pass on."""
+
+
+def to_options(argv):
+    """
+    The sqlmapapi options of a sqlmap argv. `--flag=value` works as well as `--flag value`.
+
+    Raises:
+        UnsupportedOptions: Flags OPTIONS does not know, interactive flags or stray arguments.
+    """
+    options, unsupported = {}, []
+    index = 1
+    while index < len(argv):
+        flag, equals, inline = argv[index].partition('=')
+        index += 1
+        if flag in IGNORED_FLAGS:
+            continue
+        if flag in INTERACTIVE_FLAGS or flag not in OPTIONS:
+            unsupported.append(argv[index - 1])
+            continue
+        name, kind = OPTIONS[flag]
+        if kind is None:
+            options[name] = True
+            continue
+        if equals:
+            value = inline
+        elif index < len(argv):
+            value = argv[index]
+            index += 1
+        else:
+            unsupported.append(flag)
+            continue
+        try:
+            options[name] = kind(value)
+        except ValueError:
+            unsupported.append(f'{flag} {value}')
+    if unsupported:
+        raise UnsupportedOptions(f"The API backend does not support: {' '.join(unsupported)}. "
+                                 f"Use the process backend for this command.")
+    return options
+
+
+def target_key(options):
+    """Session folder name of a task's target: host_port from the URL, or from the Host header of a request file."""
+    url = options.get('url')
+    if not url and options.get('requestFile'):
+        try:
+            with open(options['requestFile'], errors='replace') as f:
+                for line in f:
+                    if line.lower().startswith('host:'):
+                        url = 'http://' + line.split(':', 1)[1].strip()
+                        break
+        except OSError:
+            pass
+    if not url:
+        return None
+    parts = urlsplit(url if '://' in url else 'http://' + url)
+    try:
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+    except ValueError:
+        port = 0
+    return re.sub(r'[^A-Za-z0-9.-]', '_', f'{parts.hostname or "unknown"}_{port}')
+
+
+def sessions():
+    """The per-target session folders, newest first."""
+    try:
+        entries = [entry for entry in os.scandir(SESSIONS_FOLDER) if entry.is_dir()]
+    except OSError:
+        return []
+    result = []
+    for entry in entries:
+        size, modified = 0, entry.stat().st_mtime
+        for folder, _, files in os.walk(entry.path):
+            for name in files:
+                stat = os.stat(os.path.join(folder, name))
+                size += stat.st_size
+                modified = max(modified, stat.st_mtime)
+        result.append({'target': entry.name, 'bytes': size, 'modified_at': modified})
+    result.sort(key=lambda item: item['modified_at'], reverse=True)
+    return result
+
+
+_session_locks = {} # session folder name -> lock, so two runs never share a session file
+_session_locks_guard = threading.Lock()
+
+
+def session_lock(session):
+    """The lock a run holds while it uses a session folder."""
+    with _session_locks_guard:
+        return _session_locks.setdefault(session, threading.Lock())
+
+
+@contextlib.contextmanager
+def hold_session(session, log, prefix=''):
+    """Holds a session folder's lock, telling `log` when another run has it. Take it before a LIMITER slot."""
+    lock = session_lock(session) if session is not None else threading.Lock()
+    if not lock.acquire(blocking=False):
+        log.put(f"{prefix}Waiting for another run on {session} to finish (they share its session)...\n")
+        lock.acquire()
+    try:
+        yield
+    finally:
+        lock.release()
+
+
+def forget_session(target):
+    """
+    Deletes a target's session folder, so its next run detects the injection again.
+
+    Returns:
+        bool: False if there is no such folder.
+    Raises:
+        RuntimeError: A task of the target is running.
+    """
+    path = os.path.join(SESSIONS_FOLDER, target)
+    if not re.fullmatch(r'[A-Za-z0-9._-]+', target) or target.startswith('.') or not os.path.isdir(path):
+        return False
+    lock = session_lock(target)
+    if not lock.acquire(blocking=False):
+        raise RuntimeError(f'A sqlmap task on {target} is running.')
+    try:
+        shutil.rmtree(path)
+    finally:
+        lock.release()
+    return True
+
+
+def server_command():
+    """The sqlmapapi executable, or None if it is not installed."""
+    return next((path for path in map(runtime.which, SERVER_COMMANDS) if path), None)
+
+
+class ApiServer:
+    """A sqlmapapi server on a loopback port, started on first use."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.process = None
+        self.port = None
+        self.started_at = None
+        self.restarts = 0
+        self.log_file = None
+
+    def running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def base_url(self):
+        """The server's URL, starting (or restarting) the server if it is not running."""
+        with self.lock:
+            if not self.running():
+                self._start()
+            return f'http://127.0.0.1:{self.port}'
+
+    def _start(self):
+        executable = server_command()
+        if executable is None:
+            raise ApiError("sqlmapapi was not found on the server. Install sqlmap (it ships sqlmapapi) or use the process backend.")
+        if self.process is not None:
+            self.restarts += 1
+        with socket.socket() as probe: # A free port; sqlmapapi has no "any port" option
+            probe.bind(('127.0.0.1', 0))
+            self.port = probe.getsockname()[1]
+        if self.log_file is None:
+            self.log_file = open(os.path.join('uploads', 'sqlmapapi.log'), 'a')
+        self.process = subprocess.Popen([executable, '-s', '-H', '127.0.0.1', '-p', str(self.port)],
+                                        stdout=self.log_file, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL)
+        self.started_at = time.time()
+        deadline = time.monotonic() + START_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise ApiError(f'sqlmapapi exited with code {self.process.returncode} while starting (see uploads/sqlmapapi.log).')
+            try:
+                with socket.create_connection(('127.0.0.1', self.port), timeout=1):
+                    print(f"sqlmapapi started on port {self.port} (pid {self.process.pid})")
+                    return
+            except OSError:
+                time.sleep(0.2)
+        self.process.terminate()
+        raise ApiError(f'sqlmapapi did not start listening within {START_TIMEOUT} seconds.')
+
+    def call(self, path, body=None):
+        """A JSON request to the server; POST if `body` is given. Raises ApiError unless it answers success."""
+        request = urllib.request.Request(self.base_url() + path, method='POST' if body is not None else 'GET',
+                                         data=json.dumps(body).encode() if body is not None else None,
+                                         headers={'Content-Type': 'application/json'})
+        try:
+            with urllib.request.urlopen(request, timeout=REQUEST_TIMEOUT) as response:
+                answer = json.loads(response.read().decode('utf-8'))
+        except (OSError, ValueError) as e:
+            raise ApiError(f'sqlmapapi {path}: {e}') from None
+        if not isinstance(answer, dict) or not answer.get('success'):
+            message = answer.get('message') if isinstance(answer, dict) else None
+            raise ApiError(f'sqlmapapi {path}: {message or answer}')
+        return answer
+
+    def stop(self):
+        with self.lock:
+            if self.running():
+                self.process.terminate()
+                try:
+                    self.process.wait(5)
+                except subprocess.TimeoutExpired:
+                    self.process.kill()
+
+    def describe(self):
+        return {'running': self.running(), 'port': self.port, 'pid': self.process.pid if self.running() else None,
+                'started_at': self.started_at, 'restarts': self.restarts}
+
+
+SERVER = ApiServer()
+atexit.register(SERVER.stop)
+
+class ApiTask:
+    """One sqlmap run as a sqlmapapi task, writing its log to an OutputLog."""
+
+    def __init__(self, options, log, prefix='', session=None):
+        self.options = dict(options)
+        self.log = log
+        self.prefix = prefix
+        self.target = target_key(self.options)
+        self.session = session or self.target # Session folder name; bulk runs use one per endpoint
+        if self.session is not None and 'outputDir' not in self.options:
+            self.options['outputDir'] = os.path.abspath(os.path.join(SESSIONS_FOLDER, self.session))
+        self.options['batch'] = True # There is nobody to answer sqlmap's questions
+        self.task_id = None
+        self.cancelled = threading.Event()
+        self.data = []
+        self.errors = []
+        self.return_code = None
+        self._log_start = 1 # Message ID the log reads start at
+        self._log_seen = 0 # Messages from _log_start on already put in the log
+
+    def run(self, cancelled=None):
+        """
+        Runs the task to the end. Call it holding the session (see hold_session) and a LIMITER slot.
+
+        Returns:
+            int: sqlmap's return code (None if the task never ran).
+        Raises:
+            ApiError: The server failed.
+            OSError: The session folder cannot be created.
+        """
+        try:
+            if 'outputDir' in self.options:
+                os.makedirs(self.options['outputDir'], exist_ok=True)
+            self.task_id = SERVER.call('/task/new')['taskid']
+            SERVER.call(f'/scan/{self.task_id}/start', self.options)
+            self.log.put(f"{self.prefix}sqlmapapi task {self.task_id} started"
+                         f"{' (session: ' + self.options['outputDir'] + ')' if 'outputDir' in self.options else ''}\n")
+            killed = False
+            while True:
+                if not killed and (self.cancelled.is_set() or (cancelled is not None and cancelled.is_set())):
+                    SERVER.call(f'/scan/{self.task_id}/kill')
+                    self.cancelled.set()
+                    killed = True
+                status = SERVER.call(f'/scan/{self.task_id}/status')
+                self._read_log()
+                if status['status'] == 'terminated':
+                    self.return_code = status.get('returncode')
+                    break
+                time.sleep(POLL_SECONDS)
+            answer = SERVER.call(f'/scan/{self.task_id}/data')
+            self.data = [dict(entry, type_name=CONTENT_TYPES.get(entry.get('type'), str(entry.get('type'))))
+                         for entry in answer.get('data') or []]
+            self.errors = answer.get('error') or []
+            for error in self.errors:
+                self.log.put(f"{self.prefix}[ERROR] {error}\n")
+            return self.return_code
+        finally:
+            if self.task_id is not None:
+                try:
+                    SERVER.call(f'/task/{self.task_id}/delete')
+                except ApiError:
+                    pass
+
+    def _read_log(self):
+        """
+        Puts the task's new log messages in the log. sqlmapapi numbers the messages of all its
+        tasks in one sequence, so the read starts at a message ID; once LOG_WINDOW messages past it
+        were put in the log, the start moves past the last of them.
+        """
+        entries = SERVER.call(f'/scan/{self.task_id}/log/{self._log_start}/{LOG_END}')['log']
+        for entry in entries[self._log_seen:]:
+            self.log.put(f"{self.prefix}[{entry.get('time', '')}] [{entry.get('level', '')}] {entry.get('message', '')}\n")
+        self._log_seen = len(entries)
+        if self._log_seen >= LOG_WINDOW:
+            self._log_start = self._message_id(self._log_seen) + 1
+            self._log_seen = 0
+
+    def _message_id(self, count):
+        """The ID of the task's `count`-th message from _log_start on; later messages get higher IDs and do not change it."""
+        def messages_to(end):
+            return len(SERVER.call(f'/scan/{self.task_id}/log/{self._log_start}/{end}')['log'])
+
+        low = high = self._log_start + count - 1
+        while messages_to(high) < count:
+            low, high = high + 1, self._log_start + (high - self._log_start + 1) * 2
+        while low < high:
+            middle = (low + high) // 2
+            if messages_to(middle) >= count:
+                high = middle
+            else:
+                low = middle + 1
+        return high
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def injections(self):
+        """The injectable parameters the task found: place, parameter, DBMS and technique titles."""
+        found = []
+        for entry in self.data:
+            if entry['type_name'] != 'techniques':
+                continue
+            for injection in entry.get('value') or []:
+                found.append({'place': injection.get('place'), 'parameter': injection.get('parameter'),
+                              'dbms': injection.get('dbms'),
+                              'techniques': [technique.get('title') for technique in (injection.get('data') or {}).values()]})
+        return found
+
+
+class ApiScan:
+    """A /run_sqlmap run on the API backend: one task, its log in `log` and its data in uploads/."""
+
+    def __init__(self, scan_id, options, work_folder):
+        self.id = scan_id
+        self.log = runtime.OutputLog()
+        self.task = ApiTask(options, self.log)
+        self.data_file = os.path.join(work_folder, f'sqlmap_{scan_id}_data.json')
+        self.state = 'queued'
+        self.error = None
+        self.started_at = time.time()
+        self.finished_at = None
+
+    def run(self, processes, outputs):
+        """
+        Waits for the target's session, then for a limiter slot, and runs the task. Meant for a background
+        thread (see runtime.batch.RunTable); `processes` is not used, sqlmap runs inside the sqlmapapi server.
+        """
+        try:
+            with hold_session(self.task.session, self.log):
+                if LIMITER.acquire(self.task.cancelled):
+                    try:
+                        self.state = 'running'
+                        code = self.task.run()
+                        self.state = 'cancelled' if self.task.cancelled.is_set() else ('completed' if code == 0 else 'failed')
+                    finally:
+                        LIMITER.release()
+                else:
+                    self.state = 'cancelled'
+            if self.task.data or self.task.errors:
+                with open(self.data_file, 'w') as f:
+                    json.dump({'data': self.task.data, 'error': self.task.errors}, f, indent=2)
+        except Exception as e:
+            self.state, self.error = 'failed', str(e) if isinstance(e, ApiError) else f'{type(e).__name__}: {e}'
+            self.log.put(f"Error: {self.error}\n")
+        finally:
+            self.finished_at = time.time()
+            injections = ', '.join(f"{item['place']} {item['parameter']}" for item in self.task.injections())
+            self.log.put(f"\nsqlmap task finished with exit code: {self.task.return_code}; "
+                         f"injectable: {injections or 'nothing found'}\n"
+                         f"STATUS: {self.state.capitalize()}\n")
+            outputs[self.id] = self.log
+            self.log.put(END_MARKER)
+
+    def cancel(self):
+        self.task.cancel()
+
+    def describe(self):
+        return {'scan_id': self.id, 'state': self.state, 'error': self.error, 'target': self.task.target,
+                'session': self.task.options.get('outputDir'), 'task_id': self.task.task_id,
+                'exit_code': self.task.return_code, 'injections': self.task.injections(),
+                'started_at': self.started_at, 'finished_at': self.finished_at}
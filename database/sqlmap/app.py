@@ -7,11 +7,16 @@ import threading
 import queue
 import time
 import uuid # For unique filenames
-import shutil # Added for shutil.which
 import sys # To detect OS and get command-line arguments
 
 app = Flask(__name__)
 
+# Shared runtime (metrics, debug endpoints) lives at the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import api_backend
+import bulk
+import runtime
+
 # Directory to store temporary files (e.g., uploaded target lists, scan outputs)
 UPLOAD_FOLDER = 'uploads'
 if not os.path.exists(UPLOAD_FOLDER):
@@ -19,29 +24,24 @@ if not os.path.exists(UPLOAD_FOLDER):
 
 # In-memory storage for scan outputs (for demonstration).
 # In a real-world app, consider a more persistent and scalable solution (e.g., database, cloud storage).
-scan_outputs = {}
+scan_outputs = runtime.JobOutputs()
 scan_processes = {} # To keep track of running sqlmap processes
 scan_queues = {} # To store queues for real-time output
 
-# Load examples from sqlmap_examples.txt
-def load_examples(filename="sqlmap_examples.txt"):
-    """Loads examples from a JSON file."""
-    try:
-        # Assuming sqlmap_examples.txt is in the same directory as app.py
-        filepath = os.path.join(os.path.dirname(__file__), filename)
-        with open(filepath, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"Error: Examples file '{filename}' not found. Please ensure it's in the same directory as app.py.")
-        return []
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from '{filename}': {e}")
-        return []
-    except Exception as e:
-        print(f"An unexpected error occurred while loading examples: {e}")
-        return []
+# 'process' runs a sqlmap process per scan; 'api' submits tasks to a local sqlmapapi server (see api_backend.py)
+DEFAULT_BACKEND = os.environ.get('CYBERWEB_SQLMAP_BACKEND', 'process')
+MAX_KEPT_API_SCANS = 10
+MAX_KEPT_BULK_SCANS = 10
+
+runtime.init_app(app, upload_folder=UPLOAD_FOLDER, outputs=scan_outputs, processes=scan_processes, queues=scan_queues, tools=['sqlmap'])
+
+# scan_id -> api_backend.ApiScan, for /sqlmap/<id>/data and /sqlmap/<id>/cancel
+api_scans = runtime.batch.RunTable(MAX_KEPT_API_SCANS, scan_processes, scan_queues, scan_outputs)
+# scan_id -> bulk.BulkScan, for /sqlmap/<id>/endpoints
+bulk_scans = runtime.batch.RunTable(MAX_KEPT_BULK_SCANS, scan_processes, scan_queues, scan_outputs)
 
-ALL_EXAMPLES = load_examples()
+# Examples from sqlmap_examples.txt, parsed once and again only when the file changes
+EXAMPLES = runtime.ExamplesIndex(app, "sqlmap_examples.txt")
 
 @app.route('/')
 def index():
@@ -52,117 +52,101 @@ def index():
 @app.route('/get_examples', methods=['GET'])
 def get_examples():
     """Returns the sqlmap examples as JSON."""
-    return jsonify(ALL_EXAMPLES)
+    return EXAMPLES.serve()
+
+# sqlmap's options by UI tab; /generate_command builds commands from this spec and /command_spec serves it to the UI
+SQLMAP_COMMAND = runtime.CommandSpec(app, 'sqlmap', {
+    'Target': [
+        runtime.Value('-u', 'target_url_entry'),
+        runtime.Value('-r', 'request_file_entry'),
+        runtime.Value('--data', 'data_entry'),
+        runtime.Value('--cookie', 'cookie_entry'),
+        runtime.Value('--headers', 'headers_entry'),
+        runtime.Value('--user-agent', 'user_agent_entry'),
+        runtime.Value('--referer', 'referer_entry'),
+        runtime.Value('--auth', 'auth_entry'),
+        runtime.Value('--proxy', 'proxy_entry'),
+        runtime.Switch('--tor', 'tor_var'),
+        runtime.Value('--tor-type', 'tor_type_entry'),
+        runtime.Value('--tor-port', 'tor_port_entry'),
+        runtime.Switch('--random-agent', 'random_agent_var'),
+        runtime.Switch('--batch', 'batch_var'),
+        runtime.Switch('--force-ssl', 'force_ssl_var'),
+        runtime.Value('--sitemap', 'sitemap_url_entry'),
+        runtime.Value('--google-dork', 'google_dork_entry'),
+        runtime.Switch('--forms', 'forms_var'),
+        runtime.Value('--crawl', 'crawl_entry', type='int'),
+    ],
+    'Injection': [
+        runtime.Value('-p', 'parameter_entry'),
+        runtime.Value('--techniques', 'techniques_entry'),
+        runtime.Value('--dbms', 'dbms_entry'),
+        runtime.Value('--prefix', 'prefix_entry'),
+        runtime.Value('--suffix', 'suffix_entry'),
+        runtime.Value('--tamper', 'tamper_scripts_entry'),
+    ],
+    'Detection': [
+        runtime.Value('--level', 'level_entry', choices=range(1, 6)),
+        runtime.Value('--risk', 'risk_entry', choices=range(1, 4)),
+        runtime.Switch('-f', 'fingerprint_var'),
+    ],
+    'Enumeration': [
+        runtime.Switch('--current-user', 'current_user_var'),
+        runtime.Switch('--current-db', 'current_db_var'),
+        runtime.Switch('--users', 'users_var'),
+        runtime.Switch('--dbs', 'dbs_var'),
+        runtime.Value('-D', 'db_name_entry'),
+        runtime.Switch('--tables', 'tables_var'),
+        runtime.Value('-T', 'table_name_entry'),
+        runtime.Switch('--columns', 'columns_var'),
+        runtime.Value('-C', 'column_name_entry'),
+        runtime.Switch('--dump', 'dump_var'),
+        runtime.Switch('--dump-all', 'dump_all_var'),
+        runtime.Switch('--schema', 'schema_var'),
+        runtime.Switch('--passwords', 'passwords_var'),
+        runtime.Switch('--privileges', 'privileges_var'),
+        runtime.Switch('--roles', 'roles_var'),
+        runtime.Switch('--db-config', 'db_config_var'),
+        runtime.Switch('--db-system', 'db_system_var'),
+        runtime.Switch('--all', 'all_enum_var'),
+    ],
+    'Access': [
+        runtime.Switch('--os-shell', 'os_shell_var'),
+        runtime.Switch('--os-pwn', 'os_pwn_var'),
+        runtime.Value('--file-read', 'file_read_entry'),
+        runtime.Value('--file-write', 'file_write_entry'),
+        runtime.Value('--file-dest', 'file_dest_entry'),
+        runtime.Value('--file-upload', 'file_upload_entry'),
+    ],
+    'Optimization': [
+        runtime.Value('--threads', 'threads_entry', type='int'),
+        runtime.Value('--delay', 'delay_entry', type='number'),
+        runtime.Value('--timeout', 'timeout_entry', type='number'),
+        runtime.Value('--retries', 'retries_entry', type='int'),
+        runtime.Switch('--traffic-dump', 'traffic_dump_var'),
+    ],
+    'WAF Bypass': [
+        runtime.Switch('--identify-waf', 'identify_waf_var'),
+        runtime.Switch('--skip-waf', 'skip_waf_var'),
+    ],
+    'General/Miscellaneous': [
+        runtime.Value('-v', 'verbose_entry', choices=range(7)),
+        runtime.Value('-o', 'output_dir_entry'),
+        runtime.Switch('--flush-session', 'flush_session_var'),
+        runtime.Switch('--save', 'save_var'),
+        runtime.Switch('--beep', 'beep_var'),
+        runtime.Switch('--disable-coloring', 'disable_coloring_var'),
+        runtime.Switch('--no-banner', 'no_banner_var'),
+        runtime.Value('--dns-server', 'dns_server_entry'),
+        runtime.Extra('additional_args_entry'),
+    ],
+})
 
 @app.route('/generate_command', methods=['POST'])
 def generate_command():
     """Generates the sqlmap command based on form data."""
-    data = request.json
-    command_parts = ["sqlmap"]
-
-    def add_arg(arg_name, value):
-        if value:
-            command_parts.append(arg_name)
-            command_parts.append(shlex.quote(str(value)))
-
-    def add_checkbox_arg(arg_name, value):
-        if value:
-            command_parts.append(arg_name)
-
-    # Target Options
-    add_arg("-u", data.get('target_url_entry'))
-    add_arg("-r", data.get('request_file_entry'))
-    add_arg("--data", data.get('data_entry'))
-    add_arg("--cookie", data.get('cookie_entry'))
-    add_arg("--headers", data.get('headers_entry'))
-    add_arg("--user-agent", data.get('user_agent_entry'))
-    add_arg("--referer", data.get('referer_entry'))
-    add_arg("--auth", data.get('auth_entry'))
-    add_arg("--proxy", data.get('proxy_entry'))
-    add_checkbox_arg("--tor", data.get('tor_var'))
-    add_arg("--tor-type", data.get('tor_type_entry'))
-    add_arg("--tor-port", data.get('tor_port_entry'))
-    add_checkbox_arg("--random-agent", data.get('random_agent_var'))
-    add_checkbox_arg("--batch", data.get('batch_var'))
-    add_checkbox_arg("--force-ssl", data.get('force_ssl_var'))
-    add_arg("--sitemap", data.get('sitemap_url_entry'))
-    add_arg("--google-dork", data.get('google_dork_entry'))
-    add_arg("--forms", data.get('forms_var'))
-    add_arg("--crawl", data.get('crawl_entry'))
-
-    # Injection Options
-    add_arg("-p", data.get('parameter_entry'))
-    add_arg("--techniques", data.get('techniques_entry'))
-    add_arg("--dbms", data.get('dbms_entry'))
-    add_arg("--prefix", data.get('prefix_entry'))
-    add_arg("--suffix", data.get('suffix_entry'))
-    add_arg("--tamper", data.get('tamper_scripts_entry'))
-
-    # Detection Options
-    add_arg("--level", data.get('level_entry'))
-    add_arg("--risk", data.get('risk_entry'))
-    add_checkbox_arg("-f", data.get('fingerprint_var'))
-
-    # Enumeration Options
-    add_checkbox_arg("--current-user", data.get('current_user_var'))
-    add_checkbox_arg("--current-db", data.get('current_db_var'))
-    add_checkbox_arg("--users", data.get('users_var'))
-    add_checkbox_arg("--dbs", data.get('dbs_var'))
-    add_arg("-D", data.get('db_name_entry'))
-    add_checkbox_arg("--tables", data.get('tables_var'))
-    add_arg("-T", data.get('table_name_entry'))
-    add_checkbox_arg("--columns", data.get('columns_var'))
-    add_arg("-C", data.get('column_name_entry'))
-    add_checkbox_arg("--dump", data.get('dump_var'))
-    add_checkbox_arg("--dump-all", data.get('dump_all_var'))
-    add_checkbox_arg("--schema", data.get('schema_var'))
-    add_checkbox_arg("--passwords", data.get('passwords_var'))
-    add_checkbox_arg("--privileges", data.get('privileges_var'))
-    add_checkbox_arg("--roles", data.get('roles_var'))
-    add_checkbox_arg("--db-config", data.get('db_config_var'))
-    add_checkbox_arg("--db-system", data.get('db_system_var'))
-    add_checkbox_arg("--all", data.get('all_enum_var'))
-
-    # Access Options
-    add_checkbox_arg("--os-shell", data.get('os_shell_var'))
-    add_checkbox_arg("--os-pwn", data.get('os_pwn_var'))
-    add_arg("--file-read", data.get('file_read_entry'))
-    add_arg("--file-write", data.get('file_write_entry'))
-    add_arg("--file-dest", data.get('file_dest_entry'))
-    add_arg("--file-upload", data.get('file_upload_entry'))
-
-    # Optimization Options
-    add_arg("--threads", data.get('threads_entry'))
-    add_arg("--delay", data.get('delay_entry'))
-    add_arg("--timeout", data.get('timeout_entry'))
-    add_arg("--retries", data.get('retries_entry'))
-    add_checkbox_arg("--traffic-dump", data.get('traffic_dump_var'))
-
-    # WAF Bypass Options
-    add_checkbox_arg("--identify-waf", data.get('identify_waf_var'))
-    add_checkbox_arg("--skip-waf", data.get('skip_waf_var'))
-
-    # General/Miscellaneous Options
-    add_arg("-v", data.get('verbose_entry'))
-    add_arg("-o", data.get('output_dir_entry'))
-    add_checkbox_arg("--flush-session", data.get('flush_session_var'))
-    add_checkbox_arg("--save", data.get('save_var'))
-    add_checkbox_arg("--beep", data.get('beep_var'))
-    add_checkbox_arg("--disable-coloring", data.get('disable_coloring_var'))
-    add_checkbox_arg("--no-banner", data.get('no_banner_var'))
-    add_arg("--dns-server", data.get('dns_server_entry'))
-
-    additional_args = data.get('additional_args_entry', '').strip()
-    if additional_args:
-        try:
-            split_args = shlex.split(additional_args)
-            command_parts.extend(split_args)
-        except ValueError:
-            # Fallback if shlex can't parse, just add as a single string (less safe)
-            command_parts.append(shlex.quote(additional_args))
-
-    generated_cmd = " ".join(command_parts)
-    return jsonify({'command': generated_cmd})
+    command, warnings = SQLMAP_COMMAND.build(request.json)
+    return jsonify({'command': command, 'warnings': warnings})
 
 @app.route('/run_sqlmap', methods=['POST'])
 def run_sqlmap():
@@ -193,17 +177,65 @@ def run_sqlmap():
     if command[0] != 'sqlmap':
         return jsonify({'status': 'error', 'message': 'Only sqlmap commands are allowed.'}), 403
 
-    # Check if sqlmap executable exists using shutil.which
-    if shutil.which(command[0]) is None:
+    # Backend: a sqlmap process per scan, or a task of the app's sqlmapapi server (see api_backend.py)
+    backend = data.get('backend') or DEFAULT_BACKEND
+    if backend not in ('process', 'api'):
+        return jsonify({'status': 'error', 'message': "backend must be 'process' or 'api'."}), 400
+    if backend == 'api' and api_backend.server_command() is None:
+        return jsonify({'status': 'error', 'message': "sqlmapapi not found on the server. It ships with sqlmap; install sqlmap or use the process backend."}), 500
+    if backend == 'process' and runtime.which(command[0]) is None:
         return jsonify({'status': 'error', 'message': f"sqlmap executable '{command[0]}' not found on the server. Please ensure sqlmap is installed and accessible in the system's PATH."}), 500
 
+    # Bulk mode: one run per unique endpoint (method, URL path, parameter names) of a URL list or request folder
+    if data.get('urls') or data.get('targets_list') or data.get('requests_dir'):
+        skipped, rejected = 0, []
+        try:
+            if data.get('requests_dir'):
+                targets, rejected = bulk.read_request_folder(str(data['requests_dir']))
+            else:
+                targets = []
+                for url in bulk.parse_urls(runtime.batch.request_target_text(data, 'urls')):
+                    target = bulk.url_target(url)
+                    if target is None:
+                        skipped += 1
+                    else:
+                        targets.append(target)
+        except FileNotFoundError:
+            name = data.get('requests_dir') or data.get('targets_list')
+            return jsonify({'status': 'not_found', 'message': f"No request folder or target list named '{name}'."}), 404
+        except (OSError, ValueError) as e:
+            return jsonify({'status': 'error', 'message': f'Could not read the targets: {e}'}), 400
+        if len(targets) > bulk.MAX_TARGETS:
+            return jsonify({'status': 'error', 'message': f'At most {bulk.MAX_TARGETS} targets per run.'}), 400
+        endpoints = bulk.group_targets(targets)
+        if not endpoints:
+            return jsonify({'status': 'error', 'message': 'No targets with parameters to test in the list.'}), 400
+        try:
+            concurrency = runtime.batch.request_concurrency(data, len(endpoints))
+            scan = bulk.BulkScan(scan_id, command, endpoints, concurrency, backend, skipped, rejected)
+        except ValueError as e: # Includes api_backend.UnsupportedOptions
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        bulk_scans.start(scan)
+        return jsonify({'status': 'running', 'scan_id': scan_id, 'bulk': True, 'backend': backend, 'total': len(endpoints),
+                        'duplicates': len(targets) - len(endpoints), 'skipped': skipped, 'concurrency': concurrency,
+                        'message': f'sqlmap bulk run over {len(endpoints)} unique endpoint(s) started.'})
+
+    # API backend: the scan becomes a task of the app's sqlmapapi server, with a session folder per target
+    if backend == 'api':
+        try:
+            options = api_backend.to_options(command)
+        except api_backend.UnsupportedOptions as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        scan = api_scans.start(api_backend.ApiScan(scan_id, options, UPLOAD_FOLDER))
+        return jsonify({'status': 'running', 'scan_id': scan_id, 'backend': 'api', 'target': scan.task.target,
+                        'message': 'sqlmap task submitted to sqlmapapi.'})
+
     # Create a new queue for this scan's real-time output
-    output_queue = queue.Queue()
+    output_queue = runtime.OutputLog()
     scan_queues[scan_id] = output_queue
-    scan_outputs[scan_id] = "" # Initialize full output storage
+    scan_outputs[scan_id] = output_queue # The log is the stored output (see runtime.JobOutputs)
 
     def _run_sqlmap_thread(cmd, q, scan_id_val):
-        full_output_buffer = []
         try:
             process = subprocess.Popen(
                 cmd,
@@ -217,7 +249,6 @@ def run_sqlmap():
 
             for line in iter(process.stdout.readline, ''):
                 q.put(line) # Put each line into the queue
-                full_output_buffer.append(line) # Also append to buffer for final output
 
             process.wait()
             return_code = process.returncode
@@ -226,17 +257,12 @@ def run_sqlmap():
             final_status_line += f"STATUS: {'Completed' if return_code == 0 else 'Failed'}\n"
             q.put(final_status_line) # Add final status to queue
 
-            full_output_buffer.append(final_status_line)
-            scan_outputs[scan_id_val] = "".join(full_output_buffer) # Store complete output
-
         except FileNotFoundError:
             error_msg = f"Error: '{cmd[0]}' command not found. Make sure sqlmap is installed and in your system's PATH.\nSTATUS: Error\n"
             q.put(error_msg)
-            scan_outputs[scan_id_val] = error_msg
         except Exception as e:
             error_msg = f"An unexpected error occurred: {e}\nSTATUS: Error\n"
             q.put(error_msg)
-            scan_outputs[scan_id_val] = error_msg
         finally:
             if scan_id_val in scan_processes:
                 del scan_processes[scan_id_val]
@@ -251,6 +277,65 @@ def run_sqlmap():
 
     return jsonify({'status': 'running', 'scan_id': scan_id, 'message': 'sqlmap scan started.'})
 
+@app.route('/sqlmap/api', methods=['GET'])
+def get_sqlmap_api():
+    """The state of the sqlmapapi server and of the API backend's tasks."""
+    states = {}
+    for scan in api_scans.values():
+        states[scan.state] = states.get(scan.state, 0) + 1
+    return jsonify({'default_backend': DEFAULT_BACKEND, 'installed': api_backend.server_command() is not None,
+                    'server': api_backend.SERVER.describe(), 'tasks': states})
+
+@app.route('/sqlmap/<scan_id>/data', methods=['GET'])
+def get_sqlmap_data(scan_id):
+    """The data of an API backend scan: the injection points, fingerprint, enumeration results and errors."""
+    scan = api_scans.get(scan_id)
+    if scan is None:
+        return jsonify({'status': 'not_found', 'message': 'No API backend scan with this ID.'}), 404
+    return jsonify(dict(scan.describe(), data=scan.task.data, errors=scan.task.errors))
+
+@app.route('/sqlmap/<scan_id>/cancel', methods=['POST'])
+def cancel_sqlmap_task(scan_id):
+    """Kills the sqlmapapi task of an API backend scan, or drops the queued endpoints of a bulk run and stops the running ones."""
+    scan = bulk_scans.get(scan_id)
+    if scan is not None:
+        scan.cancel(scan_processes)
+        return jsonify({'status': 'success', 'message': 'Bulk scan cancelled.', 'counts': scan.counts()})
+    scan = api_scans.get(scan_id)
+    if scan is None:
+        return jsonify({'status': 'not_found', 'message': 'No API backend or bulk scan with this ID.'}), 404
+    scan.cancel()
+    return jsonify({'status': 'success', 'message': 'sqlmap task cancelled.'})
+
+@app.route('/sqlmap/<scan_id>/endpoints', methods=['GET'])
+def get_sqlmap_endpoints(scan_id):
+    """
+    The unique endpoints of a bulk run with their state and duplicates, and the consolidated table of
+    injectable parameters. ?injectable=1 returns only the table.
+    """
+    scan = bulk_scans.get(scan_id)
+    if scan is None:
+        return jsonify({'status': 'not_found', 'message': 'No bulk scan with this ID.'}), 404
+    if request.args.get('injectable'):
+        return jsonify({'status': 'running' if scan.finished_at is None else 'completed', 'injectable': scan.injectable()})
+    return jsonify(scan.describe())
+
+@app.route('/sqlmap/sessions', methods=['GET'])
+def get_sqlmap_sessions():
+    """The per-target session folders of the API backend."""
+    return jsonify({'folder': os.path.abspath(api_backend.SESSIONS_FOLDER), 'sessions': api_backend.sessions()})
+
+@app.route('/sqlmap/sessions/<target>', methods=['DELETE'])
+def delete_sqlmap_session(target):
+    """Forgets a target's session, so its next API backend scan starts with detection again."""
+    try:
+        deleted = api_backend.forget_session(target)
+    except RuntimeError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 409
+    if not deleted:
+        return jsonify({'status': 'not_found', 'message': f'No session for {target}.'}), 404
+    return jsonify({'status': 'success', 'message': f'Session of {target} deleted.'})
+
 @app.route('/get_scan_output/<scan_id>', methods=['GET'])
 def get_scan_output(scan_id):
     """
@@ -0,0 +1,325 @@
+"""
+Bulk sqlmap runs: one sqlmap run per unique endpoint of a URL list or a folder of saved requests.
+
+Candidate URLs from gospider or ffuf repeat the same endpoint with other
+parameter values (`/item?id=1`, `/item?id=2`, ...). A bulk run groups the
+targets by endpoint: method, scheme, host and port, path, and the names of
+the query and body parameters. Each group is tested once, with its first
+target. Values play no part in the key, so `/item?id=2` is never tested
+after `/item?id=1`, while `/item?id=1&sort=a` is a separate endpoint.
+
+URL lists can be plain, gospider or ffuf output (every http(s) URL in the
+text is taken), or a shared target list. URLs without query parameters are
+skipped. A folder of saved requests (as for `-r`) is read file by file;
+the Host header, request line and body give the key.
+
+The runs go through the shared runner limiter, at most `concurrency` at a
+time, on either backend (see api_backend.py). Each endpoint gets its own
+session folder under the API backend's SESSIONS_FOLDER, so a second bulk
+run over the same list resumes the injection points found the first time.
+The injectable parameters are read from the task data (API backend) or
+from sqlmap's injection point summary (process backend), and gathered in
+one table by `/sqlmap/<id>/endpoints`.
+"""
+import hashlib
+import json
+import os
+import re
+import shlex
+from urllib.parse import parse_qsl, urlsplit
+
+import api_backend
+import runtime
+from runtime.runner import run_process
+
+MAX_TARGETS = 5000
+MAX_REQUEST_FILE_BYTES = 1024 * 1024
+# Target options dropped from the command (-> whether they take a value): every endpoint gets its own -u or -r
+STRIPPED_FLAGS = {'-u': True, '--url': True, '-r': True, '-m': True, '-g': True, '-x': True,
+                  '--google-dork': True, '--sitemap': True, '--forms': False, '--crawl': True}
+_URL = re.compile(r'https?://[^\s"\'<>\\]+')
+# sqlmap's injection point summary: "Parameter: id (GET)", then "Type:"/"Title:" lines
+_PARAMETER = re.compile(r'^Parameter: (.+?) \((.+)\)\s*$')
+_TITLE = re.compile(r'^\s+Title: (.+?)\s*$')
+_DBMS = re.compile(r'^back-end DBMS: (.+?)\s*$')
+
+
+def _default_port(scheme):
+    return 443 if scheme == 'https' else 80
+
+
+def _names(pairs):
+    return tuple(sorted({name for name, _ in pairs}))
+
+
+def _body_names(body, content_type):
+    """The parameter names of a request body: form fields or top-level JSON keys."""
+    body = body.strip()
+    if not body:
+        return ()
+    if 'json' in content_type or body.startswith('{'):
+        try:
+            document = json.loads(body)
+        except ValueError:
+            return ('<body>',)
+        return tuple(sorted(document)) if isinstance(document, dict) else ('<body>',)
+    if '=' in body:
+        return _names(parse_qsl(body, keep_blank_values=True))
+    return ('<body>',)
+
+
+def endpoint_key(method, scheme, host, port, path, query_names, body_names=()):
+    """The dedup key of a target: everything but the parameter values."""
+    return (method.upper(), scheme, host.lower(), port, path or '/', tuple(query_names), tuple(body_names))
+
+
+def url_target(url):
+    """A target dict for a URL, or None if it has no query parameters (or is not a URL)."""
+    try:
+        parts = urlsplit(url)
+        port = parts.port or _default_port(parts.scheme)
+    except ValueError:
+        return None
+    query_names = _names(parse_qsl(parts.query, keep_blank_values=True))
+    if not parts.hostname or not query_names:
+        return None
+    return {'kind': 'url', 'source': url, 'method': 'GET', 'endpoint': f'{parts.scheme}://{parts.netloc}{parts.path or "/"}',
+            'parameters': list(query_names),
+            'key': endpoint_key('GET', parts.scheme, parts.hostname, port, parts.path, query_names)}
+
+
+def parse_urls(text):
+    """The URLs in a URL list or in gospider/ffuf output (JSON escapes undone), in order."""
+    text = text.replace('\\u0026', '&').replace('\\/', '/')
+    return [url.rstrip('.,;)]') for url in _URL.findall(text)]
+
+
+def request_target(path):
+    """
+    A target dict for a saved HTTP request (the -r format).
+
+    Raises:
+        ValueError: The file is not an HTTP request.
+    """
+    with open(path, 'rb') as f:
+        raw = f.read(MAX_REQUEST_FILE_BYTES).decode('utf-8', 'replace')
+    head, _, body = raw.replace('\r\n', '\n').partition('\n\n')
+    lines = head.lstrip('\n').split('\n')
+    request_line = lines[0].split()
+    if len(request_line) < 2 or not request_line[0].isalpha():
+        raise ValueError(f'{os.path.basename(path)} is not an HTTP request')
+    method, target = request_line[0].upper(), request_line[1]
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        headers.setdefault(name.strip().lower(), value.strip())
+    parts = urlsplit(target if '://' in target else f"http://{headers.get('host', '')}{target}")
+    if not parts.hostname:
+        raise ValueError(f'{os.path.basename(path)} has no Host header')
+    try:
+        port = parts.port or _default_port(parts.scheme)
+    except ValueError:
+        raise ValueError(f'{os.path.basename(path)} has a bad Host header') from None
+    query_names = _names(parse_qsl(parts.query, keep_blank_values=True))
+    body_names = _body_names(body, headers.get('content-type', ''))
+    return {'kind': 'request', 'source': path, 'method': method, 'endpoint': f'{parts.scheme}://{parts.netloc}{parts.path or "/"}',
+            'parameters': list(query_names) + [name for name in body_names if name not in query_names],
+            'key': endpoint_key(method, parts.scheme, parts.hostname, port, parts.path, query_names, body_names)}
+
+
+def read_request_folder(folder):
+    """
+    The targets of every saved request in a folder and its subfolders (hidden files skipped).
+
+    Returns:
+        (list, list): Targets, and (file name, reason) for the files that are not requests.
+    """
+    if not os.path.isdir(folder):
+        raise FileNotFoundError(folder)
+    targets, rejected = [], []
+    for root, folders, files in os.walk(folder):
+        folders[:] = sorted(name for name in folders if not name.startswith('.'))
+        for name in sorted(files):
+            if name.startswith('.'):
+                continue
+            try:
+                targets.append(request_target(os.path.join(root, name)))
+            except (OSError, ValueError) as e:
+                rejected.append((name, str(e)))
+    return targets, rejected
+
+
+def group_targets(targets):
+    """
+    The unique endpoints of a target list, in the order they first appear.
+
+    Returns:
+        list: One dict per endpoint: the first target's fields and `duplicates` (the other sources).
+    """
+    endpoints = {}
+    for target in targets:
+        if target['key'] in endpoints:
+            endpoints[target['key']]['duplicates'].append(target['source'])
+        else:
+            endpoints[target['key']] = dict(target, duplicates=[])
+    return list(endpoints.values())
+
+
+def prepare_command(argv):
+    """A sqlmap argv without STRIPPED_FLAGS (`--flag=value` forms included)."""
+    rest = [argv[0]]
+    index = 1
+    while index < len(argv):
+        flag, equals, _ = argv[index].partition('=')
+        if flag in STRIPPED_FLAGS:
+            index += 2 if STRIPPED_FLAGS[flag] and not equals else 1
+            continue
+        rest.append(argv[index])
+        index += 1
+    return rest
+
+
+def parse_injections(lines):
+    """The injection points in sqlmap's console output: place, parameter, DBMS and technique titles."""
+    found, current, dbms = [], None, None
+    for line in lines:
+        line = line.rstrip('\n')
+        match = _PARAMETER.match(line)
+        if match:
+            current = {'place': match.group(2), 'parameter': match.group(1), 'dbms': None, 'techniques': []}
+            if not any(item['place'] == current['place'] and item['parameter'] == current['parameter'] for item in found):
+                found.append(current)
+            else:
+                current = None
+            continue
+        match = _TITLE.match(line)
+        if match and current is not None:
+            current['techniques'].append(match.group(1))
+            continue
+        match = _DBMS.match(line)
+        if match:
+            dbms = match.group(1)
+    for item in found:
+        item['dbms'] = item['dbms'] or dbms
+    return found
+
+
+class _Recorder:
+    """Forwards lines to the bulk run's log and keeps them, without `prefix`, for parse_injections()."""
+
+    def __init__(self, log, prefix):
+        self.log = log
+        self.prefix = prefix
+        self.lines = []
+
+    def put(self, line):
+        self.log.put(line)
+        self.lines.append(line[len(self.prefix):] if line.startswith(self.prefix) else line)
+
+
+class BulkScan(runtime.batch.FanOutRun):
+    """One sqlmap command run against the unique endpoints of a target list."""
+    kind = 'Bulk sqlmap'
+    end_marker = '---SCAN_COMPLETE---'
+
+    def __init__(self, scan_id, argv, endpoints, concurrency, backend, skipped=0, rejected=()):
+        super().__init__(scan_id, concurrency)
+        self.argv = prepare_command(argv)
+        self.backend = backend
+        self.options = api_backend.to_options(self.argv) if backend == 'api' else None
+        self.skipped = skipped
+        self.rejected = list(rejected)
+        self.tasks = {} # endpoint index -> running api_backend.ApiTask
+        for endpoint in endpoints:
+            self.add_entry(**endpoint, injectable=[], session=self._session(endpoint))
+
+    @property
+    def endpoints(self):
+        return self.entries
+
+    @staticmethod
+    def _session(endpoint):
+        """Session folder name of an endpoint: its host and port, and a digest of its key."""
+        host = api_backend.target_key({'url': endpoint['endpoint']}) or 'unknown'
+        return f"{host}_{hashlib.sha1(repr(endpoint['key']).encode()).hexdigest()[:10]}"
+
+    def _session_dir(self, entry):
+        return os.path.abspath(os.path.join(api_backend.SESSIONS_FOLDER, entry['session']))
+
+    def command(self, entry):
+        target = ['-u', entry['source']] if entry['kind'] == 'url' else ['-r', entry['source']]
+        return self.argv + target + ['--batch', '--output-dir', self._session_dir(entry)]
+
+    def prefix(self, entry):
+        return f"[#{entry['index']} {entry['method']} {entry['endpoint']}] "
+
+    def before_run(self, processes):
+        duplicates = sum(len(entry['duplicates']) for entry in self.endpoints)
+        self.log.put(f"Bulk sqlmap ({self.backend} backend): {len(self.endpoints)} unique endpoint(s), {self.concurrency} at a time; "
+                     f"{duplicates} duplicate(s) and {self.skipped} target(s) without parameters skipped"
+                     f"{f', {len(self.rejected)} file(s) not read' if self.rejected else ''}\n")
+        for name, reason in self.rejected:
+            self.log.put(f"Skipped {name}: {reason}\n")
+
+    def hold(self, entry, prefix):
+        return api_backend.hold_session(entry['session'], self.log, prefix)
+
+    def run_entry(self, entry, processes, prefix):
+        if self.backend == 'api':
+            return self._run_task(entry, prefix)
+        return self._run_process(entry, prefix, processes)
+
+    def _run_process(self, entry, prefix, processes):
+        command = self.command(entry)
+        self.log.put(f"{prefix}$ {shlex.join(command)}\n")
+        recorder = _Recorder(self.log, prefix)
+        code = run_process(command, recorder, prefix=prefix, processes=processes, job_id=entry['job_id'],
+                           cancelled=self.cancelled)
+        entry['injectable'] = parse_injections(recorder.lines)
+        if code is None:
+            entry['error'] = 'sqlmap could not be started'
+        return code
+
+    def _run_task(self, entry, prefix):
+        options = dict(self.options, **({'url': entry['source']} if entry['kind'] == 'url' else {'requestFile': entry['source']}))
+        options['outputDir'] = self._session_dir(entry)
+        task = api_backend.ApiTask(options, self.log, prefix=prefix, session=entry['session'])
+        self.tasks[entry['index']] = task
+        try:
+            return task.run(self.cancelled)
+        finally:
+            self.tasks.pop(entry['index'], None)
+            entry['injectable'] = task.injections()
+
+    def entry_summary(self, entry):
+        found = ', '.join(f"{item['place']} {item['parameter']}" for item in entry['injectable'])
+        return (f": {'injectable: ' + found if found else 'nothing injectable found'}"
+                f"{', ' + entry['error'] if entry['error'] else ''}")
+
+    def summary(self):
+        counts = self.counts()
+        rows = self.injectable()
+        lines = [f"Bulk sqlmap finished: {counts['completed']} completed, {counts['failed']} failed, "
+                 f"{counts['cancelled']} cancelled; {len(rows)} injectable parameter(s) "
+                 f"on {len({row['endpoint'] for row in rows})} endpoint(s)."]
+        lines.extend(f"  {row['method']} {row['endpoint']}  {row['place']} parameter '{row['parameter']}'"
+                     f"  {row['dbms'] or ''}  {'; '.join(row['techniques'])}" for row in rows)
+        return '\n'.join(lines)
+
+    def cancel(self, processes):
+        super().cancel(processes)
+        for task in list(self.tasks.values()):
+            task.cancel()
+
+    def injectable(self):
+        """The consolidated table: one row per injectable parameter of every endpoint."""
+        return [{'endpoint': entry['endpoint'], 'method': entry['method'], 'source': entry['source'], **item}
+                for entry in self.endpoints for item in entry['injectable']]
+
+    def describe(self):
+        return dict(self.describe_run(), scan_id=self.id, backend=self.backend,
+                    duplicates=sum(len(entry['duplicates']) for entry in self.endpoints),
+                    skipped_without_parameters=self.skipped,
+                    rejected_files=[{'file': name, 'reason': reason} for name, reason in self.rejected],
+                    injectable=self.injectable(),
+                    endpoints=[{key: value for key, value in entry.items() if key != 'key'} for entry in self.endpoints])
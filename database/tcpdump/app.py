@@ -7,11 +7,14 @@ import threading
 import queue
 import time
 import uuid # For unique filenames
-import shutil # Added for shutil.which
 import sys # To detect OS and get command-line arguments
 
 app = Flask(__name__)
 
+# Shared runtime (metrics, debug endpoints) lives at the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import runtime
+
 # Directory to store temporary files (e.g., uploaded target lists, scan outputs)
 UPLOAD_FOLDER = 'uploads'
 if not os.path.exists(UPLOAD_FOLDER):
@@ -19,28 +22,14 @@ if not os.path.exists(UPLOAD_FOLDER):
 
 # In-memory storage for scan outputs (for demonstration).
 # In a real-world app, consider a more persistent and scalable solution (e.g., database, cloud storage).
-scan_outputs = {}
+scan_outputs = runtime.JobOutputs()
 scan_processes = {} # To keep track of running tcpdump processes
 scan_queues = {} # To store queues for real-time output
 
-# Load examples from tcpdump_examples.txt
-def load_examples(filename="tcpdump_examples.txt"):
-    """Loads tcpdump examples from a JSON file."""
-    try:
-        filepath = os.path.join(os.path.dirname(__file__), filename)
-        with open(filepath, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"Error: Examples file '{filename}' not found. Please ensure it's in the same directory as app.py.")
-        return []
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from '{filename}': {e}")
-        return []
-    except Exception as e:
-        print(f"An unexpected error occurred while loading examples: {e}")
-        return []
+runtime.init_app(app, upload_folder=UPLOAD_FOLDER, outputs=scan_outputs, processes=scan_processes, queues=scan_queues, tools=['tcpdump'])
 
-ALL_EXAMPLES = load_examples()
+# Examples from tcpdump_examples.txt, parsed once and again only when the file changes
+EXAMPLES = runtime.ExamplesIndex(app, "tcpdump_examples.txt")
 
 @app.route('/')
 def index():
@@ -51,137 +40,81 @@ def index():
 @app.route('/get_examples', methods=['GET'])
 def get_examples():
     """Returns the tcpdump examples as JSON."""
-    return jsonify(ALL_EXAMPLES)
+    return EXAMPLES.serve()
+
+# tcpdump's options by UI tab; /generate_command builds commands from this spec and /command_spec serves it to the UI
+TCPDUMP_COMMAND = runtime.CommandSpec(app, 'tcpdump', {
+    'Basic Options': [
+        runtime.Value('-i', 'interface_entry'),
+        runtime.Switch('-n', 'no_name_resolution_var'),
+        runtime.Switch('-nn', 'no_port_name_resolution_var'),
+        runtime.Switch('-v', 'verbose_var'),
+        runtime.Switch('-vv', 'more_verbose_var'),
+        runtime.Switch('-vvv', 'most_verbose_var'),
+        runtime.Switch('-e', 'ethernet_header_var'),
+        runtime.Switch('-x', 'hex_dump_var'),
+        runtime.Switch('-xx', 'hex_dump_ether_var'),
+        runtime.Switch('-A', 'ascii_dump_var'),
+        runtime.Switch('-X', 'hex_ascii_dump_var'),
+        runtime.Switch('-XX', 'hex_ascii_dump_ether_var'),
+        runtime.Switch('-q', 'quick_output_var'),
+        runtime.Switch('-t', 'no_timestamp_var', conflicts='timestamp format'),
+        runtime.Switch('-tt', 'micro_timestamp_var', conflicts='timestamp format'),
+        runtime.Switch('-ttt', 'delta_timestamp_var', conflicts='timestamp format'),
+        runtime.Switch('-tttt', 'date_timestamp_var', conflicts='timestamp format'),
+        runtime.Switch('-ttttt', 'boot_timestamp_var', conflicts='timestamp format'),
+        runtime.Value('-c', 'packet_count_entry', type='int'),
+        runtime.Switch('-l', 'line_buffered_var'),
+        runtime.Switch('-p', 'no_promiscuous_var'),
+        runtime.Switch('-L', 'list_interfaces_var'),
+    ],
+    'Filtering': [
+        runtime.Filter('host_value_entry', primitive='host', direction_key='host_type_select'),
+        runtime.Filter('port_value_entry', primitive='port', direction_key='port_type_select'),
+        runtime.Filter('protocol_select'),
+        runtime.Filter('net_value_entry', primitive='net', direction_key='net_type_select'),
+        runtime.Filter('arp_var', primitive='arp'),
+        runtime.Filter('icmp_var', primitive='icmp'),
+        runtime.Filter('tcp_var', primitive='tcp'),
+        runtime.Filter('udp_var', primitive='udp'),
+        runtime.Filter('ip_var', primitive='ip'),
+        runtime.Filter('vlan_var', primitive='vlan'),
+        runtime.Filter('broadcast_var', primitive='broadcast'),
+        runtime.Filter('multicast_var', primitive='multicast'),
+        runtime.Filter('gateway_var', primitive='gateway'),
+        runtime.Filter('expression_entry'),
+    ],
+    'File Operations': [
+        runtime.Value('-r', 'read_file_entry'),
+        runtime.Value('-w', 'write_file_entry'),
+        runtime.Value('-C', 'file_size_rotate_entry', type='int'),
+        runtime.Value('-W', 'file_count_rotate_entry', type='int'),
+        runtime.Switch('-G', 'rotate_time_var'),
+        runtime.Value('-G', 'rotate_time_entry', type='int'),
+        runtime.Switch('-K', 'dont_checksum_var'),
+        runtime.Switch('-E', 'decrypt_ipsec_var'),
+        runtime.Value('-z', 'compress_file_entry'),
+    ],
+    'Advanced Options': [
+        runtime.Value('-s', 'snaplen_entry', type='int'),
+        runtime.Value('-B', 'buffer_size_entry', type='int'),
+        runtime.Switch('-P', 'promiscuous_var'),
+        runtime.Switch('-F', 'filter_file_var'),
+        runtime.Value('-F', 'filter_file_entry'),
+        runtime.Switch('-y', 'data_link_type_var'),
+        runtime.Value('-y', 'data_link_type_entry'),
+        runtime.Switch('-D', 'list_interfaces_adv_var'),
+        runtime.Switch('--time-stamp-precision', 'timestamp_precision_var', since='4.6.0'),
+        runtime.Value('--time-stamp-precision', 'timestamp_precision_entry', since='4.6.0'),
+        runtime.Extra('additional_args_entry'),
+    ],
+})
 
 @app.route('/generate_command', methods=['POST'])
 def generate_command():
     """Generates the tcpdump command based on form data."""
-    data = request.json
-    command_parts = ["tcpdump"]
-
-    def add_arg(arg_name, value):
-        if value:
-            command_parts.append(arg_name)
-            command_parts.append(shlex.quote(str(value)))
-
-    def add_checkbox_arg(arg_name, value):
-        if value:
-            command_parts.append(arg_name)
-
-    # Basic Options Tab
-    add_arg("-i", data.get('interface_entry'))
-    add_checkbox_arg("-n", data.get('no_name_resolution_var'))
-    add_checkbox_arg("-nn", data.get('no_port_name_resolution_var'))
-    add_checkbox_arg("-v", data.get('verbose_var'))
-    add_checkbox_arg("-vv", data.get('more_verbose_var'))
-    add_checkbox_arg("-vvv", data.get('most_verbose_var'))
-    add_checkbox_arg("-e", data.get('ethernet_header_var'))
-    add_checkbox_arg("-x", data.get('hex_dump_var'))
-    add_checkbox_arg("-xx", data.get('hex_dump_ether_var'))
-    add_checkbox_arg("-A", data.get('ascii_dump_var'))
-    add_checkbox_arg("-X", data.get('hex_ascii_dump_var'))
-    add_checkbox_arg("-XX", data.get('hex_ascii_dump_ether_var'))
-    add_checkbox_arg("-q", data.get('quick_output_var'))
-    add_checkbox_arg("-t", data.get('no_timestamp_var'))
-    add_checkbox_arg("-tt", data.get('micro_timestamp_var'))
-    add_checkbox_arg("-ttt", data.get('delta_timestamp_var'))
-    add_checkbox_arg("-tttt", data.get('date_timestamp_var'))
-    add_checkbox_arg("-ttttt", data.get('boot_timestamp_var'))
-    add_arg("-c", data.get('packet_count_entry'))
-    add_checkbox_arg("-l", data.get('line_buffered_var'))
-    add_checkbox_arg("-p", data.get('no_promiscuous_var'))
-    add_checkbox_arg("-L", data.get('list_interfaces_var'))
-
-    # Filtering Tab
-    # Host filter
-    host_type = data.get('host_type_select')
-    host_value = data.get('host_value_entry')
-    if host_value:
-        if host_type == 'src':
-            command_parts.append("src")
-        elif host_type == 'dst':
-            command_parts.append("dst")
-        command_parts.append("host")
-        command_parts.append(shlex.quote(host_value))
-
-    # Port filter
-    port_type = data.get('port_type_select')
-    port_value = data.get('port_value_entry')
-    if port_value:
-        if port_type == 'src':
-            command_parts.append("src")
-        elif port_type == 'dst':
-            command_parts.append("dst")
-        command_parts.append("port")
-        command_parts.append(shlex.quote(port_value))
-
-    # Protocol filter
-    protocol_value = data.get('protocol_select')
-    if protocol_value:
-        command_parts.append(shlex.quote(protocol_value))
-    
-    # Network filter
-    net_type = data.get('net_type_select')
-    net_value = data.get('net_value_entry')
-    if net_value:
-        if net_type == 'src':
-            command_parts.append("src")
-        elif net_type == 'dst':
-            command_parts.append("dst")
-        command_parts.append("net")
-        command_parts.append(shlex.quote(net_value))
-
-    # Other common filters
-    add_checkbox_arg("arp", data.get('arp_var'))
-    add_checkbox_arg("icmp", data.get('icmp_var'))
-    add_checkbox_arg("tcp", data.get('tcp_var'))
-    add_checkbox_arg("udp", data.get('udp_var'))
-    add_checkbox_arg("ip", data.get('ip_var'))
-    add_checkbox_arg("vlan", data.get('vlan_var'))
-    add_checkbox_arg("broadcast", data.get('broadcast_var'))
-    add_checkbox_arg("multicast", data.get('multicast_var'))
-    add_checkbox_arg("gateway", data.get('gateway_var'))
-    
-    # Expression
-    expression = data.get('expression_entry')
-    if expression:
-        command_parts.append(shlex.quote(expression))
-
-    # File Operations Tab
-    add_arg("-r", data.get('read_file_entry'))
-    add_arg("-w", data.get('write_file_entry'))
-    add_arg("-C", data.get('file_size_rotate_entry'))
-    add_arg("-W", data.get('file_count_rotate_entry'))
-    add_checkbox_arg("-G", data.get('rotate_time_var'))
-    add_arg("-G", data.get('rotate_time_entry')) # This will add -G again if rotate_time_var is false but entry has value
-    add_checkbox_arg("-K", data.get('dont_checksum_var'))
-    add_checkbox_arg("-E", data.get('decrypt_ipsec_var'))
-    add_arg("-z", data.get('compress_file_entry'))
-
-    # Advanced Options Tab
-    add_arg("-s", data.get('snaplen_entry'))
-    add_arg("-B", data.get('buffer_size_entry'))
-    add_checkbox_arg("-P", data.get('promiscuous_var'))
-    add_checkbox_arg("-F", data.get('filter_file_var'))
-    add_arg("-F", data.get('filter_file_entry')) # This will add -F again if filter_file_var is false but entry has value
-    add_checkbox_arg("-y", data.get('data_link_type_var'))
-    add_arg("-y", data.get('data_link_type_entry')) # This will add -y again if data_link_type_var is false but entry has value
-    add_checkbox_arg("-D", data.get('list_interfaces_adv_var')) # Redundant with -L but kept for clarity
-    add_checkbox_arg("--time-stamp-precision", data.get('timestamp_precision_var'))
-    add_arg("--time-stamp-precision", data.get('timestamp_precision_entry')) # This will add --time-stamp-precision again if timestamp_precision_var is false but entry has value
-
-
-    additional_args = data.get('additional_args_entry', '').strip()
-    if additional_args:
-        try:
-            split_args = shlex.split(additional_args)
-            command_parts.extend(split_args)
-        except ValueError:
-            # Fallback if shlex can't parse, just add as a single string (less safe)
-            command_parts.append(shlex.quote(additional_args))
-
-    generated_cmd = " ".join(command_parts)
-    return jsonify({'command': generated_cmd})
+    command, warnings = TCPDUMP_COMMAND.build(request.json)
+    return jsonify({'command': command, 'warnings': warnings})
 
 @app.route('/run_tcpdump', methods=['POST'])
 def run_tcpdump():
@@ -214,13 +147,13 @@ def run_tcpdump():
         return jsonify({'status': 'error', 'message': 'Only tcpdump commands are allowed.'}), 403
 
     # Check if tcpdump executable exists. Add sudo if needed and available.
-    tcpdump_path = shutil.which(command[0])
+    tcpdump_path = runtime.which(command[0])
     if tcpdump_path is None:
         return jsonify({'status': 'error', 'message': f"tcpdump executable '{command[0]}' not found on the server. Please ensure tcpdump is installed and accessible in the system's PATH."}), 500
     
     # Check if sudo is available and prepend if tcpdump is not directly executable by current user
     # This is a heuristic and might not be perfect for all setups.
-    if os.geteuid() != 0 and shutil.which('sudo'): # Check if not root and sudo exists
+    if os.geteuid() != 0 and runtime.which('sudo'): # Check if not root and sudo exists
         # Check if tcpdump requires root (e.g., cannot open device)
         # A more robust check would involve trying to run a simple tcpdump command
         # and checking for permission errors, but that adds complexity.
@@ -230,12 +163,11 @@ def run_tcpdump():
 
 
     # Create a new queue for this scan's real-time output
-    output_queue = queue.Queue()
+    output_queue = runtime.OutputLog()
     scan_queues[scan_id] = output_queue
-    scan_outputs[scan_id] = "" # Initialize full output storage
+    scan_outputs[scan_id] = output_queue # The log is the stored output (see runtime.JobOutputs)
 
     def _run_tcpdump_thread(cmd, q, scan_id_val):
-        full_output_buffer = []
         try:
             process = subprocess.Popen(
                 cmd,
@@ -249,7 +181,6 @@ def run_tcpdump():
 
             for line in iter(process.stdout.readline, ''):
                 q.put(line) # Put each line into the queue
-                full_output_buffer.append(line) # Also append to buffer for final output
 
             process.wait()
             return_code = process.returncode
@@ -258,17 +189,12 @@ def run_tcpdump():
             final_status_line += f"STATUS: {'Completed' if return_code == 0 else 'Failed'}\n"
             q.put(final_status_line) # Add final status to queue
 
-            full_output_buffer.append(final_status_line)
-            scan_outputs[scan_id_val] = "".join(full_output_buffer) # Store complete output
-
         except FileNotFoundError:
             error_msg = f"Error: '{cmd[0]}' command not found. Make sure tcpdump is installed and in your system's PATH.\nSTATUS: Error\n"
             q.put(error_msg)
-            scan_outputs[scan_id_val] = error_msg
         except Exception as e:
             error_msg = f"An unexpected error occurred: {e}\nSTATUS: Error\n"
             q.put(error_msg)
-            scan_outputs[scan_id_val] = error_msg
         finally:
             if scan_id_val in scan_processes:
                 del scan_processes[scan_id_val]
@@ -388,7 +314,7 @@ def install_tcpdump():
     if sys.platform.startswith('linux'):
         scan_id = str(uuid.uuid4()) # Unique ID for this installation process
         full_output = []
-        output_queue = queue.Queue()
+        output_queue = runtime.OutputLog()
         scan_queues[scan_id] = output_queue
         scan_outputs[scan_id] = "" # Initialize full output storage for this ID
 
@@ -401,15 +327,15 @@ def install_tcpdump():
                     q.put("Detected Termux. Using 'pkg' for installation.\n")
                 elif p_type == 'linux':
                     # Check for apt, then yum, then dnf
-                    if shutil.which('apt'):
+                    if runtime.which('apt'):
                         update_command = shlex.split("sudo apt update -y")
                         install_command = shlex.split("sudo apt install tcpdump -y")
                         q.put("Detected Linux (apt). Using 'sudo apt' for installation.\n")
-                    elif shutil.which('yum'):
+                    elif runtime.which('yum'):
                         update_command = shlex.split("sudo yum check-update -y") # yum update is interactive
                         install_command = shlex.split("sudo yum install tcpdump -y")
                         q.put("Detected Linux (yum). Using 'sudo yum' for installation.\n")
-                    elif shutil.which('dnf'):
+                    elif runtime.which('dnf'):
                         update_command = shlex.split("sudo dnf check-update -y") # dnf update is interactive
                         install_command = shlex.split("sudo dnf install tcpdump -y")
                         q.put("Detected Linux (dnf). Using 'sudo dnf' for installation.\n")
@@ -7,11 +7,14 @@ import threading
 import queue
 import time
 import uuid # For unique filenames
-import shutil # Added for shutil.which
 import sys # To detect OS and get command-line arguments
 
 app = Flask(__name__)
 
+# Shared runtime (metrics, debug endpoints) lives at the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import runtime
+
 # Directory to store temporary files (e.g., uploaded target lists, scan outputs)
 UPLOAD_FOLDER = 'wafw00f_uploads'
 if not os.path.exists(UPLOAD_FOLDER):
@@ -19,29 +22,14 @@ if not os.path.exists(UPLOAD_FOLDER):
 
 # In-memory storage for scan outputs (for demonstration).
 # In a real-world app, consider a more persistent and scalable solution (e.g., database, cloud storage).
-wafw00f_outputs = {}
+wafw00f_outputs = runtime.JobOutputs()
 wafw00f_processes = {} # To keep track of running wafw00f processes
 wafw00f_queues = {} # To store queues for real-time output
 
-# Load examples from wafw00f_examples.txt
-def load_examples(filename="wafw00f_examples.txt"):
-    """Loads examples from a JSON file."""
-    try:
-        # Assuming wafw00f_examples.txt is in the same directory as app.py
-        filepath = os.path.join(os.path.dirname(__file__), filename)
-        with open(filepath, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"Error: Examples file '{filename}' not found. Please ensure it's in the same directory as app.py.")
-        return []
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from '{filename}': {e}")
-        return []
-    except Exception as e:
-        print(f"An unexpected error occurred while loading examples: {e}")
-        return []
+runtime.init_app(app, upload_folder=UPLOAD_FOLDER, outputs=wafw00f_outputs, processes=wafw00f_processes, queues=wafw00f_queues, tools=['wafw00f'])
 
-ALL_EXAMPLES = load_examples()
+# Examples from wafw00f_examples.txt, parsed once and again only when the file changes
+EXAMPLES = runtime.ExamplesIndex(app, "wafw00f_examples.txt")
 
 @app.route('/')
 def index():
@@ -52,7 +40,7 @@ def index():
 @app.route('/get_examples', methods=['GET'])
 def get_examples():
     """Returns the Wafw00f examples as JSON."""
-    return jsonify(ALL_EXAMPLES)
+    return EXAMPLES.serve()
 
 @app.route('/generate_command', methods=['POST'])
 def generate_command():
@@ -143,17 +131,16 @@ def run_wafw00f():
     if command[0] != 'wafw00f':
         return jsonify({'status': 'error', 'message': 'Only wafw00f commands are allowed.'}), 403
 
-    # Check if wafw00f executable exists using shutil.which
-    if shutil.which(command[0]) is None:
+    # Check if wafw00f executable exists using runtime.which
+    if runtime.which(command[0]) is None:
         return jsonify({'status': 'error', 'message': f"wafw00f executable '{command[0]}' not found on the server. Please ensure wafw00f is installed and accessible in the system's PATH."}), 500
 
     # Create a new queue for this scan's real-time output
-    output_queue = queue.Queue()
+    output_queue = runtime.OutputLog()
     wafw00f_queues[scan_id] = output_queue
-    wafw00f_outputs[scan_id] = "" # Initialize full output storage
+    wafw00f_outputs[scan_id] = output_queue # The log is the stored output (see runtime.JobOutputs)
 
     def _run_wafw00f_thread(cmd, q, scan_id_val):
-        full_output_buffer = []
         try:
             process = subprocess.Popen(
                 cmd,
@@ -167,7 +154,6 @@ def run_wafw00f():
 
             for line in iter(process.stdout.readline, ''):
                 q.put(line) # Put each line into the queue
-                full_output_buffer.append(line) # Also append to buffer for final output
 
             process.wait()
             return_code = process.returncode
@@ -176,17 +162,12 @@ def run_wafw00f():
             final_status_line += f"STATUS: {'Completed' if return_code == 0 else 'Failed'}\n"
             q.put(final_status_line) # Add final status to queue
 
-            full_output_buffer.append(final_status_line)
-            wafw00f_outputs[scan_id_val] = "".join(full_output_buffer) # Store complete output
-
         except FileNotFoundError:
             error_msg = f"Error: '{cmd[0]}' command not found. Make sure wafw00f is installed and in your system's PATH.\nSTATUS: Error\n"
             q.put(error_msg)
-            wafw00f_outputs[scan_id_val] = error_msg
         except Exception as e:
             error_msg = f"An unexpected error occurred: {e}\nSTATUS: Error\n"
             q.put(error_msg)
-            wafw00f_outputs[scan_id_val] = error_msg
         finally:
             if scan_id_val in wafw00f_processes:
                 del wafw00f_processes[scan_id_val]
@@ -306,7 +287,7 @@ def install_wafw00f():
     if sys.platform.startswith('linux'):
         scan_id = str(uuid.uuid4()) # Unique ID for this installation process
         full_output = []
-        output_queue = queue.Queue()
+        output_queue = runtime.OutputLog()
         wafw00f_queues[scan_id] = output_queue
         wafw00f_outputs[scan_id] = "" # Initialize full output storage for this ID
 
@@ -2,16 +2,22 @@ import os
 import subprocess
 import shlex
 import json
+import sqlite3
 from flask import Flask, render_template, request, jsonify, send_file
 import threading
 import queue
 import time
 import uuid # For unique filenames
-import shutil # Added for shutil.which
 import sys # To detect OS and get command-line arguments
 
 app = Flask(__name__)
 
+# Shared runtime (metrics, debug endpoints) lives at the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import multisite
+import runtime
+import vuln_cache
+
 # Directory to store temporary files (e.g., uploaded target lists, scan outputs)
 UPLOAD_FOLDER = 'uploads'
 if not os.path.exists(UPLOAD_FOLDER):
@@ -19,29 +25,21 @@ if not os.path.exists(UPLOAD_FOLDER):
 
 # In-memory storage for scan outputs (for demonstration).
 # In a real-world app, consider a more persistent and scalable solution (e.g., database, cloud storage).
-scan_outputs = {}
+scan_outputs = runtime.JobOutputs()
 scan_processes = {} # To keep track of running WPScan processes
 scan_queues = {} # To store queues for real-time output
 
-# Load examples from wpscan_examples.txt
-def load_examples(filename="wpscan_examples.txt"):
-    """Loads examples from a JSON file."""
-    try:
-        # Assuming wpscan_examples.txt is in the same directory as app.py
-        filepath = os.path.join(os.path.dirname(__file__), filename)
-        with open(filepath, 'r') as f:
-            return json.load(f)
-    except FileNotFoundError:
-        print(f"Error: Examples file '{filename}' not found. Please ensure it's in the same directory as app.py.")
-        return []
-    except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from '{filename}': {e}")
-        return []
-    except Exception as e:
-        print(f"An unexpected error occurred while loading examples: {e}")
-        return []
+runtime.init_app(app, upload_folder=UPLOAD_FOLDER, outputs=scan_outputs, processes=scan_processes, queues=scan_queues, tools=['wpscan'])
+
+MAX_KEPT_MULTISITE_SCANS = 10
+# scan_id -> multisite.MultiSiteScan, for /wpscan/<id>/sites
+multisite_scans = runtime.batch.RunTable(MAX_KEPT_MULTISITE_SCANS, scan_processes, scan_queues, scan_outputs)
+
+# Vulnerability lookups of multi-site runs, shared by all of them (see vuln_cache.py)
+VULN_CACHE = vuln_cache.VulnCache()
 
-ALL_EXAMPLES = load_examples()
+# Examples from wpscan_examples.txt, parsed once and again only when the file changes
+EXAMPLES = runtime.ExamplesIndex(app, "wpscan_examples.txt")
 
 @app.route('/')
 def index():
@@ -54,153 +52,116 @@ def index():
 @app.route('/get_examples', methods=['GET'])
 def get_examples():
     """Returns the WPScan examples as JSON."""
-    return jsonify(ALL_EXAMPLES)
+    return EXAMPLES.serve()
+
+# wpscan's options by UI tab; /generate_command builds commands from this spec and /command_spec serves it to the UI
+WPSCAN_COMMAND = runtime.CommandSpec(app, 'wpscan', {
+    'Target': [
+        runtime.Value('--url', 'target_url_entry'),
+        runtime.Switch('--random-agent', 'random_agent_var'),
+        runtime.Value('--user-agent', 'user_agent_entry'),
+        runtime.Value('--proxy', 'proxy_entry'),
+        runtime.Value('--proxy-auth', 'proxy_auth_entry'),
+        runtime.Value('--cookie', 'cookie_entry'),
+        runtime.Value('--cookie-string', 'cookie_string_entry'),
+        runtime.Lines('--headers', 'headers_entry'),
+        runtime.Switch('--ignore-main-redirect', 'ignore_main_redirect_var'),
+        runtime.Switch('--follow-redirects', 'follow_redirects_var'),
+        runtime.Switch('--force', 'force_var'),
+    ],
+    'Enumeration': [
+        runtime.Combined('--enumerate', [
+            ('enumerate_users_var', 'u'),
+            ('enumerate_plugins_var', 'p'),
+            ('enumerate_themes_var', 't'),
+            ('enumerate_timthumb_var', 'tt'),
+            ('enumerate_media_var', 'm'),
+            ('enumerate_config_backups_var', 'cb'),
+            ('enumerate_db_exports_var', 'dbe'),
+            ('enumerate_uploads_var', 'uploads'),
+        ], select='enumerate_profile_select', choices=('v', 'vp', 'vt', 'ap', 'at', 'e')),
+        runtime.Value('--exclude-content-based', 'exclude_content_based_entry'),
+        runtime.Value('--exclude-status-code', 'exclude_status_code_entry'),
+    ],
+    'Vulnerability Detection': [
+        runtime.Value('--api-token', 'api_token_entry'),
+        runtime.Switch('--wp-version-detection', 'wp_version_detection_var'),
+        runtime.Switch('--plugins-detection', 'plugins_detection_var'),
+        runtime.Switch('--themes-detection', 'themes_detection_var'),
+        runtime.Switch('--latest-versions', 'latest_versions_var'),
+    ],
+    'Bruteforce': [
+        runtime.Value('--passwords', 'passwords_entry'),
+        runtime.Value('--passwords-file', 'passwords_file_entry'),
+        runtime.Value('--usernames', 'usernames_entry'),
+        runtime.Value('--usernames-file', 'usernames_file_entry'),
+    ],
+    'Timing/Performance': [
+        runtime.Value('--request-timeout', 'request_timeout_entry', type='int'),
+        runtime.Value('--connect-timeout', 'connect_timeout_entry', type='int'),
+        runtime.Value('--max-threads', 'max_threads_entry', type='int'),
+        runtime.Value('--batch-size', 'batch_size_entry'),
+        runtime.Value('--throttle', 'throttle_entry', type='int'),
+    ],
+    'Output': [
+        runtime.Value('--log-file', 'log_file_entry'),
+        runtime.Value('--format', 'format_select'),
+        runtime.Switch('--no-color', 'no_color_var'),
+        runtime.Switch('--no-banner', 'no_banner_var'),
+        runtime.Switch('--no-progress-bar', 'no_progress_bar_var'),
+        runtime.Switch('--verbose', 'verbose_var'),
+        runtime.Switch('--debug', 'debug_var'),
+    ],
+    'Advanced': [
+        runtime.Value('--url-detection', 'url_detection_select'),
+        runtime.Value('--scope', 'scope_entry'),
+        runtime.Value('--exclude-pattern', 'exclude_pattern_entry'),
+        runtime.Value('--include-pattern', 'include_pattern_entry'),
+        runtime.Value('--max-scan-duration', 'max_scan_duration_entry'),
+        runtime.Value('--max-scan-retries', 'max_scan_retries_entry'),
+        runtime.Value('--scan-timeout', 'scan_timeout_entry'),
+        runtime.Value('--user-agent-file', 'user_agent_file_entry'),
+        runtime.Switch('--random-user-agent', 'random_user_agent_var'),
+        runtime.Value('--plugins-file', 'plugins_file_entry'),
+        runtime.Value('--themes-file', 'themes_file_entry'),
+        runtime.Value('--ignore-vulnerable-regex', 'ignore_vulnerable_regex_entry'),
+        runtime.Value('--ignore-vulnerable-slug', 'ignore_vulnerable_slug_entry'),
+        runtime.Value('--ignore-vulnerable-version', 'ignore_vulnerable_version_entry'),
+        runtime.Value('--ignore-vulnerable-status', 'ignore_vulnerable_status_entry'),
+        runtime.Value('--ignore-vulnerable-type', 'ignore_vulnerable_type_entry'),
+        runtime.Value('--ignore-vulnerable-severity', 'ignore_vulnerable_severity_entry'),
+        runtime.Value('--ignore-vulnerable-cvss', 'ignore_vulnerable_cvss_entry'),
+        runtime.Value('--ignore-vulnerable-references', 'ignore_vulnerable_references_entry'),
+        runtime.Value('--ignore-vulnerable-patch', 'ignore_vulnerable_patch_entry'),
+        runtime.Value('--ignore-vulnerable-fix', 'ignore_vulnerable_fix_entry'),
+        runtime.Value('--ignore-vulnerable-date', 'ignore_vulnerable_date_entry'),
+        runtime.Value('--ignore-vulnerable-tags', 'ignore_vulnerable_tags_entry'),
+        runtime.Value('--ignore-vulnerable-notes', 'ignore_vulnerable_notes_entry'),
+        runtime.Value('--ignore-vulnerable-description', 'ignore_vulnerable_description_entry'),
+        runtime.Value('--ignore-vulnerable-title', 'ignore_vulnerable_title_entry'),
+        runtime.Value('--ignore-vulnerable-cve', 'ignore_vulnerable_cve_entry'),
+        runtime.Value('--ignore-vulnerable-exploit', 'ignore_vulnerable_exploit_entry'),
+        runtime.Value('--ignore-vulnerable-disclosure', 'ignore_vulnerable_disclosure_entry'),
+        runtime.Value('--ignore-vulnerable-references-url', 'ignore_vulnerable_references_url_entry'),
+        runtime.Value('--ignore-vulnerable-references-type', 'ignore_vulnerable_references_type_entry'),
+        runtime.Value('--ignore-vulnerable-references-id', 'ignore_vulnerable_references_id_entry'),
+        runtime.Value('--ignore-vulnerable-references-title', 'ignore_vulnerable_references_title_entry'),
+        runtime.Value('--ignore-vulnerable-references-date', 'ignore_vulnerable_references_date_entry'),
+        runtime.Value('--ignore-vulnerable-references-tags', 'ignore_vulnerable_references_tags_entry'),
+        runtime.Value('--ignore-vulnerable-references-notes', 'ignore_vulnerable_references_notes_entry'),
+        runtime.Value('--ignore-vulnerable-references-description', 'ignore_vulnerable_references_description_entry'),
+        runtime.Value('--ignore-vulnerable-references-cve', 'ignore_vulnerable_references_cve_entry'),
+        runtime.Value('--ignore-vulnerable-references-exploit', 'ignore_vulnerable_references_exploit_entry'),
+        runtime.Value('--ignore-vulnerable-references-disclosure', 'ignore_vulnerable_references_disclosure_entry'),
+        runtime.Extra('additional_args_entry'),
+    ],
+})
 
 @app.route('/generate_command', methods=['POST'])
 def generate_command():
     """Generates the WPScan command based on form data."""
-    data = request.json
-    command_parts = ["wpscan"]
-
-    def add_arg(arg_name, value):
-        if value:
-            command_parts.append(arg_name)
-            command_parts.append(shlex.quote(str(value)))
-
-    def add_checkbox_arg(arg_name, value):
-        if value:
-            command_parts.append(arg_name)
-
-    # Target Tab
-    if data.get('target_url_entry'):
-        command_parts.append(f"--url {shlex.quote(data['target_url_entry'])}")
-    add_checkbox_arg("--random-agent", data.get('random_agent_var'))
-    add_arg("--user-agent", data.get('user_agent_entry'))
-    add_arg("--proxy", data.get('proxy_entry'))
-    add_arg("--proxy-auth", data.get('proxy_auth_entry'))
-    add_arg("--cookie", data.get('cookie_entry'))
-    add_arg("--cookie-string", data.get('cookie_string_entry'))
-    
-    headers = data.get('headers_entry', '').strip()
-    if headers:
-        for header_line in headers.split('\n'):
-            header_line = header_line.strip()
-            if header_line:
-                command_parts.append("--headers")
-                command_parts.append(shlex.quote(header_line))
-
-    add_checkbox_arg("--ignore-main-redirect", data.get('ignore_main_redirect_var'))
-    add_checkbox_arg("--follow-redirects", data.get('follow_redirects_var'))
-    add_checkbox_arg("--force", data.get('force_var'))
-
-    # Enumeration Tab
-    enumerate_options = []
-    if data.get('enumerate_users_var'): enumerate_options.append("u")
-    if data.get('enumerate_plugins_var'): enumerate_options.append("p")
-    if data.get('enumerate_themes_var'): enumerate_options.append("t")
-    if data.get('enumerate_timthumb_var'): enumerate_options.append("tt")
-    if data.get('enumerate_media_var'): enumerate_options.append("m")
-    if data.get('enumerate_config_backups_var'): enumerate_options.append("cb")
-    if data.get('enumerate_db_exports_var'): enumerate_options.append("dbe")
-    if data.get('enumerate_uploads_var'): enumerate_options.append("uploads")
-    
-    enumerate_profile = data.get('enumerate_profile_select')
-    if enumerate_profile == 'v': enumerate_options.append("v")
-    elif enumerate_profile == 'vp': enumerate_options.append("vp")
-    elif enumerate_profile == 'vt': enumerate_options.append("vt")
-    elif enumerate_profile == 'ap': enumerate_options.append("ap")
-    elif enumerate_profile == 'at': enumerate_options.append("at")
-    elif enumerate_profile == 'e': enumerate_options.append("e")
-
-    if enumerate_options:
-        command_parts.append(f"--enumerate {','.join(enumerate_options)}")
-
-    add_arg("--exclude-content-based", data.get('exclude_content_based_entry'))
-    add_arg("--exclude-status-code", data.get('exclude_status_code_entry'))
-
-    # Vulnerability Detection Tab
-    if data.get('api_token_entry'):
-        command_parts.append(f"--api-token {shlex.quote(data['api_token_entry'])}")
-    add_checkbox_arg("--wp-version-detection", data.get('wp_version_detection_var'))
-    add_checkbox_arg("--plugins-detection", data.get('plugins_detection_var'))
-    add_checkbox_arg("--themes-detection", data.get('themes_detection_var'))
-    add_checkbox_arg("--latest-versions", data.get('latest_versions_var'))
-
-    # Bruteforce Tab
-    add_arg("--passwords", data.get('passwords_entry'))
-    add_arg("--passwords-file", data.get('passwords_file_entry'))
-    add_arg("--usernames", data.get('usernames_entry'))
-    add_arg("--usernames-file", data.get('usernames_file_entry'))
-
-    # Timing/Performance Tab
-    add_arg("--request-timeout", data.get('request_timeout_entry'))
-    add_arg("--connect-timeout", data.get('connect_timeout_entry'))
-    add_arg("--max-threads", data.get('max_threads_entry'))
-    add_arg("--batch-size", data.get('batch_size_entry'))
-    add_arg("--throttle", data.get('throttle_entry'))
-
-    # Output Tab
-    add_arg("--log-file", data.get('log_file_entry'))
-    add_arg("--format", data.get('format_select'))
-    add_checkbox_arg("--no-color", data.get('no_color_var'))
-    add_checkbox_arg("--no-banner", data.get('no_banner_var'))
-    add_checkbox_arg("--no-progress-bar", data.get('no_progress_bar_var'))
-    add_checkbox_arg("--verbose", data.get('verbose_var'))
-    add_checkbox_arg("--debug", data.get('debug_var'))
-
-    # Advanced Tab
-    add_arg("--url-detection", data.get('url_detection_select'))
-    add_arg("--scope", data.get('scope_entry'))
-    add_arg("--exclude-pattern", data.get('exclude_pattern_entry'))
-    add_arg("--include-pattern", data.get('include_pattern_entry'))
-    add_arg("--max-scan-duration", data.get('max_scan_duration_entry'))
-    add_arg("--max-scan-retries", data.get('max_scan_retries_entry'))
-    add_arg("--scan-timeout", data.get('scan_timeout_entry'))
-    add_arg("--user-agent-file", data.get('user_agent_file_entry'))
-    add_arg("--random-user-agent", data.get('random_user_agent_var'))
-    add_arg("--plugins-file", data.get('plugins_file_entry'))
-    add_arg("--themes-file", data.get('themes_file_entry'))
-    add_arg("--ignore-vulnerable-regex", data.get('ignore_vulnerable_regex_entry'))
-    add_arg("--ignore-vulnerable-slug", data.get('ignore_vulnerable_slug_entry'))
-    add_arg("--ignore-vulnerable-version", data.get('ignore_vulnerable_version_entry'))
-    add_arg("--ignore-vulnerable-status", data.get('ignore_vulnerable_status_entry'))
-    add_arg("--ignore-vulnerable-type", data.get('ignore_vulnerable_type_entry'))
-    add_arg("--ignore-vulnerable-severity", data.get('ignore_vulnerable_severity_entry'))
-    add_arg("--ignore-vulnerable-cvss", data.get('ignore_vulnerable_cvss_entry'))
-    add_arg("--ignore-vulnerable-references", data.get('ignore_vulnerable_references_entry'))
-    add_arg("--ignore-vulnerable-patch", data.get('ignore_vulnerable_patch_entry'))
-    add_arg("--ignore-vulnerable-fix", data.get('ignore_vulnerable_fix_entry'))
-    add_arg("--ignore-vulnerable-date", data.get('ignore_vulnerable_date_entry'))
-    add_arg("--ignore-vulnerable-tags", data.get('ignore_vulnerable_tags_entry'))
-    add_arg("--ignore-vulnerable-notes", data.get('ignore_vulnerable_notes_entry'))
-    add_arg("--ignore-vulnerable-description", data.get('ignore_vulnerable_description_entry'))
-    add_arg("--ignore-vulnerable-title", data.get('ignore_vulnerable_title_entry'))
-    add_arg("--ignore-vulnerable-cve", data.get('ignore_vulnerable_cve_entry'))
-    add_arg("--ignore-vulnerable-exploit", data.get('ignore_vulnerable_exploit_entry'))
-    add_arg("--ignore-vulnerable-disclosure", data.get('ignore_vulnerable_disclosure_entry'))
-    add_arg("--ignore-vulnerable-references-url", data.get('ignore_vulnerable_references_url_entry'))
-    add_arg("--ignore-vulnerable-references-type", data.get('ignore_vulnerable_references_type_entry'))
-    add_arg("--ignore-vulnerable-references-id", data.get('ignore_vulnerable_references_id_entry'))
-    add_arg("--ignore-vulnerable-references-title", data.get('ignore_vulnerable_references_title_entry'))
-    add_arg("--ignore-vulnerable-references-date", data.get('ignore_vulnerable_references_date_entry'))
-    add_arg("--ignore-vulnerable-references-tags", data.get('ignore_vulnerable_references_tags_entry'))
-    add_arg("--ignore-vulnerable-references-notes", data.get('ignore_vulnerable_references_notes_entry'))
-    add_arg("--ignore-vulnerable-references-description", data.get('ignore_vulnerable_references_description_entry'))
-    add_arg("--ignore-vulnerable-references-cve", data.get('ignore_vulnerable_references_cve_entry'))
-    add_arg("--ignore-vulnerable-references-exploit", data.get('ignore_vulnerable_references_exploit_entry'))
-    add_arg("--ignore-vulnerable-references-disclosure", data.get('ignore_vulnerable_references_disclosure_entry'))
-    
-    additional_args = data.get('additional_args_entry', '').strip()
-    if additional_args:
-        try:
-            split_args = shlex.split(additional_args)
-            command_parts.extend(split_args)
-        except ValueError:
-            # Fallback if shlex can't parse, just add as a single string (less safe)
-            command_parts.append(shlex.quote(additional_args))
-
-    generated_cmd = " ".join(command_parts)
-    return jsonify({'command': generated_cmd})
+    command, warnings = WPSCAN_COMMAND.build(request.json)
+    return jsonify({'command': command, 'warnings': warnings})
 
 @app.route('/run_wpscan', methods=['POST'])
 def run_wpscan():
@@ -231,18 +192,44 @@ def run_wpscan():
     if command[0] != 'wpscan':
         return jsonify({'status': 'error', 'message': 'Only WPScan commands are allowed.'}), 403
 
-    # Check if wpscan executable exists using shutil.which
-    if shutil.which(command[0]) is None:
+    # Check if wpscan executable exists using runtime.which
+    if runtime.which(command[0]) is None:
         return jsonify({'status': 'error', 'message': f"WPScan executable '{command[0]}' not found on the server. Please ensure WPScan is installed and accessible in the system's PATH."}), 500
 
+    # Multi-site mode: one database update, then every site through the shared limiter
+    if data.get('sites') or data.get('targets_list'):
+        try:
+            sites = runtime.batch.parse_targets(runtime.batch.request_target_text(data, 'sites'))
+        except FileNotFoundError:
+            return jsonify({'status': 'not_found', 'message': f"No target list named '{data['targets_list']}'."}), 404
+        except (OSError, ValueError) as e:
+            return jsonify({'status': 'error', 'message': f'Could not read the target list: {e}'}), 400
+        sites = [site for site in dict.fromkeys(sites) if not site.startswith('-')]
+        if not sites:
+            return jsonify({'status': 'error', 'message': 'Provide the sites to scan, one per line.'}), 400
+        if len(sites) > multisite.MAX_SITES:
+            return jsonify({'status': 'error', 'message': f'At most {multisite.MAX_SITES} sites per run.'}), 400
+        try:
+            concurrency = runtime.batch.request_concurrency(data, len(sites))
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        multisite_scans.start(multisite.MultiSiteScan(scan_id, command, sites, concurrency, data.get('update', True) is not False,
+                                                      UPLOAD_FOLDER, VULN_CACHE))
+        return jsonify({'status': 'running', 'scan_id': scan_id, 'multisite': True, 'total': len(sites),
+                        'concurrency': concurrency, 'message': f'WPScan of {len(sites)} site(s) started.'})
+
     # Create a new queue for this scan's real-time output
-    output_queue = queue.Queue()
+    output_queue = runtime.OutputLog()
     scan_queues[scan_id] = output_queue
-    scan_outputs[scan_id] = "" # Initialize full output storage
+    scan_outputs[scan_id] = output_queue # The log is the stored output (see runtime.JobOutputs)
 
     def _run_wpscan_thread(cmd, q, scan_id_val):
-        full_output_buffer = []
+        # Pace the tool to its share of the target host's request budget (runtime/ratelimit.py)
+        cmd, lease = runtime.ratelimit.throttle_command(cmd, q, cancelled=q.cancelled)
         try:
+            if q.cancelled.is_set(): # Stopped through /jobs/<id>/cancel while waiting for budget
+                q.put("Cancelled before the scan started.\nSTATUS: Cancelled\n")
+                return
             process = subprocess.Popen(
                 cmd,
                 stdout=subprocess.PIPE,
@@ -255,7 +242,6 @@ def run_wpscan():
 
             for line in iter(process.stdout.readline, ''):
                 q.put(line) # Put each line into the queue
-                full_output_buffer.append(line) # Also append to buffer for final output
 
             process.wait()
             return_code = process.returncode
@@ -264,20 +250,16 @@ def run_wpscan():
             final_status_line += f"STATUS: {'Completed' if return_code == 0 else 'Failed'}\n"
             q.put(final_status_line) # Add final status to queue
 
-            full_output_buffer.append(final_status_line)
-            scan_outputs[scan_id_val] = "".join(full_output_buffer) # Store complete output
-
         except FileNotFoundError:
             error_msg = f"Error: '{cmd[0]}' command not found. Make sure WPScan is installed and in your system's PATH.\nSTATUS: Error\n"
             q.put(error_msg)
-            scan_outputs[scan_id_val] = error_msg
         except Exception as e:
             error_msg = f"An unexpected error occurred: {e}\nSTATUS: Error\n"
             q.put(error_msg)
-            scan_outputs[scan_id_val] = error_msg
         finally:
             if scan_id_val in scan_processes:
                 del scan_processes[scan_id_val]
+            lease.release()
             # Signal end of output by putting a special marker
             q.put("---SCAN_COMPLETE---")
 
@@ -289,6 +271,47 @@ def run_wpscan():
 
     return jsonify({'status': 'running', 'scan_id': scan_id, 'message': 'WPScan scan started.'})
 
+@app.route('/wpscan/<scan_id>/sites', methods=['GET'])
+def get_wpscan_sites(scan_id):
+    """
+    The per-site results of a multi-site run: state, WordPress version, plugin and theme counts and
+    vulnerable components. ?vulnerable=1 keeps the sites with vulnerabilities; ?component=<slug> the
+    sites running a plugin or theme (or 'wordpress').
+    """
+    scan = multisite_scans.get(scan_id)
+    if scan is None:
+        return jsonify({'status': 'not_found', 'message': 'No multi-site scan with this ID.'}), 404
+    sites = scan.find(request.args.get('vulnerable') == '1', request.args.get('component') or None)
+    return jsonify(scan.describe(sites))
+
+@app.route('/wpscan/<scan_id>/sites/<int:index>', methods=['GET'])
+def get_wpscan_site(scan_id, index):
+    """One site of a multi-site run with its components and their vulnerabilities."""
+    scan = multisite_scans.get(scan_id)
+    if scan is None or not 0 <= index < len(scan.sites):
+        return jsonify({'status': 'not_found', 'message': 'No such site in a multi-site scan.'}), 404
+    return jsonify({key: value for key, value in scan.sites[index].items() if key != 'report_file'})
+
+@app.route('/wpscan/<scan_id>/cancel', methods=['POST'])
+def cancel_wpscan_sites(scan_id):
+    """Drops the queued sites of a multi-site run and stops the running ones."""
+    scan = multisite_scans.get(scan_id)
+    if scan is None:
+        return jsonify({'status': 'not_found', 'message': 'No multi-site scan with this ID.'}), 404
+    scan.cancel(scan_processes)
+    return jsonify({'status': 'success', 'message': 'Multi-site scan cancelled.', 'counts': scan.counts()})
+
+@app.route('/wpscan/vuln_cache', methods=['GET', 'DELETE'])
+def wpscan_vuln_cache():
+    """Size and hit counts of the vulnerability lookup cache; DELETE empties it."""
+    try:
+        if request.method == 'DELETE':
+            removed = VULN_CACHE.clear()
+            return jsonify({'status': 'success', 'message': f'{removed} cached lookup(s) removed.', 'removed': removed})
+        return jsonify(VULN_CACHE.describe())
+    except sqlite3.Error as e:
+        return jsonify({'status': 'error', 'message': f'Could not use the vulnerability cache: {e}'}), 500
+
 @app.route('/get_scan_output/<scan_id>', methods=['GET'])
 def get_scan_output(scan_id):
     """
@@ -393,7 +416,7 @@ def install_wpscan():
     if sys.platform.startswith('linux'):
         scan_id = str(uuid.uuid4()) # Unique ID for this installation process
         full_output = []
-        output_queue = queue.Queue()
+        output_queue = runtime.OutputLog()
         scan_queues[scan_id] = output_queue
         scan_outputs[scan_id] = "" # Initialize full output storage for this ID
 
@@ -0,0 +1,229 @@
+"""
+Multi-site wpscan runs: one database update, then every site in parallel.
+
+A plain run checks for a vulnerability database update each time, so forty
+sites mean forty update checks. In multi-site mode the app runs
+`wpscan --update` once, and then runs the command once per site with
+`--no-update`, through the shared runner limiter (see runtime/runner.py).
+Each site writes `--format json` to its own file in uploads/. When a site
+finishes, its file is parsed into the per-site results index that
+`/wpscan/<id>/sites` serves: the WordPress version, main theme, plugins
+and themes with their versions, interesting findings and users.
+
+The --api-token of the command is taken off the per-site runs. The app
+looks up the vulnerabilities of the components found through the shared
+VulnCache (see vuln_cache.py) instead. Sites running the same stack then
+cost one API call per component between them, not one per site.
+"""
+import json
+import os
+import shlex
+import threading
+
+import runtime
+import vuln_cache
+from runtime.runner import LIMITER, run_process
+
+MAX_SITES = 1000
+# Options dropped from the command (-> whether they take a value): every site gets its own
+# --url, JSON output file and --no-update, and the API token is used by the app
+STRIPPED_FLAGS = {'--url': True, '-u': True, '--update': False, '--no-update': False, '--format': True, '-f': True,
+                  '--output': True, '-o': True, '--api-token': True}
+# wpscan exit codes: 0 nothing found, 5 vulnerabilities found; anything else is an error
+COMPLETED_CODES = (0, 5)
+
+
+def prepare_command(argv):
+    """Splits a wpscan argv for multi-site mode. Returns (argv without STRIPPED_FLAGS, the --api-token value or None)."""
+    rest, token = [argv[0]], None
+    index = 1
+    while index < len(argv):
+        token_name, _, inline = argv[index].partition('=')
+        if token_name in STRIPPED_FLAGS:
+            if STRIPPED_FLAGS[token_name] and not inline:
+                value = argv[index + 1] if index + 1 < len(argv) else None
+                index += 2
+            else:
+                value = inline
+                index += 1
+            if token_name == '--api-token':
+                token = value or None
+            continue
+        rest.append(argv[index])
+        index += 1
+    return rest, token
+
+
+def _version(record):
+    return ((record or {}).get('version') or {}).get('number') or None
+
+
+def parse_report(report):
+    """The summary of one site's wpscan JSON report, before vulnerability lookups."""
+    if not isinstance(report, dict):
+        return {'error': 'unexpected report format'}
+    summary = {
+        'effective_url': report.get('effective_url'),
+        'wordpress': {'version': _version(report), 'status': (report.get('version') or {}).get('status')},
+        'main_theme': (report.get('main_theme') or {}).get('slug'),
+        'interesting_findings': len(report.get('interesting_findings') or []),
+        'users': sorted(report.get('users') or {}),
+        'components': [],
+    }
+    if report.get('scan_aborted'):
+        summary['error'] = report['scan_aborted']
+    if summary['wordpress']['version']:
+        summary['components'].append({'kind': 'wordpresses', 'slug': 'wordpress', 'version': summary['wordpress']['version']})
+    themes = dict(report.get('themes') or {})
+    if summary['main_theme']:
+        themes.setdefault(summary['main_theme'], report['main_theme'])
+    for kind, records in (('plugins', report.get('plugins') or {}), ('themes', themes)):
+        for slug, record in sorted(records.items()):
+            summary['components'].append({'kind': kind, 'slug': slug, 'version': _version(record)})
+    return summary
+
+
+class MultiSiteScan(runtime.batch.FanOutRun):
+    """One wpscan command run against a list of sites."""
+    kind = 'Multi-site WPScan'
+    end_marker = '---SCAN_COMPLETE---'
+
+    def __init__(self, scan_id, argv, sites, concurrency, update, work_folder, cache):
+        super().__init__(scan_id, concurrency)
+        self.argv, self.token = prepare_command(argv)
+        self.update = update
+        self.work_folder = work_folder
+        self.cache = cache
+        self.lock = threading.Lock()
+        self.update_state = 'queued' if update else 'skipped'
+        self.lookups = {'cached': 0, 'api_calls': 0, 'errors': 0}
+        for index, site in enumerate(sites):
+            self.add_entry(site=site, report_file=self._report_file(index))
+
+    @property
+    def sites(self):
+        return self.entries
+
+    def _report_file(self, index):
+        return os.path.join(self.work_folder, f'wpscan_{self.id}_{index}.json')
+
+    def command(self, entry):
+        return self.argv + ['--url', entry['site'], '--no-update', '--format', 'json', '--output', entry['report_file']]
+
+    def prefix(self, entry):
+        return f"[{entry['site']}] "
+
+    def before_run(self, processes):
+        self.log.put(f"Multi-site WPScan: {len(self.sites)} site(s), {self.concurrency} at a time"
+                     f"{'' if self.token else '; no --api-token, so components are listed without vulnerabilities'}\n")
+        if self.update:
+            self._update_database(processes)
+
+    def _update_database(self, processes):
+        if not LIMITER.acquire(self.cancelled):
+            self.update_state = 'cancelled'
+            return
+        try:
+            self.update_state = 'running'
+            command = [self.argv[0], '--update', '--no-banner']
+            self.log.put(f"[update] $ {shlex.join(command)}\n")
+            code = run_process(command, self.log, prefix='[update] ', processes=processes, job_id=f'{self.id}-update',
+                               cancelled=self.cancelled)
+            self.update_state = 'completed' if code == 0 else 'failed'
+            reason = f'exit code {code}'
+        except Exception as e:
+            self.update_state, reason = 'failed', f'{type(e).__name__}: {e}'
+        finally:
+            LIMITER.release()
+        if self.update_state == 'failed':
+            self.log.put(f"[update] The database update failed ({reason}); the sites are scanned with the local copy.\n")
+
+    def run_entry(self, entry, processes, prefix):
+        command = self.command(entry)
+        self.log.put(f"{prefix}$ {shlex.join(command)}\n")
+        return run_process(command, self.log, prefix=prefix, processes=processes, job_id=entry['job_id'],
+                           cancelled=self.cancelled)
+
+    def finish_entry(self, entry, prefix):
+        entry.update(self._read_report(entry))
+        if entry.get('components') and self.token:
+            self._look_up(entry)
+
+    def entry_ok(self, entry):
+        return entry['exit_code'] in COMPLETED_CODES
+
+    def _read_report(self, entry):
+        try:
+            with open(entry['report_file']) as f:
+                return parse_report(json.load(f))
+        except FileNotFoundError:
+            return {'error': 'wpscan wrote no report'}
+        except (OSError, ValueError) as e:
+            return {'error': f'could not read the report: {e}'}
+
+    def _look_up(self, entry):
+        vulnerabilities = 0
+        for component in entry['components']:
+            try:
+                found, cached = self.cache.vulnerabilities(component['kind'], component['slug'], component['version'], self.token)
+            except vuln_cache.VulnLookupError as e:
+                component['lookup_error'] = str(e)
+                with self.lock:
+                    self.lookups['errors'] += 1
+                continue
+            with self.lock:
+                self.lookups['cached' if cached else 'api_calls'] += 1
+            component['vulnerabilities'] = found
+            vulnerabilities += len(found)
+        entry['vulnerabilities'] = vulnerabilities
+
+    def entry_summary(self, entry):
+        if entry.get('error') and not entry.get('components'):
+            return f": {entry['error']}"
+        kinds = [component['kind'] for component in entry.get('components', ())]
+        line = (f": WordPress {entry['wordpress']['version'] or 'version unknown'}, "
+                f"{kinds.count('plugins')} plugin(s), {kinds.count('themes')} theme(s)")
+        if 'vulnerabilities' in entry:
+            vulnerable = sum(1 for component in entry['components'] if component.get('vulnerabilities'))
+            line += f"; {entry['vulnerabilities']} vulnerabilit{'y' if entry['vulnerabilities'] == 1 else 'ies'} in {vulnerable} component(s)"
+        return line
+
+    def summary(self):
+        counts = self.counts()
+        vulnerable = sum(1 for entry in self.sites if entry.get('vulnerabilities'))
+        return (f"Multi-site WPScan finished: {counts['completed']} completed, {counts['failed']} failed, "
+                f"{counts['cancelled']} cancelled; {vulnerable} site(s) with vulnerabilities. "
+                f"Vulnerability lookups: {self.lookups['cached']} cached, {self.lookups['api_calls']} API call(s), "
+                f"{self.lookups['errors']} failed.")
+
+    def job_ids(self):
+        return [f'{self.id}-update'] + super().job_ids()
+
+    def site_summary(self, entry):
+        """A site without its component details."""
+        summary = {key: value for key, value in entry.items() if key not in ('components', 'report_file')}
+        components = entry.get('components') or []
+        summary['plugins'] = sum(1 for component in components if component['kind'] == 'plugins')
+        summary['themes'] = sum(1 for component in components if component['kind'] == 'themes')
+        summary['vulnerable_components'] = [f"{component['slug']} {component['version'] or '?'}"
+                                            for component in components if component.get('vulnerabilities')]
+        return summary
+
+    def describe(self, sites):
+        return dict(self.describe_run(), scan_id=self.id, update=self.update_state,
+                    vulnerability_lookups=dict(self.lookups, enabled=bool(self.token)),
+                    sites=[self.site_summary(entry) for entry in sites])
+
+    def find(self, vulnerable=False, component=None):
+        """Sites with vulnerabilities and/or running a component (plugin or theme slug, or 'wordpress')."""
+        found = []
+        for entry in self.sites:
+            components = entry.get('components') or []
+            if component is not None:
+                components = [item for item in components if item['slug'] == component]
+                if not components:
+                    continue
+            if vulnerable and not any(item.get('vulnerabilities') for item in components):
+                continue
+            found.append(entry)
+        return found
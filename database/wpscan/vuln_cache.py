@@ -0,0 +1,178 @@
+"""
+Cached WPScan vulnerability API lookups for multi-site runs.
+
+In multi-site mode wpscan itself runs without --api-token, so it makes no
+API calls. The app looks up the components each site reports instead,
+through this cache: WordPress core by version, and plugins and themes by
+slug. The API answers a plugin or theme lookup with the vulnerabilities of
+every version, so one call per slug covers any version of it. The versions
+are matched locally against `introduced_in` and `fixed_in`. Forty sites
+running the same stack make one call per component, and later runs make
+none until the entry is older than CACHE_TTL.
+
+Answers are kept in a local SQLite database, CYBERWEB_WPSCAN_CACHE_DB
+(default: vuln_cache.db in the app folder). Unknown slugs (404) are cached
+too. Failed calls are not. Concurrent lookups of one key share a single
+call. The API is CYBERWEB_WPSCAN_API (default: the public v3 API), so a
+local stand-in can replace it.
+"""
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import quote
+
+DB_PATH = os.environ.get('CYBERWEB_WPSCAN_CACHE_DB', 'vuln_cache.db')
+API_URL = os.environ.get('CYBERWEB_WPSCAN_API', 'https://wpscan.com/api/v3').rstrip('/')
+CACHE_TTL = float(os.environ.get('CYBERWEB_WPSCAN_CACHE_TTL', 86400))
+API_TIMEOUT = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS lookups (
+    kind TEXT NOT NULL,            -- wordpresses, plugins or themes
+    slug TEXT NOT NULL,            -- plugin/theme slug, or the WordPress version without dots
+    fetched_at REAL NOT NULL,
+    found INTEGER NOT NULL,        -- 0 if the API did not know the slug
+    body TEXT,                     -- the API's JSON answer
+    PRIMARY KEY (kind, slug)
+) WITHOUT ROWID;
+"""
+
+
+class VulnLookupError(Exception):
+    """The vulnerability API could not answer (bad token, quota, network)."""
+
+
+def version_key(version):
+    """Comparable form of a version string: its numbers, trailing zeros dropped."""
+    numbers = [int(number) for number in re.findall(r'\d+', str(version))]
+    while numbers and numbers[-1] == 0:
+        numbers.pop()
+    return tuple(numbers)
+
+
+def affects(vulnerability, version):
+    """Whether a vulnerability applies to a version (None: unknown, so it might)."""
+    if not version:
+        return True
+    key = version_key(version)
+    if vulnerability.get('fixed_in') and key >= version_key(vulnerability['fixed_in']):
+        return False
+    if vulnerability.get('introduced_in') and key < version_key(vulnerability['introduced_in']):
+        return False
+    return True
+
+
+class VulnCache:
+    """The SQLite-backed lookup cache of the wpscan app."""
+
+    def __init__(self, path=DB_PATH, api_url=API_URL, ttl=CACHE_TTL):
+        self.path = path
+        self.api_url = api_url
+        self.ttl = ttl
+        self.local = threading.local() # One connection per thread
+        self.lock = threading.Lock()
+        self.key_locks = {} # (kind, slug) -> lock held while the API is called for it
+        self.hits = 0
+        self.calls = 0
+        self.errors = 0
+        self.connection().executescript(SCHEMA)
+
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self.local.connection = connection
+        return connection
+
+    def _cached(self, kind, slug):
+        row = self.connection().execute('SELECT fetched_at, found, body FROM lookups WHERE kind = ? AND slug = ?',
+                                        (kind, slug)).fetchone()
+        if row is None or time.time() - row[0] > self.ttl:
+            return None
+        return json.loads(row[2]) if row[1] else {}
+
+    def _fetch(self, kind, slug, token):
+        request = urllib.request.Request(f'{self.api_url}/{kind}/{quote(slug, safe="")}',
+                                         headers={'Authorization': f'Token token={token}',
+                                                  'User-Agent': 'CyberWeb wpscan multi-site'})
+        try:
+            with urllib.request.urlopen(request, timeout=API_TIMEOUT) as response:
+                body = json.loads(response.read().decode('utf-8'))
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return None
+            raise VulnLookupError(f'{kind}/{slug}: HTTP {e.code}') from None
+        except (OSError, ValueError) as e:
+            raise VulnLookupError(f'{kind}/{slug}: {e}') from None
+        if not isinstance(body, dict):
+            raise VulnLookupError(f'{kind}/{slug}: unexpected answer')
+        return body
+
+    def lookup(self, kind, slug, token):
+        """
+        The API's answer for a component ({} if it does not know it), from the cache when fresh.
+
+        Returns:
+            (dict, bool): The answer, and whether it came from the cache.
+        Raises:
+            VulnLookupError: The API had to be called and failed.
+        """
+        key = (kind, slug)
+        with self.lock:
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+        with key_lock: # Sites scanned at once that share a plugin wait for one call
+            body = self._cached(kind, slug)
+            if body is not None:
+                with self.lock:
+                    self.hits += 1
+                return body, True
+            try:
+                body = self._fetch(kind, slug, token)
+            except VulnLookupError:
+                with self.lock:
+                    self.errors += 1
+                raise
+            with self.lock:
+                self.calls += 1
+            with self.connection() as connection:
+                connection.execute('INSERT OR REPLACE INTO lookups (kind, slug, fetched_at, found, body) VALUES (?, ?, ?, ?, ?)',
+                                   (kind, slug, time.time(), body is not None, json.dumps(body) if body is not None else None))
+            return body or {}, False
+
+    def vulnerabilities(self, kind, slug, version, token):
+        """
+        The vulnerabilities of one component version.
+
+        Args:
+            kind (str): 'wordpresses', 'plugins' or 'themes'.
+            slug (str): The plugin or theme slug (ignored for WordPress).
+            version (str): The version found, or None if wpscan could not tell.
+            token (str): WPScan API token.
+        Returns:
+            (list, bool): The vulnerabilities, and whether the answer came from the cache.
+        """
+        if kind == 'wordpresses':
+            if not version:
+                return [], True
+            body, cached = self.lookup(kind, version.replace('.', ''), token)
+            entry = (body.get(version) or next(iter(body.values()), None) or {}) if body else {}
+            return list(entry.get('vulnerabilities') or []), cached
+        body, cached = self.lookup(kind, slug, token)
+        entry = body.get(slug) or {}
+        return [vulnerability for vulnerability in entry.get('vulnerabilities') or [] if affects(vulnerability, version)], cached
+
+    def describe(self):
+        row = self.connection().execute('SELECT COUNT(*), SUM(found = 0), MIN(fetched_at) FROM lookups').fetchone()
+        return {'entries': row[0], 'unknown_slugs': row[1] or 0, 'oldest_at': row[2], 'ttl': self.ttl,
+                'api_url': self.api_url, 'hits': self.hits, 'api_calls': self.calls, 'errors': self.errors}
+
+    def clear(self):
+        with self.connection() as connection:
+            return connection.execute('DELETE FROM lookups').rowcount
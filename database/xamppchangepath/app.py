@@ -5,6 +5,11 @@ from flask import Flask, request, jsonify
 
 app = Flask(__name__)
 
+# Shared runtime (metrics, debug endpoints) lives at the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import runtime
+runtime.init_app(app)
+
 # Function to change DocumentRoot and Directory paths in httpd.conf
 def change_document_root_logic(httpd_conf_path, new_path):
     """
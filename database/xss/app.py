@@ -26,6 +26,11 @@ logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %
 
 # Initialize Flask app
 app = Flask(__name__)
+
+# Shared runtime (metrics, debug endpoints) lives at the repository root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+import runtime
+runtime.init_app(app)
 # Configure SocketIO for WebSocket communication
 # cors_allowed_origins="*" allows connections from any origin, which is useful for development.
 # In production, you should restrict this to your specific frontend origin.
@@ -59,8 +64,7 @@ def _run_aircrack_thread(command_parts):
 
     try:
         # Check if aircrack-ng is available in PATH
-        import shutil
-        if shutil.which(command_parts[0]) is None:
+        if runtime.which(command_parts[0]) is None:
             error_message = f"Error: '{command_parts[0]}' not found in system PATH. Please ensure aircrack-ng is installed and accessible."
             output_queue.put(error_message + "\n")
             output_queue.put("STATUS: Error\n")
@@ -0,0 +1,70 @@
+"""
+Shared runtime for the Flask sub-apps under database/.
+
+Every sub-app is launched by the PHP dashboard as its own process
+(`python app.py --port N`, with the app folder as working directory), so
+nothing is shared between them at import time. Each app.py puts the
+repository root on sys.path and calls `runtime.init_app(app, ...)` once its
+job tables exist; everything registered here (metrics, debug endpoints,
+...) is then installed on that app.
+"""
+import os
+
+from . import assets, batch, compression, examples, export, jobs, memory, metrics, options, profiling, ratelimit, runner, serialization
+from . import tools as tool_registry # `tools` is also an init_app() argument
+from .examples import ExamplesIndex
+from .jobs import JobOutputs, OutputLog
+from .options import CommandSpec, Combined, Extra, Filter, Lines, Positional, Switch, Value
+from .tools import which
+
+# Repository root (the folder holding index.php, php/ and database/)
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class RuntimeState:
+    """Per-app view of the state the shared runtime needs to look at."""
+
+    def __init__(self, app, upload_folder=None, outputs=None, processes=None, queues=None, tools=()):
+        self.app = app
+        # Name of the sub-app folder (e.g. 'nmap', 'curl lfi')
+        self.tool = os.path.basename(app.root_path)
+        # Upload folder is relative to the app folder (the working directory)
+        self.upload_folder = os.path.join(app.root_path, upload_folder) if upload_folder else None
+        # The app's own job tables: id -> final output (or OutputLog), id -> Popen, id -> OutputLog
+        self.outputs = outputs if outputs is not None else {}
+        self.processes = processes if processes is not None else {}
+        self.queues = queues if queues is not None else {}
+        # Executables the app runs, reported by /tool_info
+        self.tools = list(tools)
+
+
+def init_app(app, upload_folder=None, outputs=None, processes=None, queues=None, tools=()):
+    """
+    Installs the shared runtime on a sub-app.
+
+    Args:
+        app: The Flask application.
+        upload_folder (str): The app's upload folder, if it has one.
+        outputs (dict): Job id -> accumulated output text, or the job's OutputLog (see JobOutputs).
+        processes (dict): Job id -> running subprocess.Popen.
+        queues (dict): Job id -> OutputLog (or queue.Queue) of the job's output lines.
+        tools (list): Names of the executables the app runs (probed in the background).
+    """
+    state = RuntimeState(app, upload_folder=upload_folder, outputs=outputs,
+                         processes=processes, queues=queues, tools=tools)
+    app.extensions['runtime'] = state
+    serialization.init_app(app, state)
+    metrics.init_app(app, state)
+    profiling.init_app(app, state)
+    memory.init_app(app, state)
+    jobs.init_app(app, state)
+    export.init_app(app, state)
+    tool_registry.init_app(app, state)
+    runner.init_app(app, state)
+    ratelimit.init_app(app, state)
+    batch.init_app(app, state)
+    # After-request hooks run last-registered first: pages get their ETag and
+    # cached compressed copy before generic compression sees them
+    compression.init_app(app, state)
+    assets.init_app(app, state)
+    return state
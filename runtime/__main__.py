@@ -0,0 +1,44 @@
+"""
+Command-line tasks for the shared runtime.
+
+    python -m runtime assets [app folder ...]
+        Splits the tool templates ahead of time into each app's static/dist/
+        (every app under database/ when no folder is given).
+
+    python -m runtime bench
+        Reports JSON serialization time and bytes on the wire before and
+        after the fast JSON provider and response compression.
+"""
+import argparse
+import os
+
+from . import REPO_ROOT, assets, bench
+
+
+def _app_folders(folders):
+    if folders:
+        return folders
+    database = os.path.join(REPO_ROOT, 'database')
+    return sorted(os.path.join(database, name) for name in os.listdir(database)
+                  if os.path.isdir(os.path.join(database, name, 'templates')))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m runtime', description='Shared runtime tasks.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    assets_parser = commands.add_parser('assets', help='Build static/dist for the tool apps.')
+    assets_parser.add_argument('folders', nargs='*', help='App folders (default: every app under database/).')
+    bench_parser = commands.add_parser('bench', help='Benchmark JSON serialization and compression.')
+    bench_parser.add_argument('--examples', type=int, default=5, help='Largest examples files to include.')
+    bench_parser.add_argument('--scan-lines', type=int, default=50000, help='Lines in the synthetic scan output.')
+    bench_parser.add_argument('--repeat', type=int, default=20, help='Runs per measurement (best is kept).')
+    args = parser.parse_args(argv)
+
+    if args.command == 'assets':
+        assets.build_dist(_app_folders(args.folders))
+    elif args.command == 'bench':
+        bench.run(os.path.join(REPO_ROOT, 'database'), args.examples, args.scan_lines, args.repeat)
+
+
+if __name__ == '__main__':
+    main()
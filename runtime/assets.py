@@ -0,0 +1,383 @@
+"""
+Static asset pipeline for the tool UIs.
+
+Every tool page is one large template with its CSS and JavaScript inline, so
+each visit downloaded the whole thing again. The pipeline splits each
+template into:
+
+* an HTML shell, in which every inline `<style>` and `<script>` block is
+  replaced by a `<link>`/`<script src>` pointing at
+* fingerprinted assets (`/assets/<template>.<hash>.css|js`), kept gzip- and,
+  when the `brotli` module is installed, brotli-compressed, and served with
+  `Cache-Control: immutable`.
+
+Rendered HTML pages get an ETag and are revalidated (`no-cache`), so a repeat
+visit costs a 304 for the shell and nothing for the assets. Compressed copies
+of the shell are cached per page version. A page rendered from one template
+with no context from the view is kept as rendered, per URL, and served
+without running the view or Jinja until its template changes.
+
+The split happens in memory when the app starts (and again when a template
+changes). `python -m runtime assets` runs the same build ahead of time into
+each app's `static/dist/` folder (assets, their .gz/.br copies and a
+manifest); apps start from that build instead while it matches their
+templates, and a web server in front can serve the files directly.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from html.parser import HTMLParser
+
+from flask import Response, abort, g, request, template_rendered
+from jinja2 import BaseLoader, TemplateNotFound
+
+try:
+    import brotli
+except ImportError: # Optional: without it only gzip copies are made
+    brotli = None
+
+DIST_FOLDER = os.path.join('static', 'dist')
+MANIFEST = 'manifest.json'
+ASSET_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Inline blocks to move out: <style>, and classic <script> without src
+SCRIPT_TYPES = ('', 'text/javascript', 'application/javascript')
+
+# Compressed copies of rendered pages kept per app (pages differ by version only)
+MAX_CACHED_PAGES = 16
+# Bumped when split_template changes, so prebuilt dist folders from older splitters are rebuilt in memory
+SPLIT_VERSION = 2
+# Template context Flask adds to every render; a page rendered with nothing else is the same for every request
+DEFAULT_CONTEXT = {'g', 'request', 'session'}
+
+
+def _compress(data):
+    """Returns {encoding: bytes} for the encodings that make the data smaller."""
+    variants = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(data)
+    return {encoding: body for encoding, body in variants.items() if len(body) < len(data)}
+
+
+def _accepted(header, encoding):
+    for part in (header or '').split(','):
+        name, _sep, params = part.strip().partition(';')
+        if name.strip().lower() == encoding:
+            return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+def negotiate(variants):
+    """Picks the best encoding the client accepts out of {encoding: body}."""
+    header = request.headers.get('Accept-Encoding', '')
+    for encoding in ('br', 'gzip'):
+        if encoding in variants and _accepted(header, encoding):
+            return encoding
+    return None
+
+
+class Asset:
+    """One fingerprinted CSS/JS file and its compressed copies."""
+
+    def __init__(self, name, data, variants=None):
+        self.name = name
+        self.data = data
+        self.variants = _compress(data) if variants is None else variants
+        self.mimetype = 'text/css' if name.endswith('.css') else 'application/javascript'
+
+
+class _BlockFinder(HTMLParser):
+    """
+    Finds the <style> and <script> elements of a page with their source offsets.
+
+    Only real elements count: `<script>` written inside an attribute value
+    (e.g. an onclick help text) is part of that attribute to the parser.
+    """
+
+    def __init__(self, source):
+        super().__init__(convert_charrefs=False)
+        self.source = source
+        self.line_starts = [0] + [match.end() for match in re.finditer('\n', source)]
+        self.blocks = [] # (tag, attrs text, attrs dict, element start, body start, body end, element end)
+        self._open = None
+
+    def _offset(self):
+        line, column = self.getpos()
+        return self.line_starts[line - 1] + column
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ('style', 'script') and self._open is None:
+            start = self._offset()
+            text = self.get_starttag_text()
+            self._open = (tag, text[len(tag) + 1:-1], dict(attrs), start, start + len(text))
+
+    def handle_startendtag(self, tag, attrs):
+        pass # <script/> has no body to move
+
+    def handle_endtag(self, tag):
+        if self._open is not None and tag == self._open[0]:
+            start = self._offset()
+            self.blocks.append(self._open + (start, self.source.index('>', start) + 1))
+            self._open = None
+
+
+def split_template(source, stem):
+    """Returns (HTML shell, list of Assets) for one template source."""
+    finder = _BlockFinder(source)
+    finder.feed(source)
+    finder.close()
+    assets, parts, position = [], [], 0
+    for tag, attrs, attr_values, start, body_start, body_end, end in finder.blocks:
+        body = source[body_start:body_end]
+        if tag == 'script' and ('src' in attr_values or (attr_values.get('type') or '').lower() not in SCRIPT_TYPES):
+            continue
+        if not body.strip() or '{{' in body or '{%' in body:
+            continue # Nothing to move, or the block is rendered by Jinja
+        data = body.encode('utf-8')
+        extension = 'css' if tag == 'style' else 'js'
+        name = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}.{extension}"
+        assets.append(Asset(name, data))
+        parts.append(source[position:start])
+        if tag == 'style':
+            parts.append(f'<link rel="stylesheet" href="/assets/{name}"{attrs}>')
+        else:
+            parts.append(f'<script src="/assets/{name}"{attrs}></script>')
+        position = end
+    parts.append(source[position:])
+    return ''.join(parts), assets
+
+
+def _template_names(template_folder):
+    try:
+        return sorted(name for name in os.listdir(template_folder) if name.endswith('.html'))
+    except OSError:
+        return []
+
+
+def _stem(template):
+    return re.sub(r'[^A-Za-z0-9_-]+', '_', os.path.splitext(template)[0])
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+class AssetPipeline:
+    """Split templates and their assets for one app."""
+
+    def __init__(self, template_folder, dist_folder=None):
+        self.template_folder = template_folder
+        self.dist_folder = dist_folder
+        self.lock = threading.Lock()
+        self.assets = {} # name -> Asset
+        self.shells = {} # template -> (source sha1, mtime, shell)
+
+    def shell(self, template):
+        """Returns (shell source, template path, mtime) for a template, splitting it if needed."""
+        path = os.path.join(self.template_folder, template)
+        mtime = os.path.getmtime(path)
+        cached = self.shells.get(template)
+        if cached is not None and cached[1] == mtime:
+            return cached[2], path, mtime
+        with self.lock:
+            source = _read(path)
+            digest = hashlib.sha1(source).hexdigest()
+            if cached is None or cached[0] != digest:
+                shell, assets = split_template(source.decode('utf-8'), _stem(template))
+                for asset in assets:
+                    self.assets.setdefault(asset.name, asset)
+            else:
+                shell = cached[2]
+            self.shells[template] = (digest, mtime, shell)
+        return shell, path, mtime
+
+    def digest(self, template):
+        """The SHA-1 of a template's current source (re-split if it changed)."""
+        self.shell(template)
+        return self.shells[template][0]
+
+    def build(self):
+        """Splits every template in the folder, preferring an up-to-date prebuilt dist folder."""
+        if self.dist_folder and self._load_dist():
+            return self
+        for template in _template_names(self.template_folder):
+            try:
+                self.shell(template)
+            except (OSError, UnicodeDecodeError) as e:
+                print(f"Asset pipeline: could not split '{template}': {e}")
+        return self
+
+    def _load_dist(self):
+        try:
+            manifest = json.loads(_read(os.path.join(self.dist_folder, MANIFEST)))
+            if manifest.get('version') != SPLIT_VERSION:
+                return False # Built by an older splitter
+            templates = {}
+            for template, entry in manifest['templates'].items():
+                path = os.path.join(self.template_folder, template)
+                if hashlib.sha1(_read(path)).hexdigest() != entry['sha1']:
+                    return False # Stale build: split in memory instead
+                templates[template] = (entry['sha1'], os.path.getmtime(path),
+                                       _read(os.path.join(self.dist_folder, entry['shell'])).decode('utf-8'))
+            assets = {}
+            for name, encodings in manifest['assets'].items():
+                data = _read(os.path.join(self.dist_folder, name))
+                variants = {encoding: _read(os.path.join(self.dist_folder, f'{name}.{suffix}'))
+                            for encoding, suffix in (('gzip', 'gz'), ('br', 'br')) if encoding in encodings}
+                assets[name] = Asset(name, data, variants)
+        except (OSError, ValueError, KeyError, UnicodeDecodeError):
+            return False
+        if set(templates) != set(_template_names(self.template_folder)):
+            return False
+        self.shells.update(templates)
+        self.assets.update(assets)
+        return True
+
+    def write_dist(self, dist_folder):
+        """Writes the split templates, assets and their compressed copies to a folder."""
+        os.makedirs(dist_folder, exist_ok=True)
+        manifest = {'version': SPLIT_VERSION, 'templates': {}, 'assets': {}}
+        for template, (digest, _mtime, shell) in sorted(self.shells.items()):
+            shell_name = f'{_stem(template)}.shell.html'
+            with open(os.path.join(dist_folder, shell_name), 'w', encoding='utf-8') as f:
+                f.write(shell)
+            manifest['templates'][template] = {'sha1': digest, 'shell': shell_name}
+        for name, asset in sorted(self.assets.items()):
+            with open(os.path.join(dist_folder, name), 'wb') as f:
+                f.write(asset.data)
+            for encoding, body in asset.variants.items():
+                with open(os.path.join(dist_folder, f"{name}.{'gz' if encoding == 'gzip' else 'br'}"), 'wb') as f:
+                    f.write(body)
+            manifest['assets'][name] = sorted(asset.variants)
+        with open(os.path.join(dist_folder, MANIFEST), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        return manifest
+
+
+class ShellLoader(BaseLoader):
+    """Jinja loader that hands out the split shell of templates the pipeline knows."""
+
+    def __init__(self, pipeline, fallback):
+        self.pipeline = pipeline
+        self.fallback = fallback
+
+    def get_source(self, environment, template):
+        try:
+            shell, path, mtime = self.pipeline.shell(template)
+        except (OSError, UnicodeDecodeError):
+            if self.fallback is None:
+                raise TemplateNotFound(template)
+            return self.fallback.get_source(environment, template)
+
+        def uptodate():
+            try:
+                return os.path.getmtime(path) == mtime
+            except OSError:
+                return False
+        return shell, path, uptodate
+
+    def list_templates(self):
+        return self.fallback.list_templates() if self.fallback is not None else []
+
+
+def init_app(app, state):
+    """Serves split templates and /assets/<name>, and makes HTML pages revalidate with an ETag."""
+    pipeline = AssetPipeline(os.path.join(app.root_path, app.template_folder or 'templates'),
+                             os.path.join(app.root_path, DIST_FOLDER)).build()
+    state.assets = pipeline
+    app.jinja_loader = ShellLoader(pipeline, app.jinja_loader)
+    pages = OrderedDict() # ETag -> {encoding: compressed page}
+    rendered = OrderedDict() # URL -> (template, template SHA-1, ETag, page, {encoding: compressed page})
+    pages_lock = threading.Lock()
+
+    def _note_render(sender, template, context, **extra):
+        g.setdefault('_assets_renders', []).append((template.name, set(context) - DEFAULT_CONTEXT))
+
+    template_rendered.connect(_note_render, app, weak=False)
+
+    def _page_response(response, etag, variants):
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.make_conditional(request)
+        if response.status_code != 200:
+            return response
+        encoding = negotiate(variants)
+        if encoding:
+            response.set_data(variants[encoding])
+            response.headers['Content-Encoding'] = encoding
+        return response
+
+    @app.before_request
+    def _assets_rendered_page():
+        if request.method != 'GET':
+            return None
+        entry = rendered.get(request.full_path)
+        if entry is None:
+            return None
+        template, digest, etag, page, variants = entry
+        try:
+            current = pipeline.digest(template)
+        except (OSError, UnicodeDecodeError):
+            current = None
+        if current != digest:
+            with pages_lock:
+                rendered.pop(request.full_path, None)
+            return None
+        g._assets_cached = True
+        return _page_response(Response(page, mimetype='text/html'), etag, variants)
+
+    @app.route('/assets/<path:name>', methods=['GET'])
+    def runtime_asset(name):
+        """Serves a fingerprinted asset, precompressed when the client accepts it."""
+        asset = pipeline.assets.get(name)
+        if asset is None:
+            abort(404)
+        encoding = negotiate(asset.variants)
+        response = Response(asset.variants[encoding] if encoding else asset.data, mimetype=asset.mimetype)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = ASSET_CACHE_CONTROL
+        response.set_etag(name) # The name is the content hash
+        return response.make_conditional(request)
+
+    @app.after_request
+    def _assets_cache_page(response):
+        if g.get('_assets_cached') or request.method != 'GET' or response.status_code != 200 \
+                or response.mimetype != 'text/html' or response.is_streamed or response.direct_passthrough \
+                or 'Content-Encoding' in response.headers:
+            return response
+        body = response.get_data()
+        etag = hashlib.sha1(body).hexdigest()[:20]
+        renders = g.get('_assets_renders') or []
+        with pages_lock:
+            variants = pages.get(etag)
+            if variants is None:
+                variants = pages[etag] = _compress(body)
+                while len(pages) > MAX_CACHED_PAGES:
+                    pages.popitem(last=False)
+            if len(renders) == 1 and not renders[0][1] and renders[0][0] in pipeline.shells:
+                template = renders[0][0]
+                rendered[request.full_path] = (template, pipeline.shells[template][0], etag, body, variants)
+                while len(rendered) > MAX_CACHED_PAGES:
+                    rendered.popitem(last=False)
+        return _page_response(response, etag, variants)
+
+    return pipeline
+
+
+def build_dist(folders):
+    """Builds static/dist for each app folder and prints how much the HTML shrank."""
+    for folder in folders:
+        pipeline = AssetPipeline(os.path.join(folder, 'templates')).build()
+        manifest = pipeline.write_dist(os.path.join(folder, DIST_FOLDER))
+        before = sum(os.path.getsize(os.path.join(folder, 'templates', t)) for t in manifest['templates'])
+        shells = sum(len(shell.encode('utf-8')) for _digest, _mtime, shell in pipeline.shells.values())
+        print(f"{os.path.basename(folder)}: {len(manifest['templates'])} template(s), "
+              f"{len(manifest['assets'])} asset(s), HTML {before} -> {shells} bytes")
@@ -0,0 +1,434 @@
+"""
+Batch runs: one command template against many targets.
+
+    POST /run_batch
+        {"template": "nikto.pl -h {target} -Tuning 1",
+         "targets": ["a.example", "b.example"] or "a.example\\nb.example",
+         "concurrency": 4}
+        (or a multipart form with `template` and a `targets_file` upload)
+
+splits the template like a shell would, substitutes each target for
+`{target}` (as a single argument, so targets cannot add options) and
+schedules one run per target through the shared runner. Runs wait for a slot
+in the process-wide limiter, and `concurrency` caps the batch further.
+
+All runs write into one OutputLog, each line prefixed with `[target] `. Poll it
+with `GET /batch/<id>?since=<offset>&wait=25`. The response holds the new
+output, per-target state and exit code, and counts by state. The id also
+works with `/get_scan_output/<id>?since=...` and `/jobs/<id>/export`.
+`POST /batch/<id>/cancel` drops queued targets and stops running ones.
+
+Target lists saved by other apps (e.g. the names amass found) live in one
+folder all sub-apps share, CYBERWEB_TARGET_LISTS (default:
+database/target_lists). `{"targets_list": "<name>"}` runs a batch against
+one of them, and `GET /target_lists` lists them.
+"""
+import contextlib
+import os
+import re
+import shlex
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import jsonify, request
+
+from .jobs import MAX_WAIT_SECONDS, PENDING_LIMIT, OutputLog
+from .runner import LIMITER, run_process
+from .tools import which
+
+TARGET_PLACEHOLDER = '{target}'
+MAX_BATCH_TARGETS = 5000
+# Finished batches kept for polling; older ones are forgotten
+MAX_KEPT_BATCHES = 20
+END_MARKER = '---BATCH_COMPLETE---'
+STATES = ('queued', 'running', 'completed', 'failed', 'cancelled')
+TARGET_LISTS_FOLDER = os.environ.get('CYBERWEB_TARGET_LISTS') or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'database', 'target_lists')
+
+
+def parse_targets(text):
+    """Returns the targets in a scope list: one per line (or comma separated), '#' comments skipped."""
+    targets = []
+    for line in text.splitlines():
+        line = line.split('#', 1)[0]
+        targets.extend(part.strip() for part in line.split(',') if part.strip())
+    return targets
+
+
+def _target_list_path(name):
+    """Path of a shared target list; names are reduced to letters, digits, '.', '_' and '-'."""
+    name = re.sub(r'[^A-Za-z0-9._-]', '_', os.path.basename(str(name))).lstrip('.')
+    if not name:
+        raise ValueError('empty target list name')
+    if not name.endswith('.txt'):
+        name += '.txt'
+    return os.path.join(TARGET_LISTS_FOLDER, name)
+
+
+def save_target_list(name, targets):
+    """Writes a target list (one per line) to the shared folder. Returns its file name."""
+    path = _target_list_path(name)
+    os.makedirs(TARGET_LISTS_FOLDER, exist_ok=True)
+    with open(path + '.tmp', 'w') as f:
+        f.write(''.join(f'{target}\n' for target in targets))
+    os.replace(path + '.tmp', path)
+    return os.path.basename(path)
+
+
+def load_target_list(name):
+    """The targets of a shared list. Raises OSError (FileNotFoundError if there is no such list)."""
+    with open(_target_list_path(name), errors='replace') as f:
+        return parse_targets(f.read())
+
+
+def target_lists():
+    """The shared target lists, newest first."""
+    try:
+        entries = [entry for entry in os.scandir(TARGET_LISTS_FOLDER) if entry.name.endswith('.txt') and entry.is_file()]
+    except OSError:
+        return []
+    entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    return [{'name': entry.name, 'bytes': entry.stat().st_size, 'modified_at': entry.stat().st_mtime}
+            for entry in entries]
+
+
+class FanOutRun:
+    """
+    One command fanned out over many entries (targets, hosts, sites, endpoints) through the shared limiter.
+
+    Subclasses add their entries with add_entry() and implement run_entry(), which runs one entry
+    while it holds a limiter slot and returns its exit code. hold() is entered before the slot is
+    taken, e.g. to wait for a resource the entry shares with other runs. finish_entry() runs after the slot is
+    released, e.g. to parse the entry's report. An exception from either marks the entry failed
+    with the error instead of leaving it running. Every run ends its log with a summary, the
+    STATUS line and `end_marker`, also when a hook fails.
+    """
+    kind = 'Batch' # Name used in the log summary
+    end_marker = END_MARKER
+
+    def __init__(self, run_id, concurrency):
+        self.id = run_id
+        self.concurrency = concurrency
+        self.log = OutputLog(pending_limit=PENDING_LIMIT)
+        self.cancelled = threading.Event()
+        self.started_at = time.time()
+        self.finished_at = None
+        self.entries = []
+
+    def add_entry(self, **fields):
+        index = len(self.entries)
+        entry = {'index': index, 'job_id': f'{self.id}-{index}', 'state': 'queued', 'exit_code': None, 'error': None,
+                 'started_at': None, 'finished_at': None}
+        entry.update(fields)
+        self.entries.append(entry)
+        return entry
+
+    @property
+    def finished(self):
+        return self.finished_at is not None
+
+    def counts(self):
+        counts = dict.fromkeys(STATES, 0)
+        for entry in self.entries:
+            counts[entry['state']] += 1
+        return counts
+
+    def status(self):
+        if not self.finished:
+            return 'running'
+        return 'cancelled' if self.cancelled.is_set() else 'completed'
+
+    def describe_run(self):
+        """The fields every fan-out run reports."""
+        return {'status': self.status(), 'concurrency': self.concurrency, 'total': len(self.entries),
+                'counts': self.counts(), 'started_at': self.started_at, 'finished_at': self.finished_at}
+
+    # --- hooks ---
+
+    def prefix(self, entry):
+        """Put in front of the entry's log lines."""
+        return f"[{entry['target']}] "
+
+    def hold(self, entry, prefix):
+        """A context manager held around the entry's limiter slot."""
+        return contextlib.nullcontext()
+
+    def before_run(self, processes):
+        """Runs before the entries are scheduled."""
+
+    def run_entry(self, entry, processes, prefix):
+        """Runs one entry while it holds a limiter slot. Returns its exit code."""
+        raise NotImplementedError
+
+    def finish_entry(self, entry, prefix):
+        """Runs after the entry's limiter slot is released."""
+
+    def entry_ok(self, entry):
+        """Whether an entry that raised nothing and set no error completed."""
+        return entry['exit_code'] == 0
+
+    def entry_summary(self, entry):
+        """Text after '--- <state> (exit code N)' in the entry's last log line."""
+        return ''
+
+    def summary(self):
+        counts = self.counts()
+        return f"{self.kind} finished: {counts['completed']} completed, {counts['failed']} failed, {counts['cancelled']} cancelled."
+
+    # --- scheduling ---
+
+    def _run_entry(self, entry, processes):
+        prefix = self.prefix(entry)
+        try:
+            with self.hold(entry, prefix):
+                if self.cancelled.is_set() or not LIMITER.acquire(self.cancelled):
+                    entry['state'] = 'cancelled'
+                    return
+                entry['state'] = 'running'
+                entry['started_at'] = time.time()
+                try:
+                    entry['exit_code'] = self.run_entry(entry, processes, prefix)
+                finally:
+                    LIMITER.release()
+            self.finish_entry(entry, prefix)
+        except Exception as e:
+            entry['error'] = f'{type(e).__name__}: {e}'
+            self.log.put(f"{prefix}Error: {entry['error']}\n")
+        entry['finished_at'] = time.time()
+        if self.cancelled.is_set():
+            entry['state'] = 'cancelled'
+        else:
+            entry['state'] = 'completed' if not entry['error'] and self.entry_ok(entry) else 'failed'
+        try:
+            summary = self.entry_summary(entry)
+        except Exception as e:
+            summary = f', {type(e).__name__}: {e}'
+        self.log.put(f"{prefix}--- {entry['state']} (exit code {entry['exit_code']}){summary} ---\n")
+
+    def run(self, processes, outputs=None):
+        """Runs every entry. Meant for a background thread; `outputs` (a JobOutputs) receives the log."""
+        try:
+            self.before_run(processes)
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix=f'{self.kind.lower()}-{self.id[:8]}') as pool:
+                for entry in self.entries:
+                    pool.submit(self._run_entry, entry, processes)
+        finally:
+            self.finished_at = time.time()
+            try:
+                summary = self.summary()
+            except Exception as e:
+                summary = f'{self.kind} finished ({type(e).__name__}: {e}).'
+            self.log.put(f"\n{summary}\nSTATUS: {self.status().capitalize()}\n")
+            if outputs is not None:
+                outputs[self.id] = self.log
+            self.log.put(self.end_marker)
+
+    def job_ids(self):
+        """The process table keys of the entries' commands."""
+        return [entry['job_id'] for entry in self.entries]
+
+    def cancel(self, processes):
+        self.cancelled.set()
+        for job_id in self.job_ids():
+            process = processes.get(job_id)
+            if process is not None and process.poll() is None:
+                process.terminate()
+
+
+class Batch(FanOutRun):
+    """One template run against a list of targets."""
+
+    def __init__(self, batch_id, argv, targets, concurrency):
+        super().__init__(batch_id, concurrency)
+        self.argv = argv
+        for target in targets:
+            command = [token.replace(TARGET_PLACEHOLDER, target) for token in argv]
+            self.add_entry(target=target, command=shlex.join(command), argv=command)
+
+    def describe(self, with_targets=True):
+        summary = dict(self.describe_run(), batch_id=self.id, template=shlex.join(self.argv), created_at=self.started_at)
+        if with_targets:
+            summary['targets'] = [{key: value for key, value in entry.items() if key != 'argv'}
+                                  for entry in self.entries]
+        return summary
+
+    def run_entry(self, entry, processes, prefix):
+        self.log.put(f"{prefix}$ {entry['command']}\n")
+        return run_process(entry['argv'], self.log, prefix=prefix, processes=processes, job_id=entry['job_id'],
+                           cancelled=self.cancelled)
+
+
+class RunTable:
+    """
+    The runs an app keeps for its status endpoints: FanOutRuns, or anything with an `id`, a `log`,
+    `finished_at` and run(processes, outputs). start() runs one in a background thread; the oldest
+    finished runs beyond `max_kept` are forgotten, with their queues.
+    """
+
+    def __init__(self, max_kept, processes, queues, outputs=None):
+        self.max_kept = max_kept
+        self.processes = processes
+        self.queues = queues
+        self.outputs = outputs
+        self.runs = {} # run id -> FanOutRun
+        self.lock = threading.Lock()
+
+    def get(self, run_id):
+        return self.runs.get(run_id)
+
+    def __contains__(self, run_id):
+        return run_id in self.runs
+
+    def values(self):
+        with self.lock:
+            return list(self.runs.values())
+
+    def start(self, run):
+        with self.lock:
+            finished = sorted((old for old in self.runs.values() if old.finished_at is not None), key=lambda old: old.finished_at)
+            for old in finished[:max(len(finished) - self.max_kept, 0)]:
+                del self.runs[old.id]
+                self.queues.pop(old.id, None)
+            self.runs[run.id] = run
+        self.queues[run.id] = run.log
+        if self.outputs is not None:
+            self.outputs[run.id] = run.log
+        threading.Thread(target=run.run, args=(self.processes, self.outputs), daemon=True).start()
+        return run
+
+
+def request_concurrency(data, count):
+    """
+    The `concurrency` of a fan-out request, capped by the limiter and the number of entries.
+
+    Raises:
+        ValueError: It is not a whole number.
+    """
+    try:
+        concurrency = int(data.get('concurrency') or LIMITER.limit)
+    except (TypeError, ValueError):
+        raise ValueError('concurrency must be a whole number.') from None
+    return min(max(concurrency, 1), LIMITER.limit, count)
+
+
+def request_target_text(data, key):
+    """
+    The target text of a fan-out request: the shared `targets_list` if given, else `data[key]` as a list or text.
+
+    Raises:
+        OSError: The target list cannot be read (FileNotFoundError: there is no such list).
+    """
+    if data.get('targets_list'):
+        return '\n'.join(load_target_list(data['targets_list']))
+    if isinstance(data.get(key), list):
+        return '\n'.join(str(item) for item in data[key])
+    return str(data.get(key) or '')
+
+
+def _request_targets(data):
+    uploaded = request.files.get('targets_file')
+    if uploaded is not None and uploaded.filename:
+        return parse_targets(uploaded.read().decode('utf-8', errors='replace'))
+    targets = data.get('targets')
+    if isinstance(targets, list):
+        return [str(target).strip() for target in targets if str(target).strip()]
+    if isinstance(targets, str):
+        return parse_targets(targets)
+    return None
+
+
+def init_app(app, state):
+    """Adds /run_batch and /batch/<id> to apps that declare the tools they run."""
+    if not state.tools:
+        return None
+    batches = RunTable(MAX_KEPT_BATCHES, state.processes, state.queues)
+
+    @app.route('/run_batch', methods=['POST'])
+    def run_batch():
+        """Runs a command template once per target, through the shared runner."""
+        data = request.get_json(silent=True) if request.is_json else request.form
+        data = data or {}
+        template = str(data.get('template') or '').strip()
+        try:
+            argv = shlex.split(template)
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': f'Error parsing command: {e}'}), 400
+        if not argv or not any(TARGET_PLACEHOLDER in token for token in argv):
+            return jsonify({'status': 'error', 'message': f'The template must contain {TARGET_PLACEHOLDER}.'}), 400
+        if argv[0] not in state.tools:
+            return jsonify({'status': 'error', 'message': f"Only {', '.join(state.tools)} commands are allowed."}), 403
+        if which(argv[0]) is None:
+            return jsonify({'status': 'error', 'message': f"'{argv[0]}' was not found on the server. Please ensure it is installed and in the system's PATH."}), 500
+
+        if data.get('targets_list'):
+            try:
+                targets = load_target_list(data['targets_list'])
+            except FileNotFoundError:
+                return jsonify({'status': 'not_found', 'message': f"No target list named '{data['targets_list']}'."}), 404
+            except (OSError, ValueError) as e:
+                return jsonify({'status': 'error', 'message': f'Could not read the target list: {e}'}), 400
+        else:
+            targets = _request_targets(data)
+        if not targets:
+            return jsonify({'status': 'error', 'message': 'Provide targets (a list, one per line, a targets_file upload or a targets_list name).'}), 400
+        targets = list(dict.fromkeys(targets))
+        rejected = [target for target in targets if target.startswith('-')]
+        targets = [target for target in targets if not target.startswith('-')]
+        if len(targets) > MAX_BATCH_TARGETS:
+            return jsonify({'status': 'error', 'message': f'At most {MAX_BATCH_TARGETS} targets per batch.'}), 400
+        if not targets:
+            return jsonify({'status': 'error', 'message': 'Targets must not start with "-".'}), 400
+        try:
+            concurrency = request_concurrency(data, len(targets))
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+
+        batch = batches.start(Batch(str(uuid.uuid4()), argv, targets, concurrency))
+        response = {'status': 'running', 'batch_id': batch.id, 'scan_id': batch.id, 'total': len(targets),
+                    'concurrency': concurrency, 'message': f'Batch of {len(targets)} run(s) started.'}
+        if rejected:
+            response['rejected'] = rejected
+        return jsonify(response)
+
+    @app.route('/batch/<batch_id>', methods=['GET'])
+    def batch_status(batch_id):
+        """Per-target state, counts and (with `since`) the merged output after that offset."""
+        batch = batches.get(batch_id)
+        if batch is None:
+            return jsonify({'status': 'not_found', 'message': 'Batch ID not found or expired.'}), 404
+        body = batch.describe(with_targets=request.args.get('targets') != '0')
+        if 'since' in request.args or 'wait' in request.args:
+            try:
+                since = max(int(request.args.get('since', 0)), 0)
+                wait = min(max(float(request.args.get('wait', 0)), 0.0), MAX_WAIT_SECONDS)
+            except ValueError:
+                return jsonify({'status': 'error', 'message': 'since must be an integer and wait a number.'}), 400
+            if wait > 0:
+                batch.log.wait(since, wait)
+                body = batch.describe(with_targets=request.args.get('targets') != '0')
+            body['output'], body['offset'] = batch.log.read(since)
+        return jsonify(body)
+
+    @app.route('/batch/<batch_id>/cancel', methods=['POST'])
+    def cancel_batch(batch_id):
+        """Drops the batch's queued targets and terminates the running ones."""
+        batch = batches.get(batch_id)
+        if batch is None:
+            return jsonify({'status': 'not_found', 'message': 'Batch ID not found or expired.'}), 404
+        batch.cancel(state.processes)
+        return jsonify({'status': 'success', 'message': 'Batch cancelled.', 'counts': batch.counts()})
+
+    @app.route('/batches', methods=['GET'])
+    def list_batches():
+        """Summaries of the batches this app knows, newest first."""
+        known = sorted(batches.values(), key=lambda b: b.started_at, reverse=True)
+        return jsonify({'status': 'success', 'batches': [batch.describe(with_targets=False) for batch in known]})
+
+    @app.route('/target_lists', methods=['GET'])
+    def list_target_lists():
+        """The shared target lists a batch can run against with {"targets_list": name}."""
+        return jsonify({'status': 'success', 'lists': target_lists()})
+
+    return batches
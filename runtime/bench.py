@@ -0,0 +1,64 @@
+"""
+Serialization and compression benchmark for the JSON the sub-apps send.
+
+Compares, for each payload, what the apps sent before the shared JSON
+provider and compression (stdlib json as Flask's debug mode writes it:
+indented, sorted keys, no compression) with what they send now (the fast
+provider, compact, gzip-compressed). Payloads are the largest bundled
+examples files, served whole by `/get_examples`, and a synthetic
+`/get_scan_output` body of a large scan.
+"""
+import glob
+import gzip
+import json
+import os
+import time
+
+from flask import Flask
+
+from . import compression
+from .serialization import FastJSONProvider
+
+
+def _examples_payloads(database, count):
+    files = sorted(glob.glob(os.path.join(database, '*', '*[eE]xamples.txt')), key=os.path.getsize, reverse=True)
+    payloads = []
+    for path in files[:count]:
+        try:
+            with open(path, encoding='utf-8') as f:
+                payloads.append((f'{os.path.basename(os.path.dirname(path))} /get_examples', json.load(f)))
+        except (OSError, ValueError):
+            continue
+    return payloads
+
+
+def _scan_output_payload(lines):
+    output = '\n'.join(f'Discovered open port {port % 65535 + 1}/tcp on 10.0.{port // 250 % 250}.{port % 250} '
+                       f'(service: http, "Apache httpd 2.4.{port % 60}")' for port in range(lines))
+    return (f'scan output ({lines} lines)', {'status': 'completed', 'output': output, 'offset': len(output)})
+
+
+def _best(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run(database, count=5, scan_lines=50000, repeat=20):
+    """Prints bytes on the wire and serialization time before/after for each payload."""
+    provider = FastJSONProvider(Flask(__name__))
+    payloads = _examples_payloads(database, count) + [_scan_output_payload(scan_lines)]
+
+    print(f'JSON backend: {provider.backend}, gzip level {compression.COMPRESS_LEVEL}, best of {repeat} runs')
+    print(f"{'payload':<34} {'before bytes':>12} {'after bytes':>11} {'ratio':>6}   "
+          f"{'before ms':>9} {'after ms':>8} {'(+gzip)':>8}")
+    for name, obj in payloads:
+        before_time, before = _best(lambda: (json.dumps(obj, indent=2, sort_keys=True) + '\n').encode('utf-8'), repeat)
+        dump_time, body = _best(lambda: provider.dumps_bytes(obj) + b'\n', repeat)
+        gzip_time, after = _best(lambda: gzip.compress(body, compresslevel=compression.COMPRESS_LEVEL), repeat)
+        print(f'{name:<34} {len(before):>12} {len(after):>11} {len(before) / len(after):>5.1f}x   '
+              f'{before_time * 1000:>9.2f} {dump_time * 1000:>8.2f} {(dump_time + gzip_time) * 1000:>8.2f}')
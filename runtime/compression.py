@@ -0,0 +1,104 @@
+"""
+gzip/deflate compression of sub-app responses.
+
+Text-like responses (JSON, HTML, plain text, event streams, ...) are
+compressed when the client accepts gzip or deflate:
+
+* buffered bodies once they are at least CYBERWEB_COMPRESS_MIN_BYTES long
+  (default 1024);
+* streamed bodies (chunked downloads, server-sent events) chunk by chunk, with
+  a sync flush after every chunk so each event still reaches the browser as
+  soon as it is produced.
+
+Responses that already have a Content-Encoding (the precompressed assets),
+file passthroughs and range responses are left alone.
+"""
+import os
+import zlib
+
+from flask import request
+
+try:
+    MIN_BYTES = int(os.environ.get('CYBERWEB_COMPRESS_MIN_BYTES', 1024))
+except ValueError:
+    MIN_BYTES = 1024
+
+COMPRESS_LEVEL = 6
+COMPRESSIBLE_TYPES = (
+    'text/', 'application/json', 'application/javascript', 'application/xml',
+    'application/x-ndjson', 'image/svg+xml',
+)
+# zlib wbits for each Content-Encoding
+WBITS = {'gzip': 31, 'deflate': 15}
+
+
+def _accepted_encoding():
+    accepted = {}
+    for part in request.headers.get('Accept-Encoding', '').split(','):
+        name, _sep, params = part.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding in ('gzip', 'deflate'):
+        if accepted.get(encoding, 0) > 0:
+            return encoding
+    return None
+
+
+def _compressible(response):
+    if response.status_code < 200 or response.status_code in (204, 206, 304) or request.method == 'HEAD':
+        return False
+    if response.direct_passthrough or 'Content-Encoding' in response.headers or 'Content-Range' in response.headers:
+        return False
+    return (response.mimetype or '').startswith(COMPRESSIBLE_TYPES)
+
+
+def _compress_stream(iterable, encoding):
+    """Compresses a streamed body, flushing after every chunk."""
+    compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, WBITS[encoding])
+    try:
+        for chunk in iterable:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            if chunk:
+                yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+    finally:
+        close = getattr(iterable, 'close', None)
+        if close is not None:
+            close()
+
+
+def _add_vary(response):
+    vary = response.headers.get('Vary', '')
+    if 'accept-encoding' not in vary.lower():
+        response.headers['Vary'] = f'{vary}, Accept-Encoding' if vary else 'Accept-Encoding'
+
+
+def init_app(app, state, min_bytes=None):
+    """Compresses the app's text responses when the client accepts it."""
+    app.config.setdefault('RUNTIME_COMPRESS_MIN_BYTES', MIN_BYTES if min_bytes is None else min_bytes)
+
+    @app.after_request
+    def _compress_response(response):
+        if not _compressible(response):
+            return response
+        if not response.is_streamed and (response.content_length or 0) < app.config['RUNTIME_COMPRESS_MIN_BYTES']:
+            return response
+        encoding = _accepted_encoding()
+        _add_vary(response)
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = _compress_stream(response.response, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            compressor = zlib.compressobj(COMPRESS_LEVEL, zlib.DEFLATED, WBITS[encoding])
+            response.set_data(compressor.compress(response.get_data()) + compressor.flush())
+        response.headers['Content-Encoding'] = encoding
+        return response
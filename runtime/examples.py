@@ -0,0 +1,210 @@
+"""
+Shared examples service for the tool apps.
+
+Each tool ships a JSON examples file (name, description, options and a long
+example_output per entry). `ExamplesIndex` parses it once, re-parses it only
+when its mtime or size changes, and keeps an inverted index over the example
+names, descriptions and option keys. The app's `/get_examples` route returns
+`EXAMPLES.serve()`:
+
+* `GET /get_examples` returns the full array, as before.
+* `GET /get_examples?q=syn scan&offset=0&limit=50&fields=id,name,description,options`
+  returns `{"total", "offset", "limit", "examples"}` with only the matching
+  examples and the requested fields. `example_output` is left out unless asked
+  for, and can be fetched per example from `GET /get_examples/<id>`.
+
+Every response carries an ETag derived from the file version and the query,
+so a repeat load of an unchanged examples file is a 304.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import namedtuple
+
+from flask import Response, jsonify, request
+
+TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+LIST_FIELDS = ('id', 'name', 'description', 'options')
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 1000
+
+# How often (seconds) to stat the examples file for changes
+RELOAD_CHECK_SECONDS = 2.0
+
+
+# One parsed version of the file. It is replaced as a whole on reload, so a reader that takes
+# `index.snapshot` once never mixes the examples of one version with the index of another.
+Snapshot = namedtuple('Snapshot', 'examples postings vocabulary version')
+EMPTY = Snapshot([], {}, [], 'empty')
+
+
+def _resolve(root, filename):
+    """Finds the examples file, tolerating a different case (e.g. ffuf_Examples.txt)."""
+    path = os.path.join(root, filename)
+    if os.path.exists(path):
+        return path
+    try:
+        for entry in os.listdir(root):
+            if entry.lower() == filename.lower():
+                return os.path.join(root, entry)
+    except OSError:
+        pass
+    return path
+
+
+def _tokens(text):
+    return TOKEN_PATTERN.findall(str(text).lower())
+
+
+class ExamplesIndex:
+    """Parsed, indexed examples file of one tool app."""
+
+    def __init__(self, app, filename):
+        self.path = _resolve(app.root_path, filename)
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._file_key = None
+        self._checked_at = 0.0
+        self.snapshot = EMPTY
+        self._load()
+        app.add_url_rule('/get_examples/<int:example_id>', 'get_example', self.serve_one, methods=['GET'])
+
+    def _load(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            print(f"Error: Examples file '{self.filename}' not found. Please ensure it's in the same directory as app.py.")
+            self._file_key = None
+            return
+        file_key = (stat.st_mtime_ns, stat.st_size)
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                examples = json.load(f)
+        except (OSError, ValueError) as e:
+            # Keep serving the previous version until the file is fixed
+            print(f"Error decoding JSON from '{self.filename}': {e}")
+            self._file_key = file_key
+            return
+        if not isinstance(examples, list):
+            print(f"Error: '{self.filename}' does not contain a JSON array of examples.")
+            examples = []
+
+        postings = {}
+        for example_id, example in enumerate(examples):
+            if not isinstance(example, dict):
+                continue
+            words = _tokens(example.get('name', '')) + _tokens(example.get('description', ''))
+            options = example.get('options')
+            if isinstance(options, dict):
+                for key in options:
+                    words.extend(_tokens(key))
+            for word in set(words):
+                postings.setdefault(word, []).append(example_id)
+
+        version = hashlib.sha1(f'{self.path}:{file_key}'.encode()).hexdigest()[:16]
+        self.snapshot = Snapshot(examples, postings, sorted(postings), version)
+        self._file_key = file_key
+
+    @property
+    def examples(self):
+        return self.snapshot.examples
+
+    @property
+    def version(self):
+        return self.snapshot.version
+
+    def refresh(self):
+        """Re-parses the file if it changed, checking at most every RELOAD_CHECK_SECONDS."""
+        now = time.monotonic()
+        if now - self._checked_at < RELOAD_CHECK_SECONDS:
+            return
+        with self._lock:
+            if now - self._checked_at < RELOAD_CHECK_SECONDS:
+                return
+            self._checked_at = now
+            try:
+                stat = os.stat(self.path)
+                file_key = (stat.st_mtime_ns, stat.st_size)
+            except OSError:
+                file_key = None
+            if file_key != self._file_key:
+                self._load()
+
+    def search(self, query, snapshot=None):
+        """Returns the ids of the examples matching every word of the query (prefix match)."""
+        snapshot = snapshot or self.snapshot
+        words = _tokens(query)
+        if not words:
+            return list(range(len(snapshot.examples)))
+        vocabulary = snapshot.vocabulary
+        matches = None
+        for word in words:
+            ids = set()
+            position = bisect_left(vocabulary, word)
+            while position < len(vocabulary) and vocabulary[position].startswith(word):
+                ids.update(snapshot.postings[vocabulary[position]])
+                position += 1
+            matches = ids if matches is None else matches & ids
+            if not matches:
+                return []
+        return sorted(matches)
+
+    @staticmethod
+    def _project(snapshot, example_id, fields):
+        example = snapshot.examples[example_id]
+        record = dict(example) if isinstance(example, dict) else {'value': example}
+        record['id'] = example_id
+        if fields is None:
+            return record
+        return {field: record[field] for field in fields if field in record}
+
+    @staticmethod
+    def _conditional(snapshot, build_body):
+        """Answers 304 when the client already has this version, else builds and tags the body."""
+        etag = hashlib.sha1(f'{snapshot.version}?{request.query_string.decode()}'.encode()).hexdigest()[:20]
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = build_body()
+        response.set_etag(etag)
+        response.cache_control.no_cache = True # Always revalidate, which is cheap thanks to the ETag
+        return response
+
+    def serve(self):
+        """Response for the app's /get_examples route."""
+        self.refresh()
+        snapshot = self.snapshot
+        args = request.args
+        if not any(key in args for key in ('q', 'offset', 'limit', 'fields')):
+            return self._conditional(snapshot, lambda: jsonify(snapshot.examples))
+
+        try:
+            offset = max(int(args.get('offset', 0)), 0)
+            limit = min(max(int(args.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'offset and limit must be integers.'}), 400
+        fields = [field.strip() for field in args['fields'].split(',') if field.strip()] if args.get('fields') else LIST_FIELDS
+
+        def build():
+            ids = self.search(args.get('q', ''), snapshot)
+            return jsonify({
+                'total': len(ids),
+                'offset': offset,
+                'limit': limit,
+                'examples': [self._project(snapshot, example_id, fields) for example_id in ids[offset:offset + limit]],
+            })
+        return self._conditional(snapshot, build)
+
+    def serve_one(self, example_id):
+        """Response for /get_examples/<id>, e.g. to lazy-load one example_output."""
+        self.refresh()
+        snapshot = self.snapshot
+        if example_id >= len(snapshot.examples):
+            return jsonify({'status': 'not_found', 'message': 'Example not found.'}), 404
+        fields = [field.strip() for field in request.args['fields'].split(',') if field.strip()] \
+            if request.args.get('fields') else None
+        return self._conditional(snapshot, lambda: jsonify(self._project(snapshot, example_id, fields)))
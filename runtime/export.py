@@ -0,0 +1,136 @@
+"""
+Server-side export of job output.
+
+The tool UIs used to save output by posting the whole text back to
+`/save_output`, although the server already has it. These endpoints read it
+from the job's OutputLog (or the app's stored final output) instead. A finished
+job's log stays in the app's JobOutputs after its poller drops the queue, so
+its spool file can still be sent as is:
+
+* `GET /jobs/<id>/export?format=txt|jsonl|gz` streams it as a download.
+  Finished jobs whose output was spooled to disk are sent with `send_file`.
+* `POST /jobs/<id>/export` with `{"format": "txt", "filename": "..."}` writes
+  it into the app's upload folder and returns a `download_url`, like
+  `/save_output` does.
+"""
+import json
+import os
+import shutil
+import time
+import zlib
+
+from flask import Response, jsonify, request, send_file, url_for
+
+from .jobs import OutputLog, stored_log
+
+EXPORT_FORMATS = {
+    'txt': ('text/plain; charset=utf-8', '.txt'),
+    'jsonl': ('application/x-ndjson', '.jsonl'),
+    'gz': ('application/gzip', '.txt.gz'),
+}
+
+
+def _source_blocks(state, job_id):
+    """Returns (iterator of output byte blocks, OutputLog or None), or None if the job is unknown."""
+    log = state.queues.get(job_id)
+    if not isinstance(log, OutputLog):
+        log = stored_log(state.outputs, job_id)
+    if log is not None:
+        return log.iter_bytes(0, log.size), log
+    output = state.outputs.get(job_id)
+    if not isinstance(output, str):
+        return None
+    encoded = output.encode('utf-8', 'replace')
+    return (encoded[i:i + 64 * 1024] for i in range(0, len(encoded), 64 * 1024)), None
+
+
+def _jsonl_blocks(blocks):
+    """Turns output blocks into one JSON object per output line."""
+    number = 0
+    remainder = b''
+    for block in blocks:
+        lines = (remainder + block).split(b'\n')
+        remainder = lines.pop()
+        encoded = []
+        for line in lines:
+            number += 1
+            encoded.append(json.dumps({'line': number, 'text': line.decode('utf-8', 'replace')}))
+        if encoded:
+            yield ('\n'.join(encoded) + '\n').encode('utf-8')
+    if remainder:
+        yield (json.dumps({'line': number + 1, 'text': remainder.decode('utf-8', 'replace')}) + '\n').encode('utf-8')
+
+
+def _gzip_blocks(blocks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) # wbits 31 = gzip container
+    for block in blocks:
+        compressed = compressor.compress(block)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def export_blocks(blocks, export_format):
+    if export_format == 'jsonl':
+        return _jsonl_blocks(blocks)
+    if export_format == 'gz':
+        return _gzip_blocks(blocks)
+    return blocks
+
+
+def init_app(app, state):
+    """Adds /jobs/<id>/export to a sub-app."""
+
+    def default_filename(job_id, export_format):
+        return f"{state.tool.replace(' ', '_')}_output_{job_id}{EXPORT_FORMATS[export_format][1]}"
+
+    @app.route('/jobs/<job_id>/export', methods=['GET', 'POST'])
+    def export_job_output(job_id):
+        """Streams a job's output as a download, or saves it into the upload folder."""
+        data = (request.get_json(silent=True) or {}) if request.method == 'POST' else request.args
+        export_format = data.get('format', 'txt')
+        if export_format not in EXPORT_FORMATS:
+            return jsonify({'status': 'error', 'message': f"format must be one of {', '.join(EXPORT_FORMATS)}."}), 400
+        source = _source_blocks(state, job_id)
+        if source is None:
+            return jsonify({'status': 'not_found', 'message': 'Job ID not found or expired.'}), 404
+        blocks, log = source
+        filename = os.path.basename(data.get('filename') or '') or default_filename(job_id, export_format)
+        mimetype = EXPORT_FORMATS[export_format][0]
+        spooled_txt = log is not None and export_format == 'txt' and log.finished and log.spooled
+
+        if request.method == 'GET':
+            if spooled_txt:
+                blocks.close()
+                return send_file(log.spool_path, mimetype=mimetype, as_attachment=True, download_name=filename)
+            response = Response(export_blocks(blocks, export_format), mimetype=mimetype)
+            response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+            return response
+
+        if not state.upload_folder:
+            return jsonify({'status': 'error', 'message': 'This sub-app has no upload folder to save into.'}), 400
+        os.makedirs(state.upload_folder, exist_ok=True)
+        file_path = os.path.join(state.upload_folder, filename)
+        started = time.perf_counter()
+        try:
+            if spooled_txt:
+                blocks.close()
+                shutil.copyfile(log.spool_path, file_path) # Uses sendfile() where available
+            else:
+                with open(file_path, 'wb') as f:
+                    for block in export_blocks(blocks, export_format):
+                        f.write(block)
+        except OSError as e:
+            return jsonify({'status': 'error', 'message': f'Failed to save file: {e}'}), 500
+
+        if 'download_output' in app.view_functions:
+            download_url = url_for('download_output', filename=filename)
+        else:
+            download_url = url_for('export_job_output', job_id=job_id, format=export_format, filename=filename)
+        return jsonify({
+            'status': 'success',
+            'message': 'File saved successfully.',
+            'download_url': download_url,
+            'bytes': os.path.getsize(file_path),
+            'seconds': round(time.perf_counter() - started, 3),
+        })
@@ -0,0 +1,356 @@
+"""
+Job output logs and long-polling for the output polling endpoints.
+
+The tool apps feed each job's output into a per-job queue that
+`/get_scan_output/<id>` (and its per-tool siblings) drains every 500 ms.
+`OutputLog` is a drop-in replacement for that `queue.Queue`: the app keeps
+calling `put()`/`get_nowait()` as before, but every line is also kept in an
+append-only log guarded by a condition variable. That lets the runtime answer
+
+    GET /get_scan_output/<id>?since=<offset>&wait=25
+
+by blocking until output past byte `offset` arrives (or the job ends, or `wait`
+seconds pass) and returning only that output together with the new offset.
+Requests without `since`/`wait` go to the app's own handler unchanged.
+`POST /jobs/<id>/cancel` stops a job: it sets the log's `cancelled` event,
+which the runners check before they start their command (e.g. while the job
+waits for rate budget, see ratelimit.py), and terminates a running command.
+
+The apps keep their final outputs in a `JobOutputs` table. A job stores its
+OutputLog there instead of a joined copy of its output: reading the entry
+returns the log's text, while long-polling and the export read the log itself
+(and its spool file) after the app's poller has dropped the queue.
+"""
+import os
+import queue
+import re
+import tempfile
+import threading
+import time
+import weakref
+from bisect import bisect_right
+from collections import deque
+
+from flask import jsonify, request
+
+# Endpoints the tool templates poll for job output
+POLL_ENDPOINTS = {
+    'get_scan_output', 'get_tool_output', 'get_command_output',
+    'get_msf_output', 'get_process_output', 'get_tunnel_output',
+}
+
+# Longest a long-poll request may block, whatever `wait` asks for (seconds)
+MAX_WAIT_SECONDS = 60
+
+# Output beyond this many bytes per job is kept in a spool file instead of memory
+try:
+    SPOOL_THRESHOLD = int(os.environ.get('CYBERWEB_SPOOL_BYTES', 8 * 1024 * 1024))
+except ValueError:
+    SPOOL_THRESHOLD = 8 * 1024 * 1024
+
+# Most item text a fan-out run's log keeps for a get_nowait() poller; older items are dropped past it
+try:
+    PENDING_LIMIT = int(os.environ.get('CYBERWEB_PENDING_BYTES', 1024 * 1024))
+except ValueError:
+    PENDING_LIMIT = 1024 * 1024
+
+# The apps signal the end of a job by putting a marker such as ---SCAN_COMPLETE--- in its queue
+MARKER_PATTERN = re.compile(r'^---[A-Z_]+---$')
+MARKER_STATUS = {
+    '---INSTALL_COMPLETE_SUCCESS---': 'success',
+    '---INSTALL_COMPLETE_FAILURE---': 'error',
+    '---INSTALL_COMPLETE_INFO---': 'info',
+}
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class OutputLog:
+    """
+    Append-only job output with a queue.Queue-compatible interface.
+
+    `put()`, `get()`, `get_nowait()`, `empty()` and `qsize()` behave like the
+    queue the apps used before (each item is handed out once). `read(since)`,
+    `iter_bytes()` and `wait(since, timeout)` work on byte offsets into the
+    UTF-8 encoded output and never consume anything, so any number of viewers
+    can follow the job.
+
+    Once the output grows past `spool_threshold` bytes it is moved to a spool
+    file and further output is appended there, so long scans do not hold
+    hundreds of megabytes in memory; the file is removed with the log.
+
+    Items for the queue interface are only kept while nobody reads by offset:
+    once a long-poll reader attaches, only the end marker is still queued.
+    Logs created with a `pending_limit` (fan-out runs such as batches, shards
+    and bulk runs, which are read by offset) keep at most that many bytes of
+    items, dropping the oldest; the other logs keep every item for their
+    app's legacy poller.
+    """
+
+    def __init__(self, spool_threshold=None, spool_dir=None, pending_limit=None):
+        self._cond = threading.Condition()
+        self._chunks = [] # Output text in arrival order (until spooled)
+        self._ends = [] # Byte offset just past each chunk, for bisecting
+        self._pending = deque() # Items not yet taken through the queue interface
+        self._pending_size = 0 # Text length of the str items in _pending
+        self.pending_limit = pending_limit # None: keep every item until it is taken
+        self.reader_attached = False
+        self.cancelled = threading.Event() # Set by /jobs/<id>/cancel; the command is then not started
+        self.size = 0
+        self.marker = None
+        self.updated_at = time.time()
+        self.spool_threshold = SPOOL_THRESHOLD if spool_threshold is None else spool_threshold
+        self.spool_dir = spool_dir
+        self.spool_path = None
+        self._spool = None
+
+    # --- queue.Queue interface ---
+
+    def put(self, item, block=True, timeout=None):
+        with self._cond:
+            is_marker = isinstance(item, str) and MARKER_PATTERN.match(item)
+            if is_marker:
+                self.marker = item
+            elif item:
+                self._append(item)
+            if is_marker or not self.reader_attached:
+                self._queue(item)
+            self.updated_at = time.time()
+            self._cond.notify_all()
+
+    def _queue(self, item):
+        self._pending.append(item)
+        if isinstance(item, str):
+            self._pending_size += len(item)
+        if self.pending_limit is None:
+            return
+        while self._pending_size > self.pending_limit and len(self._pending) > 1:
+            dropped = self._pending.popleft()
+            if isinstance(dropped, str):
+                if MARKER_PATTERN.match(dropped): # Never lose the end marker
+                    self._pending.appendleft(dropped)
+                    break
+                self._pending_size -= len(dropped)
+
+    def attach_reader(self):
+        """Notes that the output is read by offset, so the queue interface no longer keeps items."""
+        with self._cond:
+            if not self.reader_attached:
+                self.reader_attached = True
+                self._pending = deque(item for item in self._pending if isinstance(item, str) and MARKER_PATTERN.match(item))
+                self._pending_size = sum(len(item) for item in self._pending)
+
+    def put_nowait(self, item):
+        self.put(item, block=False)
+
+    def get(self, block=True, timeout=None):
+        with self._cond:
+            if not block:
+                if not self._pending:
+                    raise queue.Empty
+            elif not self._cond.wait_for(lambda: self._pending, timeout):
+                raise queue.Empty
+            item = self._pending.popleft()
+            if isinstance(item, str):
+                self._pending_size -= len(item)
+            return item
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def empty(self):
+        with self._cond:
+            return not self._pending
+
+    def qsize(self):
+        with self._cond:
+            return len(self._pending)
+
+    # --- log interface ---
+
+    def _append(self, item):
+        encoded = item.encode('utf-8', 'replace') if isinstance(item, str) else bytes(item)
+        if self._spool is None and self.spool_threshold and self.size + len(encoded) > self.spool_threshold:
+            self._spill()
+        if self._spool is not None:
+            self._spool.write(encoded)
+            self._spool.flush()
+        else:
+            self._chunks.append(item if isinstance(item, str) else encoded.decode('utf-8', 'replace'))
+            self._ends.append(self.size + len(encoded))
+        self.size += len(encoded)
+
+    def _spill(self):
+        """Moves the in-memory output to a spool file."""
+        handle = tempfile.NamedTemporaryFile(prefix='cyberweb-job-', suffix='.log', dir=self.spool_dir, delete=False)
+        for chunk in self._chunks:
+            handle.write(chunk.encode('utf-8', 'replace'))
+        handle.flush()
+        self._spool = handle
+        self.spool_path = handle.name
+        weakref.finalize(self, _remove_quietly, handle.name)
+        weakref.finalize(self, handle.close)
+        self._chunks = []
+        self._ends = []
+
+    @property
+    def finished(self):
+        return self.marker is not None
+
+    @property
+    def spooled(self):
+        return self.spool_path is not None
+
+    def status(self):
+        """Returns the status the polling endpoints report for this job."""
+        if self.marker is None:
+            return 'running'
+        return MARKER_STATUS.get(self.marker, 'completed')
+
+    def pending_bytes(self):
+        """Text length of the items the legacy poller has not taken yet."""
+        with self._cond:
+            return self._pending_size
+
+    def iter_bytes(self, since=0, end=None, block_size=64 * 1024):
+        """Yields the encoded output between two offsets (default: everything so far) in blocks."""
+        with self._cond:
+            end = self.size if end is None else min(end, self.size)
+            since = min(max(since, 0), end)
+            spool_path = self.spool_path
+            if spool_path is None:
+                index = bisect_right(self._ends, since)
+                chunks = self._chunks[index:bisect_right(self._ends, end - 1) + 1] if end > since else []
+                first_start = self._ends[index] - len(chunks[0].encode('utf-8', 'replace')) if chunks else since
+        if spool_path is not None:
+            # Everything below `end` has been flushed, so the file can be read without the lock
+            with open(spool_path, 'rb') as f:
+                f.seek(since)
+                remaining = end - since
+                while remaining > 0:
+                    block = f.read(min(block_size, remaining))
+                    if not block:
+                        break
+                    remaining -= len(block)
+                    yield block
+            return
+        position = first_start
+        buffered = []
+        buffered_size = 0
+        for chunk in chunks:
+            data = chunk.encode('utf-8', 'replace')
+            chunk_start, position = position, position + len(data)
+            if chunk_start < since or position > end:
+                data = data[max(since - chunk_start, 0):end - chunk_start]
+            buffered.append(data)
+            buffered_size += len(data)
+            if buffered_size >= block_size:
+                yield b''.join(buffered)
+                buffered, buffered_size = [], 0
+        if buffered_size:
+            yield b''.join(buffered)
+
+    def read(self, since=0):
+        """Returns (output after offset `since`, offset of the end of the output)."""
+        end = self.size
+        return b''.join(self.iter_bytes(since, end)).decode('utf-8', 'replace'), max(end, since)
+
+    def text(self):
+        return self.read(0)[0]
+
+    def wait(self, since, timeout):
+        """Blocks until there is output past `since` or the job has ended. Returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self.size > since or self.marker is not None, timeout)
+
+
+class JobOutputs(dict):
+    """
+    Job id -> final output. Values are strings or the job's OutputLog; reading an
+    entry with `[]` or get() returns the text either way, log() the OutputLog.
+    """
+
+    def __getitem__(self, job_id):
+        value = super().__getitem__(job_id)
+        return value.text() if isinstance(value, OutputLog) else value
+
+    def get(self, job_id, default=None):
+        return self[job_id] if job_id in self else default
+
+    def log(self, job_id):
+        return stored_log(self, job_id)
+
+
+def stored_log(outputs, job_id):
+    """The OutputLog `outputs` keeps for a job in place of its text, or None."""
+    value = dict.get(outputs, job_id) if isinstance(outputs, dict) else None
+    return value if isinstance(value, OutputLog) else None
+
+
+def long_poll(state, job_id, since, wait):
+    """Builds the (body, status code) of a long-poll request for one job."""
+    log = state.queues.get(job_id)
+    if log is None:
+        # The app's own poller already cleaned up; read the stored log or the stored final output
+        log = stored_log(state.outputs, job_id)
+    if log is None:
+        final_output = state.outputs.get(job_id)
+        if final_output is None:
+            return {'status': 'not_found', 'message': 'Job ID not found or expired.'}, 404
+        status = state.outputs.get(f'{job_id}_status') or 'completed'
+        encoded = final_output.encode('utf-8', 'replace')
+        return {'status': status, 'output': encoded[since:].decode('utf-8', 'replace'), 'offset': len(encoded)}, 200
+    if not isinstance(log, OutputLog):
+        return None
+
+    log.attach_reader()
+    if wait > 0:
+        log.wait(since, wait)
+    output, offset = log.read(since)
+    status = log.status()
+    stored = stored_log(state.outputs, job_id) is log or (job_id in state.outputs and (state.outputs[job_id] or not log.size))
+    if log.finished and stored:
+        # The final output is stored, so later polls are served from it and the job is no longer active
+        state.queues.pop(job_id, None)
+        if status != 'completed':
+            state.outputs[f'{job_id}_status'] = status
+    return {'status': status, 'output': output, 'offset': offset}, 200
+
+
+def init_app(app, state):
+    """Serves `since`/`wait` requests to the output polling endpoints from the job's OutputLog."""
+
+    @app.before_request
+    def _jobs_long_poll():
+        if request.endpoint not in POLL_ENDPOINTS:
+            return None
+        if 'since' not in request.args and 'wait' not in request.args:
+            return None
+        try:
+            since = max(int(request.args.get('since', 0)), 0)
+            wait = min(max(float(request.args.get('wait', 0)), 0.0), MAX_WAIT_SECONDS)
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'since must be an integer and wait a number.'}), 400
+        job_id = next(iter((request.view_args or {}).values()), None)
+        result = long_poll(state, job_id, since, wait)
+        if result is None:
+            return None # Not an OutputLog: let the app's handler answer the old way
+        body, code = result
+        return jsonify(body), code
+
+    @app.route('/jobs/<job_id>/cancel', methods=['POST'])
+    def cancel_job(job_id):
+        """Stops a job, also while it waits to start."""
+        log = state.queues.get(job_id)
+        if not isinstance(log, OutputLog) or log.finished:
+            return jsonify({'status': 'not_found', 'message': 'Job ID not found or already finished.'}), 404
+        log.cancelled.set()
+        process = state.processes.get(job_id)
+        if process is not None and process.poll() is None:
+            process.terminate()
+        return jsonify({'status': 'success', 'message': 'Job cancelled.'})
@@ -0,0 +1,153 @@
+"""
+tracemalloc snapshots and diffs for tracking down memory growth in a sub-app.
+
+Tracing slows every allocation down, so it is off unless the sub-app is
+started with CYBERWEB_DEBUG_MEMORY=1 (CYBERWEB_TRACEMALLOC_FRAMES sets how many
+frames are kept per allocation, default 1). When it is on:
+
+* `GET /debug/memory/snapshot?limit=25&group_by=lineno` takes a snapshot, keeps
+  it under a numeric id and returns the top allocation sites by size.
+* `GET /debug/memory/diff?from=<id>[&to=<id>]` compares a kept snapshot with a
+  later one (a fresh snapshot when `to` is omitted) and returns the sites that
+  grew the most.
+"""
+import os
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+
+from flask import jsonify, request
+
+# Snapshots hold a record per allocation site, so only the most recent few are kept
+MAX_SNAPSHOTS = 10
+GROUP_BY_CHOICES = ('lineno', 'filename', 'traceback')
+
+_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+
+def _site(stat_traceback, group_by):
+    if group_by == 'traceback':
+        return [f'{frame.filename}:{frame.lineno}' for frame in stat_traceback]
+    frame = stat_traceback[0]
+    return frame.filename if group_by == 'filename' else f'{frame.filename}:{frame.lineno}'
+
+
+class SnapshotStore:
+    """Keeps the most recent tracemalloc snapshots under increasing ids."""
+
+    def __init__(self, limit=MAX_SNAPSHOTS):
+        self.limit = limit
+        self.lock = threading.Lock()
+        self.snapshots = OrderedDict() # id -> (taken at, Snapshot)
+        self.next_id = 1
+
+    def take(self):
+        snapshot = tracemalloc.take_snapshot().filter_traces(_FILTERS)
+        with self.lock:
+            snapshot_id = self.next_id
+            self.next_id += 1
+            self.snapshots[snapshot_id] = (time.time(), snapshot)
+            while len(self.snapshots) > self.limit:
+                self.snapshots.popitem(last=False)
+        return snapshot_id, snapshot
+
+    def get(self, snapshot_id):
+        with self.lock:
+            return self.snapshots.get(snapshot_id)
+
+
+def init_app(app, state):
+    """Adds the /debug/memory endpoints, starting tracemalloc if enabled."""
+    enabled = os.environ.get('CYBERWEB_DEBUG_MEMORY', '').strip().lower() in ('1', 'true', 'yes', 'on')
+    if enabled and not tracemalloc.is_tracing():
+        try:
+            frames = max(int(os.environ.get('CYBERWEB_TRACEMALLOC_FRAMES', 1)), 1)
+        except ValueError:
+            frames = 1
+        tracemalloc.start(frames)
+    store = SnapshotStore()
+    state.memory = store
+
+    def disabled_response():
+        return jsonify({'status': 'error', 'message': 'Memory debugging is off. Restart the sub-app with '
+                                                      'CYBERWEB_DEBUG_MEMORY=1 to enable it.'}), 404
+
+    def parse_options():
+        group_by = request.args.get('group_by', 'lineno')
+        if group_by not in GROUP_BY_CHOICES:
+            raise ValueError(f"group_by must be one of {', '.join(GROUP_BY_CHOICES)}.")
+        try:
+            limit = min(max(int(request.args.get('limit', 25)), 1), 500)
+        except ValueError:
+            raise ValueError('limit must be an integer.')
+        return group_by, limit
+
+    def traced_memory():
+        current, peak = tracemalloc.get_traced_memory()
+        return {'current_bytes': current, 'peak_bytes': peak}
+
+    @app.route('/debug/memory/snapshot', methods=['GET'])
+    def debug_memory_snapshot():
+        """Takes a snapshot and returns the top allocation sites by size."""
+        if not enabled:
+            return disabled_response()
+        try:
+            group_by, limit = parse_options()
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+        snapshot_id, snapshot = store.take()
+        stats = snapshot.statistics(group_by)
+        return jsonify({
+            'status': 'success',
+            'id': snapshot_id,
+            'traced': traced_memory(),
+            'total_bytes': sum(stat.size for stat in stats),
+            'top': [{'site': _site(stat.traceback, group_by), 'size_bytes': stat.size, 'count': stat.count}
+                    for stat in stats[:limit]],
+        })
+
+    @app.route('/debug/memory/diff', methods=['GET'])
+    def debug_memory_diff():
+        """Compares a kept snapshot with a later one and returns the biggest growth."""
+        if not enabled:
+            return disabled_response()
+        try:
+            group_by, limit = parse_options()
+            from_id = int(request.args['from'])
+            to_id = int(request.args['to']) if request.args.get('to') else None
+        except KeyError:
+            return jsonify({'status': 'error', 'message': "The 'from' snapshot id is required."}), 400
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
+
+        older = store.get(from_id)
+        if older is None:
+            return jsonify({'status': 'not_found', 'message': f'Snapshot {from_id} not found or expired.'}), 404
+        if to_id is None:
+            to_id, newer_snapshot = store.take()
+            newer = (time.time(), newer_snapshot)
+        else:
+            newer = store.get(to_id)
+            if newer is None:
+                return jsonify({'status': 'not_found', 'message': f'Snapshot {to_id} not found or expired.'}), 404
+
+        diff = newer[1].compare_to(older[1], group_by)
+        return jsonify({
+            'status': 'success',
+            'from': from_id,
+            'to': to_id,
+            'elapsed_seconds': round(newer[0] - older[0], 3),
+            'traced': traced_memory(),
+            'total_growth_bytes': sum(stat.size_diff for stat in diff),
+            'top': [{'site': _site(stat.traceback, group_by), 'size_bytes': stat.size,
+                     'growth_bytes': stat.size_diff, 'count': stat.count, 'count_growth': stat.count_diff}
+                    for stat in diff[:limit]],
+        })
+
+    return store
@@ -0,0 +1,325 @@
+"""
+Prometheus text-format metrics for the sub-apps.
+
+`init_app` adds a `/metrics` route and request hooks to a sub-app. Request
+counters and latency histograms are updated as requests are served; the job,
+upload and child-process gauges are computed from the app's own tables each
+time `/metrics` is scraped, so the tool apps do not need to report anything
+themselves.
+"""
+import os
+import threading
+import time
+
+from flask import Response, g, request
+
+from .jobs import POLL_ENDPOINTS, OutputLog
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Same defaults as the official Prometheus client libraries (seconds)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_START_TIME = time.time()
+try:
+    _CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+except (AttributeError, ValueError, OSError):
+    _CLOCK_TICKS = 100
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """Base class for a labelled metric family."""
+    type_name = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple((name, labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        """Yields (suffix, label pairs, value) for every child of this family."""
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield '', key, value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type_name}']
+        for suffix, labels, value in self.samples():
+            lines.append(f'{self.name}{suffix}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines)
+
+
+class Counter(_Metric):
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    type_name = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(counts), total)) for key, (counts, total) in self._values.items()]
+        for key, (counts, total) in items:
+            for bound, count in zip(self.buckets, counts):
+                yield '_bucket', key + (('le', _format_value(float(bound))),), count
+            yield '_count', key, counts[-1]
+            yield '_sum', key, total
+
+
+class Registry:
+    """Holds the metric families of one sub-app plus scrape-time collectors."""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector):
+        """Registers a callable returning freshly computed metric families at scrape time."""
+        self._collectors.append(collector)
+        return collector
+
+    def render(self):
+        families = list(self._metrics)
+        for collector in self._collectors:
+            try:
+                families.extend(collector())
+            except Exception as e:
+                print(f"Metrics collector {getattr(collector, '__name__', collector)} failed: {e}")
+        return '\n'.join(family.render() for family in families) + '\n'
+
+
+def _text_length(item):
+    if isinstance(item, OutputLog): # A stored log only holds its output in memory until it is spooled
+        return 0 if item.spooled else item.size
+    return len(item) if isinstance(item, (str, bytes)) else 0
+
+
+def _queue_bytes(q):
+    """Sums the pending output still sitting in a job queue, without consuming it."""
+    if hasattr(q, 'pending_bytes'):
+        return q.pending_bytes()
+    mutex = getattr(q, 'mutex', None)
+    pending = getattr(q, 'queue', None)
+    if mutex is None or pending is None:
+        return 0
+    with mutex:
+        items = list(pending)
+    return sum(_text_length(item) for item in items)
+
+
+def _process_cpu_seconds(pid):
+    """Reads user+system CPU time of a live child from /proc (Linux only)."""
+    try:
+        with open(f'/proc/{pid}/stat', 'r') as f:
+            stat = f.read()
+    except OSError:
+        return 0.0
+    # The command name may contain spaces, so split after the closing parenthesis
+    fields = stat.rsplit(')', 1)[-1].split()
+    try:
+        return (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS
+    except (IndexError, ValueError):
+        return 0.0
+
+
+def _directory_bytes(path):
+    total = 0
+    for root, _dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _job_collector(state):
+    """Builds the job, child-process and upload gauges from the app's own tables."""
+    def collect():
+        processes = dict(state.processes)
+        queues = dict(state.queues)
+        outputs = dict(state.outputs)
+
+        jobs = Gauge('cyberweb_jobs', 'Jobs known to this sub-app by state.', ['state'])
+        # An OutputLog that has seen its end marker and been fully read counts as finished
+        drained = {job_id for job_id, q in queues.items()
+                   if getattr(q, 'finished', False) and q.empty() and job_id not in processes}
+        finished = [job_id for job_id in set(outputs) | drained
+                    if job_id not in processes and (job_id not in queues or job_id in drained)
+                    and not str(job_id).endswith('_status')]
+        jobs.set(len(processes), state='running')
+        jobs.set(len([job_id for job_id in queues if job_id not in processes and job_id not in drained]),
+                 state='draining')
+        jobs.set(len(finished), state='finished')
+
+        queue_bytes = Gauge('cyberweb_job_queue_bytes',
+                            'Output waiting in the job queue for the next poll (text length).', ['job'])
+        buffer_bytes = Gauge('cyberweb_job_buffer_bytes',
+                             'Output retained in memory for an active job (text length).', ['job'])
+        for job_id in (set(queues) - drained) | set(processes):
+            if job_id in queues:
+                queue_bytes.set(_queue_bytes(queues[job_id]), job=job_id)
+            buffer_bytes.set(_text_length(outputs.get(job_id)), job=job_id)
+
+        retained = Gauge('cyberweb_job_outputs_retained_bytes',
+                         'Output retained in memory for all jobs, finished ones included (text length).')
+        retained.set(sum(_text_length(output) for output in outputs.values()))
+
+        child_cpu = Gauge('cyberweb_child_cpu_seconds',
+                          'CPU seconds used by child processes (reaped = already exited, live = running).',
+                          ['state'])
+        if resource is not None:
+            usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+            child_cpu.set(usage.ru_utime + usage.ru_stime, state='reaped')
+        child_cpu.set(sum(_process_cpu_seconds(p.pid) for p in processes.values() if hasattr(p, 'pid')),
+                      state='live')
+
+        families = [jobs, queue_bytes, buffer_bytes, retained, child_cpu]
+        if state.upload_folder:
+            uploads = Gauge('cyberweb_upload_bytes', 'Bytes on disk in the upload folder.')
+            uploads.set(_directory_bytes(state.upload_folder))
+            families.append(uploads)
+        return families
+    return collect
+
+
+def _process_collector(state):
+    def collect():
+        info = Gauge('cyberweb_app_info', 'Sub-app served by this process.', ['tool'])
+        info.set(1, tool=state.tool)
+        cpu = Counter('process_cpu_seconds_total', 'Total user and system CPU time of this process.')
+        cpu.inc(time.process_time())
+        start = Gauge('process_start_time_seconds', 'Start time of the process since unix epoch in seconds.')
+        start.set(_START_TIME)
+        return [info, cpu, start]
+    return collect
+
+
+def _count_streamed(iterable, counter, labels):
+    """Passes a streamed response body through, counting the bytes sent."""
+    try:
+        for chunk in iterable:
+            counter.inc(len(chunk.encode('utf-8')) if isinstance(chunk, str) else len(chunk), **labels)
+            yield chunk
+    finally:
+        close = getattr(iterable, 'close', None)
+        if close is not None:
+            close()
+
+
+def init_app(app, state):
+    """Adds request instrumentation and the /metrics endpoint to a sub-app."""
+    registry = Registry()
+    state.metrics = registry
+
+    requests_total = registry.counter('cyberweb_http_requests_total',
+                                      'HTTP requests served by route.', ['method', 'route', 'status'])
+    latency = registry.histogram('cyberweb_http_request_duration_seconds',
+                                 'Time to produce the response (headers) by route.', ['method', 'route'])
+    sent_bytes = registry.counter('cyberweb_http_response_bytes_total',
+                                  'Response body bytes sent to clients by route.', ['route'])
+    polls = registry.counter('cyberweb_output_polls_total',
+                             'Calls to the job output polling endpoints.', ['endpoint'])
+    registry.add_collector(_process_collector(state))
+    registry.add_collector(_job_collector(state))
+
+    @app.before_request
+    def _metrics_start_timer():
+        g.runtime_request_start = time.perf_counter()
+
+    @app.after_request
+    def _metrics_record_request(response):
+        start = g.pop('runtime_request_start', None)
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        requests_total.inc(method=request.method, route=route, status=str(response.status_code))
+        if start is not None:
+            latency.observe(time.perf_counter() - start, method=request.method, route=route)
+        if request.endpoint in POLL_ENDPOINTS:
+            polls.inc(endpoint=request.endpoint)
+
+        if response.direct_passthrough:
+            # send_file responses: the length is known without reading the file
+            sent_bytes.inc(response.content_length or 0, route=route)
+        elif response.is_streamed:
+            response.response = _count_streamed(response.response, sent_bytes, {'route': route})
+        else:
+            sent_bytes.inc(response.calculate_content_length() or 0, route=route)
+        return response
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        """Exposes the sub-app metrics in Prometheus text format."""
+        return Response(registry.render(), mimetype=CONTENT_TYPE)
+
+    return registry
@@ -0,0 +1,409 @@
+"""
+Declarative command-line specs for the tools' `generate_command` endpoints.
+
+A tool app describes the options its UI offers once, tab by tab:
+
+    NMAP_COMMAND = runtime.CommandSpec(app, 'nmap', {
+        'Target': [
+            runtime.Positional('target_entry'),
+            runtime.Value('-iL', 'target_list_file_entry'),
+            runtime.Switch('-Pn', 'no_ping_var'),
+        ],
+        ...
+    })
+
+and `/generate_command` returns `NMAP_COMMAND.build(request.json)`. The spec
+is checked and compiled when the app is imported. Building a command:
+
+* drops values that fail their type or choice check, with a warning;
+* emits a flag once even when several tabs set it (identical repeats are
+  dropped, a value form such as `-p 80` absorbs a bare `-p`, and different
+  values for a non-repeatable flag keep the first one, with a warning);
+* warns when options from the same `conflicts` group are combined;
+* checks flags against the installed tool (see tools.py) once it has been
+  probed: an option needing a newer version (`since`) is dropped, and a
+  flag the tool's help does not list is kept with a warning.
+
+The spec also adds `GET /command_spec` (the spec as JSON, for the UI) and
+`POST /generate_commands` (`{"base": {...}, "variants": [{...}, ...]}` builds
+one command per variant, each variant's fields laid over `base`).
+"""
+import shlex
+
+from flask import jsonify, request
+
+from .tools import REGISTRY, version_tuple
+
+# Most variants one /generate_commands call may build
+MAX_VARIANTS = 1000
+
+TYPE_NAMES = ('str', 'int', 'number')
+
+# Fewer flags than this parsed from a help text means it was not really a help text
+MIN_HELP_FLAGS = 5
+
+
+class Option:
+    """One form field and the command-line tokens it turns into."""
+
+    kind = 'option'
+
+    def __init__(self, flag, key, type='str', choices=None, conflicts=None, dedupe=None, repeat=False, since=None):
+        if type not in TYPE_NAMES:
+            raise ValueError(f"Option {key}: type must be one of {', '.join(TYPE_NAMES)}.")
+        self.flag = flag
+        self.key = key
+        self.type = type
+        self.choices = tuple(str(choice) for choice in choices) if choices else None
+        self.conflicts = conflicts
+        self.dedupe = dedupe if dedupe is not None else flag
+        self.repeat = repeat
+        self.since = since # Oldest tool version that has the flag
+        self.tab = None
+        self.trailing = False
+
+    @property
+    def keys(self):
+        return (self.key,)
+
+    def extract(self, data):
+        return data.get(self.key)
+
+    def check(self, value):
+        """Returns the value as it goes on the command line, or raises ValueError."""
+        if self.type == 'int':
+            if isinstance(value, float) and value.is_integer():
+                value = int(value)
+            elif isinstance(value, str) and value.strip().lstrip('-').isdigit():
+                value = int(value.strip())
+            if isinstance(value, bool) or not isinstance(value, int):
+                raise ValueError(f'{value!r} is not a whole number')
+        elif self.type == 'number':
+            try:
+                float(value)
+            except (TypeError, ValueError):
+                raise ValueError(f'{value!r} is not a number')
+        value = str(value)
+        if self.choices is not None and value not in self.choices:
+            raise ValueError(f"{value!r} is not one of {', '.join(self.choices)}")
+        return value
+
+    def render(self, value):
+        return [self.flag, shlex.quote(self.check(value))]
+
+    def describe(self):
+        spec = {'kind': self.kind, 'key': self.key, 'flag': self.flag, 'type': self.type, 'tab': self.tab}
+        if self.choices is not None:
+            spec['choices'] = list(self.choices)
+        if self.conflicts:
+            spec['conflicts'] = self.conflicts
+        if self.dedupe is not None:
+            spec['dedupe'] = self.dedupe
+        if self.repeat:
+            spec['repeat'] = True
+        if self.since:
+            spec['since'] = self.since
+        return spec
+
+
+class Value(Option):
+    """`flag value` when the field is filled in. `prefix` tokens go before the flag."""
+
+    kind = 'value'
+
+    def __init__(self, flag, key, prefix=(), **kwargs):
+        super().__init__(flag, key, **kwargs)
+        self.prefix = list(prefix)
+
+    def render(self, value):
+        return self.prefix + [self.flag, shlex.quote(self.check(value))]
+
+    def describe(self):
+        spec = super().describe()
+        if self.prefix:
+            spec['prefix'] = self.prefix
+        return spec
+
+
+class Switch(Option):
+    """A bare flag when the checkbox is ticked."""
+
+    kind = 'switch'
+
+    def render(self, value):
+        return [self.flag]
+
+
+class Lines(Option):
+    """`flag line` for every non-empty line of a textarea (e.g. --script-args, --headers)."""
+
+    kind = 'lines'
+
+    def __init__(self, flag, key, **kwargs):
+        kwargs.setdefault('repeat', True)
+        super().__init__(flag, key, **kwargs)
+
+    def render(self, value):
+        tokens = []
+        for line in str(value).split('\n'):
+            line = line.strip()
+            if line:
+                tokens += [self.flag, shlex.quote(line)]
+        return tokens
+
+
+class Positional(Option):
+    """The field's value on its own, e.g. the scan target."""
+
+    kind = 'positional'
+
+    def __init__(self, key, **kwargs):
+        super().__init__(None, key, **kwargs)
+
+    def render(self, value):
+        return [shlex.quote(self.check(value))]
+
+
+class Combined(Option):
+    """
+    One flag whose value joins what several fields contribute, e.g.
+    `--enumerate u,p,vp` from per-item checkboxes plus a profile select.
+    """
+
+    kind = 'combined'
+
+    def __init__(self, flag, parts, select=None, separator=',', **kwargs):
+        super().__init__(flag, None, **kwargs)
+        self.parts = list(parts) # (checkbox key, item)
+        self.select = select # Key of a select whose value (one of `choices`) is added too
+        self.separator = separator
+
+    @property
+    def keys(self):
+        return tuple(key for key, _item in self.parts) + ((self.select,) if self.select else ())
+
+    def extract(self, data):
+        items = [item for key, item in self.parts if data.get(key)]
+        selected = data.get(self.select) if self.select else None
+        if selected and (self.choices is None or str(selected) in self.choices):
+            items.append(str(selected))
+        return items
+
+    def render(self, value):
+        return [self.flag, shlex.quote(self.separator.join(value))]
+
+    def describe(self):
+        spec = super().describe()
+        del spec['key']
+        spec['parts'] = [{'key': key, 'item': item} for key, item in self.parts]
+        if self.select:
+            spec['select'] = self.select
+        return spec
+
+
+class Filter(Option):
+    """
+    A term of a trailing filter expression (tcpdump's pcap filter): the value,
+    preceded by `primitive` (e.g. `host`) and the direction chosen in
+    `direction_key` (`src`/`dst`). For a checkbox the term is just the
+    primitive (e.g. `icmp`). Filter terms go after every option and are
+    joined with `and`.
+    """
+
+    kind = 'filter'
+
+    def __init__(self, key, primitive=None, direction_key=None, **kwargs):
+        super().__init__(None, key, **kwargs)
+        self.primitive = primitive
+        self.direction_key = direction_key
+        self.trailing = True
+
+    @property
+    def keys(self):
+        return (self.key, self.direction_key) if self.direction_key else (self.key,)
+
+    def extract(self, data):
+        value = data.get(self.key)
+        if not value:
+            return None
+        direction = data.get(self.direction_key) if self.direction_key else None
+        return (direction if direction in ('src', 'dst') else None, value)
+
+    def render(self, value):
+        direction, value = value
+        tokens = [direction] if direction else []
+        if self.primitive:
+            tokens.append(self.primitive)
+        if value is True:
+            return tokens
+        return tokens + [shlex.quote(self.check(value))]
+
+    def describe(self):
+        spec = super().describe()
+        if self.primitive:
+            spec['primitive'] = self.primitive
+        if self.direction_key:
+            spec['direction_key'] = self.direction_key
+        return spec
+
+
+class Extra(Option):
+    """Free-form arguments appended as typed (split like a shell would)."""
+
+    kind = 'extra'
+
+    def __init__(self, key):
+        super().__init__(None, key)
+
+    def render(self, value):
+        value = str(value).strip()
+        try:
+            return shlex.split(value)
+        except ValueError:
+            # Fallback if shlex can't parse, just add as a single string (less safe)
+            return [shlex.quote(value)]
+
+
+class CommandSpec:
+    """A tool's options by tab, compiled into a command builder."""
+
+    def __init__(self, app, program, tabs):
+        self.program = program
+        self.tabs = list(tabs)
+        self.options = []
+        seen_keys = set()
+        for tab, options in tabs.items():
+            for option in options:
+                option.tab = tab
+                for key in option.keys:
+                    if key in seen_keys:
+                        raise ValueError(f'{program} command spec: field {key!r} is used twice.')
+                    seen_keys.add(key)
+                self.options.append(option)
+        # Filter terms always go last (before free-form extras), whatever their tab
+        self._leading = tuple(option for option in self.options if not option.trailing)
+        self._trailing = tuple(option for option in self.options if option.trailing)
+        self._description = {
+            'program': program,
+            'tabs': self.tabs,
+            'options': [option.describe() for option in self.options],
+        }
+        self._help_flags = {} # probe key -> set of flags the tool's help lists
+        if app is not None:
+            self.init_app(app)
+
+    def _support(self, option, tool):
+        """Returns (keep, warning) for an option's flag on the probed tool."""
+        version = tool.get('version')
+        if option.since and version and version_tuple(version) < version_tuple(option.since):
+            return False, f"{option.flag} needs {self.program} {option.since} or later (installed: {version}); dropped."
+        flags = self._help_flags.get(tool['key'])
+        if flags is None:
+            flags = self._help_flags[tool['key']] = set(tool['flags'])
+        # parse_flags() keeps the leading dashes but drops trailing ones, so nmap's `-p-` is listed as -p
+        if len(flags) >= MIN_HELP_FLAGS and option.flag.rstrip('-') not in flags:
+            return True, (f"{option.flag} is not listed in the help of the installed {self.program}"
+                          f"{f' {version}' if version else ''}; it may not be supported.")
+        return True, None
+
+    def build(self, data):
+        """Returns (command string, list of warnings) for one set of form values."""
+        data = data if isinstance(data, dict) else {}
+        warnings = []
+        parts = [[self.program]]
+        terms = []
+        extras = []
+        placed = {} # dedupe key -> [(option, tokens, slot list, slot index)]
+        groups = {} # conflicts group -> flags used
+        tool = REGISTRY.cached(self.program) # Never waits for a probe
+        checked = {} # flag -> keep
+
+        for options, target in ((self._leading, parts), (self._trailing, terms)):
+            for option in options:
+                value = option.extract(data)
+                if not value or (isinstance(value, str) and not value.strip()):
+                    continue
+                if tool is not None and tool['found'] and option.flag:
+                    if option.flag not in checked:
+                        checked[option.flag], warning = self._support(option, tool)
+                        if warning:
+                            warnings.append(warning)
+                    if not checked[option.flag]:
+                        continue
+                try:
+                    tokens = option.render(value)
+                except ValueError as e:
+                    warnings.append(f"{option.flag or option.key}: {e}; ignored.")
+                    continue
+                if not tokens:
+                    continue
+                if isinstance(option, Extra):
+                    extras.append(tokens)
+                    continue
+
+                if option.dedupe is not None:
+                    entries = placed.setdefault(option.dedupe, [])
+                    if any(entry[1] == tokens for entry in entries):
+                        continue
+                    if entries and isinstance(option, Switch):
+                        continue # Already on the command line in its value form
+                    bare = next((entry for entry in entries if isinstance(entry[0], Switch)), None)
+                    if bare is not None:
+                        # A value form of the flag replaces the bare flag in place
+                        bare[2][bare[3]] = tokens
+                        entries[entries.index(bare)] = (option, tokens, bare[2], bare[3])
+                        continue
+                    if entries and not option.repeat:
+                        kept = entries[0]
+                        warnings.append(f"{option.dedupe} is set in both {kept[0].key} and {option.key}; "
+                                        f"using {' '.join(kept[1])}.")
+                        continue
+                    entries.append((option, tokens, target, len(target)))
+                target.append(tokens)
+                if option.conflicts:
+                    groups.setdefault(option.conflicts, [])
+                    if (option.dedupe or option.key) not in groups[option.conflicts]:
+                        groups[option.conflicts].append(option.dedupe or option.key)
+
+        for group, flags in groups.items():
+            if len(flags) > 1:
+                warnings.append(f"{', '.join(flags)} cannot be combined ({group}).")
+
+        tokens = [token for option_tokens in parts for token in option_tokens]
+        for index, term in enumerate(terms):
+            if index:
+                tokens.append('and')
+            tokens.extend(term)
+        for extra in extras:
+            tokens.extend(extra)
+        return ' '.join(tokens), warnings
+
+    def describe(self):
+        return self._description
+
+    def init_app(self, app):
+        """Adds /command_spec and /generate_commands to the app."""
+
+        @app.route('/command_spec', methods=['GET'])
+        def command_spec():
+            """Returns the tool's option spec."""
+            tool = REGISTRY.cached(self.program)
+            installed = {'found': tool['found'], 'version': tool.get('version')} if tool is not None else None
+            return jsonify({**self._description, 'installed': installed})
+
+        @app.route('/generate_commands', methods=['POST'])
+        def generate_commands():
+            """Builds one command per variant in a single call."""
+            data = request.get_json(silent=True) or {}
+            base = data.get('base') or {}
+            variants = data.get('variants')
+            if not isinstance(base, dict) or not isinstance(variants, list) \
+                    or not all(isinstance(variant, dict) for variant in variants):
+                return jsonify({'status': 'error', 'message': "Expected {'base': {...}, 'variants': [{...}, ...]}."}), 400
+            if len(variants) > MAX_VARIANTS:
+                return jsonify({'status': 'error', 'message': f'At most {MAX_VARIANTS} variants per call.'}), 400
+            commands = []
+            for variant in variants:
+                command, warnings = self.build({**base, **variant})
+                commands.append({'command': command, 'warnings': warnings})
+            return jsonify({'status': 'success', 'commands': commands})
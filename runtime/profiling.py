@@ -0,0 +1,310 @@
+"""
+Request timing log, slow-request stack dumps and an on-demand sampling profiler.
+
+Nothing here needs a restart to switch on:
+
+* `GET /debug/requests` shows the current settings and the requests in flight;
+  `POST /debug/requests` with `{"log_requests": true, "slow_request_seconds": 2}`
+  changes them on the running process.
+* A watchdog thread dumps the stack of any request that has been running for
+  longer than the slow-request threshold, while it is still running.
+* `GET /debug/profile?seconds=10&format=collapsed|pstats` samples the stacks of
+  every thread in the process for the given time and returns the result as a
+  collapsed-stack file (flamegraph.pl / speedscope) or a pstats file
+  (`python -m pstats`, snakeviz).
+"""
+import logging
+import marshal
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter
+
+from flask import Response, g, jsonify, request
+
+from .jobs import POLL_ENDPOINTS
+
+MAX_PROFILE_SECONDS = 60
+DEFAULT_SAMPLE_INTERVAL = 0.005
+
+# Endpoints that are slow by design and should not trigger slow-request dumps
+SLOW_EXEMPT_ENDPOINTS = {'debug_profile'}
+
+logger = logging.getLogger('runtime.requests')
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stderr)
+    _handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+def _env_flag(name, default=False):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def _env_float(name, default):
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+def _frame_label(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _stack_codes(frame):
+    """Returns the code objects of a frame's stack, outermost call first."""
+    codes = []
+    while frame is not None:
+        codes.append(frame.f_code)
+        frame = frame.f_back
+    codes.reverse()
+    return codes
+
+
+class SamplingProfiler:
+    """Samples the stacks of all threads except the sampling one."""
+
+    def __init__(self, interval=DEFAULT_SAMPLE_INTERVAL, ignore=()):
+        self.interval = interval
+        self.ignore = set(ignore)
+        self.samples = Counter() # (thread name, code objects...) -> hits
+        self.sample_count = 0
+
+    def run(self, seconds):
+        own = threading.get_ident()
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own or ident in self.ignore:
+                    continue
+                self.samples[(names.get(ident, f'thread-{ident}'),) + tuple(_stack_codes(frame))] += 1
+            self.sample_count += 1
+            time.sleep(self.interval)
+        return self
+
+    def collapsed(self):
+        """Renders the samples in Brendan Gregg's collapsed-stack format."""
+        lines = []
+        for (thread_name, *codes), hits in self.samples.most_common():
+            frames = [thread_name] + [_frame_label(code) for code in codes]
+            lines.append(f"{';'.join(frame.replace(';', ':') for frame in frames)} {hits}")
+        return '\n'.join(lines) + '\n'
+
+    def pstats(self):
+        """
+        Converts the samples into the marshalled dict `pstats.Stats` loads.
+
+        Call counts are sample counts, and times are sample counts times the
+        sampling interval, so the numbers are estimates of where wall time went.
+        """
+        def key(code):
+            return (code.co_filename, code.co_firstlineno, code.co_name)
+
+        stats = {}
+        for (_thread_name, *codes), hits in self.samples.items():
+            if not codes:
+                continue
+            elapsed = hits * self.interval
+            seen = set()
+            for depth, code in enumerate(codes):
+                func = key(code)
+                cc, nc, tt, ct, callers = stats.setdefault(func, (0, 0, 0.0, 0.0, {}))
+                nc += hits
+                if func not in seen: # Recursive frames only count once toward cumulative time
+                    cc += hits
+                    ct += elapsed
+                    seen.add(func)
+                if depth == len(codes) - 1:
+                    tt += elapsed
+                if depth > 0:
+                    caller = key(codes[depth - 1])
+                    c_cc, c_nc, c_tt, c_ct = callers.get(caller, (0, 0, 0.0, 0.0))
+                    callers[caller] = (c_cc + hits, c_nc + hits,
+                                       c_tt + (elapsed if depth == len(codes) - 1 else 0.0), c_ct + elapsed)
+                stats[func] = (cc, nc, tt, ct, callers)
+        return marshal.dumps(stats)
+
+
+class _Watchdog(threading.Thread):
+    """Dumps the stack of requests that run past the slow-request threshold."""
+
+    def __init__(self, tracker):
+        super().__init__(name='runtime-slow-request-watchdog', daemon=True)
+        self.tracker = tracker
+
+    def run(self):
+        while True:
+            threshold = self.tracker.slow_request_seconds()
+            time.sleep(min(max(threshold / 2, 0.1), 1.0) if threshold > 0 else 1.0)
+            if threshold > 0:
+                self.tracker.dump_slow(threshold)
+
+
+class RequestTracker:
+    """Keeps track of in-flight requests and logs their timings."""
+
+    def __init__(self, app):
+        self.app = app
+        self.lock = threading.Lock()
+        self.inflight = {} # thread ident -> request info dict
+        self.watchdog = None
+
+    def slow_request_seconds(self):
+        return float(self.app.config.get('RUNTIME_SLOW_REQUEST_SECONDS') or 0)
+
+    def ensure_watchdog(self):
+        if self.watchdog is None:
+            with self.lock:
+                if self.watchdog is None:
+                    self.watchdog = _Watchdog(self)
+                    self.watchdog.start()
+
+    def begin(self):
+        exempt = (request.endpoint in SLOW_EXEMPT_ENDPOINTS
+                  or (request.endpoint in POLL_ENDPOINTS and 'wait' in request.args)) # Long-polls block on purpose
+        info = {'method': request.method, 'path': request.full_path.rstrip('?'),
+                'start': time.perf_counter(), 'dumped': exempt, 'exempt': exempt}
+        with self.lock:
+            self.inflight[threading.get_ident()] = info
+        return info
+
+    def end(self):
+        with self.lock:
+            self.inflight.pop(threading.get_ident(), None)
+
+    def snapshot(self):
+        now = time.perf_counter()
+        with self.lock:
+            return [{'thread': ident, 'method': info['method'], 'path': info['path'],
+                     'running_seconds': round(now - info['start'], 3)}
+                    for ident, info in self.inflight.items()]
+
+    def dump_slow(self, threshold):
+        now = time.perf_counter()
+        with self.lock:
+            slow = [(ident, info) for ident, info in self.inflight.items()
+                    if not info['dumped'] and now - info['start'] > threshold]
+            for _ident, info in slow:
+                info['dumped'] = True
+        frames = sys._current_frames()
+        for ident, info in slow:
+            frame = frames.get(ident)
+            stack = ''.join(traceback.format_stack(frame)) if frame is not None else '(thread finished)\n'
+            logger.warning(f"Slow request still running after {now - info['start']:.2f}s: "
+                           f"{info['method']} {info['path']}\n{stack}")
+
+
+def _tally(iterable, sent):
+    """Passes a streamed body through while adding up its size in sent[0]."""
+    try:
+        for chunk in iterable:
+            sent[0] += len(chunk.encode('utf-8')) if isinstance(chunk, str) else len(chunk)
+            yield chunk
+    finally:
+        close = getattr(iterable, 'close', None)
+        if close is not None:
+            close()
+
+
+def init_app(app, state):
+    """Adds the timing log, slow-request watchdog and /debug/profile to a sub-app."""
+    app.config.setdefault('RUNTIME_REQUEST_LOG', _env_flag('CYBERWEB_REQUEST_LOG'))
+    app.config.setdefault('RUNTIME_SLOW_REQUEST_SECONDS', _env_float('CYBERWEB_SLOW_REQUEST_SECONDS', 5.0))
+    tracker = RequestTracker(app)
+    state.requests = tracker
+    profile_lock = threading.Lock()
+
+    @app.before_request
+    def _profiling_begin_request():
+        if app.config['RUNTIME_SLOW_REQUEST_SECONDS']:
+            tracker.ensure_watchdog()
+        g.runtime_request_info = tracker.begin()
+
+    @app.after_request
+    def _profiling_log_request(response):
+        info = g.get('runtime_request_info')
+        if info is None:
+            return response
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        headers_seconds = time.perf_counter() - info['start']
+        sent = [0]
+        if response.is_streamed and not response.direct_passthrough:
+            response.response = _tally(response.response, sent)
+        else:
+            sent[0] = response.content_length or 0
+
+        def log_timing():
+            total = time.perf_counter() - info['start']
+            threshold = float(app.config.get('RUNTIME_SLOW_REQUEST_SECONDS') or 0)
+            message = (f"{info['method']} {route} {response.status_code} "
+                       f"{headers_seconds * 1000:.1f}ms (body done {total * 1000:.1f}ms) {sent[0]} bytes")
+            if threshold and headers_seconds > threshold and not info['exempt']:
+                logger.warning(f"Slow request: {message}")
+            elif app.config.get('RUNTIME_REQUEST_LOG'):
+                logger.info(message)
+
+        response.call_on_close(log_timing)
+        return response
+
+    @app.teardown_request
+    def _profiling_end_request(_exc):
+        tracker.end()
+
+    @app.route('/debug/requests', methods=['GET', 'POST'])
+    def debug_requests():
+        """Shows or changes the request log settings, and lists requests in flight."""
+        if request.method == 'POST':
+            data = request.get_json(silent=True) or {}
+            if 'log_requests' in data:
+                app.config['RUNTIME_REQUEST_LOG'] = bool(data['log_requests'])
+            if 'slow_request_seconds' in data:
+                try:
+                    app.config['RUNTIME_SLOW_REQUEST_SECONDS'] = max(float(data['slow_request_seconds']), 0.0)
+                except (TypeError, ValueError):
+                    return jsonify({'status': 'error', 'message': 'slow_request_seconds must be a number.'}), 400
+        return jsonify({
+            'status': 'success',
+            'log_requests': app.config['RUNTIME_REQUEST_LOG'],
+            'slow_request_seconds': app.config['RUNTIME_SLOW_REQUEST_SECONDS'],
+            'inflight': tracker.snapshot(),
+        })
+
+    @app.route('/debug/profile', methods=['GET'])
+    def debug_profile():
+        """Samples every thread of the process and returns a collapsed-stack or pstats file."""
+        try:
+            seconds = min(max(float(request.args.get('seconds', 10)), 0.1), MAX_PROFILE_SECONDS)
+            interval = min(max(float(request.args.get('interval', DEFAULT_SAMPLE_INTERVAL)), 0.001), 1.0)
+        except ValueError:
+            return jsonify({'status': 'error', 'message': 'seconds and interval must be numbers.'}), 400
+        output_format = request.args.get('format', 'collapsed')
+        if output_format not in ('collapsed', 'pstats'):
+            return jsonify({'status': 'error', 'message': "format must be 'collapsed' or 'pstats'."}), 400
+        if not profile_lock.acquire(blocking=False):
+            return jsonify({'status': 'error', 'message': 'A profile is already being taken.'}), 409
+        try:
+            ignore = [tracker.watchdog.ident] if tracker.watchdog is not None else []
+            profiler = SamplingProfiler(interval=interval, ignore=ignore).run(seconds)
+        finally:
+            profile_lock.release()
+
+        stamp = time.strftime('%Y%m%d_%H%M%S')
+        if output_format == 'pstats':
+            body, mimetype, filename = profiler.pstats(), 'application/octet-stream', f'{state.tool}_{stamp}.pstats'
+        else:
+            body, mimetype, filename = profiler.collapsed(), 'text/plain', f'{state.tool}_{stamp}.collapsed.txt'
+        response = Response(body, mimetype=mimetype)
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+        response.headers['X-Profile-Samples'] = str(profiler.sample_count)
+        return response
+
+    return tracker
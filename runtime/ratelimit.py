@@ -0,0 +1,452 @@
+"""
+Per-host request budget shared by every HTTP-hitting tool on the machine.
+
+Each tool paces itself (ffuf -rate, wpscan --throttle, ...), but when
+several of them hit the same host at once their rates add up. Every sub-app
+is its own process, so the budget lives in a small SQLite database
+(`CYBERWEB_RATE_DB`, default in the temp folder) that all of them share:
+
+* a ceiling per host in requests per second: `CYBERWEB_HOST_RATE` for every
+  host (default 0: no ceiling), or one set for a host with
+  `POST /rate_limits {"host": ..., "rate": ...}` on any sub-app;
+* leases: every job against a host with a ceiling takes a share of it
+  first. A job alone on the host gets the whole ceiling; next to other jobs
+  a share is at most `CYBERWEB_HOST_RATE_SHARE` of it (default half). A
+  share is never more than the job asked for, nor more than what the other
+  leases left. A job that finds no budget waits for one (at most
+  `CYBERWEB_RATE_WAIT` seconds; after that it runs at MIN_RATE and says so
+  in its log). While it waits it holds a lease of rate 0, so the others
+  know to make room.
+
+Command runners call `throttle_command()`, which reads the target and the
+rate the user asked for from the argv, takes the lease and rewrites the
+tool's rate and thread flags to it (RULES). They pass the job's cancel event
+(OutputLog.cancelled, or a fan-out run's), so a job stopped while it waits
+for budget gives up at once and is not started. In-process scanners open a
+lease with `open_lease()` and call `lease.acquire()` before each request;
+their leases shrink to the share cap when another job on the host waits
+and grow back when the other jobs finish. A command-line tool keeps the
+rate it started with until it exits, so a tool that had a host to itself
+makes the next job wait for it. Leases of processes that died are dropped.
+"""
+import math
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+from flask import jsonify, request
+
+
+def _env_float(name, default):
+    try:
+        return max(float(os.environ.get(name, default)), 0.0)
+    except ValueError:
+        return default
+
+
+DB_PATH = os.environ.get('CYBERWEB_RATE_DB') or os.path.join(tempfile.gettempdir(), 'cyberweb-rate-limits.db')
+DEFAULT_CEILING = _env_float('CYBERWEB_HOST_RATE', 0.0)
+MAX_SHARE = min(_env_float('CYBERWEB_HOST_RATE_SHARE', 0.5), 1.0) or 0.5
+MAX_WAIT = _env_float('CYBERWEB_RATE_WAIT', 300.0)
+MIN_RATE = 1.0 # requests per second; smallest share worth starting a job with
+REFRESH_SECONDS = 2.0 # how often an in-process lease re-reads its share
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ceilings (host TEXT PRIMARY KEY, rate REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS leases (
+    id INTEGER PRIMARY KEY,
+    host TEXT NOT NULL,
+    tool TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    rate REAL NOT NULL,
+    wanted REAL,
+    started_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS leases_host ON leases (host);
+"""
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def _connect():
+    global _schema_ready
+    db = sqlite3.connect(DB_PATH, timeout=30, isolation_level=None)
+    if not _schema_ready:
+        with _schema_lock:
+            db.executescript(_SCHEMA)
+            _schema_ready = True
+    return db
+
+
+def host_of(target):
+    """The host a URL or bare 'host[:port]' points to, lowercased, or None."""
+    if not target:
+        return None
+    try:
+        return urlsplit(target if '://' in target else '//' + target).hostname or None
+    except ValueError:
+        return None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError: # e.g. EPERM: alive, just not ours
+        return True
+    return True
+
+
+def _drop_dead_leases(db):
+    for (pid,) in db.execute('SELECT DISTINCT pid FROM leases').fetchall():
+        if pid != os.getpid() and not _pid_alive(pid):
+            db.execute('DELETE FROM leases WHERE pid = ?', (pid,))
+
+
+def _ceiling(db, host):
+    row = db.execute('SELECT rate FROM ceilings WHERE host = ?', (host,)).fetchone()
+    return row[0] if row is not None else DEFAULT_CEILING
+
+
+def _others(db, host, lease_id):
+    """(count, summed rate) of the leases on a host other than `lease_id`; waiting jobs count with rate 0."""
+    return db.execute('SELECT COUNT(*), COALESCE(SUM(rate), 0) FROM leases WHERE host = ? AND id IS NOT ?',
+                      (host, lease_id)).fetchone()
+
+
+def _grant(ceiling, others, leased, wanted):
+    """The share a new (or refreshed) lease gets, given how many other leases there are and what they hold."""
+    share = ceiling - leased if not others else min(ceiling * MAX_SHARE, ceiling - leased)
+    if wanted:
+        share = min(share, wanted)
+    return max(share, 0.0)
+
+
+def ceiling_for(host):
+    """The host's ceiling in requests per second (0: none)."""
+    if not host:
+        return 0.0
+    try:
+        db = _connect()
+        try:
+            return _ceiling(db, host)
+        finally:
+            db.close()
+    except sqlite3.Error as e:
+        print(f"Rate limit database unavailable: {e}")
+        return 0.0
+
+
+class Lease:
+    """A job's share of a host's ceiling. A lease without an id is unlimited."""
+
+    def __init__(self, host=None, tool=None, rate=None, wanted=None, lease_id=None):
+        self.host = host
+        self.tool = tool
+        self.rate = rate
+        self.wanted = wanted
+        self.id = lease_id
+        self._lock = threading.Lock()
+        self._next_at = 0.0
+        self._refreshed_at = time.monotonic()
+
+    def acquire(self):
+        """Waits until the next request may go out (for in-process scanners)."""
+        if self.id is None:
+            return
+        with self._lock:
+            now = time.monotonic()
+            if now - self._refreshed_at >= REFRESH_SECONDS:
+                self._refresh()
+                self._refreshed_at = now
+            wait = self._next_at - now
+            self._next_at = max(self._next_at, now) + 1.0 / self.rate
+        if wait > 0:
+            time.sleep(wait)
+
+    def _refresh(self):
+        """Re-reads the share: shrinks when another job on the host waits, grows back when the others finished."""
+        try:
+            db = _connect()
+            try:
+                db.execute('BEGIN IMMEDIATE')
+                _drop_dead_leases(db)
+                ceiling = _ceiling(db, self.host)
+                if not ceiling: # Removed meanwhile; keep the pace the job started with
+                    db.execute('COMMIT')
+                    return
+                others, leased = _others(db, self.host, self.id)
+                rate = _grant(ceiling, others, leased, self.wanted)
+                if rate >= MIN_RATE or rate > self.rate:
+                    self.rate = rate
+                    db.execute('UPDATE leases SET rate = ? WHERE id = ?', (rate, self.id))
+                db.execute('COMMIT')
+            finally:
+                db.close()
+        except sqlite3.Error as e:
+            print(f"Could not refresh rate lease for {self.host}: {e}")
+
+    def release(self):
+        if self.id is None:
+            return
+        try:
+            db = _connect()
+            try:
+                db.execute('DELETE FROM leases WHERE id = ?', (self.id,))
+            finally:
+                db.close()
+        except sqlite3.Error as e:
+            print(f"Could not release rate lease for {self.host}: {e}")
+        self.id = None
+
+
+def open_lease(host, tool, wanted=None, log=None, cancelled=None):
+    """
+    Takes a share of a host's ceiling, waiting while the other leases leave none.
+
+    Args:
+        host (str): Target host (see host_of()).
+        tool (str): Name shown in /rate_limits.
+        wanted (float): The rate the job asked for in requests per second, or None for as much as it may.
+        log: Optional OutputLog (or queue) told about waiting and the share taken.
+        cancelled (threading.Event): Gives up waiting when set; the lease is then unlimited.
+
+    Returns:
+        Lease: Unlimited (no id) when the host has no ceiling.
+    """
+    started = time.monotonic()
+    told = False
+    lease_id = None # Our lease of rate 0 while we wait, so in-process leases on the host make room
+    try:
+        while True:
+            try:
+                db = _connect()
+                try:
+                    db.execute('BEGIN IMMEDIATE')
+                    ceiling = _ceiling(db, host) if host else 0.0
+                    if not ceiling:
+                        db.execute('COMMIT')
+                        return Lease(host, tool, wanted=wanted)
+                    _drop_dead_leases(db)
+                    others, leased = _others(db, host, lease_id)
+                    rate = _grant(ceiling, others, leased, wanted)
+                    overdue = time.monotonic() - started >= MAX_WAIT
+                    if rate >= min(MIN_RATE, wanted or MIN_RATE, ceiling * MAX_SHARE) or overdue:
+                        rate = max(rate, min(MIN_RATE, ceiling))
+                        if lease_id is None:
+                            lease_id = db.execute(
+                                'INSERT INTO leases (host, tool, pid, rate, wanted, started_at) VALUES (?, ?, ?, ?, ?, ?)',
+                                (host, tool, os.getpid(), rate, wanted, time.time())).lastrowid
+                        else:
+                            db.execute('UPDATE leases SET rate = ?, started_at = ? WHERE id = ?', (rate, time.time(), lease_id))
+                        db.execute('COMMIT')
+                        lease = Lease(host, tool, rate, wanted, lease_id)
+                        lease_id = None # Granted: the caller releases it
+                        if log is not None:
+                            note = ' after waiting too long; the host may go over its ceiling' if overdue and leased else ''
+                            log.put(f"Rate limit: {rate:g} req/s against {host} "
+                                    f"(ceiling {ceiling:g} req/s, {leased:g} req/s taken by other jobs){note}\n")
+                        return lease
+                    if lease_id is None:
+                        lease_id = db.execute(
+                            'INSERT INTO leases (host, tool, pid, rate, wanted, started_at) VALUES (?, ?, ?, 0, ?, ?)',
+                            (host, tool, os.getpid(), wanted, time.time())).lastrowid
+                    db.execute('COMMIT')
+                finally:
+                    db.close()
+            except sqlite3.Error as e:
+                print(f"Rate limit database unavailable, running {tool} against {host} unthrottled: {e}")
+                return Lease(host, tool, wanted=wanted)
+            if not told and log is not None:
+                log.put(f"Rate limit: waiting for request budget on {host} "
+                        f"(ceiling {ceiling:g} req/s, {leased:g} req/s taken by other jobs)...\n")
+                told = True
+            if cancelled is not None and cancelled.wait(1.0):
+                return Lease(host, tool, wanted=wanted)
+            if cancelled is None:
+                time.sleep(1.0)
+    finally:
+        if lease_id is not None: # Gave up waiting
+            Lease(host, tool, lease_id=lease_id).release()
+
+
+# --- Tool rules: where the target is in an argv, what rate it asks for, how to pace it ---
+
+def _value(argv, flags):
+    """The value after the last of `flags` in an argv, or None."""
+    value = None
+    for index, token in enumerate(argv[:-1]):
+        if token in flags:
+            value = argv[index + 1]
+    return value
+
+
+def _number(argv, flags, default=None):
+    try:
+        return float(_value(argv, flags))
+    except (TypeError, ValueError):
+        return default
+
+
+def _set(argv, flags, value):
+    """Drops every `flags` option (with its value) from an argv and appends `flags[0] value`."""
+    result, index = [], 0
+    while index < len(argv):
+        if argv[index] in flags and index + 1 < len(argv):
+            index += 2
+            continue
+        result.append(argv[index])
+        index += 1
+    return result + [flags[0], value]
+
+
+def _seconds(rate):
+    return f'{1.0 / rate:.3f}'.rstrip('0').rstrip('.')
+
+
+def _milliseconds(rate):
+    return str(max(math.ceil(1000.0 / rate), 1))
+
+
+def _per_delay(count, delay):
+    return count / delay if count and delay else None
+
+
+class Rule:
+    """How one tool is paced."""
+
+    def __init__(self, target_flags, current, apply, list_flags=()):
+        self.target_flags = target_flags
+        self.list_flags = list_flags # options naming a file of targets
+        self.current = current # argv -> requested req/s, or None for unpaced
+        self.apply = apply # (argv, req/s) -> argv
+
+    def target(self, argv):
+        """
+        The host the argv targets: the value of a target flag, else the first URL argument,
+        else the first line of a target list file.
+        """
+        value = _value(argv, self.target_flags)
+        if value is None:
+            value = next((token for token in argv[1:] if '://' in token), None)
+        path = _value(argv, self.list_flags) if value is None and self.list_flags else None
+        if path is not None:
+            try:
+                with open(path) as f:
+                    value = next((line.strip() for line in f if line.strip()), None)
+            except OSError:
+                pass
+        return host_of(value)
+
+
+RULES = {
+    'ffuf': Rule(
+        ('-u',),
+        lambda argv: _number(argv, ('-rate',)) or None,
+        lambda argv, rate: _set(argv, ('-rate',), str(max(int(rate), 1)))),
+    # gospider paces per domain: at most -c requests in flight, a -k second pause before each new one
+    'gospider': Rule(
+        ('-s', '--site'),
+        lambda argv: _per_delay(_number(argv, ('-c', '--concurrent'), 5), _number(argv, ('-k', '--delay'))),
+        lambda argv, rate: _set(_set(argv, ('-c', '--concurrent'), str(max(int(rate), 1))),
+                                ('-k', '--delay'), str(max(math.ceil(1 / rate), 1))),
+        list_flags=('-S', '--sites')),
+    # --throttle also makes wpscan use a single thread
+    'wpscan': Rule(
+        ('--url', '-u'),
+        lambda argv: _per_delay(1000, _number(argv, ('--throttle',))),
+        lambda argv, rate: _set(argv, ('--throttle',), _milliseconds(rate))),
+    'nikto': Rule(
+        ('-h', '-host', '-url'),
+        lambda argv: _per_delay(1, _number(argv, ('-Pause', '-pause'))),
+        lambda argv, rate: _set(argv, ('-Pause', '-pause'), _seconds(rate))),
+    # dalfox's --delay is per worker, so it runs with a single worker
+    'dalfox': Rule(
+        ('-u', '--url'),
+        lambda argv: _per_delay(_number(argv, ('-w', '--worker'), 100) * 1000, _number(argv, ('--delay',))),
+        lambda argv, rate: _set(_set(argv, ('-w', '--worker'), '1'), ('--delay',), _milliseconds(rate))),
+    # wfuzz's -s is per thread, so it runs with a single thread
+    'wfuzz': Rule(
+        ('-u',),
+        lambda argv: _per_delay(_number(argv, ('-t',), 10), _number(argv, ('-s',))),
+        lambda argv, rate: _set(_set(argv, ('-t',), '1'), ('-s',), _seconds(rate))),
+}
+RULES['nikto.pl'] = RULES['nikto']
+
+
+def throttle_command(argv, log=None, tool=None, cancelled=None):
+    """
+    Takes a lease for a command's target host and rewrites its pacing flags to it.
+
+    Args:
+        argv (list): The command; its tool is looked up in RULES by executable name.
+        log: Optional OutputLog (or queue) told about the share taken.
+        tool (str): Name shown in /rate_limits (default: the executable name).
+        cancelled (threading.Event): Stops waiting for budget when set; check it before starting the command.
+
+    Returns:
+        (list, Lease): The argv to run and the lease to release when it exits.
+    """
+    name = os.path.basename(argv[0]) if argv else ''
+    rule = RULES.get(name)
+    host = rule.target(argv) if rule is not None else None
+    if host is None or not ceiling_for(host):
+        return argv, Lease()
+    lease = open_lease(host, tool or name, rule.current(argv), log, cancelled)
+    if lease.id is None:
+        return argv, lease
+    return rule.apply(argv, lease.rate), lease
+
+
+def describe():
+    """Ceilings and active leases, for /rate_limits."""
+    db = _connect()
+    try:
+        _drop_dead_leases(db)
+        ceilings = dict(db.execute('SELECT host, rate FROM ceilings ORDER BY host').fetchall())
+        leases = [{'host': host, 'tool': tool, 'pid': pid, 'rate': rate, 'wanted': wanted, 'started_at': started_at}
+                  for host, tool, pid, rate, wanted, started_at in db.execute(
+                      'SELECT host, tool, pid, rate, wanted, started_at FROM leases ORDER BY host, id')]
+    finally:
+        db.close()
+    return {'default_ceiling': DEFAULT_CEILING, 'max_share': MAX_SHARE, 'ceilings': ceilings, 'leases': leases}
+
+
+def set_ceiling(host, rate):
+    """Sets a host's ceiling (req/s); None removes it, falling back to DEFAULT_CEILING."""
+    db = _connect()
+    try:
+        if rate is None:
+            db.execute('DELETE FROM ceilings WHERE host = ?', (host,))
+        else:
+            db.execute('INSERT OR REPLACE INTO ceilings (host, rate) VALUES (?, ?)', (host, rate))
+    finally:
+        db.close()
+
+
+def init_app(app, state):
+    """Registers /rate_limits: GET shows ceilings and leases, POST sets a host's ceiling."""
+
+    @app.route('/rate_limits', methods=['GET', 'POST'])
+    def rate_limits():
+        try:
+            if request.method == 'POST':
+                data = request.get_json(silent=True) or {}
+                host = host_of(str(data.get('host') or '').strip())
+                if host is None:
+                    return jsonify({'status': 'error', 'message': 'host is required.'}), 400
+                rate = data.get('rate')
+                try:
+                    rate = float(rate) if rate not in (None, '') else None
+                except (TypeError, ValueError):
+                    return jsonify({'status': 'error', 'message': 'rate must be a number of requests per second.'}), 400
+                if rate is not None and rate < 0:
+                    return jsonify({'status': 'error', 'message': 'rate cannot be negative.'}), 400
+                set_ceiling(host, rate)
+            return jsonify(describe())
+        except sqlite3.Error as e:
+            return jsonify({'status': 'error', 'message': f'Rate limit database unavailable: {e}'}), 500
@@ -0,0 +1,149 @@
+"""
+Shared process runner and concurrency limiter.
+
+The tool apps each start their own `subprocess.Popen` and copy its output
+into the job's OutputLog line by line. `run_process()` does the same for
+runtime features that run commands themselves, such as batches and shards:
+it registers the process in the app's process table, so metrics and
+termination see it, and it prefixes every line when several commands share
+one log.
+
+`LIMITER` caps how many commands run at once in a sub-app process
+(`CYBERWEB_MAX_PARALLEL_JOBS`, default: the number of CPUs, at least 2).
+Work scheduled through the runtime waits for a free slot, so a batch of 200
+targets does not start 200 scanners at once. HTTP tools also take their
+share of the target host's request budget first (see ratelimit.py).
+"""
+import os
+import subprocess
+import threading
+
+from . import ratelimit
+from .metrics import Gauge
+
+try:
+    MAX_PARALLEL_JOBS = max(int(os.environ.get('CYBERWEB_MAX_PARALLEL_JOBS', 0)), 0) or max(os.cpu_count() or 1, 2)
+except ValueError:
+    MAX_PARALLEL_JOBS = max(os.cpu_count() or 1, 2)
+
+
+class ConcurrencyLimiter:
+    """A counting semaphore that reports how many slots are taken and awaited."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.running = 0
+        self.waiting = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, cancelled=None):
+        """Waits for a free slot. Returns False if `cancelled` (an Event) is set first."""
+        with self._cond:
+            self.waiting += 1
+            try:
+                while self.running >= self.limit:
+                    if cancelled is not None and cancelled.is_set():
+                        return False
+                    self._cond.wait(0.5)
+                if cancelled is not None and cancelled.is_set():
+                    return False
+                self.running += 1
+                return True
+            finally:
+                self.waiting -= 1
+
+    def release(self):
+        with self._cond:
+            self.running -= 1
+            self._cond.notify()
+
+    def resize(self, limit):
+        with self._cond:
+            self.limit = max(int(limit), 1)
+            self._cond.notify_all()
+
+
+# One limiter per process; every sub-app is its own process
+LIMITER = ConcurrencyLimiter(MAX_PARALLEL_JOBS)
+
+
+def run_process(command, log, prefix='', processes=None, job_id=None, cwd=None, cancelled=None):
+    """
+    Runs a command, putting each output line (stderr merged) into `log`.
+
+    Args:
+        command (list): The argv to run.
+        log: OutputLog (or queue) receiving `prefix + line` for every line.
+        prefix (str): Put in front of every line, e.g. '[10.0.0.1] '.
+        processes (dict): The app's process table; the Popen is kept there under `job_id` while it runs.
+        job_id (str): Key for `processes`.
+        cwd (str): Working directory of the command.
+        cancelled (threading.Event): When set while the command waits for rate budget, it is not started.
+
+    Returns:
+        int: The exit code, or None if the command could not be started.
+    """
+    command, lease = ratelimit.throttle_command(command, _Prefixed(log, prefix), cancelled=cancelled)
+    try:
+        if cancelled is not None and cancelled.is_set():
+            log.put(f"{prefix}Cancelled before '{command[0]}' started.\n")
+            return None
+        return _run(command, log, prefix, processes, job_id, cwd)
+    finally:
+        lease.release()
+
+
+class _Prefixed:
+    """Puts lines into a log with a prefix."""
+
+    def __init__(self, log, prefix):
+        self.log = log
+        self.prefix = prefix
+
+    def put(self, line):
+        self.log.put(self.prefix + line)
+
+
+def _run(command, log, prefix, processes, job_id, cwd):
+    try:
+        process = subprocess.Popen(
+            command,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT, # Merge stderr into stdout for simpler real-time logging
+            stdin=subprocess.DEVNULL,
+            text=True,
+            errors='replace',
+            bufsize=1, # Line-buffered
+            cwd=cwd,
+        )
+    except OSError as e:
+        log.put(f"{prefix}Error: could not start '{command[0]}': {e}\n")
+        return None
+    if processes is not None and job_id is not None:
+        processes[job_id] = process
+    try:
+        for line in iter(process.stdout.readline, ''):
+            log.put(prefix + line if line.endswith('\n') else f'{prefix}{line}\n')
+        process.wait()
+    finally:
+        process.stdout.close()
+        if processes is not None and job_id is not None:
+            processes.pop(job_id, None)
+    return process.returncode
+
+
+def _limiter_collector():
+    def collect():
+        slots = Gauge('cyberweb_runner_slots', 'Runtime-scheduled commands by state.', ['state'])
+        slots.set(LIMITER.running, state='running')
+        slots.set(LIMITER.waiting, state='waiting')
+        limit = Gauge('cyberweb_runner_slot_limit', 'Most runtime-scheduled commands run at once.')
+        limit.set(LIMITER.limit)
+        return [slots, limit]
+    return collect
+
+
+def init_app(app, state):
+    """Reports the limiter's slots on /metrics."""
+    state.metrics.add_collector(_limiter_collector())
+    return LIMITER
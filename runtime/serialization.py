@@ -0,0 +1,71 @@
+"""
+Fast JSON provider for the sub-apps.
+
+`jsonify()` and `request.json` go through `app.json`. `FastJSONProvider` uses
+orjson when it is installed, which serializes the large bodies the apps send
+(scan output, examples lists) several times faster than the `json` module,
+and falls back to Flask's default provider when orjson is missing or cannot
+handle a value (e.g. integers wider than 64 bits).
+
+Responses are always compact. Flask pretty-prints JSON responses in debug
+mode, and the apps run with `debug=True`, so this alone makes the bodies
+noticeably smaller.
+"""
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError: # Optional: without it the stock json module is used
+    orjson = None
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """DefaultJSONProvider that serializes with orjson when it can."""
+
+    sort_keys = False # Keep the apps' key order; sorting costs time for nothing
+    compact = True
+
+    def __init__(self, app):
+        super().__init__(app)
+        if orjson is not None:
+            # Dates, decimals etc. are handed to Flask's `default` so they serialize as before
+            self._options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    @property
+    def backend(self):
+        return 'orjson' if orjson is not None else 'json'
+
+    def dumps_bytes(self, obj):
+        """Serializes to UTF-8 bytes, the form a response body needs."""
+        if orjson is not None:
+            try:
+                return orjson.dumps(obj, default=self.default, option=self._options)
+            except TypeError:
+                pass # Something orjson cannot represent; let the json module try
+        return super().dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            try:
+                return orjson.dumps(obj, default=self.default, option=self._options).decode('utf-8')
+            except TypeError:
+                pass
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            try:
+                return orjson.loads(s)
+            except orjson.JSONDecodeError:
+                pass # Re-parse with the json module so the error is the usual ValueError subclass
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj) + b'\n', mimetype=self.mimetype)
+
+
+def init_app(app, state):
+    """Makes jsonify() and request.json use the fast provider."""
+    app.json = FastJSONProvider(app)
+    return app.json
@@ -0,0 +1,256 @@
+"""
+Tool discovery and version/capability probing.
+
+`which(name)` replaces `shutil.which()` in the run handlers. The registry
+resolves each binary once and afterwards only stats the cached path, instead
+of scanning every PATH directory on every run. Names that were not found are
+looked up again after MISS_TTL_SECONDS, so installing a tool from the UI is
+picked up without a restart.
+
+`probe(name)` runs the tool's version and help commands once per binary and
+keeps the result keyed by the binary's inode, mtime and size. An upgraded
+binary is therefore probed again. Results are saved to CYBERWEB_TOOL_CACHE
+(default: cyberweb-tool-cache.json in the temp folder), so restarting an app
+does not spawn the tools again. The probe yields:
+
+* the version (`version_output`, and `version` as the first dotted number);
+* the option flags listed in the help text (`flags`), which command
+  generation checks without spawning anything.
+
+`/tool_info` returns this for the tools the app uses (`?name=` for one,
+`?refresh=1` to probe again).
+"""
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+
+from flask import jsonify, request
+
+MISS_TTL_SECONDS = 10
+PROBE_TIMEOUT_SECONDS = 15
+CACHE_PATH = os.environ.get('CYBERWEB_TOOL_CACHE') or os.path.join(tempfile.gettempdir(), 'cyberweb-tool-cache.json')
+
+# Arguments that print the version and the option list, where they differ from --version/--help
+PROBE_ARGS = {
+    'amass': (['-version'], ['enum', '-h']),
+    'ffuf': (['-V'], ['-h']),
+    'gospider': (['--version'], ['-h']),
+    'dalfox': (['version'], ['--help']),
+    'msfconsole': (['--version'], ['--help']),
+    'msfvenom': (['--version'], ['--help']),
+    'netdiscover': (['-h'], ['-h']),
+    'netstat': (['--version'], ['--help']),
+    'nikto.pl': (['-Version'], ['-H']),
+    'ngrok': (['version'], ['--help']),
+    'skipfish': (['-h'], ['-h']),
+    'sqlmap': (['--version'], ['-hh']),
+    'steghide': (['--version'], ['--help']),
+    'strings': (['--version'], ['--help']),
+    'wfuzz': (['--version'], ['--help']),
+    'wpscan': (['--version'], ['--hh']),
+}
+DEFAULT_PROBE_ARGS = (['--version'], ['--help'])
+
+VERSION_PATTERN = re.compile(r'(?<![\w.])v?(\d+(?:\.\d+)+)')
+# A flag in help text: -x, -sV, --script, -recursion-depth; slashes join
+# alternatives (nmap's -sS/sT/sA) and --[no-]x names both forms
+FLAG_PATTERN = re.compile(r'(?<![\w/-])(-{1,2})(\[no-\])?([A-Za-z0-9][\w-]*(?:/[A-Za-z0-9][\w-]*)*)')
+
+
+def parse_version(text):
+    """Returns the first dotted version number in the text as a string, or None."""
+    match = VERSION_PATTERN.search(text or '')
+    return match.group(1) if match else None
+
+
+def version_tuple(version):
+    return tuple(int(part) for part in re.findall(r'\d+', version or ''))
+
+
+def parse_flags(text):
+    """Returns the set of option flags mentioned in a help text."""
+    flags = set()
+    for dashes, negation, names in FLAG_PATTERN.findall(text or ''):
+        for index, name in enumerate(names.split('/')):
+            # nmap writes -PS/PA/PU: the alternatives share the leading dash(es)
+            if index and len(name) > 3 and dashes == '-':
+                break # A path or URL rather than alternatives
+            flags.add(dashes + name.rstrip('-'))
+            if negation:
+                flags.add(f'{dashes}no-{name}')
+    return flags
+
+
+def _run(path, args):
+    try:
+        completed = subprocess.run([path] + list(args), stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                   stdin=subprocess.DEVNULL, timeout=PROBE_TIMEOUT_SECONDS)
+    except (OSError, subprocess.SubprocessError) as e:
+        return f'{e}'
+    return completed.stdout.decode('utf-8', errors='replace')
+
+
+class ToolRegistry:
+    """Resolved paths and probe results of the binaries one app runs."""
+
+    def __init__(self, cache_path=CACHE_PATH):
+        self.cache_path = cache_path
+        self.lock = threading.Lock()
+        self.names = [] # Every name looked up, in order
+        self.paths = {} # name -> (PATH value, resolved path or None, resolved at)
+        self.probes = {} # name -> probe result
+        self.probing = {} # name -> threading.Event set once the probe finishes
+        self._saved = None
+
+    def which(self, name):
+        """shutil.which() with the result cached until the binary or PATH changes."""
+        if not name:
+            return None
+        search_path = os.environ.get('PATH', '')
+        cached = self.paths.get(name)
+        if cached is not None and cached[0] == search_path:
+            path = cached[1]
+            if path is None:
+                if time.monotonic() - cached[2] < MISS_TTL_SECONDS:
+                    return None
+            elif os.path.isfile(path) and os.access(path, os.X_OK):
+                return path
+        path = shutil.which(name)
+        with self.lock:
+            if name not in self.paths:
+                self.names.append(name)
+            self.paths[name] = (search_path, path, time.monotonic())
+        return path
+
+    def _key(self, path):
+        st = os.stat(path)
+        return f'{os.path.realpath(path)}:{st.st_ino}:{st.st_mtime_ns}:{st.st_size}'
+
+    def _load_saved(self):
+        if self._saved is None:
+            try:
+                with open(self.cache_path, encoding='utf-8') as f:
+                    self._saved = json.load(f)
+            except (OSError, ValueError):
+                self._saved = {}
+        return self._saved
+
+    def _save(self, key, result):
+        self._saved = None # Other apps may have saved their tools since this one loaded the file
+        saved = self._load_saved()
+        saved[key] = result
+        try:
+            temp_path = f'{self.cache_path}.{os.getpid()}.tmp'
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(saved, f)
+            os.replace(temp_path, self.cache_path)
+        except OSError as e:
+            print(f"Tool registry: could not save probe cache to '{self.cache_path}': {e}")
+
+    def probe(self, name, refresh=False):
+        """Returns the probe result for a tool, running its version/help commands if needed."""
+        path = self.which(name)
+        try:
+            key = self._key(path) if path is not None else None
+        except OSError:
+            key = None
+        if key is None:
+            result = self.probes[name] = {'name': name, 'found': False, 'path': None, 'probed_at': time.time()}
+            return result
+        cached = self.probes.get(name)
+        if not refresh and cached is not None and cached.get('key') == key:
+            return cached
+        with self.lock:
+            saved = self._load_saved().get(key)
+        if not refresh and saved is not None:
+            self.probes[name] = saved
+            return saved
+
+        version_args, help_args = PROBE_ARGS.get(name, DEFAULT_PROBE_ARGS)
+        version_output = _run(path, version_args)
+        help_output = version_output if help_args == version_args else _run(path, help_args)
+        result = {
+            'name': name,
+            'found': True,
+            'path': path,
+            'key': key,
+            'version': parse_version(version_output),
+            'version_output': version_output.strip()[:2000],
+            'flags': sorted(parse_flags(help_output)),
+            'help_args': help_args,
+            'probed_at': time.time(),
+        }
+        with self.lock:
+            self.probes[name] = result
+            self._save(key, result)
+        return result
+
+    def probe_async(self, name):
+        """Probes a tool in the background (once at a time per name)."""
+        with self.lock:
+            event = self.probing.get(name)
+            if event is not None and not event.is_set():
+                return event
+            event = self.probing[name] = threading.Event()
+
+        def run():
+            try:
+                self.probe(name)
+            except Exception as e: # A probe must never take the app down
+                print(f"Tool registry: probing '{name}' failed: {e}")
+            finally:
+                event.set()
+        threading.Thread(target=run, name=f'probe-{name}', daemon=True).start()
+        return event
+
+    def cached(self, name):
+        """The probe result if it is already known, without spawning anything."""
+        result = self.probes.get(name)
+        if result is None or (not result['found'] and time.time() - result['probed_at'] > MISS_TTL_SECONDS):
+            self.probe_async(name)
+        return result
+
+    def info(self, name, refresh=False, flags=False):
+        result = dict(self.probe(name, refresh=refresh))
+        if result.get('found'):
+            result['flag_count'] = len(result['flags'])
+            if not flags:
+                del result['flags']
+        result.pop('key', None)
+        return result
+
+
+# One registry per process; every sub-app is its own process
+REGISTRY = ToolRegistry()
+
+
+def which(name):
+    """Cached shutil.which()."""
+    return REGISTRY.which(name)
+
+
+def init_app(app, state):
+    """Adds /tool_info and starts probing the app's tools in the background."""
+    for name in state.tools:
+        REGISTRY.which(name)
+        REGISTRY.probe_async(name)
+
+    @app.route('/tool_info', methods=['GET'])
+    def tool_info():
+        """Returns path, version and supported flags of the app's tools."""
+        refresh = request.args.get('refresh') in ('1', 'true')
+        with_flags = request.args.get('flags') in ('1', 'true')
+        name = request.args.get('name')
+        if name:
+            if name not in state.tools and name not in REGISTRY.names:
+                return jsonify({'status': 'error', 'message': f"'{name}' is not a tool this app runs."}), 404
+            return jsonify({'status': 'success', 'tool': REGISTRY.info(name, refresh, with_flags)})
+        names = state.tools or REGISTRY.names
+        return jsonify({'status': 'success', 'tools': [REGISTRY.info(n, refresh, with_flags) for n in names]})
+
+    return REGISTRY
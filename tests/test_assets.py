@@ -0,0 +1,48 @@
+"""Template splitting of the static asset pipeline (runtime/assets.py)."""
+import os
+import sys
+import unittest
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, REPO_ROOT)
+
+from runtime import assets
+
+
+class SplitTemplateTest(unittest.TestCase):
+
+    def test_moves_inline_blocks(self):
+        shell, found = assets.split_template(
+            '<html><head><style>body { color: red; }</style></head>'
+            '<body><script>var a = 1;</script><script src="/x.js"></script>'
+            '<script type="application/json">{"a": 1}</script></body></html>', 'page')
+        self.assertEqual([asset.name.rsplit('.', 1)[1] for asset in found], ['css', 'js'])
+        self.assertIn(f'<link rel="stylesheet" href="/assets/{found[0].name}">', shell)
+        self.assertIn(f'<script src="/assets/{found[1].name}"></script>', shell)
+        self.assertIn('<script src="/x.js"></script>', shell)
+        self.assertIn('{"a": 1}', shell)
+
+    def test_keeps_jinja_blocks(self):
+        source = '<script>var id = "{{ scan_id }}";</script>'
+        self.assertEqual(assets.split_template(source, 'page'), (source, []))
+
+    def test_ignores_script_text_in_attributes(self):
+        source = ('<button onclick="showHelp(\'Payload such as \\\'<script>alert(1)</script>\\\' here.\')">?</button>'
+                  '<script>function showHelp(text) {}</script>')
+        shell, found = assets.split_template(source, 'page')
+        self.assertEqual([asset.data for asset in found], [b'function showHelp(text) {}'])
+        self.assertTrue(shell.startswith(source.split('<script>function')[0]))
+
+    def test_dalfox_help_text_is_left_alone(self):
+        # The dalfox page has `<script>alert(1)</script>` inside an onclick attribute
+        path = os.path.join(REPO_ROOT, 'database', 'dalfox', 'templates', 'dalfox_index.html')
+        with open(path, encoding='utf-8') as f:
+            source = f.read()
+        shell, found = assets.split_template(source, 'dalfox_index')
+        self.assertIn('<script>alert(1)</script>', shell)
+        self.assertTrue(all(len(asset.data) > 100 for asset in found))
+        self.assertEqual(sorted(asset.name.rsplit('.', 1)[1] for asset in found), ['css', 'js'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+"""Fan-out runs of the shared runtime (runtime/batch.py)."""
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from runtime import batch, jobs
+
+
+class _Run(batch.FanOutRun):
+    """Entries named 'boom' raise in run_entry, 'late' in finish_entry; the others exit with 0."""
+
+    def __init__(self, targets):
+        super().__init__('run', 2)
+        for target in targets:
+            self.add_entry(target=target)
+
+    def run_entry(self, entry, processes, prefix):
+        if entry['target'] == 'boom':
+            raise OSError('no such file')
+        return 0
+
+    def finish_entry(self, entry, prefix):
+        if entry['target'] == 'late':
+            raise KeyError('taskid')
+
+
+class FanOutRunTest(unittest.TestCase):
+
+    def test_failing_hooks_mark_the_entry_failed(self):
+        run = _Run(['ok', 'boom', 'late'])
+        outputs = jobs.JobOutputs()
+        run.run({}, outputs)
+        self.assertEqual([entry['state'] for entry in run.entries], ['completed', 'failed', 'failed'])
+        self.assertEqual(run.entries[1]['error'], 'OSError: no such file')
+        self.assertEqual(run.entries[2]['exit_code'], 0)
+        self.assertEqual(run.counts(), {'queued': 0, 'running': 0, 'completed': 1, 'failed': 2, 'cancelled': 0})
+        self.assertIn('Batch finished: 1 completed, 2 failed, 0 cancelled.', outputs['run'])
+        self.assertEqual(run.log.marker, batch.END_MARKER)
+
+    def test_cancelled_run_skips_queued_entries(self):
+        run = _Run(['a', 'b'])
+        run.cancel({})
+        run.run({})
+        self.assertEqual(run.status(), 'cancelled')
+        self.assertEqual(run.counts()['cancelled'], 2)
+
+
+class RequestHelpersTest(unittest.TestCase):
+
+    def test_concurrency_is_capped(self):
+        limit = batch.LIMITER.limit
+        self.assertEqual(batch.request_concurrency({}, 100), limit)
+        self.assertEqual(batch.request_concurrency({'concurrency': '0'}, 100), 1)
+        self.assertEqual(batch.request_concurrency({'concurrency': limit + 5}, 3), min(limit, 3))
+        with self.assertRaises(ValueError):
+            batch.request_concurrency({'concurrency': 'many'}, 3)
+
+    def test_target_text(self):
+        self.assertEqual(batch.request_target_text({'hosts': ['a', 'b']}, 'hosts'), 'a\nb')
+        self.assertEqual(batch.request_target_text({'hosts': 'a\nb'}, 'hosts'), 'a\nb')
+        with self.assertRaises(FileNotFoundError):
+            batch.request_target_text({'targets_list': 'no-such-list-here'}, 'hosts')
+
+
+if __name__ == '__main__':
+    unittest.main()
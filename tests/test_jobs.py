@@ -0,0 +1,50 @@
+"""Job output logs and the stored outputs of the shared runtime (runtime/jobs.py)."""
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from runtime import jobs
+
+
+class _State:
+    def __init__(self, outputs, queues):
+        self.outputs = outputs
+        self.queues = queues
+
+
+class JobOutputsTest(unittest.TestCase):
+
+    def test_stored_log_reads_as_text(self):
+        log = jobs.OutputLog()
+        outputs = jobs.JobOutputs(old='done\n')
+        outputs['job'] = log
+        log.put('line 1\n')
+        log.put('line 2\n')
+        self.assertEqual(outputs['job'], 'line 1\nline 2\n')
+        self.assertEqual(outputs.get('job'), 'line 1\nline 2\n')
+        self.assertIs(outputs.log('job'), log)
+        self.assertEqual(outputs.get('old'), 'done\n')
+        self.assertIsNone(outputs.log('old'))
+        self.assertEqual(outputs.get('missing', ''), '')
+
+    def test_long_poll_reads_the_stored_log_after_the_queue_is_dropped(self):
+        with tempfile.TemporaryDirectory() as folder:
+            log = jobs.OutputLog(spool_threshold=4, spool_dir=folder)
+            outputs = jobs.JobOutputs(job=log)
+            queues = {'job': log}
+            log.put('spooled output\n')
+            log.put('---SCAN_COMPLETE---')
+            state = _State(outputs, queues)
+            body, code = jobs.long_poll(state, 'job', 0, 0)
+            self.assertEqual((code, body['output']), (200, 'spooled output\n'))
+            self.assertNotIn('job', queues)
+            body, code = jobs.long_poll(state, 'job', 8, 0)
+            self.assertEqual((code, body['status'], body['output']), (200, 'completed', 'output\n'))
+            self.assertTrue(os.path.exists(log.spool_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
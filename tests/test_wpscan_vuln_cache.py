@@ -0,0 +1,132 @@
+"""WPScan vulnerability lookups (database/wpscan/vuln_cache.py) against a local stand-in for the API."""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.join(REPO_ROOT, 'database', 'wpscan'))
+
+import multisite
+import vuln_cache
+
+PLUGINS = {
+    'contact-form-7': {'contact-form-7': {'vulnerabilities': [
+        {'title': 'Unrestricted upload', 'fixed_in': '5.3.2'},
+        {'title': 'Reflected XSS', 'introduced_in': '5.0', 'fixed_in': '5.1'},
+    ]}},
+}
+
+
+class _StubApi(BaseHTTPRequestHandler):
+    """Answers /plugins/<slug> from PLUGINS (404 otherwise), slowly, and counts the calls."""
+    calls = []
+    delay = 0.2
+
+    def do_GET(self):
+        type(self).calls.append(self.path)
+        time.sleep(self.delay)
+        slug = self.path.rsplit('/', 1)[1]
+        if not self.path.startswith('/plugins/') or slug not in PLUGINS:
+            self.send_error(404)
+            return
+        body = json.dumps(PLUGINS[slug]).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class VulnCacheTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), _StubApi)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.api_url = f'http://127.0.0.1:{cls.server.server_address[1]}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        _StubApi.calls = []
+        self.folder = tempfile.mkdtemp()
+        self.cache = vuln_cache.VulnCache(os.path.join(self.folder, 'cache.db'), api_url=self.api_url, ttl=3600)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_second_lookup_is_a_cache_hit(self):
+        first, cached = self.cache.vulnerabilities('plugins', 'contact-form-7', '5.3.1', 'token')
+        self.assertFalse(cached)
+        self.assertEqual([vulnerability['title'] for vulnerability in first], ['Unrestricted upload'])
+        second, cached = self.cache.vulnerabilities('plugins', 'contact-form-7', '5.0.4', 'token')
+        self.assertTrue(cached)
+        self.assertEqual([vulnerability['title'] for vulnerability in second], ['Unrestricted upload', 'Reflected XSS'])
+        self.assertEqual(len(_StubApi.calls), 1)
+
+    def test_unknown_slugs_are_cached(self):
+        self.assertEqual(self.cache.vulnerabilities('plugins', 'no-such-plugin', '1.0', 'token'), ([], False))
+        self.assertEqual(self.cache.vulnerabilities('plugins', 'no-such-plugin', '1.0', 'token'), ([], True))
+        self.assertEqual(len(_StubApi.calls), 1)
+        self.assertEqual(self.cache.describe()['unknown_slugs'], 1)
+
+    def test_concurrent_lookups_share_one_call(self):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+            self.cache.vulnerabilities('plugins', 'contact-form-7', '5.3.1', 'token'))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(_StubApi.calls), 1)
+        self.assertEqual(sorted(cached for _found, cached in results), [False] + [True] * 7)
+
+    def test_expired_entries_are_fetched_again(self):
+        self.cache.ttl = 0
+        self.cache.vulnerabilities('plugins', 'contact-form-7', '5.3.1', 'token')
+        time.sleep(0.01)
+        self.cache.vulnerabilities('plugins', 'contact-form-7', '5.3.1', 'token')
+        self.assertEqual(len(_StubApi.calls), 2)
+
+
+class AffectsTest(unittest.TestCase):
+
+    def test_version_matching(self):
+        vulnerability = {'introduced_in': '2.0', 'fixed_in': '2.4.1'}
+        self.assertTrue(vuln_cache.affects(vulnerability, '2.0'))
+        self.assertTrue(vuln_cache.affects(vulnerability, '2.4'))
+        self.assertFalse(vuln_cache.affects(vulnerability, '2.4.1'))
+        self.assertFalse(vuln_cache.affects(vulnerability, '2.10'))
+        self.assertFalse(vuln_cache.affects(vulnerability, '1.9.9'))
+        self.assertTrue(vuln_cache.affects(vulnerability, None))
+        self.assertFalse(vuln_cache.affects({'fixed_in': '3.0'}, '3.0.0'))
+        self.assertTrue(vuln_cache.affects({}, '1.0'))
+
+
+class PrepareCommandTest(unittest.TestCase):
+
+    def test_strips_per_site_options_and_keeps_the_token(self):
+        argv = ['wpscan', '--url', 'http://a.example', '--api-token', 'secret', '--format', 'cli', '-o', 'out.txt',
+                '--update', '--enumerate', 'vp', '--output=x.json', '--random-user-agent']
+        self.assertEqual(multisite.prepare_command(argv),
+                         (['wpscan', '--enumerate', 'vp', '--random-user-agent'], 'secret'))
+
+    def test_inline_token(self):
+        self.assertEqual(multisite.prepare_command(['wpscan', '--api-token=abc', '-f', 'json']), (['wpscan'], 'abc'))
+
+
+if __name__ == '__main__':
+    unittest.main()